@@ -5,6 +5,16 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Змішаний деплой (sync-сторінки під gunicorn/WSGI, AJAX під ASGI):
+    DJANGO_ASYNC_AJAX=True gunicorn construction_crm.wsgi                           # сторінки, форми
+    DJANGO_ASYNC_AJAX=True uvicorn construction_crm.asgi:application --workers 2   # /ajax/
+Проксі (nginx) направляє location /ajax/ на uvicorn, решту - на gunicorn.
+З DJANGO_ASYNC_AJAX=True маршрути /ajax/... віддають async views (warehouse/views/ajax_async.py),
+тому клієнтський JS не змінюється. Порівняння під навантаженням: manage.py load_test_ajax.
+SSE-потік залишків (/ajax/warehouse/<id>/stock/events/) реєструється тільки з DJANGO_ASYNC_AJAX=True
+і теж має йти на uvicorn; прапорець потрібен і gunicorn-процесу - за ним форми вмикають підписку
+(без нього - опитування). З різними процесами для запису і стріму потрібен DJANGO_STOCK_EVENTS_BACKEND=db.
 """
 
 import os
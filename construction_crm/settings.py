@@ -107,6 +107,40 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# --- QUERY INSTRUMENTATION (opt-in) ---
+
+# Метрики запиту (SQL count/time, дублікати, рендер шаблонів) у Server-Timing та логер 'warehouse'
+QUERY_INSTRUMENTATION = parse_bool(os.getenv('DJANGO_QUERY_INSTRUMENTATION', 'False'), False)
+try:
+    QUERY_BUDGET_DEFAULT = int(os.getenv('DJANGO_QUERY_BUDGET', '50'))
+except ValueError:
+    QUERY_BUDGET_DEFAULT = 50
+# Бюджети окремих views за url name; перевищення - WARNING у логері 'warehouse'
+QUERY_BUDGETS = {
+    'period_report': 30,
+    'objects_comparison': 30,
+    'material_detail': 20,
+}
+
+if QUERY_INSTRUMENTATION:
+    # Після WhiteNoise: статика не рахується, сесія/користувач - рахуються
+    MIDDLEWARE.insert(2, 'warehouse.middleware.QueryInstrumentationMiddleware')
+
+# --- PROFILING (opt-in) ---
+
+# Staff може зняти профіль запиту (?_profile=1 або заголовок X-Profile: 1): cProfile + журнал SQL.
+# Вимкнено - middleware не підключається, накладних витрат немає.
+PROFILING_ENABLED = parse_bool(os.getenv('DJANGO_PROFILING', 'False'), False)
+PROFILING_DIR = Path(os.getenv('DJANGO_PROFILING_DIR', BASE_DIR / 'logs' / 'profiles'))
+try:
+    PROFILING_KEEP = int(os.getenv('DJANGO_PROFILING_KEEP', '50'))
+except ValueError:
+    PROFILING_KEEP = 50
+
+if PROFILING_ENABLED:
+    # Останнім: після AuthenticationMiddleware (потрібен request.user), профілюється тільки view
+    MIDDLEWARE.append('warehouse.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'construction_crm.urls'
 
 TEMPLATES = [
@@ -120,6 +154,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'warehouse.context_processors.async_features',
             ],
         },
     },
@@ -189,8 +224,9 @@ STATICFILES_DIRS = [
 # У тестах використовуємо простий storage без manifest
 if IS_CHECK_OR_TEST:
     STORAGES = {
+        # Медіа з адресацією за вмістом: однакові файли зберігаються один раз
         "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "BACKEND": "warehouse.storage.ContentAddressedStorage",
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -198,8 +234,9 @@ if IS_CHECK_OR_TEST:
     }
 else:
     STORAGES = {
+        # Медіа з адресацією за вмістом: однакові файли зберігаються один раз
         "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "BACKEND": "warehouse.storage.ContentAddressedStorage",
         },
         "staticfiles": {
             "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -225,10 +262,27 @@ CACHES = {
 }
 
 
+# --- ASYNC AJAX ---
+
+# True: маршрути /ajax/... (stock, materials, stages, duplicates) обслуговують async views.
+# Має сенс, коли /ajax/ проксіюється на ASGI-воркери (див. construction_crm/asgi.py).
+# Async-версії завжди доступні також за префіксом /ajax/async/.
+# Також вмикає SSE-потік залишків (під WSGI його немає - форми опитують /ajax/warehouse/<id>/stock/).
+ASYNC_AJAX = parse_bool(os.getenv('DJANGO_ASYNC_AJAX', 'False'), False)
+
+# Канал змін залишків (SSE /ajax/warehouse/<id>/stock/events/):
+# 'db' - опитування таблиці Transaction, працює між процесами (gunicorn + uvicorn);
+# 'local' - pub-sub у пам'яті, тільки коли запис і стрім в одному процесі.
+STOCK_EVENTS_BACKEND = os.getenv('DJANGO_STOCK_EVENTS_BACKEND', 'db')
+
+
 # Налаштування для завантаження файлів (фото)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Завантаження: потокова перевірка розміру/типу і запис одразу поруч зі сховищем (warehouse.uploads)
+FILE_UPLOAD_HANDLERS = ['warehouse.uploads.StreamingUploadHandler']
+
 
 # --- DEFAULT PRIMARY KEY ---
 
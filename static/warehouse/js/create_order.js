@@ -185,14 +185,10 @@ window.CreateOrder = {
                 const newSelect = addedRow.querySelector('select');
 
                 // Ініціалізуємо TomSelect для нового селекту
-                if (newSelect && typeof TomSelect !== 'undefined') {
+                if (newSelect && typeof window.initTomSelect === 'function') {
                     // Невелика затримка, щоб DOM оновився
                     setTimeout(function() {
-                        new TomSelect(newSelect, {
-                            create: false,
-                            sortField: { field: "text", direction: "asc" },
-                            placeholder: "Оберіть матеріал..."
-                        });
+                        window.initTomSelect(newSelect);
                     }, 10);
                 }
             });
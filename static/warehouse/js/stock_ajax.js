@@ -9,11 +9,16 @@
  * - data-material-select="#id_material"
  * - data-qty-input="#id_quantity"
  * - data-hint-target="#stock-hint"
+ * - data-stock-events - живі зміни залишків через SSE (тільки ASYNC_AJAX / ASGI);
+ *   без нього залишки перечитуються кожні POLL_INTERVAL_MS
  */
 
 (function() {
     'use strict';
 
+    // Без SSE-потоку кеш залишків складу вважається застарілим через стільки мс
+    const POLL_INTERVAL_MS = 30000;
+
     /**
      * Парсить рядок з десятковим числом в ціле число (помножене на scale).
      * Це дозволяє порівнювати кількості без float-артефактів.
@@ -57,10 +62,36 @@
         return result;
     }
 
+    /**
+     * Приводить відповідь /ajax/warehouse/<id>/stock/ ({items: [...]}) до мап,
+     * з якими працює валідатор: {stock: {mat_id: "qty"}, units: {mat_id: "unit"}}.
+     */
+    function toStockMaps(data) {
+        if (data.stock) return data;
+        const result = { warehouse_id: data.warehouse_id, stock: {}, units: {} };
+        (data.items || []).forEach(item => {
+            result.stock[item.material_id] = item.qty;
+            result.units[item.material_id] = item.unit;
+        });
+        return result;
+    }
+
+    /**
+     * Додає дельту до залишку (обидва - Decimal-рядки) через цілі числа (scale=1000).
+     * Приклад: addDecimalStrings("10.000", "-4.5") -> "5.500"
+     */
+    function addDecimalStrings(a, b) {
+        const total = parseDecimalToInt(a, 1000) + parseDecimalToInt(b, 1000);
+        const abs = Math.abs(total);
+        return `${total < 0 ? '-' : ''}${Math.floor(abs / 1000)}.${String(abs % 1000).padStart(3, '0')}`;
+    }
+
     class StockValidator {
         constructor(form) {
             this.form = form;
             this.cache = {}; // Кеш для зберігання даних: { warehouseId: responseData }
+            // SSE-маршрут є лише під ASGI (settings.ASYNC_AJAX) - інакше опитування
+            this.liveUpdates = form.hasAttribute('data-stock-events') && !!window.EventSource;
 
             // 1. Зчитуємо налаштування з data-атрибутів або беремо дефолтні (Django IDs)
             this.config = {
@@ -107,27 +138,34 @@
             }
         }
 
-        fetchStock(warehouseId) {
+        isFresh(data) {
+            return this.liveUpdates || Date.now() - data.fetchedAt < POLL_INTERVAL_MS;
+        }
+
+        fetchStock(warehouseId, background = false) {
             if (!warehouseId) {
                 this.currentData = null;
                 this.updateUI(null);
                 return;
             }
 
-            // Перевірка кешу
-            if (this.cache[warehouseId]) {
+            // Перевірка кешу (актуальний, поки відкрито SSE-потік цього складу або не минув інтервал опитування)
+            if (!background && this.cache[warehouseId] && this.isFresh(this.cache[warehouseId])) {
                 this.currentData = this.cache[warehouseId];
                 this.validate();
+                this.subscribe(warehouseId);
                 return;
             }
 
-            // Індикація завантаження
-            if (this.elHint) {
-                this.elHint.style.display = 'block';
-                this.elHint.textContent = 'Завантаження залишків...';
-                this.elHint.className = 'form-text text-muted';
+            // Індикація завантаження (фонове оновлення - без блокування форми)
+            if (!background) {
+                if (this.elHint) {
+                    this.elHint.style.display = 'block';
+                    this.elHint.textContent = 'Завантаження залишків...';
+                    this.elHint.className = 'form-text text-muted';
+                }
+                if (this.elSubmit) this.elSubmit.disabled = true;
             }
-            if (this.elSubmit) this.elSubmit.disabled = true;
 
             // AJAX запит на canonical endpoint
             fetch(`/ajax/warehouse/${warehouseId}/stock/`)
@@ -139,12 +177,21 @@
                 })
                 .then(data => {
                     // Зберігаємо в кеш
+                    data = toStockMaps(data);
+                    data.fetchedAt = Date.now();
                     this.cache[warehouseId] = data;
+                    // Відповідь фонового оновлення могла прийти вже після зміни складу
+                    if (background && this.elWarehouse.value !== warehouseId) return;
                     this.currentData = data;
                     this.validate();
+                    this.subscribe(warehouseId);
                 })
                 .catch(error => {
                     console.error('Error fetching stock:', error);
+                    if (background) {
+                        this.schedulePoll(warehouseId);
+                        return;
+                    }
                     if (this.elHint) {
                         this.elHint.textContent = 'Помилка отримання даних';
                         this.elHint.className = 'form-text text-danger';
@@ -154,6 +201,60 @@
                 });
         }
 
+        /**
+         * Підписка на зміни залишків складу (SSE): дельти застосовуються до кешу,
+         * тому повторні запити повних залишків не потрібні.
+         * Подія resync - потік пропустив зміни, перечитуємо залишки повністю.
+         */
+        subscribe(warehouseId) {
+            if (!this.liveUpdates) {
+                this.schedulePoll(warehouseId);
+                return;
+            }
+            if (this.events && this.eventsWarehouse === warehouseId) return;
+
+            if (this.events) {
+                this.events.close();
+                // Без потоку кеш попереднього складу застаріє
+                delete this.cache[this.eventsWarehouse];
+            }
+
+            this.eventsWarehouse = warehouseId;
+            this.events = new EventSource(`/ajax/warehouse/${warehouseId}/stock/events/`);
+            this.events.addEventListener('stock', (e) => this.applyDeltas(warehouseId, JSON.parse(e.data)));
+            this.events.addEventListener('resync', () => {
+                delete this.cache[warehouseId];
+                if (this.elWarehouse.value === warehouseId) this.fetchStock(warehouseId);
+            });
+        }
+
+        /**
+         * Без SSE: фонове перечитування залишків вибраного складу кожні POLL_INTERVAL_MS
+         * (прихована вкладка не опитує - оновиться при наступному виборі складу).
+         */
+        schedulePoll(warehouseId) {
+            clearTimeout(this.pollTimer);
+            this.pollTimer = setTimeout(() => {
+                if (this.elWarehouse.value !== warehouseId) return;
+                if (document.hidden) {
+                    this.schedulePoll(warehouseId);
+                    return;
+                }
+                this.fetchStock(warehouseId, true);
+            }, POLL_INTERVAL_MS);
+        }
+
+        applyDeltas(warehouseId, payload) {
+            const data = this.cache[warehouseId];
+            if (!data) return;
+
+            (payload.deltas || []).forEach(item => {
+                data.stock[item.material_id] = addDecimalStrings(data.stock[item.material_id] || '0', item.delta);
+            });
+
+            if (this.currentData === data) this.validate();
+        }
+
         validate() {
             // Скидаємо стан кнопки (розблоковуємо за замовчуванням)
             if (this.elSubmit) this.elSubmit.disabled = false;
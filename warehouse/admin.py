@@ -4,7 +4,8 @@ from django.db.models import Sum, Q
 from .models import (
     Material, Warehouse, Transaction, Order, OrderItem, 
     Supplier, SupplierPrice, AuditLog, Category, 
-    ConstructionStage, StageLimit, UserProfile
+    ConstructionStage, StageLimit, UserProfile, ReorderSuggestion,
+    InventoryEvent, EventCheckpoint, Stocktake, StocktakeLine
 )
 
 # --- INLINES (Вкладені таблиці) ---
@@ -23,6 +24,11 @@ class StageLimitInline(TabularInline):
     extra = 1
     raw_id_fields = ['material'] 
 
+class StocktakeLineInline(TabularInline):
+    model = StocktakeLine
+    extra = 0
+    raw_id_fields = ['material']
+
 # --- ADMIN MODELS ---
 
 @admin.register(Category)
@@ -79,6 +85,31 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('id', 'warehouse__name', 'note')
     inlines = [OrderItemInline]
 
+@admin.register(ReorderSuggestion)
+class ReorderSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('reorder_date', 'warehouse', 'material', 'current_stock', 'days_of_cover', 'reorder_quantity', 'computed_at')
+    list_filter = ('warehouse',)
+    search_fields = ('material__name',)
+    raw_id_fields = ('material',)
+
+@admin.register(InventoryEvent)
+class InventoryEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'warehouse', 'material', 'delta', 'transaction', 'created_at')
+    list_filter = ('event_type', 'warehouse')
+    raw_id_fields = ('material', 'transaction')
+    readonly_fields = ('event_type', 'transaction', 'warehouse', 'material', 'delta', 'created_at')
+
+@admin.register(EventCheckpoint)
+class EventCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('consumer', 'position', 'gap_seen_at', 'updated_at')
+
+@admin.register(Stocktake)
+class StocktakeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'warehouse', 'status', 'created_by', 'created_at', 'posted_at')
+    list_filter = ('status', 'warehouse')
+    readonly_fields = ('posted_at',)
+    inlines = [StocktakeLineInline]
+
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'user', 'action_type', 'affected_object', 'ip_address')
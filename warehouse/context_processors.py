@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def async_features(request):
+    """
+    Прапорці можливостей, що залежать від деплою (ASGI / WSGI), для шаблонів.
+    stock_events_enabled - SSE-потік залишків зареєстровано (див. urls.py), форми можуть підписуватись.
+    """
+    return {'stock_events_enabled': settings.ASYNC_AJAX}
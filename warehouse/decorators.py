@@ -1,4 +1,5 @@
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.core.exceptions import PermissionDenied
 from django.http import JsonResponse
@@ -6,37 +7,57 @@ from django.core.cache import cache
 import time
 
 
+def _rate_limit_identifier(request, user):
+    """Ключ лімітування: user_id для авторизованих, IP для анонімних."""
+    if user.is_authenticated:
+        return f"user_{user.id}"
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0].strip()
+    else:
+        ip = request.META.get('REMOTE_ADDR', 'unknown')
+    return f"ip_{ip}"
+
+
+def _rate_limited_response():
+    return JsonResponse({
+        'error': 'Too many requests. Please try again later.',
+        'retry_after': 60
+    }, status=429)
+
+
 def rate_limit(requests_per_minute=60, key_prefix='rl'):
     """
     Декоратор для rate limiting.
     Обмежує кількість запитів на хвилину для кожного користувача/IP.
+    Підтримує і sync, і async views (для async - request.auser() та async API кешу).
 
     Використання: @rate_limit(requests_per_minute=30)
     """
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _async_wrapped_view(request, *args, **kwargs):
+                user = await request.auser()
+                cache_key = f"{key_prefix}:{view_func.__name__}:{_rate_limit_identifier(request, user)}"
+
+                request_count = await cache.aget(cache_key, 0)
+                if request_count >= requests_per_minute:
+                    return _rate_limited_response()
+                await cache.aset(cache_key, request_count + 1, timeout=60)
+
+                return await view_func(request, *args, **kwargs)
+            return _async_wrapped_view
+
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            # Визначаємо ключ: user_id для авторизованих, IP для анонімних
-            if request.user.is_authenticated:
-                identifier = f"user_{request.user.id}"
-            else:
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip = x_forwarded_for.split(',')[0].strip()
-                else:
-                    ip = request.META.get('REMOTE_ADDR', 'unknown')
-                identifier = f"ip_{ip}"
-
-            cache_key = f"{key_prefix}:{view_func.__name__}:{identifier}"
+            cache_key = f"{key_prefix}:{view_func.__name__}:{_rate_limit_identifier(request, request.user)}"
 
             # Отримуємо поточний лічильник
             request_count = cache.get(cache_key, 0)
 
             if request_count >= requests_per_minute:
-                return JsonResponse({
-                    'error': 'Too many requests. Please try again later.',
-                    'retry_after': 60
-                }, status=429)
+                return _rate_limited_response()
 
             # Збільшуємо лічильник
             cache.set(cache_key, request_count + 1, timeout=60)
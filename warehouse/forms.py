@@ -1,16 +1,19 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.forms import inlineformset_factory
+from django.forms import inlineformset_factory, BaseInlineFormSet
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
 from django.db.models import Sum, Case, When, F, DecimalField
 from decimal import Decimal
-from django.urls import reverse
+from django.urls import reverse_lazy
+from django.utils.functional import cached_property
 
 from .models import (
     Transaction, Order, OrderItem, OrderComment,
-    UserProfile, Warehouse, Category, ConstructionStage, Material
+    UserProfile, Warehouse, Category, ConstructionStage, Material, Supplier
 )
+from .services.inventory import StockCheck, InsufficientStockError
+from .services.data_import import IMPORT_EXTENSIONS, KIND_LABELS
 
 
 # ==============================================================================
@@ -21,12 +24,20 @@ from .models import (
 MAX_UPLOAD_SIZE_MB = 10
 MAX_UPLOAD_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
 
+# Файли імпорту (CSV/XLSX) мають власний ліміт: читаються потоково (services.data_import),
+# тож розмір впливає лише на диск і час імпорту, а не на пам'ять
+MAX_IMPORT_UPLOAD_SIZE_MB = 200
+MAX_IMPORT_UPLOAD_SIZE = MAX_IMPORT_UPLOAD_SIZE_MB * 1024 * 1024
+
 # Дозволені розширення для зображень
 ALLOWED_IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
 
 # Дозволені розширення для документів
 ALLOWED_DOC_EXTENSIONS = ['pdf', 'jpg', 'jpeg', 'png']
 
+# Дозволені розширення для імпорту даних (services.data_import)
+ALLOWED_IMPORT_EXTENSIONS = list(IMPORT_EXTENSIONS)
+
 
 def validate_file_size(file):
     """Валідатор розміру файлу."""
@@ -49,11 +60,125 @@ def validate_image_file(file):
                 f"Недозволений тип файлу. Дозволені: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
             )
 
+class RejectedUploadsMixin:
+    """
+    Файли, відхилені ще під час прийому (uploads.StreamingUploadHandler: розмір/тип),
+    прибираються з files і показуються як помилки відповідних полів форми.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = {}
+        for name in self.fields:
+            upload = self.files.get(self.add_prefix(name))
+            if getattr(upload, 'upload_error', None):
+                self.upload_errors[name] = upload.upload_error
+        if self.upload_errors:
+            self.files = self.files.copy()
+            for name in self.upload_errors:
+                del self.files[self.add_prefix(name)]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, message in self.upload_errors.items():
+            self.add_error(name, message)
+        return cleaned_data
+
+# ==============================================================================
+# AUTOCOMPLETE МАТЕРІАЛІВ
+# ==============================================================================
+
+class MaterialAutocompleteWidget(forms.Select):
+    """
+    Select для матеріалу, що рендерить тільки вибране значення.
+    Решта опцій підвантажується через AJAX (ajax_materials) - див. initMaterialAutocomplete у base.html.
+    Це прибирає <option> для кожного матеріалу каталогу з кожної форми та кожного рядка formset.
+    """
+
+    def __init__(self, attrs=None):
+        default_attrs = {
+            'class': 'form-select material-autocomplete',
+            'data-ajax-url': reverse_lazy('ajax_materials'),
+        }
+        if attrs:
+            default_attrs.update(attrs)
+        super().__init__(default_attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected_values = [v for v in value if v not in ('', None)]
+        options = [self.create_option(name, '', '---------', not selected_values, 0)]
+
+        if selected_values:
+            field = self.choices.field
+            prefetched = getattr(field, 'prefetched', None) or {}
+            for index, raw in enumerate(selected_values, start=1):
+                try:
+                    obj = prefetched.get(int(raw)) or field.queryset.filter(pk=raw).first()
+                except (TypeError, ValueError):
+                    obj = None
+                if obj is not None:
+                    options.append(self.create_option(name, obj.pk, field.label_from_instance(obj), True, index))
+
+        return [(None, options, 0)]
+
+
+class MaterialChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField для матеріалу з autocomplete-віджетом.
+    Якщо formset заздалегідь резолвив id (prefetched = {id: Material}), валідація не робить запитів.
+    """
+    widget = MaterialAutocompleteWidget
+
+    def __init__(self, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = Material.objects.all()
+        super().__init__(queryset=queryset, **kwargs)
+        self.prefetched = None
+
+    def to_python(self, value):
+        if self.prefetched is None or value in self.empty_values or isinstance(value, Material):
+            return super().to_python(value)
+        try:
+            obj = self.prefetched.get(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
+class MaterialItemFormSet(BaseInlineFormSet):
+    """
+    Inline formset позицій з полем material.
+    Усі матеріали formset резолвляться одним in_bulk (замість get() на кожен рядок).
+    """
+
+    @cached_property
+    def material_map(self):
+        ids = set()
+        if self.is_bound:
+            for i in range(self.total_form_count()):
+                raw = self.data.get(f"{self.add_prefix(i)}-material")
+                if raw and str(raw).isdigit():
+                    ids.add(int(raw))
+        else:
+            ids.update(obj.material_id for obj in self.get_queryset())
+        return Material.objects.in_bulk(ids) if ids else {}
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['material'].prefetched = self.material_map
+        return form
+
 # ==============================================================================
 # 1. ФОРМИ ТРАНЗАКЦІЙ (INVENTORY MOVEMENT)
 # ==============================================================================
 
-class TransactionForm(forms.ModelForm):
+class TransactionForm(RejectedUploadsMixin, forms.ModelForm):
     """
     Форма для ручного створення транзакцій (Списання, Прихід, Втрати).
     Використовується на сторінці /transaction/add/
@@ -70,12 +195,8 @@ class TransactionForm(forms.ModelForm):
         widget=forms.Select(attrs={'class': 'form-select', 'id': 'type-select'})
     )
     
-    # Явне визначення поля матеріалу для гарантованого завантаження списку
-    material = forms.ModelChoiceField(
-        queryset=Material.objects.all().order_by('name'),
-        label="Матеріал",
-        widget=forms.Select(attrs={'class': 'form-select tom-select'})
-    )
+    # Матеріал обирається через AJAX autocomplete (без рендеру всього каталогу)
+    material = MaterialChoiceField(label="Матеріал")
 
     # Використовуємо DecimalField для точності
     quantity = forms.DecimalField(
@@ -109,20 +230,16 @@ class TransactionForm(forms.ModelForm):
         material = cleaned_data.get('material')
         warehouse = cleaned_data.get('warehouse')
         
-        # Валідація залишків при списанні
+        # Валідація залишків при списанні.
+        # Один запит на залишок; в транзакції view він блокує матеріал, і create_writeoff
+        # перевикористовує цей же контекст (self.stock_check) без повторного читання.
+        self.stock_check = None
         if t_type in ['OUT', 'LOSS'] and qty and material and warehouse:
-            in_qty = Transaction.objects.filter(
-                material=material, warehouse=warehouse, transaction_type='IN'
-            ).aggregate(s=Sum('quantity'))['s'] or Decimal("0")
-            
-            out_loss_qty = Transaction.objects.filter(
-                material=material, warehouse=warehouse, transaction_type__in=['OUT', 'LOSS']
-            ).aggregate(s=Sum('quantity'))['s'] or Decimal("0")
-            
-            current_stock = in_qty - out_loss_qty
-            
-            if qty > current_stock:
-                raise ValidationError(f"Недостатньо товару на складі! Доступно: {current_stock} {material.unit}")
+            self.stock_check = StockCheck(warehouse, material)
+            try:
+                self.stock_check.ensure(qty)
+            except InsufficientStockError as e:
+                raise ValidationError(f"Недостатньо товару на складі! Доступно: {e.available_qty} {material.unit}")
                 
         return cleaned_data
 
@@ -130,7 +247,7 @@ class TransactionForm(forms.ModelForm):
 # 2. ФОРМИ ЗАЯВОК (ORDERS)
 # ==============================================================================
 
-class OrderForm(forms.ModelForm):
+class OrderForm(RejectedUploadsMixin, forms.ModelForm):
     """Форма створення/редагування самої заявки (шапка)"""
     class Meta:
         model = Order
@@ -169,10 +286,7 @@ class OrderForm(forms.ModelForm):
 
 class OrderItemForm(forms.ModelForm):
     """Форма одного рядка заявки (Матеріал + Кількість)"""
-    material = forms.ModelChoiceField(
-        queryset=Material.objects.all().order_by('name'),
-        widget=forms.Select(attrs={'class': 'form-select tom-select'}) # Клас для TomSelect JS
-    )
+    material = MaterialChoiceField()
     quantity = forms.DecimalField(
         min_value=Decimal("0.001"), 
         max_digits=14, 
@@ -180,21 +294,22 @@ class OrderItemForm(forms.ModelForm):
         widget=forms.NumberInput(attrs={'step': '0.001', 'class': 'form-control'})
     )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Додаємо URL для AJAX пошуку матеріалів
-        self.fields['material'].widget.attrs.update({
-            'data-ajax-url': reverse('ajax_materials')
-        })
-
     class Meta:
         model = OrderItem
         fields = ['material', 'quantity']
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Матеріал вже резолвлено formset'ом через in_bulk - повторна перевірка FK дала б запит на кожен рядок
+        if self.fields['material'].prefetched is not None:
+            exclude.add('material')
+        return exclude
+
 # FormSet для редагування списку товарів у заявці
 OrderItemFormSet = inlineformset_factory(
     Order, OrderItem, 
     form=OrderItemForm,
+    formset=MaterialItemFormSet,
     extra=1, 
     can_delete=True
 )
@@ -229,7 +344,7 @@ class UserUpdateForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
         }
 
-class ProfileUpdateForm(forms.ModelForm):
+class ProfileUpdateForm(RejectedUploadsMixin, forms.ModelForm):
     """Редагування розширених даних профілю (UserProfile)"""
     class Meta:
         model = UserProfile
@@ -277,4 +392,87 @@ class PeriodReportForm(forms.Form):
         label="Категорія",
         widget=forms.Select(attrs={'class': 'form-select'}),
         empty_label="-- Всі категорії --"
-    )
\ No newline at end of file
+    )
+
+
+# ==============================================================================
+# 5. ІМПОРТ ДАНИХ (CSV / XLSX)
+# ==============================================================================
+
+class DataImportForm(RejectedUploadsMixin, forms.Form):
+    """
+    Форма імпорту: початкові залишки, ліміти етапів, прайс постачальника.
+    Склад потрібен для залишків і лімітів, постачальник - для прайсу.
+    """
+    kind = forms.ChoiceField(
+        choices=list(KIND_LABELS.items()),
+        label="Що імпортуємо",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    file = forms.FileField(
+        label=f"Файл (CSV або XLSX, до {MAX_IMPORT_UPLOAD_SIZE_MB} MB)",
+        validators=[FileExtensionValidator(allowed_extensions=ALLOWED_IMPORT_EXTENSIONS)],
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    warehouse = forms.ModelChoiceField(
+        queryset=Warehouse.objects.all(),
+        required=False,
+        label="Склад (об'єкт)",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        empty_label="-- Оберіть склад --"
+    )
+    supplier = forms.ModelChoiceField(
+        queryset=Supplier.objects.all(),
+        required=False,
+        label="Постачальник",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        empty_label="-- Оберіть постачальника --"
+    )
+
+    def __init__(self, *args, warehouses=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if warehouses is not None:
+            self.fields['warehouse'].queryset = warehouses
+
+    def clean(self):
+        cleaned_data = super().clean()
+        kind = cleaned_data.get('kind')
+        if kind in ('stock', 'stage_limits') and not cleaned_data.get('warehouse'):
+            self.add_error('warehouse', "Оберіть склад для цього імпорту.")
+        if kind == 'supplier_prices' and not cleaned_data.get('supplier'):
+            self.add_error('supplier', "Оберіть постачальника для прайсу.")
+        return cleaned_data
+
+
+# ==============================================================================
+# 6. ІНВЕНТАРИЗАЦІЯ
+# ==============================================================================
+
+class StocktakeStartForm(forms.Form):
+    """Старт інвентаризації: склад + примітка."""
+    warehouse = forms.ModelChoiceField(
+        queryset=Warehouse.objects.all(),
+        label="Склад (об'єкт)",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        empty_label="-- Оберіть склад --"
+    )
+    note = forms.CharField(
+        max_length=255,
+        required=False,
+        label="Примітка",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Напр.: річна інвентаризація'})
+    )
+
+    def __init__(self, *args, warehouses=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if warehouses is not None:
+            self.fields['warehouse'].queryset = warehouses
+
+
+class StocktakeUploadForm(RejectedUploadsMixin, forms.Form):
+    """Результати підрахунку файлом: колонки article, quantity."""
+    file = forms.FileField(
+        label=f"Файл підрахунку (CSV або XLSX, до {MAX_IMPORT_UPLOAD_SIZE_MB} MB)",
+        validators=[FileExtensionValidator(allowed_extensions=ALLOWED_IMPORT_EXTENSIONS)],
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
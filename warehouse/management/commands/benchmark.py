@@ -0,0 +1,69 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from warehouse.services import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк сервісів і звітів на поточній (засіяній) БД: списання, прийом заявки, залишки складу, '
+        'оборотка, експорт залишків, пошук матеріалів. Рахує ops/sec, перцентилі затримки і запити на операцію; '
+        'результат - JSON для порівняння між комітами. Усі зміни в БД відкочуються. '
+        'Дані: manage.py generate_synthetic_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=list(benchmark.SCENARIOS),
+            help='Сценарій (можна кілька; default: усі)'
+        )
+        parser.add_argument('--read-only', action='store_true', help='Пропустити сценарії, що пишуть у БД')
+        parser.add_argument('--iterations', type=int, default=benchmark.DEFAULT_ITERATIONS, help=f'Вимірів на сценарій (default: {benchmark.DEFAULT_ITERATIONS})')
+        parser.add_argument('--warmup', type=int, default=benchmark.DEFAULT_WARMUP, help=f'Прогрівних викликів, не враховуються (default: {benchmark.DEFAULT_WARMUP})')
+        parser.add_argument('--order-lines', type=int, default=benchmark.DEFAULT_ORDER_LINES, help=f'Позицій у заявці для process_order_receipt (default: {benchmark.DEFAULT_ORDER_LINES})')
+        parser.add_argument('--seed', type=int, default=42, help='Seed вибору матеріалів і запитів (default: 42)')
+        parser.add_argument('--output', help='Записати JSON у файл (інакше - у stdout)')
+        parser.add_argument('--compare', help='JSON попереднього прогону: показати зміну ops/sec і p95, %%')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations має бути >= 1')
+
+        names = options['scenario'] or list(benchmark.SCENARIOS)
+        if options['read_only']:
+            names = [name for name in names if not benchmark.SCENARIOS[name][1]]
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Не вдалося прочитати {options['compare']}: {exc}")
+
+        def progress(name, result):
+            self.stderr.write(
+                f"   {name}: {result['ops_per_sec']} ops/s, p50 {result['p50_ms']:.1f} мс, "
+                f"p95 {result['p95_ms']:.1f} мс, SQL/оп {result['queries_per_op']}"
+            )
+
+        try:
+            report = benchmark.run_benchmark(
+                names, iterations=options['iterations'], warmup=options['warmup'],
+                order_lines=options['order_lines'], seed=options['seed'], progress=progress
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if baseline is not None:
+            report['compare'] = {
+                'baseline_commit': baseline.get('meta', {}).get('commit'),
+                'changes_pct': benchmark.compare(report, baseline),
+            }
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"✅ Результат: {options['output']}"))
+        else:
+            self.stdout.write(output)
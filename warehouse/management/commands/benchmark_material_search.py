@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction, connection
+from warehouse.models import Material
+from warehouse.services import material_search
+
+BASE_NAMES = [
+    'Цемент', 'Пісок', 'Щебінь', 'Арматура', 'Цегла', 'Бетон', 'Дошка', 'Брус', 'Фарба',
+    'Грунтовка', 'Саморіз', 'Дюбель', 'Профіль', 'Гіпсокартон', 'Утеплювач', 'Клей', 'Шпаклівка',
+]
+GRADES = ['М400', 'М500', 'А500С', 'ПЦ-II', 'F150', 'B25', 'Ø12', 'Ø16', '50x150', '3.5x35']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк пошуку матеріалів (ajax_materials): генерує N синтетичних матеріалів, '
+        'імітує введення по символу і рахує p50/p95 затримки на натискання. Дані відкочуються.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000, help='Кількість синтетичних матеріалів (default: 100000)')
+        parser.add_argument('--queries', type=int, default=200, help='Скільки назв "вводити" (default: 200)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора (default: 42)')
+        parser.add_argument('--keep', action='store_true', help='Не відкочувати згенеровані матеріали')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(rng, options)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write("↩️  Синтетичні матеріали відкочено.")
+        finally:
+            material_search.invalidate_local_index()
+
+    def _run(self, rng, options):
+        count = options['count']
+        self.stdout.write(f"🧪 Генерація {count} матеріалів ({connection.vendor})...")
+
+        started = time.perf_counter()
+        batch = []
+        for i in range(count):
+            name = f"{rng.choice(BASE_NAMES)} {rng.choice(GRADES)} {rng.randint(1, 999)}"
+            article = f"BENCH-{i:06d}"
+            batch.append(Material(
+                name=name,
+                article=article,
+                unit='шт',
+                search_name=material_search.build_search_name(name, article)
+            ))
+            if len(batch) >= 5000:
+                Material.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Material.objects.bulk_create(batch)
+        self.stdout.write(f"   створено за {time.perf_counter() - started:.2f} с")
+
+        material_search.invalidate_local_index()
+        if connection.vendor != 'postgresql':
+            started = time.perf_counter()
+            material_search.get_local_index()
+            self.stdout.write(f"   локальний індекс побудовано за {time.perf_counter() - started:.2f} с")
+
+        # Імітація введення: кожен префікс назви (до 10 символів) - окремий запит, як при autocomplete
+        sample = list(Material.objects.filter(article__startswith='BENCH-').values_list('name', 'article')[:count])
+        typed = [rng.choice(sample) for _ in range(options['queries'])]
+
+        latencies = []
+        for name, article in typed:
+            text = name if rng.random() < 0.8 else article
+            for length in range(1, min(len(text), 10) + 1):
+                t0 = time.perf_counter()
+                material_search.search_materials(text[:length])
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        p50 = statistics.median(latencies)
+        p95 = statistics.quantiles(latencies, n=100)[94]
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(latencies)} натискань: p50 {p50:.2f} мс, p95 {p95:.2f} мс, max {max(latencies):.2f} мс"
+        ))
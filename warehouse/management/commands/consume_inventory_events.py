@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from warehouse.services import inventory_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Обробляє outbox подій складу (InventoryEvent) зареєстрованими споживачами пакетами з чекпоінтами. '
+        'Разово - з cron, або постійно з --follow. --rebuild перераховує стан споживача з нуля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'consumers', nargs='*', help=f"Споживачі: {', '.join(sorted(inventory_events.CONSUMERS))} (default: усі)"
+        )
+        parser.add_argument('--batch-size', type=int, default=inventory_events.DEFAULT_BATCH_SIZE,
+                            help=f'Подій за одну транзакцію (default: {inventory_events.DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--follow', action='store_true', help='Не завершуватись: опитувати нові події')
+        parser.add_argument('--interval', type=float, default=1.0, help='З --follow: пауза між опитуваннями, с')
+        parser.add_argument('--rebuild', action='store_true', help='Перерахувати стан і поставити чекпоінт на останню подію')
+
+    def handle(self, *args, **options):
+        names = options['consumers'] or sorted(inventory_events.CONSUMERS)
+        unknown = set(names) - set(inventory_events.CONSUMERS)
+        if unknown:
+            raise CommandError(f"Невідомі споживачі: {', '.join(sorted(unknown))}")
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size має бути більше 0')
+
+        if options['rebuild']:
+            for name in names:
+                try:
+                    position = inventory_events.rebuild(name)
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"   {name}: перебудовано до події #{position}")
+
+        while True:
+            total = 0
+            for name in names:
+                processed = inventory_events.consume(name, batch_size=options['batch_size'])
+                total += processed
+                if processed or not options['follow']:
+                    self.stdout.write(f"   {name}: оброблено подій {processed}, в черзі {inventory_events.pending(name)}")
+            if not options['follow']:
+                break
+            if not total:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("✅ Готово"))
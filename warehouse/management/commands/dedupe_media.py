@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from warehouse.services import media_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Медіа з адресацією за вмістом: переносить старі фото (transactions/, orders/, avatars/) у blobs/ '
+        '(однакові файли - один blob, посилання оновлюються) і видаляє blobs без посилань. Можна запускати з cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc-only', action='store_true', help='Тільки видалити blobs без посилань')
+
+    def handle(self, *args, **options):
+        if not options['gc_only']:
+            stats = media_store.dedupe_existing()
+            self.stdout.write(
+                f"   Перенесено файлів: {stats['files']} (записів: {stats['rows']}, "
+                f"{stats['bytes'] / (1024 * 1024):.1f} MB), відсутні на диску: {stats['missing']}"
+            )
+        removed = media_store.collect_garbage()
+        self.stdout.write(self.style.SUCCESS(f"✅ Видалено blobs без посилань: {removed}"))
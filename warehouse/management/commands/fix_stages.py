@@ -26,13 +26,13 @@ class Command(BaseCommand):
             StageLimit.objects.get_or_create(
                 stage=stage_1, 
                 material=concrete, 
-                defaults={'construct_type': 'horizontal', 'planned_quantity': 100}
+                defaults={'planned_quantity': 100}
             )
             
             StageLimit.objects.get_or_create(
                 stage=stage_2, 
                 material=concrete, 
-                defaults={'construct_type': 'vertical', 'planned_quantity': 50}
+                defaults={'planned_quantity': 50}
             )
 
         self.stdout.write(self.style.SUCCESS(f"✅ Готово! Етапи додано до {warehouses.count()} складів."))
\ No newline at end of file
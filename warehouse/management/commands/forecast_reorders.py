@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from warehouse.models import Warehouse
+from warehouse.services import forecasting
+
+
+class Command(BaseCommand):
+    help = 'Перераховує прогноз дозамовлення (ReorderSuggestion) по всіх складах. Запускати щоночі (cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history-days', type=int, default=forecasting.DEFAULT_HISTORY_DAYS,
+                            help=f'Глибина історії витрат у днях (default: {forecasting.DEFAULT_HISTORY_DAYS})')
+        parser.add_argument('--window', type=int, default=forecasting.DEFAULT_WINDOW,
+                            help=f'Вікно ковзного середнього (default: {forecasting.DEFAULT_WINDOW})')
+        parser.add_argument('--alpha', type=float, default=forecasting.DEFAULT_ALPHA,
+                            help=f'Коефіцієнт згладжування EWMA (default: {forecasting.DEFAULT_ALPHA})')
+        parser.add_argument('--lead-time', type=int, default=forecasting.DEFAULT_LEAD_TIME,
+                            help=f'Термін поставки у днях (default: {forecasting.DEFAULT_LEAD_TIME})')
+        parser.add_argument('--review-days', type=int, default=forecasting.DEFAULT_REVIEW_DAYS,
+                            help=f'На скільки днів вперед замовляти (default: {forecasting.DEFAULT_REVIEW_DAYS})')
+        parser.add_argument('--horizon', type=int, default=forecasting.DEFAULT_HORIZON,
+                            help=f'Горизонт пропозицій у днях (default: {forecasting.DEFAULT_HORIZON})')
+
+    def handle(self, *args, **options):
+        if not 0 < options['alpha'] <= 1:
+            self.stdout.write(self.style.ERROR('--alpha має бути в діапазоні (0, 1]'))
+            return
+
+        self.stdout.write("📈 Розрахунок прогнозу дозамовлення...")
+        started = time.monotonic()
+
+        count = forecasting.refresh_reorder_suggestions(
+            Warehouse.objects.all(),
+            history_days=options['history_days'],
+            window=options['window'],
+            alpha=options['alpha'],
+            lead_time=options['lead_time'],
+            review_days=options['review_days'],
+            horizon=options['horizon'],
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"✅ Збережено {count} пропозицій за {elapsed:.2f} с."))
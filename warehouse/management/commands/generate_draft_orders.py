@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+from warehouse.models import Warehouse
+from warehouse.services import forecasting, auto_orders
+
+
+class Command(BaseCommand):
+    help = 'Створює чернетки заявок (draft) з прогнозу витрати та дефіциту залишків по всіх складах. Запускати щоночі.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=['forecast', 'low_stock', 'both'],
+            default='both',
+            help="Джерело потреби: прогноз, поточний дефіцит або обидва (default: both)",
+        )
+        parser.add_argument(
+            '--due-within',
+            type=int,
+            default=0,
+            help='Включати прогнози з датою замовлення в межах N днів (default: 0 - тільки на сьогодні)',
+        )
+        parser.add_argument(
+            '--refresh-forecast',
+            action='store_true',
+            help='Спочатку перерахувати прогноз (forecast_reorders)',
+        )
+
+    def handle(self, *args, **options):
+        warehouses = Warehouse.objects.all()
+        started = time.monotonic()
+
+        if options['refresh_forecast']:
+            t0 = time.monotonic()
+            count = forecasting.refresh_reorder_suggestions(warehouses)
+            self.stdout.write(f"📈 Прогноз: {count} пропозицій за {time.monotonic() - t0:.2f} с.")
+
+        t0 = time.monotonic()
+        result = auto_orders.generate_draft_orders(
+            warehouses,
+            source=options['source'],
+            due_within_days=options['due_within'],
+        )
+        self.stdout.write(f"📝 Чернетки: {result['orders']} заявок, {result['items']} позицій за {time.monotonic() - t0:.2f} с.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Готово: {warehouses.count()} складів оброблено за {time.monotonic() - started:.2f} с."
+        ))
@@ -0,0 +1,57 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from warehouse.services.synthetic_data import SyntheticDataGenerator, purge_synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерує синтетичні дані для навантажувальних тестів і бенчмарків: склади, матеріали, '
+        'постачальники, заявки та транзакції (з парними переміщеннями) пакетами через COPY/bulk_create. '
+        'Однаковий --seed дає однакові дані. Масштаб продакшену, наприклад: '
+        '--warehouses 200 --materials 50000 --transactions 20000000 --orders 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouses', type=int, default=20, help='Кількість складів (default: 20)')
+        parser.add_argument('--materials', type=int, default=2000, help='Кількість матеріалів (default: 2000)')
+        parser.add_argument('--transactions', type=int, default=200_000, help='Кількість транзакцій, без вхідних залишків і приходів по заявках (default: 200000)')
+        parser.add_argument('--orders', type=int, default=2000, help='Кількість заявок (default: 2000)')
+        parser.add_argument('--items-per-order', type=int, default=4, help='Середня кількість позицій у заявці (default: 4)')
+        parser.add_argument('--days', type=int, default=365, help='Період історії в днях (default: 365)')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=None, help='Остання дата періоду, YYYY-MM-DD (default: сьогодні)')
+        parser.add_argument('--batch-size', type=int, default=20_000, help='Розмір пакета запису (default: 20000)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора (default: 42)')
+        parser.add_argument('--purge', action='store_true', help='Спочатку видалити раніше згенеровані синтетичні дані')
+        parser.add_argument('--purge-only', action='store_true', help='Тільки видалити синтетичні дані')
+
+    def handle(self, *args, **options):
+        if options['purge'] or options['purge_only']:
+            deleted = purge_synthetic_data()
+            self.stdout.write('🧹 Видалено: ' + ', '.join(f'{key} {count}' for key, count in deleted.items()))
+            if options['purge_only']:
+                return
+
+        generator = SyntheticDataGenerator(
+            seed=options['seed'],
+            warehouses=options['warehouses'],
+            materials=options['materials'],
+            transactions=options['transactions'],
+            orders=options['orders'],
+            items_per_order=options['items_per_order'],
+            days=options['days'],
+            end_date=options['end_date'],
+            batch_size=options['batch_size'],
+            progress=self.stdout.write,
+        )
+        self.stdout.write(f"🚀 Генерація (seed={options['seed']})...")
+        try:
+            stats = generator.run()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ За {stats['seconds']} с: складів {stats['warehouses']}, матеріалів {stats['materials']}, "
+            f"постачальників {stats['suppliers']}, заявок {stats['orders']} ({stats['order_items']} позицій), "
+            f"транзакцій {stats['transactions']} (з них вхідних залишків {stats['opening_balances']}, "
+            f"приходів по заявках {stats['order_receipts']}), період {stats['date_from']} - {stats['date_to']}"
+        ))
@@ -0,0 +1,75 @@
+from pathlib import PurePosixPath
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from warehouse.services import images, media_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Фонова обробка фото: створює мініатюри (WebP) для всіх збережених фото, щоб сторінки '
+        'не генерували їх при першому відкритті. З --convert-originals перекодовує старі '
+        'оригінали (JPEG/PNG з телефонів) у WebP з обмеженою роздільністю. Можна запускати з cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', choices=list(images.THUMBNAIL_SIZES), default=list(images.THUMBNAIL_SIZES),
+            help='Розміри мініатюр (default: усі)'
+        )
+        parser.add_argument('--convert-originals', action='store_true', help='Перекодувати оригінали, що ще не WebP')
+        parser.add_argument('--keep-originals', action='store_true', help='З --convert-originals: не видаляти старі файли')
+        parser.add_argument('--limit', type=int, default=None, help='Обробити не більше N записів на поле')
+
+    def handle(self, *args, **options):
+        stats = {'files': 0, 'thumbnails': 0, 'converted': 0, 'bytes_before': 0, 'bytes_after': 0, 'errors': 0}
+
+        for label, fields in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field_name, max_dimension in fields.items():
+                queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True}).order_by('pk')
+                rows = queryset.values_list('pk', field_name)
+                if options['limit']:
+                    rows = rows[:options['limit']]
+                for pk, name in rows.iterator(chunk_size=500):
+                    instance = model(pk=pk, **{field_name: name})
+                    field_file = getattr(instance, field_name)
+                    stats['files'] += 1
+                    if options['convert_originals'] and not name.lower().endswith('.webp'):
+                        field_file = self._convert(model, pk, field_name, field_file, max_dimension, options, stats)
+                    for size in options['sizes']:
+                        if images.make_thumbnail(field_file, size):
+                            stats['thumbnails'] += 1
+                        else:
+                            stats['errors'] += 1
+            self.stdout.write(f"   {label}: оброблено")
+
+        saved_mb = (stats['bytes_before'] - stats['bytes_after']) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Файлів: {stats['files']}, мініатюр: {stats['thumbnails']}, перекодовано: {stats['converted']} "
+            f"(зекономлено {saved_mb:.1f} MB), не зображення/помилки: {stats['errors']}"
+        ))
+
+    def _convert(self, model, pk, field_name, field_file, max_dimension, options, stats):
+        storage = field_file.storage
+        try:
+            with storage.open(field_file.name, 'rb') as f:
+                data = images.encode_webp(f, max_dimension)
+            size_before = storage.size(field_file.name)
+        except OSError:
+            return field_file
+        if data is None:
+            return field_file
+
+        old_name = field_file.name
+        new_name = storage.save(str(PurePosixPath(old_name).with_suffix('.webp')), ContentFile(data))
+        # update() - без pre_save/auto_now, змінюється тільки шлях до файлу
+        model.objects.filter(pk=pk).update(**{field_name: new_name})
+        if not options['keep_originals']:
+            # Старий файл міг бути спільним для кількох записів - видаляється з останнім посиланням
+            media_store.release(old_name, storage)
+
+        stats['converted'] += 1
+        stats['bytes_before'] += size_before
+        stats['bytes_after'] += len(data)
+        return getattr(model(pk=pk, **{field_name: new_name}), field_name)
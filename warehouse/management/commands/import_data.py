@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from warehouse.models import Supplier, Warehouse
+from warehouse.services import data_import
+
+
+def _lookup(model, value, label):
+    """Склад / постачальник за id або точною назвою."""
+    if value is None:
+        return None
+    qs = model.objects.filter(pk=int(value)) if value.isdigit() else model.objects.filter(name=value)
+    obj = qs.first()
+    if obj is None:
+        raise CommandError(f"{label} «{value}» не знайдено")
+    return obj
+
+
+class Command(BaseCommand):
+    help = (
+        'Імпорт CSV/XLSX: початкові залишки (stock), ліміти етапів (stage_limits), прайс постачальника '
+        '(supplier_prices). Файл читається порядково і записується пакетами (bulk upsert).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(data_import.IMPORTERS), help='Що імпортуємо')
+        parser.add_argument('path', help='Шлях до файлу .csv або .xlsx')
+        parser.add_argument('--warehouse', help='Склад (id або назва) - для stock і stage_limits')
+        parser.add_argument('--supplier', help='Постачальник (id або назва) - для supplier_prices')
+        parser.add_argument('--batch-size', type=int, default=data_import.DEFAULT_BATCH_SIZE,
+                            help=f'Рядків в одному пакеті (default: {data_import.DEFAULT_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        warehouse = _lookup(Warehouse, options['warehouse'], 'Склад')
+        supplier = _lookup(Supplier, options['supplier'], 'Постачальник')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size має бути більше 0')
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as f:
+                stats = data_import.run_import(
+                    options['kind'], f, options['path'],
+                    warehouse=warehouse, supplier=supplier, batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(f"Не вдалося відкрити файл: {e}")
+        except data_import.DataImportError as e:
+            raise CommandError(str(e))
+
+        for line, message in stats['errors']:
+            self.stdout.write(self.style.WARNING(f"   рядок {line}: {message}"))
+        if stats['error_count'] > len(stats['errors']):
+            self.stdout.write(f"   ... ще {stats['error_count'] - len(stats['errors'])} помилок")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Рядків: {stats['rows']}, імпортовано: {stats['imported']}, без змін: {stats['unchanged']}, "
+            f"помилок: {stats['error_count']} за {time.monotonic() - started:.2f} с."
+        ))
@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from django.core.management.base import BaseCommand, CommandError
+
+# Що "вводить" користувач в autocomplete - по символу, як TomSelect
+TYPED_QUERIES = ['цемент', 'пісок', 'щебінь', 'арматура', 'цегла', 'бетон', 'дошка', 'фарба', 'клей', 'профіль']
+
+# Маршрути: sync (WSGI-версії або ті, що зараз на /ajax/) і async (/ajax/async/)
+PATHS = {
+    'sync': {
+        'materials': '/ajax/materials/',
+        'stock': '/ajax/warehouse/{warehouse_id}/stock/',
+        'stages': '/ajax/load-stages/',
+        'duplicates': '/ajax/check_duplicates/',
+    },
+    'async': {
+        'materials': '/ajax/async/materials/',
+        'stock': '/ajax/async/warehouse/{warehouse_id}/stock/',
+        'stages': '/ajax/async/load-stages/',
+        'duplicates': '/ajax/async/check_duplicates/',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Навантажувальний тест AJAX endpoints на запущеному сервері: N паралельних "користувачів" '
+        'друкують у autocomplete (запит на кожен символ) і відкривають залишки складу. '
+        'Порівнює sync і async маршрути: p50/p95 затримки, RPS, помилки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Адреса сервера (default: http://127.0.0.1:8000)')
+        parser.add_argument(
+            '--session', action='append', required=True,
+            help='Значення cookie sessionid (можна кілька: rate limit рахується на користувача)'
+        )
+        parser.add_argument('--warehouse', type=int, required=True, help='ID складу для stock/stages/duplicates')
+        parser.add_argument('--concurrency', type=int, default=20, help='Паралельних користувачів (default: 20)')
+        parser.add_argument('--duration', type=float, default=30, help='Тривалість кожного прогону, с (default: 30)')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both', help='Які маршрути тестувати')
+        parser.add_argument('--think-time', type=float, default=0.15, help='Пауза між натисканнями, с (default: 0.15)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора (default: 42)')
+
+    def handle(self, *args, **options):
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        results = {}
+        for mode in modes:
+            self.stdout.write(f"🚀 {mode}: {options['concurrency']} користувачів, {options['duration']:.0f} с...")
+            results[mode] = self._run(PATHS[mode], options)
+            self._report(mode, results[mode])
+
+        if len(results) == 2 and results['sync']['latencies'] and results['async']['latencies']:
+            sync_p95, async_p95 = self._p95(results['sync']['latencies']), self._p95(results['async']['latencies'])
+            self.stdout.write(self.style.SUCCESS(
+                f"📊 p95: sync {sync_p95:.1f} мс / async {async_p95:.1f} мс; "
+                f"RPS: sync {results['sync']['rps']:.1f} / async {results['async']['rps']:.1f}"
+            ))
+
+    def _run(self, paths, options):
+        base_url = options['base_url'].rstrip('/')
+        sessions = options['session']
+        deadline = time.monotonic() + options['duration']
+        lock = threading.Lock()
+        stats = {'latencies': [], 'errors': 0, 'throttled': 0}
+
+        def fetch(session, path, params):
+            url = f"{base_url}{path}?{urlencode(params)}"
+            request = Request(url, headers={
+                'Cookie': f'sessionid={session}',
+                'X-Requested-With': 'XMLHttpRequest',
+            })
+            started = time.perf_counter()
+            try:
+                with urlopen(request, timeout=30) as response:
+                    response.read()
+                    # Без валідної сесії login_required редіректить на HTML-сторінку входу
+                    ok = response.status == 200 and 'json' in response.headers.get('Content-Type', '')
+            except HTTPError as exc:
+                with lock:
+                    stats['throttled' if exc.code == 429 else 'errors'] += 1
+                return
+            except URLError:
+                with lock:
+                    stats['errors'] += 1
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    stats['latencies'].append(elapsed)
+                else:
+                    stats['errors'] += 1
+
+        def user(user_no):
+            rng = random.Random(options['seed'] + user_no)
+            session = sessions[user_no % len(sessions)]
+            wh_params = {'warehouse_id': options['warehouse']}
+            # Відкриття форми: етапи, перевірка дублікатів, залишки
+            fetch(session, paths['stages'], wh_params)
+            fetch(session, paths['duplicates'], {'warehouse': options['warehouse']})
+            while time.monotonic() < deadline:
+                fetch(session, paths['stock'].format(warehouse_id=options['warehouse']), {})
+                word = rng.choice(TYPED_QUERIES)
+                for length in range(1, len(word) + 1):
+                    if time.monotonic() >= deadline:
+                        break
+                    fetch(session, paths['materials'], {'q': word[:length]})
+                    time.sleep(options['think_time'])
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(user, range(options['concurrency'])))
+        elapsed = time.monotonic() - started
+
+        stats['rps'] = len(stats['latencies']) / elapsed if elapsed else 0
+        return stats
+
+    @staticmethod
+    def _p95(latencies):
+        return statistics.quantiles(latencies, n=100)[94] if len(latencies) >= 2 else latencies[0]
+
+    def _report(self, mode, stats):
+        latencies = stats['latencies']
+        if not latencies:
+            raise CommandError(
+                f"{mode}: жодної успішної відповіді (помилок {stats['errors']}, 429: {stats['throttled']}). "
+                f"Перевірте --base-url та --session."
+            )
+        self.stdout.write(
+            f"   {len(latencies)} OK, p50 {statistics.median(latencies):.1f} мс, p95 {self._p95(latencies):.1f} мс, "
+            f"max {max(latencies):.1f} мс, {stats['rps']:.1f} RPS; помилок {stats['errors']}, 429: {stats['throttled']}"
+        )
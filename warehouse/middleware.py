@@ -0,0 +1,187 @@
+import cProfile
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+from django.urls import reverse
+from .services import profiling
+
+logger = logging.getLogger('warehouse')
+
+# Метрики поточного запиту (ContextVar - коректно і для потоків, і для async)
+_current_metrics = ContextVar('warehouse_request_metrics', default=None)
+
+# Нормалізація SQL для відбитка: літерали та списки IN (...) -> ?, щоб N+1 з різними id збігались
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def sql_fingerprint(sql):
+    """Відбиток запиту без параметрів: однакові запити з різними значеннями дають той самий відбиток."""
+    normalized = _STRING_RE.sub('?', sql)
+    normalized = _NUMBER_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('(?)', normalized)
+    normalized = _SPACE_RE.sub(' ', normalized).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+
+class RequestMetrics:
+    """Лічильники одного запиту: SQL (кількість, час, відбитки) і рендер шаблонів."""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper: обгортає кожен запит
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            fingerprint, normalized = sql_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            self.samples.setdefault(fingerprint, normalized)
+
+    def duplicates(self):
+        """[(fingerprint, count, sql)] для запитів, що повторились, від найчастіших."""
+        return [
+            (fingerprint, count, self.samples[fingerprint])
+            for fingerprint, count in self.fingerprints.most_common()
+            if count > 1
+        ]
+
+
+_original_template_render = DjangoTemplate.render
+
+
+def _timed_template_render(self, context=None, request=None):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return _original_template_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_template_render(self, context, request)
+    finally:
+        metrics.template_time += time.perf_counter() - started
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Opt-in (settings.QUERY_INSTRUMENTATION) метрики запиту:
+    кількість і час SQL, дублікати за відбитком (ознака N+1), час рендеру шаблонів.
+
+    - Заголовок Server-Timing (видно у DevTools -> Network -> Timing).
+    - Рядок key=value у логері 'warehouse' (INFO), з extra={'request_metrics': {...}}.
+    - Перевищення бюджету (QUERY_BUDGETS[url_name] або QUERY_BUDGET_DEFAULT) - WARNING з топ-дублікатами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Рендер шаблонів вимірюємо на рівні backend-шаблону: render() / render_to_string верхнього рівня
+        DjangoTemplate.render = _timed_template_render
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total = time.perf_counter() - started
+
+        view_name = request.resolver_match.url_name if request.resolver_match else None
+        budget = settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+        duplicates = metrics.duplicates()
+        duplicate_count = sum(count - 1 for _, count, _ in duplicates)
+
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={metrics.sql_time * 1000:.1f};desc="SQL {metrics.sql_count}"',
+            f'dup;desc="duplicate SQL {duplicate_count}"',
+            f'tpl;dur={metrics.template_time * 1000:.1f};desc="Templates"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        data = {
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'sql_count': metrics.sql_count,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'sql_duplicates': duplicate_count,
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'budget': budget,
+        }
+        logger.info(
+            'request_metrics ' + ' '.join(f'{key}={value}' for key, value in data.items()),
+            extra={'request_metrics': data}
+        )
+
+        if metrics.sql_count > budget:
+            top = '; '.join(f'{count}x [{fingerprint}] {sql[:200]}' for fingerprint, count, sql in duplicates[:3])
+            logger.warning(
+                f"query_budget_exceeded view={view_name} path={request.path} "
+                f"sql_count={metrics.sql_count} budget={budget} duplicates: {top or '-'}",
+                extra={'request_metrics': data}
+            )
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (settings.PROFILING_ENABLED) профілювання окремого запиту для staff:
+    ?_profile=1 або заголовок X-Profile: 1. View виконується під cProfile із журналом SQL,
+    результат зберігається (services.profiling) і доступний на /profiling/<id>/,
+    у відповіді - заголовки X-Profile-Id та X-Profile-URL.
+
+    Коли вимкнено, middleware не додається в MIDDLEWARE зовсім. Стоїть останнім (після
+    AuthenticationMiddleware), тому профіль охоплює view, а не інші middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.wants_profile(request) or not request.user.is_staff:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        sql_log = profiling.SqlLog()
+        started = time.perf_counter()
+        with connections['default'].execute_wrapper(sql_log):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        capture_id = profiling.save_capture(profiler, sql_log, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': request.resolver_match.url_name if request.resolver_match else None,
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'total_ms': total_ms,
+        })
+        response['X-Profile-Id'] = capture_id
+        response['X-Profile-URL'] = reverse('profiling_detail', args=[capture_id])
+        logger.info(
+            f"profile_captured id={capture_id} path={request.path} total_ms={total_ms} sql_count={sql_log.count}"
+        )
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0012_alter_category_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_stock', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Залишок')),
+                ('avg_daily_usage', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Сер. витрата/день (SMA)')),
+                ('smoothed_daily_usage', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Згладжена витрата/день (EWMA)')),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True, verbose_name='Вистачить на (днів)')),
+                ('reorder_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Рекомендовано замовити')),
+                ('reorder_date', models.DateField(blank=True, null=True, verbose_name='Замовити до')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Розраховано')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_suggestions', to='warehouse.material', verbose_name='Матеріал')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_suggestions', to='warehouse.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Прогноз дозамовлення',
+                'verbose_name_plural': 'Прогнози дозамовлення',
+                'ordering': ['reorder_date', 'days_of_cover'],
+                'unique_together': {('warehouse', 'material')},
+            },
+        ),
+    ]
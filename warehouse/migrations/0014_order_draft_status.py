@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0013_reordersuggestion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Чернетка (авто)'), ('new', 'Нова'), ('rfq', 'Запит ціни (RFQ)'), ('approved', 'Погоджено'), ('purchasing', 'У закупівлі'), ('transit', 'В дорозі'), ('completed', 'Виконано / На складі'), ('rejected', 'Відхилено')], default='new', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+def populate_search_name(apps, schema_editor):
+    from warehouse.services.material_search import build_search_name
+
+    Material = apps.get_model('warehouse', 'Material')
+    batch = []
+    for material in Material.objects.only('id', 'name', 'article').iterator(chunk_size=2000):
+        material.search_name = build_search_name(material.name, material.article)
+        batch.append(material)
+        if len(batch) >= 2000:
+            Material.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    if batch:
+        Material.objects.bulk_update(batch, ['search_name'])
+
+
+def create_trigram_index(apps, schema_editor):
+    # Trigram GIN-індекс для пошуку підрядка - тільки PostgreSQL (на SQLite працює локальний індекс)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS warehouse_material_search_trgm "
+        "ON warehouse_material USING gin (search_name gin_trgm_ops);"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS warehouse_material_search_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0014_order_draft_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='Пошуковий ключ'),
+        ),
+        migrations.RunPython(populate_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
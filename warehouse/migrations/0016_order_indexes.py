@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0015_material_search_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'expected_date'], name='warehouse_o_status_a477cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['warehouse', 'created_at'], name='warehouse_o_warehou_85f750_idx'),
+        ),
+    ]
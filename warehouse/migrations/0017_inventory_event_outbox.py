@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:59
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0016_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=50, unique=True, verbose_name='Споживач')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Остання подія')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Чекпоінт споживача подій',
+                'verbose_name_plural': 'Чекпоінти споживачів подій',
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('stock_changed', 'Зміна залишку')], default='stock_changed', max_length=30, verbose_name='Тип події')),
+                ('delta', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Зміна залишку')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_events', to='warehouse.material')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='warehouse.transaction')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_events', to='warehouse.warehouse')),
+            ],
+            options={
+                'verbose_name': 'Подія складу',
+                'verbose_name_plural': 'Події складу (outbox)',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Залишок')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='warehouse.material')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='warehouse.warehouse')),
+            ],
+            options={
+                'verbose_name': 'Залишок (зведення)',
+                'verbose_name_plural': 'Залишки (зведення)',
+                'unique_together': {('warehouse', 'material')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:05
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_limits(apps, schema_editor):
+    # Дублікати (етап, матеріал) - лишаємо найновіший ліміт
+    StageLimit = apps.get_model('warehouse', 'StageLimit')
+    duplicates = (
+        StageLimit.objects.values('stage_id', 'material_id')
+        .annotate(n=Count('id'), keep=Max('id')).filter(n__gt=1)
+    )
+    for row in duplicates:
+        StageLimit.objects.filter(stage_id=row['stage_id'], material_id=row['material_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0018_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_limits, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='stagelimit',
+            unique_together={('stage', 'material')},
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:11
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0019_stagelimit_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stocktake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('draft', 'Підрахунок'), ('posted', 'Проведено')], default='draft', max_length=20, verbose_name='Статус')),
+                ('note', models.CharField(blank=True, max_length=255, verbose_name='Примітка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('posted_at', models.DateTimeField(blank=True, null=True, verbose_name='Проведено')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocktakes', to='warehouse.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Інвентаризація',
+                'verbose_name_plural': 'Інвентаризації',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='stocktake',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='warehouse.stocktake', verbose_name='Інвентаризація'),
+        ),
+        migrations.CreateModel(
+            name='StocktakeLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('system_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Обліковий залишок')),
+                ('counted_quantity', models.DecimalField(blank=True, decimal_places=3, max_digits=14, null=True, verbose_name='Фактично')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='warehouse.material')),
+                ('stocktake', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='warehouse.stocktake')),
+            ],
+            options={
+                'verbose_name': 'Рядок інвентаризації',
+                'verbose_name_plural': 'Рядки інвентаризації',
+                'unique_together': {('stocktake', 'material')},
+            },
+        ),
+    ]
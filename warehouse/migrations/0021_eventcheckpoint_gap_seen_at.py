@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0020_stocktake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventcheckpoint',
+            name='gap_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Пропуск помічено'),
+        ),
+    ]
@@ -88,6 +88,9 @@ class Material(models.Model):
         default=Decimal("0.000")
     )
 
+    # Нормалізовані назва + артикул (латиниця, нижній регістр) для autocomplete - див. services.material_search
+    search_name = models.CharField("Пошуковий ключ", max_length=255, blank=True, default='', db_index=True, editable=False)
+
     class Meta:
         verbose_name = "Матеріал"
         verbose_name_plural = "Матеріали"
@@ -95,6 +98,15 @@ class Material(models.Model):
     def __str__(self):
         return f"{self.name} ({self.unit})"
 
+    def save(self, *args, **kwargs):
+        from .services.material_search import build_search_name
+
+        self.search_name = build_search_name(self.name, self.article)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'article'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super().save(*args, **kwargs)
+
     @property
     def total_stock(self):
         """
@@ -174,10 +186,13 @@ class StageLimit(models.Model):
     class Meta:
         verbose_name = "Ліміт матеріалу"
         verbose_name_plural = "Ліміти матеріалів (Кошторис)"
+        # Один ліміт на (етап, матеріал): ключ upsert для імпорту кошторису
+        unique_together = ('stage', 'material')
 
 
 class Order(models.Model):
     STATUS_CHOICES = [
+        ('draft', 'Чернетка (авто)'),
         ('new', 'Нова'),
         ('rfq', 'Запит ціни (RFQ)'),
         ('approved', 'Погоджено'),
@@ -215,6 +230,12 @@ class Order(models.Model):
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
         ordering = ['-created_at']
+        indexes = [
+            # Логістика (status=... ORDER BY expected_date) і прострочені (status IN ... AND expected_date < ...)
+            models.Index(fields=['status', 'expected_date']),
+            # Перевірка дублікатів: warehouse_id=... AND created_at >= ...
+            models.Index(fields=['warehouse', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} ({self.get_status_display()})"
@@ -293,6 +314,12 @@ class Transaction(models.Model):
     
     # Для переміщень (групує OUT та IN)
     transfer_group_id = models.UUIDField(null=True, blank=True, db_index=True)
+
+    # Коригування інвентаризації (групує IN/LOSS одного документа)
+    stocktake = models.ForeignKey(
+        'Stocktake', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='transactions', verbose_name="Інвентаризація"
+    )
     
     photo = models.ImageField(upload_to='transactions/', null=True, blank=True, verbose_name="Фото підтвердження")
 
@@ -321,6 +348,170 @@ class SupplierPrice(models.Model):
         unique_together = ('supplier', 'material')
 
 
+class ReorderSuggestion(models.Model):
+    """
+    Прогноз дозамовлення по парі (склад, матеріал).
+    Кеш результатів нічної команди forecast_reorders — view тільки читає ці рядки.
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='reorder_suggestions', verbose_name="Склад")
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='reorder_suggestions', verbose_name="Матеріал")
+
+    # DECIMAL UPDATE: Кількість (3 знаки)
+    current_stock = models.DecimalField("Залишок", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    avg_daily_usage = models.DecimalField("Сер. витрата/день (SMA)", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    smoothed_daily_usage = models.DecimalField("Згладжена витрата/день (EWMA)", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    days_of_cover = models.DecimalField("Вистачить на (днів)", max_digits=10, decimal_places=1, null=True, blank=True)
+    reorder_quantity = models.DecimalField("Рекомендовано замовити", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    reorder_date = models.DateField("Замовити до", null=True, blank=True)
+
+    computed_at = models.DateTimeField("Розраховано", auto_now=True)
+
+    class Meta:
+        verbose_name = "Прогноз дозамовлення"
+        verbose_name_plural = "Прогнози дозамовлення"
+        unique_together = ('warehouse', 'material')
+        ordering = ['reorder_date', 'days_of_cover']
+
+    def __str__(self):
+        return f"{self.material.name} @ {self.warehouse.name}: {self.reorder_quantity}"
+
+
+# --- INVENTORY EVENTS (OUTBOX) ---
+
+class InventoryEvent(models.Model):
+    """
+    Outbox змін залишків: пишеться сервісами inventory в тій самій транзакції БД, що й Transaction.
+    id - монотонна послідовність; споживачі (services.inventory_events) читають події після свого
+    чекпоінта і оновлюють кеші/зведення інкрементально, без повного перерахунку по Transaction.
+    """
+    STOCK_CHANGED = 'stock_changed'
+    EVENT_TYPES = [
+        (STOCK_CHANGED, 'Зміна залишку'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField("Тип події", max_length=30, choices=EVENT_TYPES, default=STOCK_CHANGED)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='inventory_events')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='inventory_events')
+
+    # DECIMAL UPDATE: Зміна залишку зі знаком (3 знаки): IN > 0, OUT/LOSS < 0
+    delta = models.DecimalField("Зміна залишку", max_digits=14, decimal_places=3)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Подія складу"
+        verbose_name_plural = "Події складу (outbox)"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.event_type}: {self.material_id}@{self.warehouse_id} {self.delta}"
+
+
+class EventCheckpoint(models.Model):
+    """Чекпоінт споживача подій: id останньої обробленої InventoryEvent."""
+    consumer = models.CharField("Споживач", max_length=50, unique=True)
+    position = models.BigIntegerField("Остання подія", default=0)
+    # Коли споживач уперше побачив пропуск id одразу за position (годинник споживача, не запису)
+    gap_seen_at = models.DateTimeField("Пропуск помічено", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Чекпоінт споживача подій"
+        verbose_name_plural = "Чекпоінти споживачів подій"
+
+    def __str__(self):
+        return f"{self.consumer}: {self.position}"
+
+
+class StockLevel(models.Model):
+    """
+    Зведення залишків (склад, матеріал), яке веде споживач подій stock_levels.
+    Оновлюється інкрементально з InventoryEvent; перебудова - consume_inventory_events --rebuild.
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stock_levels')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='stock_levels')
+
+    # DECIMAL UPDATE: Кількість (3 знаки)
+    quantity = models.DecimalField("Залишок", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Залишок (зведення)"
+        verbose_name_plural = "Залишки (зведення)"
+        unique_together = ('warehouse', 'material')
+
+    def __str__(self):
+        return f"{self.material_id}@{self.warehouse_id}: {self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ ідемпотентності пакетного API (api/transactions/batch/): згенерований клієнтом ключ операції.
+    Унікальний індекс (user, key) гарантує, що повторна відправка не створить операцію вдруге -
+    повтор отримує збережений результат.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField("Ключ", max_length=64)
+    result = models.JSONField("Результат", default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Ключ ідемпотентності"
+        verbose_name_plural = "Ключі ідемпотентності"
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+
+# --- STOCKTAKE (ІНВЕНТАРИЗАЦІЯ) ---
+
+class Stocktake(models.Model):
+    """
+    Інвентаризація складу: знімок облікових залишків на момент початку + фактичні кількості.
+    Проведення створює коригування (IN - надлишок, LOSS - нестача) одним пакетом;
+    усі транзакції документа пов'язані з ним через Transaction.stocktake.
+    """
+    STATUS_CHOICES = [
+        ('draft', 'Підрахунок'),
+        ('posted', 'Проведено'),
+    ]
+
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stocktakes', verbose_name="Склад")
+    status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='draft')
+    note = models.CharField("Примітка", max_length=255, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name="Автор")
+    created_at = models.DateTimeField(auto_now_add=True)
+    posted_at = models.DateTimeField("Проведено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Інвентаризація"
+        verbose_name_plural = "Інвентаризації"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Інвентаризація №{self.id} ({self.warehouse.name})"
+
+
+class StocktakeLine(models.Model):
+    """Рядок інвентаризації: обліковий залишок (знімок) і фактично пораховано (None - ще не рахували)."""
+    stocktake = models.ForeignKey(Stocktake, on_delete=models.CASCADE, related_name='lines')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+
+    # DECIMAL UPDATE: Кількість (3 знаки)
+    system_quantity = models.DecimalField("Обліковий залишок", max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    counted_quantity = models.DecimalField("Фактично", max_digits=14, decimal_places=3, null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Рядок інвентаризації"
+        verbose_name_plural = "Рядки інвентаризації"
+        unique_together = ('stocktake', 'material')
+
+    def __str__(self):
+        return f"{self.material_id}: {self.system_quantity} -> {self.counted_quantity}"
+
+
 # --- AUDIT LOG ---
 
 class AuditLog(models.Model):
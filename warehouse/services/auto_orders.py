@@ -0,0 +1,139 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from ..models import Order, OrderItem, ReorderSuggestion, AuditLog
+from .low_stock import low_stock_qs
+from .inventory import to_decimal
+from .supplier_prices import SupplierPriceIndex
+
+# Заявки в цих статусах вже покривають потребу - не дублюємо їх
+OPEN_ORDER_STATUSES = ['draft', 'new', 'rfq', 'approved', 'purchasing', 'transit']
+
+
+def collect_needs(warehouses, source='both', due_within_days=0, today=None):
+    """
+    Збирає потребу {(warehouse_id, material_id): {'qty': Decimal, 'due': date}} з:
+    - 'forecast': ReorderSuggestion з датою замовлення <= today + due_within_days;
+    - 'low_stock': поточний дефіцит до min_limit (low_stock_qs);
+    - 'both': максимум з двох джерел.
+    Від потреби віднімається кількість, вже замовлена у відкритих заявках.
+    """
+    if today is None:
+        today = timezone.localdate()
+
+    needs = {}
+
+    def add_need(key, qty, due):
+        qty = to_decimal(qty, places=3)
+        if qty <= 0:
+            return
+        current = needs.get(key)
+        if current is None:
+            needs[key] = {'qty': qty, 'due': due}
+        else:
+            current['qty'] = max(current['qty'], qty)
+            current['due'] = min(current['due'], due)
+
+    if source in ('forecast', 'both'):
+        due_limit = today + datetime.timedelta(days=due_within_days)
+        suggestions = ReorderSuggestion.objects.filter(
+            warehouse__in=warehouses,
+            reorder_date__lte=due_limit
+        ).values_list('warehouse_id', 'material_id', 'reorder_quantity', 'reorder_date')
+        for wh_id, mat_id, qty, due in suggestions:
+            add_need((wh_id, mat_id), qty, due)
+
+    if source in ('low_stock', 'both'):
+        for row in low_stock_qs(warehouses).order_by():
+            add_need((row['warehouse_id'], row['material_id']), row['shortage'], today)
+
+    if not needs:
+        return needs
+
+    # Віднімаємо вже замовлене (один агрегований запит)
+    open_qty = OrderItem.objects.filter(
+        order__warehouse__in=warehouses,
+        order__status__in=OPEN_ORDER_STATUSES,
+        material_id__in={mat_id for _, mat_id in needs}
+    ).values_list('order__warehouse_id', 'material_id').annotate(q=Sum('quantity')).order_by()
+
+    for wh_id, mat_id, qty in open_qty:
+        need = needs.get((wh_id, mat_id))
+        if need is not None:
+            need['qty'] -= qty or Decimal("0.000")
+
+    return {key: need for key, need in needs.items() if need['qty'] > 0}
+
+
+@transaction.atomic
+def generate_draft_orders(warehouses, user=None, source='both', due_within_days=0, today=None):
+    """
+    Створює чернетки заявок (status='draft') з прогнозу/дефіциту.
+
+    Групування: одна заявка на пару (склад, найдешевший постачальник).
+    Заявки, позиції та записи аудиту створюються через bulk_create в одній транзакції,
+    тому кількість запитів не залежить від кількості складів.
+
+    Повертає {'orders': N, 'items': M}.
+    """
+    if today is None:
+        today = timezone.localdate()
+
+    needs = collect_needs(warehouses, source=source, due_within_days=due_within_days, today=today)
+    if not needs:
+        return {'orders': 0, 'items': 0}
+
+    price_index = SupplierPriceIndex.for_materials({mat_id for _, mat_id in needs})
+
+    # (warehouse_id, supplier_id) -> [(material_id, qty, price, due)]
+    groups = defaultdict(list)
+    for (wh_id, mat_id), need in sorted(needs.items()):
+        sup_id, price = price_index.best(mat_id) or (None, None)
+        groups[(wh_id, sup_id)].append((mat_id, need['qty'], price, need['due']))
+
+    group_keys = list(groups.keys())
+    orders = []
+    for wh_id, sup_id in group_keys:
+        lines = groups[(wh_id, sup_id)]
+        due = min(line[3] for line in lines)
+        orders.append(Order(
+            warehouse_id=wh_id,
+            status='draft',
+            priority='critical' if due <= today else 'high',
+            created_by=user,
+            expected_date=due,
+            note="Автоматична чернетка (прогноз витрати / дефіцит залишків)"
+        ))
+
+    Order.objects.bulk_create(orders, batch_size=500)
+
+    items = []
+    for order, key in zip(orders, group_keys):
+        _, sup_id = key
+        for mat_id, qty, price, _ in groups[key]:
+            items.append(OrderItem(
+                order=order,
+                material_id=mat_id,
+                quantity=qty,
+                supplier_id=sup_id,
+                supplier_price=price
+            ))
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+
+    order_type = ContentType.objects.get_for_model(Order)
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user=user,
+            action_type='CREATE',
+            content_type=order_type,
+            object_id=order.id,
+            new_value=f"Auto draft order #{order.id} ({len(groups[key])} items)"
+        )
+        for order, key in zip(orders, group_keys)
+    ], batch_size=1000)
+
+    return {'orders': len(orders), 'items': len(items)}
@@ -0,0 +1,363 @@
+import inspect
+import platform
+import random
+import subprocess
+import time
+import uuid
+from decimal import Decimal
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Min, Max
+from django.test import RequestFactory
+from django.utils import timezone
+from ..middleware import RequestMetrics
+from ..models import Warehouse, Material, Order, OrderItem, Transaction
+from . import inventory
+from .low_stock import BALANCE_EXPR
+from .material_search import invalidate_local_index
+
+DEFAULT_ITERATIONS = 30
+DEFAULT_WARMUP = 3
+DEFAULT_ORDER_LINES = 20
+PERCENTILES = (50, 90, 95, 99)
+# Період оборотки: останні N днів даних
+PERIOD_REPORT_DAYS = 90
+# Вибірки заявок (логістика, прострочені) - перша сторінка
+ORDER_LOOKUP_LIMIT = 50
+# Скільки матеріалів нової заявки порівнюється з недавніми (check_order_duplicates)
+DUPLICATE_MATERIALS = 5
+
+# name -> (factory, writes); factory(context, count) повертає op(i) - одну виміряну операцію
+SCENARIOS = {}
+
+
+def scenario(name, writes=False):
+    """Реєструє сценарій. writes=True - сценарій пише в БД (усе відкочується після прогону)."""
+    def decorator(factory):
+        SCENARIOS[name] = (factory, writes)
+        return factory
+    return decorator
+
+
+class _Rollback(Exception):
+    pass
+
+
+class BenchmarkContext:
+    """Спільне для сценаріїв: користувач (superuser, відкочується), найбільший склад, RequestFactory."""
+
+    def __init__(self, user, seed=42, order_lines=DEFAULT_ORDER_LINES):
+        self.user = user
+        self.rng = random.Random(seed)
+        self.order_lines = order_lines
+        self.factory = RequestFactory()
+
+        # Найбільший склад за кількістю транзакцій - найгірший випадок для залишків
+        largest = (
+            Transaction.objects.values('warehouse_id').annotate(n=Count('id')).order_by('-n').first()
+        )
+        if largest is None:
+            raise ValueError('У базі немає транзакцій. Спочатку: manage.py generate_synthetic_data')
+        self.warehouse = Warehouse.objects.get(pk=largest['warehouse_id'])
+        self.warehouse_transactions = largest['n']
+
+    def get(self, view, params=None):
+        """Викликає view без декораторів (login_required, rate_limit) - вимірюємо саму роботу."""
+        request = self.factory.get('/', params or {})
+        request.user = self.user
+        return inspect.unwrap(view)(request)
+
+    def stocked_materials(self, limit=50):
+        """Матеріали з найбільшим залишком на найбільшому складі (для списань без InsufficientStockError)."""
+        rows = (
+            Transaction.objects.filter(warehouse=self.warehouse).values('material_id')
+            .annotate(qty=BALANCE_EXPR).filter(qty__gt=1).order_by('-qty')[:limit]
+        )
+        materials = Material.objects.in_bulk([row['material_id'] for row in rows])
+        return list(materials.values())
+
+    def sample_materials(self, k):
+        """k випадкових матеріалів, відтворювано за seed (order_by('?') залежить від БД)."""
+        ids = list(Material.objects.order_by('id').values_list('id', flat=True))
+        chosen = self.rng.sample(ids, min(k, len(ids)))
+        materials = Material.objects.in_bulk(chosen)
+        return [materials[mat_id] for mat_id in chosen]
+
+
+# ==============================================================================
+# СЦЕНАРІЇ
+# ==============================================================================
+
+@scenario('get_warehouse_balance')
+def _warehouse_balance(context, count):
+    from ..views.utils import get_warehouse_balance
+
+    def op(i):
+        get_warehouse_balance(context.warehouse)
+    return op
+
+
+@scenario('period_report')
+def _period_report(context, count):
+    from ..views.reports import period_report
+
+    last = Transaction.objects.aggregate(last=Max('date'))['last']
+    params = {
+        'start_date': (last - timezone.timedelta(days=PERIOD_REPORT_DAYS - 1)).isoformat(),
+        'end_date': last.isoformat(),
+    }
+
+    def op(i):
+        _assert_ok(context.get(period_report, params))
+    return op
+
+
+@scenario('stock_balance_report_export')
+def _stock_balance_export(context, count):
+    from ..views.reports import stock_balance_report
+
+    def op(i):
+        _assert_ok(context.get(stock_balance_report, {'export': 'excel'}))
+    return op
+
+
+@scenario('order_list')
+def _order_list(context, count):
+    from ..views.orders import order_list
+
+    def op(i):
+        _assert_ok(context.get(order_list, {'page': i % 5 + 1}))
+    return op
+
+
+@scenario('order_list_export')
+def _order_list_export(context, count):
+    from ..views.orders import order_list
+
+    def op(i):
+        response = context.get(order_list, {'export': 'excel'})
+        _assert_ok(response)
+        # Потокова відповідь: час включає формування і читання всього файлу
+        b''.join(response.streaming_content)
+    return op
+
+
+@scenario('ajax_materials')
+def _ajax_materials(context, count):
+    from ..views.utils import ajax_materials
+
+    # Імітація autocomplete: префікси назв і артикулів випадкових матеріалів
+    queries = []
+    for material in context.sample_materials(200):
+        text = material.article if material.article and context.rng.random() < 0.2 else material.name
+        queries.extend(text[:length] for length in range(2, min(len(text), 8) + 1))
+    context.rng.shuffle(queries)
+    queries = queries or ['а']
+    invalidate_local_index()
+
+    def op(i):
+        _assert_ok(context.get(ajax_materials, {'q': queries[i % len(queries)]}))
+    return op
+
+
+@scenario('check_order_duplicates')
+def _check_order_duplicates(context, count):
+    from ..views.orders import check_order_duplicates
+
+    # Вікно дублікатів рахується від "зараз": склад - з найновішою заявкою, матеріали - випадкові
+    latest = Order.objects.order_by('-created_at').values('warehouse_id').first()
+    if latest is None:
+        raise ValueError('У базі немає заявок. Спочатку: manage.py generate_synthetic_data --orders N')
+    material_ids = [material.id for material in context.sample_materials(DUPLICATE_MATERIALS * 10)]
+    params = [
+        {'warehouse': latest['warehouse_id'],
+         'materials': ','.join(str(pk) for pk in context.rng.sample(material_ids, min(DUPLICATE_MATERIALS, len(material_ids))))}
+        for _ in range(count)
+    ]
+
+    def op(i):
+        _assert_ok(context.get(check_order_duplicates, params[i]))
+    return op
+
+
+@scenario('logistics_orders')
+def _logistics_orders(context, count):
+    # Вибірка логістичного монітора: status=... ORDER BY expected_date (індекс status, expected_date)
+    statuses = ['purchasing', 'transit']
+
+    def op(i):
+        list(
+            Order.objects.filter(status=statuses[i % len(statuses)]).order_by('expected_date')
+            .values_list('id', 'warehouse_id', 'expected_date')[:ORDER_LOOKUP_LIMIT]
+        )
+    return op
+
+
+@scenario('overdue_orders')
+def _overdue_orders(context, count):
+    # Вибірка problem_areas: status IN (...) AND expected_date < дата
+    last = Order.objects.aggregate(last=Max('expected_date'))['last'] or timezone.now().date()
+
+    def op(i):
+        list(
+            Order.objects.filter(status__in=['purchasing', 'transit'], expected_date__lt=last)
+            .order_by('expected_date').values_list('id', 'warehouse_id', 'expected_date')[:ORDER_LOOKUP_LIMIT]
+        )
+    return op
+
+
+@scenario('create_writeoff', writes=True)
+def _create_writeoff(context, count):
+    materials = context.stocked_materials()
+    if not materials:
+        raise ValueError(f'На складі {context.warehouse} немає залишків для списання')
+
+    def op(i):
+        inventory.create_writeoff(
+            materials[i % len(materials)], context.warehouse, Decimal('0.001'), context.user,
+            description='benchmark'
+        )
+    return op
+
+
+@scenario('process_order_receipt', writes=True)
+def _process_order_receipt(context, count):
+    # Заявки готуються поза виміром: одна на ітерацію, order_lines позицій
+    materials = context.sample_materials(context.order_lines)
+    orders = Order.objects.bulk_create([
+        Order(warehouse=context.warehouse, status='transit', created_by=context.user, note='benchmark')
+        for _ in range(count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, material=material, quantity=Decimal('10.000'), supplier_price=material.current_avg_price)
+        for order in orders for material in materials
+    ])
+    receipts = [
+        (order, {item_id: '10' for item_id in order.items.values_list('id', flat=True)})
+        for order in orders
+    ]
+
+    def op(i):
+        order, items_data = receipts[i]
+        inventory.process_order_receipt(order, items_data, context.user)
+    return op
+
+
+def _assert_ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f'Відповідь {response.status_code}')
+
+
+# ==============================================================================
+# ЗАПУСК
+# ==============================================================================
+
+def _measure(op, iterations, warmup):
+    for i in range(warmup):
+        op(i)
+
+    metrics = RequestMetrics()
+    latencies = []
+    with connection.execute_wrapper(metrics):
+        started = time.perf_counter()
+        for i in range(warmup, warmup + iterations):
+            t0 = time.perf_counter()
+            op(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        total = time.perf_counter() - started
+
+    values = np.percentile(latencies, PERCENTILES)
+    result = {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 2) if total else None,
+        'mean_ms': round(float(np.mean(latencies)), 3),
+        'min_ms': round(min(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+    }
+    result.update({f'p{p}_ms': round(float(v), 3) for p, v in zip(PERCENTILES, values)})
+    result['queries_per_op'] = round(metrics.sql_count / iterations, 1)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def dataset_summary():
+    dates = Transaction.objects.aggregate(first=Min('date'), last=Max('date'))
+    return {
+        'warehouses': Warehouse.objects.count(),
+        'materials': Material.objects.count(),
+        'orders': Order.objects.count(),
+        'transactions': Transaction.objects.count(),
+        'date_from': dates['first'].isoformat() if dates['first'] else None,
+        'date_to': dates['last'].isoformat() if dates['last'] else None,
+    }
+
+
+def run_benchmark(names=None, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP,
+                  order_lines=DEFAULT_ORDER_LINES, seed=42, progress=None):
+    """
+    Проганяє сценарії (за замовчуванням - усі) на поточній БД і повертає результат для JSON:
+    {'meta': {...}, 'scenarios': {name: {ops_per_sec, p50_ms, ..., queries_per_op}}}.
+
+    Усе, що пишуть сценарії (і службовий користувач), відкочується - БД лишається як була.
+    """
+    names = list(names or SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Невідомі сценарії: {', '.join(sorted(unknown))}")
+    progress = progress or (lambda name, result: None)
+
+    meta = {
+        'commit': _git_commit(),
+        'timestamp': timezone.now().isoformat(timespec='seconds'),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'iterations': iterations,
+        'warmup': warmup,
+        'order_lines': order_lines,
+        'seed': seed,
+        'dataset': dataset_summary(),
+    }
+    results = {}
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'benchmark_{uuid.uuid4().hex[:8]}', is_staff=True, is_superuser=True)
+            context = BenchmarkContext(user, seed=seed, order_lines=order_lines)
+            meta['warehouse'] = {'id': context.warehouse.id, 'transactions': context.warehouse_transactions}
+
+            for name in names:
+                factory, _ = SCENARIOS[name]
+                op = factory(context, warmup + iterations)
+                results[name] = _measure(op, iterations, warmup)
+                progress(name, results[name])
+            raise _Rollback()
+    except _Rollback:
+        pass
+    finally:
+        invalidate_local_index()
+
+    return {'meta': meta, 'scenarios': results}
+
+
+def compare(current, baseline):
+    """Зміна відносно попереднього прогону (у %): ops/sec (більше - краще) і p95 (менше - краще)."""
+    changes = {}
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        changes[name] = {
+            key: round((result[key] - before[key]) / before[key] * 100, 1) if before.get(key) else None
+            for key in ('ops_per_sec', 'p95_ms')
+        }
+    return changes
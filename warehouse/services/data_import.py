@@ -0,0 +1,345 @@
+import codecs
+import csv
+import io
+import os
+import zipfile
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+from django.db import transaction
+from ..models import ConstructionStage, Material, StageLimit, StocktakeLine, SupplierPrice, Transaction
+from . import inventory
+from .low_stock import BALANCE_EXPR
+
+IMPORT_EXTENSIONS = ('csv', 'xlsx')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+CSV_DELIMITERS = ';,\t'
+CSV_SNIFF_BYTES = 64 * 1024  # Зразок для визначення кодування
+
+# Колонки файлів: перший рядок - заголовок (регістр і пробіли не важливі, можна українською)
+COLUMNS = {
+    'stock': ('article', 'quantity'),
+    'stage_limits': ('stage', 'article', 'planned_quantity'),
+    'supplier_prices': ('article', 'price'),
+}
+OPTIONAL_COLUMNS = {
+    'stock': ('price',),
+}
+HEADER_ALIASES = {
+    'артикул': 'article',
+    'код': 'article',
+    'кількість': 'quantity',
+    'залишок': 'quantity',
+    'ціна': 'price',
+    'етап': 'stage',
+    'план': 'planned_quantity',
+    'план. кількість': 'planned_quantity',
+}
+KIND_LABELS = {
+    'stock': 'Початкові залишки',
+    'stage_limits': 'Ліміти етапів (кошторис)',
+    'supplier_prices': 'Прайс постачальника',
+}
+OPENING_STOCK_DESCRIPTION = "Введення залишків (імпорт)"
+
+
+class DataImportError(ValueError):
+    """Помилка: файл не можна імпортувати (формат, відсутні колонки, не вказано склад/постачальника)."""
+    pass
+
+
+class _RowError(Exception):
+    pass
+
+
+# ==============================================================================
+# ЧИТАННЯ ФАЙЛІВ (ПОРЯДКОВО)
+# ==============================================================================
+
+def _normalize_header(value):
+    name = str(value or '').strip().lower()
+    return HEADER_ALIASES.get(name, name.replace(' ', '_'))
+
+
+def _is_blank(values):
+    return all(value is None or str(value).strip() == '' for value in values)
+
+
+def _csv_encoding(file):
+    """UTF-8 (з BOM або без), інакше Windows-1251 - так Excel зберігає CSV в українській локалі."""
+    sample = file.read(CSV_SNIFF_BYTES)
+    file.seek(0)
+    try:
+        # final=False: символ, обрізаний межею зразка, не є помилкою
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8-sig'
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding=_csv_encoding(file), newline='')
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError:
+        raise DataImportError("Не вдалося прочитати CSV: збережіть файл у кодуванні UTF-8 або Windows-1251")
+    except csv.Error as e:
+        raise DataImportError(f"Пошкоджений файл CSV: {e}")
+    finally:
+        # Файл закриває власник (upload / команда), не обгортка
+        text.detach()
+
+
+def _xlsx_rows(file):
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise DataImportError("Файл не є книгою Excel (.xlsx) або пошкоджений")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(file, filename, required=()):
+    """
+    Рядки CSV/XLSX по одному (csv.reader / openpyxl read-only) - файл не завантажується в пам'ять.
+    Повертає генератор (номер рядка у файлі, {колонка: значення}); порожні рядки пропускаються.
+    """
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension not in IMPORT_EXTENSIONS:
+        raise DataImportError(f"Непідтримуваний формат файлу. Дозволені: {', '.join(IMPORT_EXTENSIONS)}")
+    rows = _csv_rows(file) if extension == 'csv' else _xlsx_rows(file)
+
+    try:
+        header = [_normalize_header(value) for value in next(rows)]
+    except StopIteration:
+        raise DataImportError("Файл порожній")
+    missing = [column for column in required if column not in header]
+    if missing:
+        rows.close()
+        raise DataImportError(f"Відсутні колонки: {', '.join(missing)}")
+
+    def generate():
+        for line, values in enumerate(rows, start=2):
+            if not _is_blank(values):
+                yield line, dict(zip(header, values))
+    return generate()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# ==============================================================================
+# ПАРСИНГ ЗНАЧЕНЬ
+# ==============================================================================
+
+def _text(row, column):
+    value = row.get(column)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Excel зберігає числові артикули як float: 1001.0 -> "1001"
+        value = int(value)
+    return str(value).strip()
+
+
+def _decimal(row, column, field, label):
+    """Невід'ємне число з комірки, округлене і обмежене за DecimalField моделі (max_digits, decimal_places)."""
+    raw = _text(row, column).replace(' ', '').replace(',', '.')
+    try:
+        value = Decimal(raw)
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite():
+        raise _RowError(f"{label}: некоректне число «{_text(row, column)}»")
+
+    # to_decimal обнуляє число поза точністю контексту (1e30 -> 0), тому межа перевіряється і до округлення
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if abs(value) < limit:
+        value = inventory.to_decimal(value, places=field.decimal_places)
+    if value < 0:
+        raise _RowError(f"{label} не може бути від'ємною")
+    if value >= limit:
+        raise _RowError(f"{label}: завелике число «{_text(row, column)}»")
+    return value
+
+
+class ImportContext:
+    """Спільне для всіх пакетів одного імпорту: параметри і карта артикул -> id (один запит)."""
+
+    def __init__(self, warehouse=None, supplier=None, user=None):
+        self.warehouse = warehouse
+        self.supplier = supplier
+        self.user = user
+        self.material_ids = dict(
+            Material.objects.exclude(article__isnull=True).exclude(article='').values_list('article', 'id')
+        )
+        self.stage_ids = None
+
+    def material_id(self, row):
+        article = _text(row, 'article')
+        if not article:
+            raise _RowError("Не вказано артикул")
+        material_id = self.material_ids.get(article)
+        if material_id is None:
+            raise _RowError(f"Матеріал з артикулом «{article}» не знайдено")
+        return material_id
+
+
+def _parse(batch, parse_row, errors):
+    """Валідує пакет: {ключ: значення} (останній рядок з тим самим ключем перемагає) + помилки рядків."""
+    parsed = {}
+    for line, row in batch:
+        try:
+            key, value = parse_row(row)
+        except _RowError as e:
+            errors.append((line, str(e)))
+            continue
+        parsed[key] = (line, value)
+    return parsed
+
+
+# ==============================================================================
+# ІМПОРТЕРИ: import_<kind>(batch, context, errors) -> (імпортовано, без змін)
+# ==============================================================================
+
+def import_stock(batch, context, errors):
+    """
+    Початкові залишки складу: кількість у файлі - цільовий залишок. Проводиться тільки різниця
+    (прихід через inventory.post_batch), тому повторний імпорт того самого файлу нічого не змінює.
+    """
+    def parse_row(row):
+        price = _decimal(row, 'price', Transaction._meta.get_field('price'), "Ціна") if _text(row, 'price') else None
+        return context.material_id(row), (_decimal(row, 'quantity', Transaction._meta.get_field('quantity'), "Кількість"), price)
+
+    parsed = _parse(batch, parse_row, errors)
+    balances = dict(
+        Transaction.objects.filter(warehouse=context.warehouse, material_id__in=parsed).order_by()
+        .values('material_id').annotate(balance=BALANCE_EXPR).values_list('material_id', 'balance')
+    )
+    materials = Material.objects.in_bulk(parsed)
+
+    entries, unchanged = [], 0
+    for material_id, (line, (quantity, price)) in parsed.items():
+        balance = inventory.to_decimal(balances.get(material_id) or 0, places=3)
+        if quantity == balance:
+            unchanged += 1
+        elif quantity < balance:
+            errors.append((line, f"На складі вже {balance}, більше ніж у файлі ({quantity})"))
+        else:
+            entries.append({
+                'type': 'IN', 'material': materials[material_id], 'warehouse': context.warehouse,
+                'quantity': quantity - balance, 'price': price, 'description': OPENING_STOCK_DESCRIPTION,
+            })
+    inventory.post_batch(entries, context.user)
+    return len(entries), unchanged
+
+
+def import_stage_limits(batch, context, errors):
+    """Ліміти етапів (кошторис) складу: етапи створюються за назвою, ліміти - upsert по (етап, матеріал)."""
+    if context.stage_ids is None:
+        context.stage_ids = dict(ConstructionStage.objects.filter(warehouse=context.warehouse).values_list('name', 'id'))
+
+    def parse_row(row):
+        stage = _text(row, 'stage')
+        if not stage:
+            raise _RowError("Не вказано етап")
+        if len(stage) > ConstructionStage._meta.get_field('name').max_length:
+            raise _RowError("Назва етапу задовга")
+        planned = _decimal(row, 'planned_quantity', StageLimit._meta.get_field('planned_quantity'), "План. кількість")
+        return (stage, context.material_id(row)), planned
+
+    parsed = _parse(batch, parse_row, errors)
+    new_stages = [
+        ConstructionStage(name=name, warehouse=context.warehouse)
+        for name in dict.fromkeys(stage for stage, _ in parsed) if name not in context.stage_ids
+    ]
+    for stage in ConstructionStage.objects.bulk_create(new_stages):
+        context.stage_ids[stage.name] = stage.id
+
+    StageLimit.objects.bulk_create(
+        [
+            StageLimit(stage_id=context.stage_ids[stage], material_id=material_id, planned_quantity=quantity)
+            for (stage, material_id), (_, quantity) in parsed.items()
+        ],
+        update_conflicts=True, unique_fields=['stage', 'material'], update_fields=['planned_quantity'],
+    )
+    return len(parsed), 0
+
+
+def import_supplier_prices(batch, context, errors):
+    """Прайс постачальника: upsert ціни по (постачальник, матеріал)."""
+    def parse_row(row):
+        return context.material_id(row), _decimal(row, 'price', SupplierPrice._meta.get_field('price'), "Ціна")
+
+    parsed = _parse(batch, parse_row, errors)
+    SupplierPrice.objects.bulk_create(
+        [
+            SupplierPrice(supplier=context.supplier, material_id=material_id, price=price)
+            for material_id, (_, price) in parsed.items()
+        ],
+        update_conflicts=True, unique_fields=['supplier', 'material'], update_fields=['price', 'updated_at'],
+    )
+    return len(parsed), 0
+
+
+def read_quantities(file, filename):
+    """
+    Файл «article; quantity» (напр. результати інвентаризації) -> ({material_id: кількість}, помилки).
+    Помилки - [(рядок, повідомлення)]; повтор артикула - перемагає останній рядок.
+    """
+    context = ImportContext()
+
+    def parse_row(row):
+        return context.material_id(row), _decimal(row, 'quantity', StocktakeLine._meta.get_field('counted_quantity'), "Кількість")
+
+    errors = []
+    parsed = _parse(read_rows(file, filename, required=('article', 'quantity')), parse_row, errors)
+    return {material_id: quantity for material_id, (_, quantity) in parsed.items()}, errors
+
+
+IMPORTERS = {
+    'stock': import_stock,
+    'stage_limits': import_stage_limits,
+    'supplier_prices': import_supplier_prices,
+}
+
+
+def run_import(kind, file, filename, warehouse=None, supplier=None, user=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Імпорт CSV/XLSX: рядки читаються потоково, валідуються й записуються пакетами по batch_size
+    (кожен пакет - окрема транзакція БД, bulk-запити). Рядки з помилками пропускаються.
+    Повертає {'rows', 'imported', 'unchanged', 'errors': [(рядок, повідомлення)], 'error_count'}.
+    """
+    if kind not in IMPORTERS:
+        raise DataImportError(f"Невідомий тип імпорту: {kind}")
+    if kind in ('stock', 'stage_limits') and warehouse is None:
+        raise DataImportError("Вкажіть склад (об'єкт)")
+    if kind == 'supplier_prices' and supplier is None:
+        raise DataImportError("Вкажіть постачальника")
+
+    rows = read_rows(file, filename, required=COLUMNS[kind])
+    context = ImportContext(warehouse=warehouse, supplier=supplier, user=user)
+    stats = {'rows': 0, 'imported': 0, 'unchanged': 0, 'errors': [], 'error_count': 0}
+    for batch in _batches(rows, batch_size):
+        errors = []
+        with transaction.atomic():
+            imported, unchanged = IMPORTERS[kind](batch, context, errors)
+        stats['rows'] += len(batch)
+        stats['imported'] += imported
+        stats['unchanged'] += unchanged
+        stats['error_count'] += len(errors)
+        stats['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(stats['errors'])])
+    return stats
@@ -0,0 +1,174 @@
+import datetime
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from ..models import Transaction, Material, ReorderSuggestion
+from .low_stock import BALANCE_EXPR
+
+# Параметри прогнозу за замовчуванням
+DEFAULT_HISTORY_DAYS = 90   # Глибина історії витрат
+DEFAULT_WINDOW = 14         # Вікно ковзного середнього (SMA)
+DEFAULT_ALPHA = 0.3         # Коефіцієнт експоненційного згладжування (EWMA)
+DEFAULT_LEAD_TIME = 3       # Днів від заявки до поставки
+DEFAULT_REVIEW_DAYS = 7     # На скільки днів вперед замовляємо
+DEFAULT_HORIZON = 30        # Зберігаємо тільки пропозиції з датою замовлення в цьому горизонті
+MIN_DAILY_RATE = 0.001      # Темп нижче точності кількостей (0.001) - витрати немає
+
+# Покриття більше за діапазон ReorderSuggestion.days_of_cover (max_digits=10, 1 знак) обрізається
+_COVER_FIELD = ReorderSuggestion._meta.get_field('days_of_cover')
+MAX_DAYS_OF_COVER = 10 ** (_COVER_FIELD.max_digits - _COVER_FIELD.decimal_places) - 10 ** -_COVER_FIELD.decimal_places
+
+
+def load_usage_matrix(warehouses, history_days=DEFAULT_HISTORY_DAYS, end_date=None):
+    """
+    Завантажує денну витрату (OUT + LOSS, без переміщень) одним запитом
+    і розкладає її в матрицю NumPy: рядок = пара (warehouse_id, material_id), стовпець = день.
+
+    Повертає (pairs, matrix), де pairs - список кортежів у порядку рядків матриці.
+    """
+    if end_date is None:
+        end_date = timezone.localdate()
+    start_date = end_date - datetime.timedelta(days=history_days - 1)
+
+    rows = Transaction.objects.filter(
+        warehouse__in=warehouses,
+        transaction_type__in=['OUT', 'LOSS'],
+        transfer_group_id__isnull=True,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values_list('warehouse_id', 'material_id', 'date').annotate(
+        qty=Sum('quantity')
+    ).order_by()
+
+    pair_index = {}
+    row_idx, day_idx, values = [], [], []
+    for wh_id, mat_id, day, qty in rows:
+        key = (wh_id, mat_id)
+        if key not in pair_index:
+            pair_index[key] = len(pair_index)
+        row_idx.append(pair_index[key])
+        day_idx.append((day - start_date).days)
+        values.append(float(qty or 0))
+
+    matrix = np.zeros((len(pair_index), history_days), dtype=np.float64)
+    if values:
+        # add.at коректно підсумовує, якщо (пара, день) зустрічається кілька разів
+        np.add.at(matrix, (np.array(row_idx), np.array(day_idx)), np.array(values))
+
+    return list(pair_index.keys()), matrix
+
+
+def _load_stock_vector(warehouses, pairs):
+    """Поточні залишки для пар (один GROUP BY запит), у порядку pairs."""
+    pair_index = {key: i for i, key in enumerate(pairs)}
+    stock = np.zeros(len(pairs), dtype=np.float64)
+
+    balances = Transaction.objects.filter(warehouse__in=warehouses).values_list(
+        'warehouse_id', 'material_id'
+    ).annotate(balance=BALANCE_EXPR).order_by()
+
+    for wh_id, mat_id, balance in balances:
+        i = pair_index.get((wh_id, mat_id))
+        if i is not None:
+            stock[i] = float(balance or 0)
+    return stock
+
+
+def compute_reorder_plan(
+    warehouses,
+    history_days=DEFAULT_HISTORY_DAYS,
+    window=DEFAULT_WINDOW,
+    alpha=DEFAULT_ALPHA,
+    lead_time=DEFAULT_LEAD_TIME,
+    review_days=DEFAULT_REVIEW_DAYS,
+    horizon=DEFAULT_HORIZON,
+    end_date=None,
+):
+    """
+    Прогноз дозамовлення для всіх пар (склад, матеріал) одночасно.
+
+    Вся математика - векторні операції над матрицею витрат:
+    - SMA: середнє за останні `window` днів;
+    - EWMA: зважена сума з вагами alpha*(1-alpha)^k (нормована на суму ваг);
+    - темп витрати = max(SMA, EWMA) (консервативно);
+    - точка замовлення = min_limit + темп * lead_time;
+    - кількість = min_limit + темп * (lead_time + review_days) - залишок на дату замовлення.
+
+    Повертає список словників, готових до збереження у ReorderSuggestion.
+    """
+    if end_date is None:
+        end_date = timezone.localdate()
+
+    pairs, matrix = load_usage_matrix(warehouses, history_days, end_date)
+    if not pairs:
+        return []
+
+    stock = _load_stock_vector(warehouses, pairs)
+
+    material_ids = {mat_id for _, mat_id in pairs}
+    min_limits_map = dict(Material.objects.filter(id__in=material_ids).values_list('id', 'min_limit'))
+    min_limit = np.array([float(min_limits_map.get(mat_id) or 0) for _, mat_id in pairs])
+
+    # 1. Темп витрати
+    window = max(1, min(window, history_days))
+    sma = matrix[:, -window:].mean(axis=1)
+
+    weights = alpha * (1 - alpha) ** np.arange(history_days)[::-1]  # найновіший день має найбільшу вагу
+    ewma = matrix @ weights / weights.sum()
+
+    rate = np.maximum(sma, ewma)
+    # Мізерний темп (залишки давньої історії в EWMA) дав би покриття ~1e15 днів
+    has_usage = rate >= MIN_DAILY_RATE
+
+    # 2. Покриття та дата замовлення
+    stock_pos = np.clip(stock, 0, None)
+    days_of_cover = np.divide(stock_pos, rate, out=np.full(len(pairs), np.inf), where=has_usage)
+    days_of_cover = np.minimum(days_of_cover, MAX_DAYS_OF_COVER)
+
+    reorder_point = min_limit + rate * lead_time
+    days_until_reorder = np.divide(
+        stock_pos - reorder_point, rate, out=np.zeros(len(pairs)), where=has_usage
+    )
+    days_until_reorder = np.floor(np.clip(days_until_reorder, 0, None))
+
+    # 3. Кількість: поповнюємо до рівня min_limit + потреба на (lead_time + review_days)
+    stock_at_reorder = np.minimum(stock_pos, reorder_point)
+    target_level = min_limit + rate * (lead_time + review_days)
+    reorder_qty = np.ceil(np.clip(target_level - stock_at_reorder, 0, None) * 1000) / 1000
+
+    selected = has_usage & (days_until_reorder <= horizon) & (reorder_qty > 0)
+
+    plan = []
+    for i in np.flatnonzero(selected):
+        wh_id, mat_id = pairs[i]
+        plan.append({
+            'warehouse_id': wh_id,
+            'material_id': mat_id,
+            'current_stock': Decimal(str(round(stock[i], 3))),
+            'avg_daily_usage': Decimal(str(round(sma[i], 3))),
+            'smoothed_daily_usage': Decimal(str(round(ewma[i], 3))),
+            'days_of_cover': Decimal(str(round(days_of_cover[i], 1))),
+            'reorder_quantity': Decimal(str(round(reorder_qty[i], 3))),
+            'reorder_date': end_date + datetime.timedelta(days=int(days_until_reorder[i])),
+        })
+
+    plan.sort(key=lambda row: (row['reorder_date'], row['days_of_cover']))
+    return plan
+
+
+@transaction.atomic
+def refresh_reorder_suggestions(warehouses, **params):
+    """
+    Перераховує прогноз і повністю замінює кеш ReorderSuggestion для переданих складів.
+    Повертає кількість збережених пропозицій.
+    """
+    plan = compute_reorder_plan(warehouses, **params)
+
+    ReorderSuggestion.objects.filter(warehouse__in=warehouses).delete()
+    ReorderSuggestion.objects.bulk_create(
+        [ReorderSuggestion(**row) for row in plan],
+        batch_size=1000
+    )
+    return len(plan)
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import logging
+from pathlib import PurePosixPath
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger('warehouse')
+
+WEBP_QUALITY = 80
+# Максимальна сторона після перекодування: фото з телефона (4000+ px) -> 2048 px
+MAX_DIMENSION = 2048
+AVATAR_MAX_DIMENSION = 512
+
+# Поля з фото, які перекодовуються при збереженні: {model label: {поле: максимальна сторона}}
+IMAGE_FIELDS = {
+    'warehouse.transaction': {'photo': MAX_DIMENSION},
+    'warehouse.order': {'request_photo': MAX_DIMENSION, 'proof_photo': MAX_DIMENSION},
+    'warehouse.userprofile': {'photo': AVATAR_MAX_DIMENSION},
+}
+
+# Мініатюри: sm - списки/журнали, md - сторінки деталей
+THUMBNAIL_SIZES = {'sm': 160, 'md': 640}
+THUMBNAIL_ROOT = 'thumbs'
+# Скільки пам'ятати, що оригінал не зображення (PDF): не декодувати його при кожному показі
+NOT_IMAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _webp_mode(image):
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('P', 'LA', 'PA') or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def encode_webp(file, max_dimension):
+    """
+    Перекодовує зображення у WebP: поворот за EXIF, зменшення до max_dimension, без метаданих
+    (EXIF з GPS не зберігається). Повертає bytes або None, якщо це не зображення
+    (PDF заявки), анімація або файл пошкоджений - тоді файл лишається як є.
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            if getattr(image, 'is_animated', False):
+                return None
+            image = _webp_mode(ImageOps.exif_transpose(image))
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+            return output.getvalue()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as exc:
+        logger.debug(f"encode_webp skipped {getattr(file, 'name', file)}: {exc}")
+        return None
+    finally:
+        file.seek(0)
+
+
+def webp_name(name):
+    return PurePosixPath(name).with_suffix('.webp').name
+
+
+def normalize_upload(upload, max_dimension=MAX_DIMENSION):
+    """
+    ContentFile з WebP для завантаженого файлу або None (не зображення).
+    Результат кешується на самому upload: той самий файл може зберігатися в кілька записів
+    (process_order_receipt: фото ТТН у кожну транзакцію і в заявку) - кодуємо один раз.
+    """
+    cache = upload.__dict__.setdefault('_webp_cache', {})
+    if max_dimension not in cache:
+        cache[max_dimension] = encode_webp(upload, max_dimension)
+    data = cache[max_dimension]
+    if data is None:
+        return None
+    return ContentFile(data, name=webp_name(upload.name))
+
+
+def normalize_instance_images(instance):
+    """Перекодовує нові (ще не збережені) файли у полях IMAGE_FIELDS моделі. Викликається з pre_save."""
+    for field_name, max_dimension in IMAGE_FIELDS.get(instance._meta.label_lower, {}).items():
+        field_file = getattr(instance, field_name)
+        if not field_file or field_file._committed:
+            continue
+        content = normalize_upload(field_file.file, max_dimension)
+        if content is not None:
+            setattr(instance, field_name, content)
+
+
+# ==============================================================================
+# МІНІАТЮРИ
+# ==============================================================================
+
+def thumbnail_name(name, size):
+    return f"{THUMBNAIL_ROOT}/{size}/{PurePosixPath(name).with_suffix('.webp')}"
+
+
+def _not_image_key(name):
+    return f"thumb-not-image:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+def make_thumbnail(field_file, size):
+    """
+    Створює мініатюру у сховищі поля. True - є (створено або вже була).
+    Якщо оригінал не зображення, це кешується на NOT_IMAGE_CACHE_TIMEOUT, і файл повторно не читається.
+    """
+    storage = field_file.storage
+    name = thumbnail_name(field_file.name, size)
+    if storage.exists(name):
+        return True
+    if cache.get(_not_image_key(field_file.name)):
+        return False
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as f:
+            data = encode_webp(f, THUMBNAIL_SIZES[size])
+    except OSError:
+        # Файл зник зі сховища - показуємо посилання на оригінал як є (не кешується: може з'явитися)
+        return False
+    if data is None:
+        cache.set(_not_image_key(field_file.name), True, timeout=NOT_IMAGE_CACHE_TIMEOUT)
+        return False
+    storage.save(name, ContentFile(data))
+    return True
+
+
+def thumbnail_url(field_file, size='sm'):
+    """URL мініатюри (створюється при першому зверненні); якщо не вийшло - URL оригіналу."""
+    if not field_file:
+        return ''
+    if size not in THUMBNAIL_SIZES:
+        raise ValueError(f"Невідомий розмір мініатюри: {size}")
+    if make_thumbnail(field_file, size):
+        return field_file.storage.url(thumbnail_name(field_file.name, size))
+    return field_file.url
@@ -0,0 +1,203 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from ..models import AuditLog, ConstructionStage, IdempotencyKey, Material, Transaction, Warehouse
+from . import inventory
+
+# Пакетне API операцій (офлайн-клієнти прорабів): POST api/transactions/batch/
+MAX_BATCH_ITEMS = 200
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+OPERATION_TYPES = ('IN', 'OUT', 'LOSS', 'TRANSFER')
+DESCRIPTION_MAX_LENGTH = 255
+
+
+class BatchError(ValueError):
+    """Помилка: пакет некоректний цілком (не список операцій, порожній або завеликий)."""
+    pass
+
+
+class _InvalidOperation(Exception):
+    pass
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _decimal(value, field, label):
+    """Число з JSON -> Decimal, округлене за DecimalField моделі; NaN, Infinity і числа поза полем - помилка."""
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise _InvalidOperation(f"{label}: некоректне число")
+    if not number.is_finite():
+        raise _InvalidOperation(f"{label}: некоректне число")
+    # to_decimal обнуляє число поза точністю контексту (1e30 -> 0), тому межа перевіряється і до округлення
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if abs(number) < limit:
+        number = inventory.to_decimal(number, places=field.decimal_places)
+    if abs(number) >= limit:
+        raise _InvalidOperation(f"{label}: завелике число (максимум {field.max_digits - field.decimal_places} цифр до коми)")
+    return number
+
+
+def _key(item):
+    key = item.get('key') if isinstance(item, dict) else None
+    if isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH:
+        return key
+    return None
+
+
+class _References:
+    """Матеріали, склади й етапи всіх операцій пакета - по одному запиту на модель."""
+
+    def __init__(self, items, allowed_warehouse_ids):
+        def ids(field):
+            return {_int(item.get(field)) for item in items} - {None}
+
+        self.materials = Material.objects.in_bulk(ids('material_id'))
+        self.warehouses = Warehouse.objects.in_bulk(ids('warehouse_id') | ids('target_warehouse_id'))
+        self.stages = ConstructionStage.objects.in_bulk(ids('stage_id'))
+        self.allowed_warehouse_ids = allowed_warehouse_ids
+
+    def warehouse(self, value, label):
+        warehouse = self.warehouses.get(_int(value))
+        if warehouse is None:
+            raise _InvalidOperation(f"{label} не знайдено")
+        if warehouse.pk not in self.allowed_warehouse_ids:
+            raise _InvalidOperation(f"Немає доступу до складу «{warehouse.name}»")
+        return warehouse
+
+
+def _entry(item, refs):
+    """dict операції з JSON -> entry для inventory.post_batch; _InvalidOperation - якщо дані некоректні."""
+    op_type = item.get('type')
+    if op_type not in OPERATION_TYPES:
+        raise _InvalidOperation(f"Невідомий тип операції. Дозволені: {', '.join(OPERATION_TYPES)}")
+
+    material = refs.materials.get(_int(item.get('material_id')))
+    if material is None:
+        raise _InvalidOperation("Матеріал не знайдено")
+    entry = {
+        'type': op_type,
+        'material': material,
+        'warehouse': refs.warehouse(item.get('warehouse_id'), "Склад"),
+        'quantity': _decimal(item.get('quantity'), Transaction._meta.get_field('quantity'), "Кількість"),
+        'description': str(item.get('description') or '')[:DESCRIPTION_MAX_LENGTH],
+    }
+    if entry['quantity'] <= 0:
+        raise _InvalidOperation("Кількість має бути додатною")
+
+    if item.get('date'):
+        try:
+            entry['date'] = datetime.date.fromisoformat(str(item['date']))
+        except ValueError:
+            raise _InvalidOperation("Некоректна дата (очікується YYYY-MM-DD)")
+
+    if op_type == 'IN' and item.get('price') is not None:
+        entry['price'] = _decimal(item['price'], Transaction._meta.get_field('price'), "Ціна")
+        if entry['price'] < 0:
+            raise _InvalidOperation("Ціна не може бути від'ємною")
+
+    if op_type == 'TRANSFER':
+        entry['target_warehouse'] = refs.warehouse(item.get('target_warehouse_id'), "Склад призначення")
+        if entry['target_warehouse'].pk == entry['warehouse'].pk:
+            raise _InvalidOperation("Склад призначення збігається зі складом-джерелом")
+
+    if op_type == 'OUT' and item.get('stage_id') is not None:
+        entry['stage'] = refs.stages.get(_int(item['stage_id']))
+        if entry['stage'] is None:
+            raise _InvalidOperation("Етап робіт не знайдено")
+    return entry
+
+
+def _error(key, message):
+    return {'key': key, 'status': 'error', 'error': message}
+
+
+def _ingest(items, user, allowed_warehouse_ids, ip):
+    keys = [_key(item) for item in items]
+    stored = {
+        row.key: row.result
+        for row in IdempotencyKey.objects.filter(user=user, key__in={key for key in keys if key})
+    }
+
+    refs = _References([item for item in items if isinstance(item, dict)], allowed_warehouse_ids)
+    results = [None] * len(items)
+    entries, positions = [], []
+    first_position = {}
+    for position, (item, key) in enumerate(zip(items, keys)):
+        if key is None:
+            results[position] = _error(None, f"Потрібен key - рядок до {MAX_KEY_LENGTH} символів")
+        elif key in stored:
+            results[position] = {'key': key, 'status': 'duplicate', **stored[key]}
+        elif key in first_position:
+            continue  # повтор у тому ж пакеті - результат першої операції, див. нижче
+        else:
+            first_position[key] = position
+            try:
+                entries.append(_entry(item, refs))
+                positions.append(position)
+            except _InvalidOperation as e:
+                results[position] = _error(key, str(e))
+
+    created_keys, audit = [], []
+    transaction_type = ContentType.objects.get_for_model(Transaction)
+    for position, entry, (txns, error) in zip(positions, entries, inventory.post_batch(entries, user)):
+        key = keys[position]
+        if error is not None:
+            results[position] = _error(key, str(error))
+            continue
+        result = {
+            'transactions': [txn.id for txn in txns],
+            'transfer_group_id': str(txns[0].transfer_group_id) if txns[0].transfer_group_id else None,
+        }
+        results[position] = {'key': key, 'status': 'created', **result}
+        created_keys.append(IdempotencyKey(user=user, key=key, result=result))
+        audit.append(AuditLog(
+            user=user, action_type='CREATE', ip_address=ip, content_type=transaction_type, object_id=txns[0].id,
+            new_value=f"{entry['type']}: {entry['material'].name} x {entry['quantity']} on {entry['warehouse'].name} (api key {key})"
+        ))
+
+    # Унікальний індекс (user, key): паралельний пакет з тим самим ключем - IntegrityError і відкат
+    IdempotencyKey.objects.bulk_create(created_keys)
+    AuditLog.objects.bulk_create(audit)
+
+    for position, key in enumerate(keys):
+        if results[position] is None:
+            first = results[first_position[key]]
+            results[position] = {**first, 'status': 'duplicate'} if first['status'] == 'created' else first
+    return results
+
+
+def ingest(items, user, allowed_warehouses, ip=None):
+    """
+    Пакет операцій від клієнта: список dict з key (ідемпотентності, генерує клієнт), type
+    ('IN' / 'OUT' / 'LOSS' / 'TRANSFER'), material_id, warehouse_id, quantity і, за потреби,
+    target_warehouse_id, price, date, description, stage_id.
+
+    Усе - одна транзакція БД: операції проводяться inventory.post_batch (bulk insert), ключі
+    зберігаються разом з ними. Повторна відправка ключа (пакет переслано після обриву зв'язку)
+    нічого не створює і повертає збережений результат зі статусом 'duplicate'. Некоректні
+    операції та нестача залишку - статус 'error' лише для цієї операції, ключ не зберігається.
+
+    Повертає список результатів у порядку items: {'key', 'status', 'transactions',
+    'transfer_group_id'} або {'key', 'status': 'error', 'error'}.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError("Очікується непорожній список операцій")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise BatchError(f"Забагато операцій у пакеті: {len(items)} (максимум {MAX_BATCH_ITEMS})")
+
+    allowed_warehouse_ids = set(allowed_warehouses.values_list('pk', flat=True))
+    try:
+        with transaction.atomic():
+            return _ingest(items, user, allowed_warehouse_ids, ip)
+    except IntegrityError:
+        # Той самий ключ щойно закомітив паралельний запит - повтор побачить його як duplicate
+        with transaction.atomic():
+            return _ingest(items, user, allowed_warehouse_ids, ip)
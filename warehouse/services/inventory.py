@@ -1,9 +1,12 @@
 import uuid
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from django.db import transaction
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, OuterRef, Subquery
 from django.utils import timezone
-from ..models import Transaction, Material, Warehouse, ConstructionStage
+from ..models import Transaction, Material, Order, Warehouse, ConstructionStage
+from .low_stock import BALANCE_EXPR
+from .stock_events import publish_on_commit
+from . import inventory_events, order_workflow
 
 class InsufficientStockError(Exception):
     """
@@ -20,31 +23,84 @@ class InsufficientStockError(Exception):
         )
         super().__init__(self.message)
 
-def assert_stock_available(warehouse, material, requested_qty, *, allow_zero=True):
+class StockCheck:
+    """
+    Контекст перевірки залишку для пари (склад, матеріал) в межах одного запиту.
+
+    Залишок читається одним запитом, який в атомарному блоці блокує рядок матеріалу
+    (SELECT ... FOR UPDATE), тому паралельні списання цього матеріалу чекають.
+    Форма і сервіс можуть ділити один контекст: повторне читання не потрібне,
+    поки триває та сама транзакція.
+    """
+
+    def __init__(self, warehouse, material):
+        self.warehouse = warehouse
+        self.material = material
+        self.available = None
+        self._locked = False
+
+    def matches(self, warehouse, material):
+        return self.warehouse.pk == warehouse.pk and self.material.pk == material.pk
+
+    @property
+    def is_current(self):
+        """Залишок прочитано під блокуванням, і транзакція ще триває."""
+        return self.available is not None and self._locked and transaction.get_connection().in_atomic_block
+
+    def load(self):
+        """Читає залишок (IN - OUT - LOSS) одним запитом; в транзакції - з блокуванням матеріалу."""
+        balance_sq = Transaction.objects.filter(
+            warehouse=self.warehouse, material=OuterRef('pk')
+        ).order_by().values('material').annotate(b=BALANCE_EXPR).values('b')
+
+        qs = Material.objects.filter(pk=self.material.pk).annotate(balance=Subquery(balance_sq))
+
+        in_atomic = transaction.get_connection().in_atomic_block
+        if in_atomic:
+            qs = qs.select_for_update()
+
+        balance = qs.values_list('balance', flat=True).first()
+        self.available = to_decimal(balance or 0, places=3)
+        self._locked = in_atomic
+        if in_atomic:
+            transaction.on_commit(self._invalidate)
+        return self.available
+
+    def _invalidate(self):
+        self.available = None
+        self._locked = False
+
+    def ensure(self, requested_qty):
+        """Піднімає InsufficientStockError, якщо requested_qty > доступного залишку."""
+        if not self.is_current:
+            self.load()
+        if requested_qty > self.available:
+            raise InsufficientStockError(self.warehouse, self.material, requested_qty, self.available)
+
+    def consume(self, quantity):
+        """Враховує проведене списання, щоб наступні перевірки в цьому запиті не читали БД."""
+        if self.available is not None:
+            self.available -= quantity
+
+
+def assert_stock_available(warehouse, material, requested_qty, *, allow_zero=True, stock_check=None):
     """
     Перевіряє, чи достатньо товару на складі.
     Піднімає InsufficientStockError, якщо requested_qty > available_qty.
+    stock_check: вже прочитаний StockCheck (наприклад, з форми) - перевикористовується без запиту.
+    Повертає використаний StockCheck.
     """
+    if stock_check is None or not stock_check.matches(warehouse, material):
+        stock_check = StockCheck(warehouse, material)
+
     if requested_qty <= 0:
         if allow_zero:
-            return
+            return stock_check
         # Якщо логіка забороняє нульові/від'ємні списання, можна додати валідацію тут
         pass
 
-    # Розрахунок поточного залишку (IN - OUT - LOSS)
-    # Фільтруємо транзакції, що відносяться до переміщень, через їх типи
-    aggregates = Transaction.objects.filter(warehouse=warehouse, material=material).aggregate(
-        total_in=Sum('quantity', filter=Q(transaction_type='IN')),
-        total_out=Sum('quantity', filter=Q(transaction_type__in=['OUT', 'LOSS']))
-    )
-    
-    total_in = aggregates['total_in'] or Decimal("0.000")
-    total_out = aggregates['total_out'] or Decimal("0.000")
-    
-    available_qty = total_in - total_out
-    
-    if requested_qty > available_qty:
-        raise InsufficientStockError(warehouse, material, requested_qty, available_qty)
+    stock_check.ensure(requested_qty)
+    return stock_check
 
 def to_decimal(value, places=3):
     """
@@ -78,6 +134,13 @@ class InvalidPriceError(ValueError):
     pass
 
 
+def _record_stock_changes(transactions):
+    """Outbox-події (inventory_events) - у поточній транзакції БД; SSE-публікація - після коміту."""
+    inventory_events.record(transactions)
+    publish_on_commit(transactions)
+
+
+@transaction.atomic
 def create_incoming(material, warehouse, quantity, user, price=None, description="", date=None, photo=None):
     """
     Реєструє прихід матеріалу на склад (Закупівля / Введення залишків).
@@ -112,16 +175,18 @@ def create_incoming(material, warehouse, quantity, user, price=None, description
         date=date,
         photo=photo
     )
-    
     if price_dec > 0:
         material.update_material_avg_price()
-        
+
+    _record_stock_changes([txn])
     return txn
 
-def create_writeoff(material, warehouse, quantity, user, transaction_type='OUT', description="", date=None, stage=None, photo=None, reason=None):
+def create_writeoff(material, warehouse, quantity, user, transaction_type='OUT', description="", date=None, stage=None, photo=None, reason=None, stock_check=None):
     """
     Реєструє списання матеріалу (Витрата на роботи або Втрати).
     Тип транзакції: OUT або LOSS.
+    stock_check: StockCheck з форми - якщо залишок вже прочитано під блокуванням у цій
+    транзакції, повторного запиту не буде.
     """
     if date is None:
         date = timezone.now().date()
@@ -137,7 +202,7 @@ def create_writeoff(material, warehouse, quantity, user, transaction_type='OUT',
 
     # Валідація залишків (Atomic block recommended at view level, but good to have check here)
     with transaction.atomic():
-        assert_stock_available(warehouse, material, qty_dec)
+        stock_check = assert_stock_available(warehouse, material, qty_dec, stock_check=stock_check)
         
         price_dec = material.current_avg_price
         
@@ -153,6 +218,8 @@ def create_writeoff(material, warehouse, quantity, user, transaction_type='OUT',
             stage=stage,
             photo=photo
         )
+        stock_check.consume(qty_dec)
+        _record_stock_changes([txn])
     
     return txn
 
@@ -175,7 +242,7 @@ def create_transfer(user, material, source_warehouse, target_warehouse, quantity
     price_dec = material.current_avg_price
     
     # 1. Списання з джерела (OUT)
-    Transaction.objects.create(
+    out_txn = Transaction.objects.create(
         transaction_type='OUT',
         warehouse=source_warehouse,
         material=material,
@@ -188,7 +255,7 @@ def create_transfer(user, material, source_warehouse, target_warehouse, quantity
     )
     
     # 2. Прихід на призначення (IN)
-    Transaction.objects.create(
+    in_txn = Transaction.objects.create(
         transaction_type='IN',
         warehouse=target_warehouse,
         material=material,
@@ -199,9 +266,97 @@ def create_transfer(user, material, source_warehouse, target_warehouse, quantity
         description=f"Отримано з {source_warehouse.name}. {description}",
         transfer_group_id=group_id
     )
+    _record_stock_changes([out_txn, in_txn])
     
     return group_id
 
+@transaction.atomic
+def post_batch(entries, user, update_avg_prices=True):
+    """
+    Проводить пакет операцій однією транзакцією БД (пакетне API, services.ingestion).
+    entries: список dict з type ('IN' / 'OUT' / 'LOSS' / 'TRANSFER'), material, warehouse, quantity
+    (Decimal) і, за потреби, target_warehouse (TRANSFER), price (IN), date, description, stage (OUT),
+    stocktake (документ інвентаризації).
+    update_avg_prices=False - не перераховувати середню ціну (приходи за поточною середньою ціною).
+
+    Залишки всіх пар (склад, матеріал) зі списаннями читаються одним запитом під блокуванням
+    матеріалів (як StockCheck) і далі ведуться в пам'яті; транзакції вставляються одним bulk_create.
+    Операція, для якої не вистачає залишку, не проводиться, решта - проводяться.
+
+    Повертає список (transactions, error) у порядку entries; error - InsufficientStockError або None.
+    """
+    outgoing = {(e['warehouse'].pk, e['material'].pk) for e in entries if e['type'] != 'IN'}
+    available = {}
+    if outgoing:
+        material_ids = sorted({mat_id for _, mat_id in outgoing})
+        # Блокування в порядку pk - без взаємних блокувань з паралельними пакетами
+        list(Material.objects.select_for_update().filter(pk__in=material_ids).order_by('pk').values_list('pk', flat=True))
+        rows = (
+            Transaction.objects.filter(warehouse_id__in={wh_id for wh_id, _ in outgoing}, material_id__in=material_ids)
+            .order_by().values('warehouse_id', 'material_id').annotate(balance=BALANCE_EXPR)
+        )
+        available = {(row['warehouse_id'], row['material_id']): to_decimal(row['balance'] or 0) for row in rows}
+
+    today = timezone.now().date()
+    results = []
+    pending = []
+    for entry in entries:
+        material, warehouse, qty_dec = entry['material'], entry['warehouse'], entry['quantity']
+        common = {
+            'material': material, 'quantity': qty_dec, 'created_by': user,
+            'date': entry.get('date') or today, 'stocktake': entry.get('stocktake'),
+        }
+        description = entry.get('description', '')
+
+        if entry['type'] == 'IN':
+            txns = [Transaction(
+                transaction_type='IN', warehouse=warehouse, price=entry.get('price') or Decimal("0.00"),
+                description=description, **common
+            )]
+        else:
+            balance = available.get((warehouse.pk, material.pk), Decimal("0.000"))
+            if qty_dec > balance:
+                results.append(([], InsufficientStockError(warehouse, material, qty_dec, balance)))
+                continue
+            price_dec = material.current_avg_price
+            if entry['type'] == 'TRANSFER':
+                target = entry['target_warehouse']
+                group_id = uuid.uuid4()
+                txns = [
+                    Transaction(
+                        transaction_type='OUT', warehouse=warehouse, price=price_dec, transfer_group_id=group_id,
+                        description=f"Переміщення на {target.name}. {description}", **common
+                    ),
+                    Transaction(
+                        transaction_type='IN', warehouse=target, price=price_dec, transfer_group_id=group_id,
+                        description=f"Отримано з {warehouse.name}. {description}", **common
+                    ),
+                ]
+            else:
+                txns = [Transaction(
+                    transaction_type=entry['type'], warehouse=warehouse, price=price_dec,
+                    stage=entry.get('stage'), description=description, **common
+                )]
+
+        for txn in txns:
+            key = (txn.warehouse.pk, material.pk)
+            sign = 1 if txn.transaction_type == 'IN' else -1
+            available[key] = available.get(key, Decimal("0.000")) + sign * qty_dec
+        pending.extend(txns)
+        results.append((txns, None))
+
+    Transaction.objects.bulk_create(pending)
+
+    if update_avg_prices:
+        priced = {e['material'].pk: e['material'] for e in entries if e['type'] == 'IN' and (e.get('price') or 0) > 0}
+        for material in priced.values():
+            material.update_material_avg_price()
+
+    # Outbox - останнім: id подій видаються якомога ближче до коміту (менше вікно пропусків)
+    _record_stock_changes(pending)
+    return results
+
+
 @transaction.atomic
 def process_order_receipt(order, items_data, user, proof_photo=None, comment=""):
     """
@@ -214,6 +369,11 @@ def process_order_receipt(order, items_data, user, proof_photo=None, comment="")
     import logging
     logger = logging.getLogger('warehouse')
 
+    # Блокування заявки до кінця транзакції: два одночасні прийоми не проведуть товар двічі.
+    # Прийняти можна тільки погоджену / закуплену / відправлену заявку (order_workflow.TRANSITIONS)
+    order.status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+    order_workflow.check_transition(order, 'completed')
+
     transfer_group_id = None
     if order.source_warehouse:
         transfer_group_id = uuid.uuid4()
@@ -251,6 +411,7 @@ def process_order_receipt(order, items_data, user, proof_photo=None, comment="")
 
     # === ФАЗА 2: Створення транзакцій (тільки якщо всі позиції валідні) ===
     created_transactions = []
+    source_transactions = []
 
     for vi in validated_items:
         item = vi['item']
@@ -279,7 +440,7 @@ def process_order_receipt(order, items_data, user, proof_photo=None, comment="")
 
         # 2. Якщо це внутрішнє переміщення, створюємо списання (OUT) з джерела
         if order.source_warehouse and transfer_group_id:
-            Transaction.objects.create(
+            out_txn = Transaction.objects.create(
                 transaction_type='OUT',
                 warehouse=order.source_warehouse,
                 material=item.material,
@@ -291,22 +452,21 @@ def process_order_receipt(order, items_data, user, proof_photo=None, comment="")
                 transfer_group_id=transfer_group_id,
                 description=f"Переміщення по заявці #{order.id} на {order.warehouse.name}"
             )
+            source_transactions.append(out_txn)
 
         if not order.source_warehouse and price_dec > 0:
             item.material.update_material_avg_price()
 
-    # === ФАЗА 3: Оновлення статусу заявки ===
-    order.status = 'completed'
+    # === ФАЗА 3: Оновлення статусу заявки (із записом ORDER_STATUS у журнал аудиту) ===
+    order_workflow.transition(order, 'completed', user=user)
 
     if proof_photo and hasattr(order, 'proof_photo'):
         try:
             order.proof_photo = proof_photo
-            order.save()
+            order.save(update_fields=['proof_photo'])
         except (IOError, OSError) as e:
-            # Логуємо помилку збереження фото, але зберігаємо статус
+            # Логуємо помилку збереження фото, статус уже збережено
             logger.warning(f"Failed to save proof_photo for order #{order.id}: {e}")
-            order.save(update_fields=['status'])
-    else:
-        order.save(update_fields=['status'])
 
+    _record_stock_changes(created_transactions + source_transactions)
     return created_transactions
\ No newline at end of file
@@ -0,0 +1,175 @@
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from ..models import EventCheckpoint, InventoryEvent, StockLevel, Transaction
+from .low_stock import BALANCE_EXPR
+from .stock_events import DELTA_SIGN
+
+logger = logging.getLogger('warehouse')
+
+DEFAULT_BATCH_SIZE = 500
+# Пропуск у послідовності id - ще не закомічена транзакція: споживач зупиняється перед ним.
+# Якщо споживач бачить той самий пропуск довше за стільки секунд - це відкат (id втрачено
+# назавжди), його пропускаємо. Час рахується від першого виявлення (EventCheckpoint.gap_seen_at),
+# а не від created_at події: довга транзакція може тримати менші id незакоміченими довго.
+GAP_GRACE_SECONDS = 30
+
+# {name: (handler, rebuild)}: handler(events) - пакет подій у тій самій транзакції БД, що й чекпоінт;
+# rebuild(up_to_id) - повний перерахунок стану станом на подію up_to_id (необов'язково)
+CONSUMERS = {}
+
+
+def consumer(name, rebuild=None):
+    """Реєструє споживача подій: @consumer('name') над handler(events)."""
+    def decorator(handler):
+        CONSUMERS[name] = (handler, rebuild)
+        return handler
+    return decorator
+
+
+def record(transactions):
+    """
+    Пише outbox-події для створених транзакцій. Викликається сервісами inventory всередині
+    їхньої транзакції БД: подія існує тоді й тільки тоді, коли закомічено Transaction.
+    """
+    events = [
+        InventoryEvent(
+            event_type=InventoryEvent.STOCK_CHANGED,
+            transaction_id=txn.id,
+            warehouse_id=txn.warehouse_id,
+            material_id=txn.material_id,
+            delta=txn.quantity * DELTA_SIGN.get(txn.transaction_type, 0),
+        )
+        for txn in transactions
+    ]
+    return InventoryEvent.objects.bulk_create(events) if events else []
+
+
+def _checkpoint(name):
+    EventCheckpoint.objects.get_or_create(consumer=name)
+    # Блокування рядка: два процеси одного споживача не обробляють ті самі події
+    return EventCheckpoint.objects.select_for_update().get(consumer=name)
+
+
+def _ready(events, checkpoint):
+    """
+    Префікс пакета без пропусків у id. Пропуск одразу за чекпоінтом, який споживач бачить
+    довше GAP_GRACE_SECONDS, пропускається; перше виявлення пропуску запам'ятовується в чекпоінті.
+    """
+    expected = checkpoint.position + 1
+    if events and events[0].id != expected:
+        now = timezone.now()
+        if checkpoint.gap_seen_at is None:
+            checkpoint.gap_seen_at = now
+        if now - checkpoint.gap_seen_at < timezone.timedelta(seconds=GAP_GRACE_SECONDS):
+            return []
+        expected = events[0].id
+
+    ready = []
+    for event in events:
+        if event.id != expected:
+            break
+        ready.append(event)
+        expected = event.id + 1
+    return ready
+
+
+def consume(name, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """
+    Обробляє нові події споживачем name пакетами по batch_size. Кожен пакет - одна транзакція БД:
+    handler + зсув чекпоінта комітяться разом (зведення в БД оновлюються рівно один раз;
+    зовнішні ефекти, напр. кеш, мають бути ідемпотентними). Повертає кількість оброблених подій.
+    """
+    handler, _ = CONSUMERS[name]
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            checkpoint = _checkpoint(name)
+            gap_seen_at = checkpoint.gap_seen_at
+            events = _ready(
+                list(InventoryEvent.objects.filter(id__gt=checkpoint.position).order_by('id')[:batch_size]),
+                checkpoint
+            )
+            if not events:
+                if checkpoint.gap_seen_at != gap_seen_at:
+                    checkpoint.save(update_fields=['gap_seen_at', 'updated_at'])
+                break
+            handler(events)
+            checkpoint.position = events[-1].id
+            checkpoint.gap_seen_at = None
+            checkpoint.save(update_fields=['position', 'gap_seen_at', 'updated_at'])
+        processed += len(events)
+        batches += 1
+    if processed:
+        logger.info(f"inventory events: {name} processed {processed} events in {batches} batches")
+    return processed
+
+
+def pending(name):
+    """Скільки подій чекає на споживача name."""
+    position = EventCheckpoint.objects.filter(consumer=name).values_list('position', flat=True).first() or 0
+    return InventoryEvent.objects.filter(id__gt=position).count()
+
+
+@transaction.atomic
+def rebuild(name):
+    """Перераховує стан споживача повністю і ставить чекпоінт на останню подію. Повертає чекпоінт."""
+    _, rebuild_state = CONSUMERS[name]
+    if rebuild_state is None:
+        raise ValueError(f"Споживач {name} не підтримує перебудову")
+    checkpoint = _checkpoint(name)
+    checkpoint.position = InventoryEvent.objects.aggregate(last=Max('id'))['last'] or 0
+    checkpoint.gap_seen_at = None
+    rebuild_state(checkpoint.position)
+    checkpoint.save(update_fields=['position', 'gap_seen_at', 'updated_at'])
+    return checkpoint.position
+
+
+# ==============================================================================
+# СПОЖИВАЧІ
+# ==============================================================================
+
+def _rebuild_stock_levels(up_to_id):
+    # Транзакції з подіями після up_to_id (закомічені між запитами) дорахує consume
+    later = InventoryEvent.objects.filter(id__gt=up_to_id, transaction__isnull=False).values('transaction_id')
+    rows = (
+        Transaction.objects.exclude(id__in=later).order_by()
+        .values('warehouse_id', 'material_id').annotate(qty=BALANCE_EXPR)
+    )
+    StockLevel.objects.all().delete()
+    StockLevel.objects.bulk_create([
+        StockLevel(warehouse_id=row['warehouse_id'], material_id=row['material_id'], quantity=row['qty'] or Decimal('0'))
+        for row in rows
+    ], batch_size=DEFAULT_BATCH_SIZE)
+
+
+@consumer('stock_levels', rebuild=_rebuild_stock_levels)
+def apply_stock_levels(events):
+    """Зведення StockLevel: дельти пакета сумуються по (склад, матеріал) - 1 SELECT + bulk UPDATE/INSERT."""
+    deltas = {}
+    for event in events:
+        key = (event.warehouse_id, event.material_id)
+        deltas[key] = deltas.get(key, Decimal('0')) + event.delta
+
+    existing = {
+        (level.warehouse_id, level.material_id): level
+        for level in StockLevel.objects.filter(
+            warehouse_id__in={wh_id for wh_id, _ in deltas},
+            material_id__in={mat_id for _, mat_id in deltas},
+        )
+    }
+    now = timezone.now()
+    changed, created = [], []
+    for (wh_id, mat_id), delta in deltas.items():
+        level = existing.get((wh_id, mat_id))
+        if level is None:
+            created.append(StockLevel(warehouse_id=wh_id, material_id=mat_id, quantity=delta))
+        else:
+            level.quantity += delta
+            level.updated_at = now
+            changed.append(level)
+    StockLevel.objects.bulk_update(changed, ['quantity', 'updated_at'], batch_size=DEFAULT_BATCH_SIZE)
+    StockLevel.objects.bulk_create(created, batch_size=DEFAULT_BATCH_SIZE)
@@ -0,0 +1,54 @@
+from decimal import Decimal
+from django.db.models import Sum, Case, When, F, Value, DecimalField, FloatField, ExpressionWrapper
+from django.db.models.functions import Cast
+from ..models import Transaction
+
+# Залишок рахуємо як SUM(IN) - SUM(OUT + LOSS) в одному агрегаті
+BALANCE_EXPR = Sum(
+    Case(
+        When(transaction_type='IN', then=F('quantity')),
+        When(transaction_type__in=['OUT', 'LOSS'], then=-F('quantity')),
+        default=Value(Decimal("0.000")),
+        output_field=DecimalField(max_digits=14, decimal_places=3)
+    )
+)
+
+
+def low_stock_qs(warehouses):
+    """
+    Повертає QuerySet (values) позицій з критичним залишком: balance <= min_limit.
+    Розрахунок повністю в SQL: один GROUP BY (warehouse, material) + HAVING,
+    без обходу балансів кожного складу в Python.
+
+    Кожен рядок:
+    {warehouse_id, warehouse__name, material_id, material__name, material__unit,
+     min_limit, balance, shortage, fill_ratio}
+
+    Ранжування: спочатку найменше покриття ліміту (fill_ratio), потім найбільший дефіцит.
+    QuerySet лінивий, тому його можна передати в Paginator (COUNT + LIMIT/OFFSET).
+    """
+    qs = Transaction.objects.filter(
+        warehouse__in=warehouses,
+        material__min_limit__gt=0
+    ).values(
+        'warehouse_id', 'warehouse__name',
+        'material_id', 'material__name', 'material__unit'
+    ).annotate(
+        min_limit=F('material__min_limit'),
+        balance=BALANCE_EXPR,
+    ).filter(
+        balance__lte=F('min_limit')
+    ).annotate(
+        shortage=ExpressionWrapper(
+            F('min_limit') - F('balance'),
+            output_field=DecimalField(max_digits=14, decimal_places=3)
+        ),
+        # Cast у float: на SQLite ділення цілих decimal-значень інакше дає 0
+        fill_ratio=ExpressionWrapper(
+            Cast('balance', FloatField()) / Cast('min_limit', FloatField()),
+            output_field=FloatField()
+        ),
+    ).order_by('fill_ratio', '-shortage', 'material__name')
+
+    return qs
+
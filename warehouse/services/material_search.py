@@ -0,0 +1,287 @@
+import re
+import time
+import threading
+from bisect import bisect_left
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+from ..models import Material
+
+DEFAULT_LIMIT = 50
+
+# Мінімальна довжина запиту, з якої на PostgreSQL працює trigram-індекс (LIKE '%...%')
+TRIGRAM_MIN_LENGTH = 3
+# Префікс слова всередині назви (LIKE '% xy%') на PostgreSQL обслуговує той самий GIN trigram-індекс:
+# pg_trgm бере з початку слова доповнені триграми ("  x", " xy"). Триграм одного символу є майже
+# в кожному рядку - планувальник обирає seq scan, тому запит з одного символу шукає лише префікс
+# назви (btree varchar_pattern_ops), без префіксів слів
+WORD_PREFIX_MIN_LENGTH = 2
+# Поріг схожості для нечіткого пошуку (pg_trgm similarity)
+FUZZY_THRESHOLD = 0.3
+# Скільки секунд локальний індекс (SQLite) живе без перебудови, навіть без сигналів
+LOCAL_INDEX_TTL = 300
+
+# Транслітерація (КМУ 2010, без позиційних правил) - щоб "цем" і "tsem" знаходили одне й те саме
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie',
+    'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l',
+    'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 'ю': 'iu',
+    'я': 'ia', 'ы': 'y', 'э': 'e', 'ё': 'e', 'ъ': '', "'": '', '’': '', 'ʼ': '',
+})
+NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Нормалізує текст для пошуку: нижній регістр, латиниця, тільки [a-z0-9] через пробіл."""
+    if not text:
+        return ''
+    text = str(text).lower().translate(TRANSLIT)
+    return NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def build_search_name(name, article=None):
+    """Значення колонки Material.search_name: нормалізовані назва та артикул."""
+    return ' '.join(part for part in (normalize(name), normalize(article)) if part)[:255]
+
+
+# ==============================================================================
+# POSTGRESQL: пошук в БД (btree varchar_pattern_ops для префікса, GIN trigram для підрядка)
+# ==============================================================================
+
+def _rank_expression(raw_query, nq):
+    """0 - точний артикул, 1 - префікс артикула, 2 - префікс назви, 3 - префікс слова, 4 - інше."""
+    return Case(
+        When(article__iexact=raw_query, then=Value(0)),
+        When(article__istartswith=raw_query, then=Value(1)),
+        When(search_name__startswith=nq, then=Value(2)),
+        When(search_name__contains=f' {nq}', then=Value(3)),
+        default=Value(4),
+        output_field=IntegerField()
+    )
+
+
+def _exact_qs(raw_query, nq):
+    if len(nq) >= TRIGRAM_MIN_LENGTH:
+        condition = Q(search_name__contains=nq)
+    elif len(nq) >= WORD_PREFIX_MIN_LENGTH:
+        # Короткий запит: підрядок не шукаємо, беремо префікс назви або слова
+        condition = Q(search_name__startswith=nq) | Q(search_name__contains=f' {nq}')
+    else:
+        condition = Q(search_name__startswith=nq)
+
+    return (
+        Material.objects.filter(condition)
+        .annotate(rank=_rank_expression(raw_query, nq))
+        .order_by('rank', 'name')
+        .values('id', 'name', 'unit', 'article')
+    )
+
+
+def _fuzzy_qs(nq, found_ids):
+    # Нечіткий пошук (одруківки) - тільки якщо точних збігів не вистачило
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models import F
+
+    return (
+        Material.objects.filter(TrigramSimilar(F('search_name'), nq))
+        .exclude(id__in=found_ids)
+        .annotate(similarity=TrigramSimilarity('search_name', nq))
+        .filter(similarity__gte=FUZZY_THRESHOLD)
+        .order_by('-similarity', 'name')
+        .values('id', 'name', 'unit', 'article')
+    )
+
+
+def _search_db(raw_query, nq, limit):
+    rows = list(_exact_qs(raw_query, nq)[:limit])
+    if len(rows) < limit and len(nq) >= TRIGRAM_MIN_LENGTH:
+        rows += list(_fuzzy_qs(nq, [row['id'] for row in rows])[:limit - len(rows)])
+    return rows
+
+
+async def _asearch_db(raw_query, nq, limit):
+    rows = [row async for row in _exact_qs(raw_query, nq)[:limit]]
+    if len(rows) < limit and len(nq) >= TRIGRAM_MIN_LENGTH:
+        rows += [row async for row in _fuzzy_qs(nq, [row['id'] for row in rows])[:limit - len(rows)]]
+    return rows
+
+
+# ==============================================================================
+# SQLITE / ІНШІ БД: відсортований індекс префіксів у пам'яті процесу
+# ==============================================================================
+
+class LocalSearchIndex:
+    """
+    Індекс у пам'яті процесу (SQLite fallback), будується одним запитом.
+
+    Матеріали нумеруються в порядку назви (position). Для кожного рівня рангу є відсортований
+    список ключів і паралельний numpy-масив позицій: префікс - це зріз [lo:hi] (bisect),
+    а топ-N за назвою - np.unique по зрізу, без сортування кандидатів у Python.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))  # за назвою
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.search_names = []
+        self.articles = {}
+
+        article_pairs, name_pairs, token_pairs = [], [], []
+        for position, (mat_id, name, article, search_name) in enumerate(rows):
+            search_name = search_name or build_search_name(name, article)
+            self.search_names.append(search_name)
+            name_pairs.append((search_name, position))
+            token_pairs.extend((token, position) for token in set(search_name.split()))
+            if article:
+                article_lower = article.lower()
+                self.articles.setdefault(article_lower, []).append(position)
+                article_pairs.append((article_lower, position))
+
+        self.article_keys, self.article_pos = self._split(article_pairs)
+        self.name_keys, self.name_pos = self._split(name_pairs)
+        self.token_keys, self.token_pos = self._split(token_pairs)
+
+        # Усі search_name одним рядком (у порядку назви) для пошуку підрядка
+        self.blob = '\n'.join(self.search_names)
+        lengths = np.array([len(sn) + 1 for sn in self.search_names], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(lengths) else lengths
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _split(pairs):
+        pairs.sort()
+        return [key for key, _ in pairs], np.array([pos for _, pos in pairs], dtype=np.int64)
+
+    @classmethod
+    def build(cls):
+        return cls(list(Material.objects.values_list('id', 'name', 'article', 'search_name').iterator(chunk_size=5000)))
+
+    @staticmethod
+    def _prefix_positions(keys, positions, prefix, limit):
+        """Найменші (за назвою) унікальні позиції для ключів з префіксом prefix, не більше ~limit."""
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + '\uffff', lo)
+        matched = positions[lo:hi]
+        # Запас x4 покриває дублікати (кілька слів одного матеріалу з тим самим префіксом)
+        kth = limit * 4
+        if len(matched) > kth:
+            matched = np.partition(matched, kth - 1)[:kth]
+        return np.unique(matched)
+
+    def _substring_positions(self, nq):
+        """Позиції (у порядку назви), де search_name містить nq. str.find по одному буферу - швидше за цикл."""
+        start = self.blob.find(nq)
+        while start != -1:
+            position = int(np.searchsorted(self.offsets, start, side='right')) - 1
+            yield position
+            next_line = self.offsets[position + 1] if position + 1 < len(self.offsets) else len(self.blob)
+            start = self.blob.find(nq, next_line)
+
+    def search(self, raw_query, nq, limit):
+        """Повертає id матеріалів у порядку рангу (див. _rank_expression)."""
+        query_lower = raw_query.lower()
+        single_word = ' ' not in nq
+
+        result, seen = [], set()
+
+        def take(positions):
+            for position in positions:
+                if len(result) >= limit:
+                    return
+                position = int(position)
+                if position not in seen:
+                    seen.add(position)
+                    result.append(position)
+
+        # 0. Точний артикул, 1. префікс артикула, 2. префікс назви
+        take(sorted(self.articles.get(query_lower, ())))
+        take(self._prefix_positions(self.article_keys, self.article_pos, query_lower, limit))
+        take(self._prefix_positions(self.name_keys, self.name_pos, nq, limit))
+
+        # 3. Префікс слова (для запиту з кількох слів - перевіряємо фразу повністю); як на PostgreSQL - від 2 символів
+        if len(result) < limit and len(nq) >= WORD_PREFIX_MIN_LENGTH:
+            first_token = nq.split()[0]
+            positions = self._prefix_positions(
+                self.token_keys, self.token_pos, first_token, limit if single_word else len(self.token_keys)
+            )
+            if not single_word:
+                positions = [p for p in positions if f' {nq}' in f' {self.search_names[p]}']
+            take(positions)
+
+        # 4. Підрядок (середина слова) - лінійний прохід, тільки якщо префіксних збігів не вистачило
+        if len(result) < limit and len(nq) >= TRIGRAM_MIN_LENGTH:
+            take(self._substring_positions(nq))
+
+        return self.ids[result].tolist() if result else []
+
+
+_local_index = None
+_local_lock = threading.Lock()
+
+
+def get_local_index():
+    global _local_index
+    with _local_lock:
+        if _local_index is None or time.monotonic() - _local_index.built_at > LOCAL_INDEX_TTL:
+            _local_index = LocalSearchIndex.build()
+        return _local_index
+
+
+def invalidate_local_index(**kwargs):
+    """Скидає локальний індекс (викликається сигналами post_save/post_delete Material)."""
+    global _local_index
+    with _local_lock:
+        _local_index = None
+
+
+def _rows_in_order(ids, materials):
+    return [
+        {'id': m.id, 'name': m.name, 'unit': m.unit, 'article': m.article}
+        for m in (materials.get(mat_id) for mat_id in ids) if m is not None
+    ]
+
+
+def _search_local(raw_query, nq, limit):
+    ids = get_local_index().search(raw_query, nq, limit)
+    return _rows_in_order(ids, Material.objects.in_bulk(ids))
+
+
+async def _asearch_local(raw_query, nq, limit):
+    # Побудова індексу - синхронний запит до БД, сам пошук - у пам'яті, без блокування циклу подій
+    index = await sync_to_async(get_local_index)()
+    ids = index.search(raw_query, nq, limit)
+    return _rows_in_order(ids, await Material.objects.ain_bulk(ids))
+
+
+# ==============================================================================
+# ПУБЛІЧНИЙ API
+# ==============================================================================
+
+def search_materials(query, limit=DEFAULT_LIMIT):
+    """
+    Пошук матеріалів для autocomplete. Повертає список {id, name, unit, article}.
+    Ранжування: точний артикул, префікс артикула, префікс назви, префікс слова, підрядок, нечіткий (PostgreSQL).
+    Порожній запит - перші `limit` матеріалів за назвою.
+    """
+    raw_query = (query or '').strip()
+    nq = normalize(raw_query)
+    if not nq:
+        return list(Material.objects.order_by('name').values('id', 'name', 'unit', 'article')[:limit])
+
+    if connection.vendor == 'postgresql':
+        return _search_db(raw_query, nq, limit)
+    return _search_local(raw_query, nq, limit)
+
+
+async def asearch_materials(query, limit=DEFAULT_LIMIT):
+    """Async-версія search_materials (async ORM) для ASGI endpoints. Результат ідентичний."""
+    raw_query = (query or '').strip()
+    nq = normalize(raw_query)
+    if not nq:
+        return [row async for row in Material.objects.order_by('name').values('id', 'name', 'unit', 'article')[:limit]]
+
+    if connection.vendor == 'postgresql':
+        return await _asearch_db(raw_query, nq, limit)
+    return await _asearch_local(raw_query, nq, limit)
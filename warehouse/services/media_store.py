@@ -0,0 +1,117 @@
+import logging
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from ..storage import BLOB_ROOT, is_blob
+from .images import IMAGE_FIELDS, THUMBNAIL_SIZES, thumbnail_name
+
+logger = logging.getLogger('warehouse')
+
+# Blob, записаний або повторно взятий (ContentAddressedStorage.claim) за останні N секунд, не видаляється:
+# посилання на нього може бути ще не закомічене. Такий blob пізніше прибере collect_garbage.
+RELEASE_GRACE_SECONDS = 600
+
+
+def _image_fields():
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field_name in fields:
+            yield model, field_name
+
+
+def reference_count(name):
+    """Скільки записів (у всіх полях з фото) посилаються на файл."""
+    if not name:
+        return 0
+    return sum(model.objects.filter(**{field_name: name}).count() for model, field_name in _image_fields())
+
+
+def _delete_with_thumbnails(name, storage=default_storage):
+    if is_blob(name) and hasattr(storage, 'delete_unclaimed'):
+        if not storage.delete_unclaimed(name, RELEASE_GRACE_SECONDS):
+            return False
+    else:
+        storage.delete(name)
+    for size in THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(name, size))
+    return True
+
+
+def release(name, storage=default_storage):
+    """
+    Видаляє файл (і його мініатюри), якщо на нього більше ніхто не посилається. True - видалено.
+    Blob, який щойно записав або взяв паралельний save того самого вмісту, залишається.
+    """
+    if not name or reference_count(name):
+        return False
+    return _delete_with_thumbnails(name, storage)
+
+
+def release_instance_files(instance):
+    """Після видалення запису: звільнити його фото після коміту (при відкаті файли лишаються)."""
+    names = [
+        getattr(instance, field_name).name
+        for field_name in IMAGE_FIELDS.get(instance._meta.label_lower, {})
+        if getattr(instance, field_name)
+    ]
+    if names:
+        transaction.on_commit(lambda: [release(name) for name in names])
+
+
+def dedupe_existing(storage=default_storage):
+    """
+    Переносить старі файли (збережені до адресації за вмістом) у blobs: однаковий вміст -
+    один blob, посилання оновлюються через update(), старі файли видаляються.
+    """
+    stats = {'files': 0, 'rows': 0, 'missing': 0, 'bytes': 0}
+    for model, field_name in _image_fields():
+        legacy = (
+            model.objects.exclude(**{f'{field_name}__startswith': f'{BLOB_ROOT}/'})
+            .exclude(Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True}))
+            .values_list(field_name, flat=True).distinct()
+        )
+        for old_name in list(legacy):
+            try:
+                size = storage.size(old_name)
+                with storage.open(old_name, 'rb') as f:
+                    blob = storage.save(old_name, f)
+            except OSError:
+                stats['missing'] += 1
+                continue
+            rows = 0
+            for ref_model, ref_field in _image_fields():
+                rows += ref_model.objects.filter(**{ref_field: old_name}).update(**{ref_field: blob})
+            _delete_with_thumbnails(old_name, storage)
+            stats['files'] += 1
+            stats['rows'] += rows
+            stats['bytes'] += size
+    return stats
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield f'{directory}/{file_name}'
+    for sub in directories:
+        yield from _walk(storage, f'{directory}/{sub}')
+
+
+def collect_garbage(storage=default_storage):
+    """
+    Видаляє blobs, на які не посилається жоден запис (після видалення/заміни фото), крім записаних
+    або взятих за останні RELEASE_GRACE_SECONDS. Повертає кількість.
+    """
+    if not storage.exists(BLOB_ROOT):
+        return 0
+    referenced = set()
+    for model, field_name in _image_fields():
+        referenced.update(
+            model.objects.filter(**{f'{field_name}__startswith': f'{BLOB_ROOT}/'}).values_list(field_name, flat=True)
+        )
+    removed = 0
+    for name in list(_walk(storage, BLOB_ROOT)):
+        if is_blob(name) and name not in referenced and _delete_with_thumbnails(name, storage):
+            removed += 1
+    logger.info(f"media gc: removed {removed} unreferenced blobs")
+    return removed
@@ -0,0 +1,85 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from ..models import Order, AuditLog
+
+# Дозволені переходи статусів заявки (ключі - Order.STATUS_CHOICES)
+TRANSITIONS = {
+    'draft': ('new', 'rejected'),
+    'new': ('rfq', 'approved', 'rejected'),
+    'rfq': ('approved', 'rejected'),
+    'approved': ('purchasing', 'transit', 'completed', 'rejected'),
+    'purchasing': ('transit', 'completed', 'rejected'),
+    'transit': ('completed',),
+    'completed': (),
+    'rejected': (),
+}
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+class TransitionError(ValueError):
+    """Помилка: перехід статусу заявки не дозволений."""
+
+    def __init__(self, order_id, from_status, to_status):
+        self.order_id = order_id
+        self.from_status = from_status
+        self.to_status = to_status
+        super().__init__(
+            f"Заявку #{order_id} не можна перевести зі статусу "
+            f"«{STATUS_LABELS.get(from_status, from_status)}» у «{STATUS_LABELS.get(to_status, to_status)}»"
+        )
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def check_transition(order, to_status):
+    if to_status not in TRANSITIONS:
+        raise ValueError(f"Невідомий статус заявки: {to_status}")
+    if not can_transition(order.status, to_status):
+        raise TransitionError(order.id, order.status, to_status)
+
+
+@transaction.atomic
+def bulk_transition(orders, to_status, user=None, ip=None):
+    """
+    Переводить заявки (queryset Order) у to_status: один SELECT ... FOR UPDATE, один UPDATE
+    і один bulk INSERT у журнал аудиту, незалежно від кількості заявок.
+    Заявки, для яких перехід не дозволений, пропускаються.
+
+    Повертає (moved_ids, skipped), де skipped - {order_id: поточний статус}.
+    """
+    if to_status not in TRANSITIONS:
+        raise ValueError(f"Невідомий статус заявки: {to_status}")
+
+    current = dict(orders.select_for_update().order_by('pk').values_list('pk', 'status'))
+    moved_ids = [pk for pk, status in current.items() if can_transition(status, to_status)]
+    skipped = {pk: status for pk, status in current.items() if not can_transition(status, to_status)}
+    if not moved_ids:
+        return [], skipped
+
+    Order.objects.filter(pk__in=moved_ids).update(status=to_status, updated_at=timezone.now())
+
+    order_type = ContentType.objects.get_for_model(Order)
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user=user if user is not None and user.is_authenticated else None,
+            action_type='ORDER_STATUS', content_type=order_type, object_id=pk,
+            old_value=current[pk], new_value=to_status, ip_address=ip
+        )
+        for pk in moved_ids
+    ])
+    return moved_ids, skipped
+
+
+def transition(order, to_status, user=None, ip=None):
+    """Переводить одну заявку (через bulk_transition); TransitionError - якщо перехід не дозволений."""
+    check_transition(order, to_status)
+    moved_ids, skipped = bulk_transition(Order.objects.filter(pk=order.pk), to_status, user=user, ip=ip)
+    if not moved_ids:
+        # Статус змінили паралельно між завантаженням заявки і UPDATE
+        raise TransitionError(order.id, skipped.get(order.pk, order.status), to_status)
+    order.status = to_status
+    return order
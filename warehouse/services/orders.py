@@ -0,0 +1,149 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Prefetch, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Order, OrderItem, Supplier
+from . import order_workflow
+from .supplier_prices import SupplierPriceIndex
+
+ORIGINAL_GROUP = 'original'
+
+# Перевірка дублікатів: активні заявки на той самий склад за останні N днів
+DUPLICATE_WINDOW_DAYS = 3
+DUPLICATE_ITEMS_PREVIEW = 3
+INACTIVE_ORDER_STATUSES = ['completed', 'rejected', 'draft']
+
+# Журнал заявок: розмір сторінки і розмір пачки при потоковому експорті
+ORDER_LIST_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _supplier_id_from_group(group_key):
+    """'sup_<id>' -> id, для інших міток None."""
+    if not group_key.startswith('sup_'):
+        return None
+    try:
+        return int(group_key.split('_', 1)[1])
+    except ValueError:
+        return None
+
+
+@transaction.atomic
+def split_order(order, assignments, user=None, ip=None):
+    """
+    Розділяє заявку на нові за групами.
+    assignments: dict {item_id: group_key}, де group_key - 'original', 'sup_<id>' або довільна мітка.
+
+    Для груп постачальника позиціям проставляється постачальник і його ціна з SupplierPriceIndex.
+    Кількість запитів фіксована: постачальники + ціни + bulk_create заявок + bulk_update позицій.
+
+    Якщо перенесено всі позиції, заявка закривається через order_workflow (перехід у 'rejected'
+    з записом в аудит); order_workflow.TransitionError - якщо зі свого статусу вона закритися не може.
+
+    Повертає (new_orders, moved_count).
+    """
+    items = list(order.items.all())
+    moving = [item for item in items if assignments.get(item.id, ORIGINAL_GROUP) != ORIGINAL_GROUP]
+    if not moving:
+        return [], 0
+    closes_order = len(moving) == len(items)
+    if closes_order:
+        order_workflow.check_transition(order, 'rejected')
+
+    group_keys = list(dict.fromkeys(assignments[item.id] for item in moving))
+    requested_ids = {_supplier_id_from_group(key) for key in group_keys} - {None}
+    valid_supplier_ids = set(Supplier.objects.filter(id__in=requested_ids).values_list('id', flat=True))
+    price_index = SupplierPriceIndex.for_materials({item.material_id for item in moving})
+
+    new_orders = [
+        Order(
+            warehouse_id=order.warehouse_id,
+            created_by_id=order.created_by_id,
+            status='new',
+            priority=order.priority,
+            expected_date=order.expected_date,
+            note=f"Розділено із заявки #{order.id}"
+        )
+        for _ in group_keys
+    ]
+    Order.objects.bulk_create(new_orders)
+    orders_by_group = dict(zip(group_keys, new_orders))
+
+    for item in moving:
+        group_key = assignments[item.id]
+        item.order = orders_by_group[group_key]
+        supplier_id = _supplier_id_from_group(group_key)
+        if supplier_id in valid_supplier_ids:
+            item.supplier_id = supplier_id
+            price = price_index.price(item.material_id, supplier_id)
+            if price is not None:
+                item.supplier_price = price
+
+    OrderItem.objects.bulk_update(moving, ['order', 'supplier', 'supplier_price'], batch_size=500)
+
+    order.note = f"{order.note} | Частково розділена."
+    if closes_order:
+        order.note += " (Всі товари перенесено)"
+    order.save(update_fields=['note', 'updated_at'])
+    if closes_order:
+        order_workflow.transition(order, 'rejected', user=user, ip=ip)
+
+    return new_orders, len(moving)
+
+
+def duplicate_candidates(warehouse_id, material_ids=None, days=DUPLICATE_WINDOW_DAYS):
+    """
+    Активні заявки на склад за останні days днів (індекс warehouse, created_at), від найновіших.
+    Якщо передано material_ids - тільки заявки, де є хоча б один з цих матеріалів;
+    кількість збігів (shared_materials) рахується тим самим запитом.
+    """
+    since = timezone.now() - timezone.timedelta(days=days)
+    qs = (
+        Order.objects.filter(warehouse_id=warehouse_id, created_at__gte=since)
+        .exclude(status__in=INACTIVE_ORDER_STATUSES)
+        .order_by('-created_at')
+    )
+    if material_ids:
+        qs = qs.annotate(
+            shared_materials=Count('items__material', filter=Q(items__material_id__in=material_ids), distinct=True)
+        ).filter(shared_materials__gt=0)
+    return qs
+
+
+def find_duplicate_orders(warehouse_id, material_ids=None, days=DUPLICATE_WINDOW_DAYS):
+    """
+    Схожі заявки для попередження при створенні: два запити (заявки + позиції з матеріалами через prefetch)
+    незалежно від кількості заявок і позицій. Повертає список dict для JSON.
+    """
+    items = OrderItem.objects.select_related('material').only('order_id', 'material__name').order_by('id')
+    orders = duplicate_candidates(warehouse_id, material_ids, days).only('id', 'created_at').prefetch_related(
+        Prefetch('items', queryset=items)
+    )
+    data = []
+    for order in orders:
+        row = {
+            'id': order.id,
+            'date': order.created_at.strftime("%d.%m %H:%M"),
+            'items': ", ".join(item.material.name for item in order.items.all()[:DUPLICATE_ITEMS_PREVIEW]),
+        }
+        if material_ids:
+            row['shared_materials'] = order.shared_materials
+        data.append(row)
+    return data
+
+
+def with_totals(orders):
+    """
+    Додає до queryset заявок кількість позицій (items_total) і орієнтовну суму
+    (estimated_total = SUM(кількість * середня ціна матеріалу)) - в тому ж SQL-запиті,
+    без order.items.count() і підсумовування в Python.
+    """
+    money = DecimalField(max_digits=28, decimal_places=5)
+    return orders.annotate(
+        items_total=Count('items'),
+        estimated_total=Coalesce(
+            Sum(F('items__quantity') * F('items__material__current_avg_price'), output_field=money),
+            Value(Decimal('0')), output_field=money
+        ),
+    )
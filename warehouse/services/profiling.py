@@ -0,0 +1,145 @@
+import io
+import json
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+# Увімкнення профілювання запиту (тільки staff, тільки коли settings.PROFILING_ENABLED)
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+
+# Скільки функцій показувати у зведенні (за cumulative і за tottime)
+TOP_FUNCTIONS = 40
+# Не більше стільки SQL у журналі одного запиту (решта лише рахується)
+SQL_LOG_LIMIT = 2000
+SQL_PARAMS_MAX_LENGTH = 500
+
+CAPTURE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+DOWNLOAD_KINDS = {
+    'prof': ('application/octet-stream', 'prof'),
+    'sql': ('text/plain; charset=utf-8', 'sql'),
+    'json': ('application/json', 'json'),
+}
+
+
+def wants_profile(request):
+    return request.GET.get(PROFILE_PARAM) == '1' or request.headers.get(PROFILE_HEADER) == '1'
+
+
+class SqlLog:
+    """connection.execute_wrapper: журнал SQL запиту (текст, параметри, час)."""
+
+    def __init__(self):
+        self.entries = []
+        self.count = 0
+        self.total_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total_ms += elapsed
+            if len(self.entries) < SQL_LOG_LIMIT:
+                self.entries.append({
+                    'sql': sql,
+                    'params': repr(params)[:SQL_PARAMS_MAX_LENGTH],
+                    'many': many,
+                    'ms': round(elapsed, 3),
+                })
+
+
+def captures_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def capture_path(capture_id, extension):
+    if not CAPTURE_ID_RE.match(capture_id or ''):
+        raise FileNotFoundError(capture_id)
+    return captures_dir() / f'{capture_id}.{extension}'
+
+
+def _stats_text(profiler, sort_key):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def save_capture(profiler, sql_log, meta):
+    """
+    Зберігає профіль: <id>.prof (pstats, відкривається snakeviz / python -m pstats)
+    і <id>.json (метадані, зведення функцій, журнал SQL). Старші за PROFILING_KEEP - видаляються.
+    """
+    capture_id = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    directory = captures_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    profiler.dump_stats(str(capture_path(capture_id, 'prof')))
+    data = {
+        'id': capture_id,
+        'created_at': timezone.now().isoformat(timespec='seconds'),
+        **meta,
+        'sql_count': sql_log.count,
+        'sql_ms': round(sql_log.total_ms, 1),
+        'sql_truncated': sql_log.count > len(sql_log.entries),
+        'top_cumulative': _stats_text(profiler, 'cumulative'),
+        'top_tottime': _stats_text(profiler, 'tottime'),
+        'sql': sql_log.entries,
+    }
+    with open(capture_path(capture_id, 'json'), 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+
+    prune(settings.PROFILING_KEEP)
+    return capture_id
+
+
+def _capture_ids():
+    """Id збережених профілів, від найновіших (id починається з часу)."""
+    directory = captures_dir()
+    if not directory.is_dir():
+        return []
+    return sorted((p.stem for p in directory.glob('*.json') if CAPTURE_ID_RE.match(p.stem)), reverse=True)
+
+
+def prune(keep):
+    for capture_id in _capture_ids()[keep:]:
+        for extension in ('json', 'prof'):
+            capture_path(capture_id, extension).unlink(missing_ok=True)
+
+
+def load_capture(capture_id):
+    """Повний профіль (з журналом SQL). FileNotFoundError - немає такого або некоректний id."""
+    with open(capture_path(capture_id, 'json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_captures(limit=None):
+    """Останні профілі - тільки метадані (без зведень і SQL)."""
+    captures = []
+    for capture_id in _capture_ids()[:limit]:
+        try:
+            data = load_capture(capture_id)
+        except (OSError, ValueError):
+            continue
+        for key in ('sql', 'top_cumulative', 'top_tottime'):
+            data.pop(key, None)
+        captures.append(data)
+    return captures
+
+
+def render_sql_log(capture):
+    """Журнал SQL як .sql файл: час і параметри - коментарями перед запитом."""
+    lines = [f"-- {capture['method']} {capture['path']}: {capture['sql_count']} запитів, {capture['sql_ms']} мс"]
+    if capture.get('sql_truncated'):
+        lines.append(f"-- показано перші {len(capture['sql'])}")
+    for number, entry in enumerate(capture['sql'], start=1):
+        lines.append('')
+        lines.append(f"-- #{number}: {entry['ms']} мс; params: {entry['params']}")
+        lines.append(entry['sql'].rstrip(';') + ';')
+    return '\n'.join(lines) + '\n'
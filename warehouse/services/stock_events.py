@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from ..models import Transaction
+
+# Знак зміни залишку за типом транзакції (як у BALANCE_EXPR)
+DELTA_SIGN = {'IN': 1, 'OUT': -1, 'LOSS': -1}
+
+# Якщо подій немає стільки секунд, listen() віддає порожній пакет (для keep-alive у SSE)
+IDLE_TIMEOUT = 15
+# Ознака "пропущено події - клієнт має перечитати залишки повністю"
+RESYNC = object()
+
+
+class Batch(list):
+    """Пакет подій брокера + позиція потоку (SSE id / Last-Event-ID для відтворення)."""
+
+    def __init__(self, events, position):
+        super().__init__(events)
+        self.position = position
+
+
+def format_position(cursor, gaps=()):
+    """Позиція потоку: "cursor" або "cursor:id,id" - id нижче курсора, ще не закомічені."""
+    return f"{cursor}:{','.join(map(str, sorted(gaps)))}" if gaps else str(cursor)
+
+
+def parse_position(value):
+    """Last-Event-ID -> (cursor, [id відкритих пропусків]) або None, якщо некоректний."""
+    cursor, _, gaps = str(value or '').partition(':')
+    try:
+        return int(cursor), [int(gap) for gap in gaps.split(',') if gap]
+    except ValueError:
+        return None
+
+
+def make_event(event_id, warehouse_id, material_id, transaction_type, quantity):
+    return {
+        'id': event_id,
+        'warehouse_id': warehouse_id,
+        'material_id': material_id,
+        'delta': quantity * DELTA_SIGN.get(transaction_type, 0),
+    }
+
+
+def publish_on_commit(transactions):
+    """
+    Публікує зміни залишків від створених транзакцій після коміту
+    (відкат - нічого не публікується). Викликається сервісами inventory.
+    """
+    events = [
+        make_event(txn.id, txn.warehouse_id, txn.material_id, txn.transaction_type, txn.quantity)
+        for txn in transactions
+    ]
+    if events:
+        transaction.on_commit(lambda: get_broker().publish(events))
+
+
+# ==============================================================================
+# LOCAL: pub-sub у пам'яті процесу
+# ==============================================================================
+
+class _Subscription:
+    QUEUE_SIZE = 1000
+
+    def __init__(self, warehouse_id):
+        self.warehouse_id = warehouse_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self.overflow = False
+
+    def push(self, events):
+        # publish() викликається з sync-коду (інший потік), тому через цикл подій підписника
+        self.loop.call_soon_threadsafe(self._put, events)
+
+    def _put(self, events):
+        try:
+            self.queue.put_nowait(events)
+        except asyncio.QueueFull:
+            self.overflow = True
+
+
+class LocalBroker:
+    """
+    Pub-sub у пам'яті процесу: publish() роздає події підписникам складу.
+    Працює, лише коли запис і SSE-потік в одному процесі (runserver, тести, один ASGI-процес).
+    Після перепідключення (Last-Event-ID) пропущені події не відтворює - віддає RESYNC.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # {warehouse_id: set(_Subscription)}
+
+    def publish(self, events):
+        by_warehouse = {}
+        for event in events:
+            by_warehouse.setdefault(event['warehouse_id'], []).append(event)
+
+        with self._lock:
+            targets = [
+                (subscription, wh_events)
+                for wh_id, wh_events in by_warehouse.items()
+                for subscription in self._subscriptions.get(wh_id, ())
+            ]
+        for subscription, wh_events in targets:
+            subscription.push(wh_events)
+
+    async def listen(self, warehouse_id, last_event_id=None, idle_timeout=IDLE_TIMEOUT):
+        subscription = _Subscription(warehouse_id)
+        with self._lock:
+            self._subscriptions.setdefault(warehouse_id, set()).add(subscription)
+        try:
+            if last_event_id is not None:
+                yield RESYNC
+            while True:
+                try:
+                    events = await asyncio.wait_for(subscription.queue.get(), idle_timeout)
+                except asyncio.TimeoutError:
+                    yield []
+                    continue
+                if subscription.overflow:
+                    # Підписник не встигав читати - частину подій втрачено
+                    subscription.overflow = False
+                    yield RESYNC
+                    continue
+                yield Batch(events, format_position(events[-1]['id']))
+        finally:
+            with self._lock:
+                self._subscriptions.get(warehouse_id, set()).discard(subscription)
+
+
+# ==============================================================================
+# DB: між процесами (gunicorn пише, uvicorn стрімить)
+# ==============================================================================
+
+class DatabaseBroker:
+    """
+    Журналом подій слугує сама таблиця Transaction: підписник опитує нові записи
+    (id > курсор, індекс по PK), тому публікувати окремо нічого не треба.
+
+    Паралельні транзакції комітяться не в порядку id: рядок з меншим id може з'явитися після
+    прочитаного більшого. Тому пропущені id нижче курсора ("пропуски") перевіряються при кожному
+    опитуванні ще GAP_TIMEOUT секунд; пропуск, що так і не з'явився (відкат або надто довга
+    транзакція), - RESYNC. Позиція потоку (курсор + відкриті пропуски) йде в SSE id, тож після
+    перепідключення (Last-Event-ID) пропуски перевіряються далі.
+    """
+    POLL_INTERVAL = 1.0
+    BATCH_SIZE = 500
+    GAP_TIMEOUT = 60
+    MAX_GAPS = 200
+
+    def publish(self, events):
+        pass
+
+    async def listen(self, warehouse_id, last_event_id=None, idle_timeout=IDLE_TIMEOUT):
+        # Курсор - по всіх складах: id інших складів не є пропусками
+        if last_event_id is None:
+            aggregate = await Transaction.objects.aaggregate(last=Max('id'))
+            cursor, gap_ids = aggregate['last'] or 0, []
+        else:
+            cursor, gap_ids = last_event_id
+        gaps = dict.fromkeys(gap_ids, time.monotonic())  # {id: коли вперше помічено}
+
+        idle = 0.0
+        while True:
+            now = time.monotonic()
+            expired = [gap for gap, seen in gaps.items() if now - seen > self.GAP_TIMEOUT]
+            if expired or len(gaps) > self.MAX_GAPS:
+                # Зміни могли загубитися - клієнт перечитує залишки повністю
+                if len(gaps) > self.MAX_GAPS:
+                    gaps.clear()
+                for gap in expired:
+                    gaps.pop(gap, None)
+                yield RESYNC
+                continue
+
+            rows = Transaction.objects.filter(Q(id__gt=cursor) | Q(id__in=list(gaps))).order_by('id').values_list(
+                'id', 'warehouse_id', 'material_id', 'transaction_type', 'quantity'
+            )[:self.BATCH_SIZE]
+            events, seen_rows = [], False
+            async for txn_id, wh_id, *rest in rows:
+                seen_rows = True
+                if txn_id > cursor:
+                    # Великий стрибок не розгортаємо: понад MAX_GAPS пропусків - RESYNC на наступному колі
+                    gaps.update(dict.fromkeys(range(cursor + 1, min(txn_id, cursor + self.MAX_GAPS + 2)), now))
+                    cursor = txn_id
+                else:
+                    gaps.pop(txn_id, None)
+                if wh_id == warehouse_id:
+                    events.append(make_event(txn_id, warehouse_id, *rest))
+            if events:
+                idle = 0.0
+                yield Batch(events, format_position(cursor, gaps))
+                continue
+            if seen_rows:
+                continue
+
+            await asyncio.sleep(self.POLL_INTERVAL)
+            idle += self.POLL_INTERVAL
+            if idle >= idle_timeout:
+                idle = 0.0
+                yield []
+
+
+BROKERS = {
+    'local': LocalBroker,
+    'db': DatabaseBroker,
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Брокер за settings.STOCK_EVENTS_BACKEND ('db' або 'local'), один на процес."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = BROKERS[settings.STOCK_EVENTS_BACKEND]()
+        return _broker
+
+
+def reset_broker():
+    """Скидає брокер (після зміни налаштувань, у тестах)."""
+    global _broker
+    with _broker_lock:
+        _broker = None
@@ -0,0 +1,156 @@
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils import timezone
+from ..models import Stocktake, StocktakeLine, Transaction, Warehouse
+from . import inventory
+from .low_stock import BALANCE_EXPR
+
+BATCH_SIZE = 1000
+
+_COUNT_FIELD = StocktakeLine._meta.get_field('counted_quantity')
+MAX_COUNT = Decimal(10) ** (_COUNT_FIELD.max_digits - _COUNT_FIELD.decimal_places)  # Межа поля (14, 3), не включно
+
+
+class StocktakeError(ValueError):
+    """Помилка інвентаризації: вже триває інша, документ проведено або нестачу неможливо списати."""
+    pass
+
+
+def _balances(warehouse):
+    rows = (
+        Transaction.objects.filter(warehouse=warehouse).order_by()
+        .values('material_id').annotate(balance=BALANCE_EXPR)
+    )
+    return {row['material_id']: inventory.to_decimal(row['balance'] or 0) for row in rows}
+
+
+def _lock_draft(stocktake):
+    # Блокування документа: підрахунок і проведення не перетинаються, двічі не проводиться
+    locked = Stocktake.objects.select_for_update(of=('self',)).select_related('warehouse').get(pk=stocktake.pk)
+    if locked.status != 'draft':
+        raise StocktakeError(f"Інвентаризацію №{locked.id} вже проведено")
+    return locked
+
+
+@transaction.atomic
+def start(warehouse, user, note=''):
+    """
+    Починає інвентаризацію складу: знімок облікових залишків (один GROUP BY) -> рядки документа
+    (bulk insert). На склад - одна незавершена інвентаризація.
+    """
+    # Блокування складу: два одночасні старти не створять двох документів
+    list(Warehouse.objects.select_for_update().filter(pk=warehouse.pk).values_list('pk', flat=True))
+    if Stocktake.objects.filter(warehouse=warehouse, status='draft').exists():
+        raise StocktakeError(f"На складі «{warehouse.name}» вже триває інвентаризація")
+
+    stocktake = Stocktake.objects.create(warehouse=warehouse, created_by=user, note=note)
+    StocktakeLine.objects.bulk_create([
+        StocktakeLine(stocktake=stocktake, material_id=material_id, system_quantity=balance)
+        for material_id, balance in _balances(warehouse).items() if balance
+    ], batch_size=BATCH_SIZE)
+    return stocktake
+
+
+def counts_from_form(data, lines):
+    """
+    POST форми підрахунку (поля count_<material_id>) -> ({material_id: кількість або None}, помилки).
+    Порожнє поле - рядок не пораховано.
+    """
+    counts, errors = {}, []
+    for line in lines:
+        raw = (data.get(f'count_{line.material_id}') or '').strip().replace(' ', '').replace(',', '.')
+        if not raw:
+            counts[line.material_id] = None
+            continue
+        try:
+            value = Decimal(raw)
+        except InvalidOperation:
+            value = None
+        if value is not None and value.is_finite() and abs(value) < MAX_COUNT:
+            # Округлення - лише в межах поля: to_decimal обнуляє завеликі числа
+            value = inventory.to_decimal(value, places=_COUNT_FIELD.decimal_places)
+        if value is None or not value.is_finite() or value < 0 or value >= MAX_COUNT:
+            errors.append(f"{line.material.name}: некоректна кількість «{raw}»")
+            continue
+        counts[line.material_id] = value
+    return counts, errors
+
+
+@transaction.atomic
+def save_counts(stocktake, counts):
+    """
+    Записує фактичні кількості {material_id: кількість або None} одним upsert по (документ, матеріал).
+    Матеріал поза знімком (знайдено на складі без облікового залишку) додається з нульовим обліком.
+    """
+    stocktake = _lock_draft(stocktake)
+    StocktakeLine.objects.bulk_create(
+        [
+            StocktakeLine(stocktake=stocktake, material_id=material_id, counted_quantity=quantity)
+            for material_id, quantity in counts.items()
+        ],
+        update_conflicts=True, unique_fields=['stocktake', 'material'], update_fields=['counted_quantity'],
+        batch_size=BATCH_SIZE,
+    )
+    return len(counts)
+
+
+def variance_report(stocktake):
+    """
+    Рядки документа з розбіжністю (факт - облік) і її вартістю за середньою ціною + підсумки.
+    Один запит і один прохід по рядках. Повертає (lines, totals).
+    """
+    lines = list(stocktake.lines.select_related('material').order_by('material__name'))
+    totals = {
+        'lines': len(lines), 'counted': 0, 'mismatched': 0,
+        'surplus_value': Decimal('0.00'), 'shortage_value': Decimal('0.00'),
+    }
+    for line in lines:
+        line.variance = None
+        line.variance_value = None
+        if line.counted_quantity is None:
+            continue
+        totals['counted'] += 1
+        line.variance = line.counted_quantity - line.system_quantity
+        line.variance_value = inventory.to_decimal(line.variance * line.material.current_avg_price, places=2)
+        if line.variance:
+            totals['mismatched'] += 1
+            key = 'surplus_value' if line.variance > 0 else 'shortage_value'
+            totals[key] += abs(line.variance_value)
+    return lines, totals
+
+
+@transaction.atomic
+def post(stocktake, user):
+    """
+    Проводить інвентаризацію. Розбіжність кожного порахованого рядка (факт - знімок) коригує поточний
+    залишок: надлишок - IN за середньою ціною, нестача - LOSS. Операції, проведені під час підрахунку,
+    зберігаються. Усі коригування - один inventory.post_batch (bulk insert) з Transaction.stocktake.
+    Непораховані рядки не змінюються. Якщо нестачу списати не можна - не проводиться нічого.
+    Повертає список створених транзакцій.
+    """
+    stocktake = _lock_draft(stocktake)
+    entries = []
+    for line in stocktake.lines.filter(counted_quantity__isnull=False).select_related('material'):
+        variance = line.counted_quantity - line.system_quantity
+        if not variance:
+            continue
+        entries.append({
+            'type': 'IN' if variance > 0 else 'LOSS',
+            'material': line.material,
+            'warehouse': stocktake.warehouse,
+            'quantity': abs(variance),
+            'price': line.material.current_avg_price,
+            'description': f"Інвентаризація №{stocktake.id}",
+            'stocktake': stocktake,
+        })
+
+    # Надлишок за поточною середньою ціною її не змінює - перерахунок не потрібен
+    results = inventory.post_batch(entries, user, update_avg_prices=False) if entries else []
+    failed = [error.material.name for _, error in results if error is not None]
+    if failed:
+        raise StocktakeError(f"Залишок зменшився під час підрахунку, нестачу не списати: {', '.join(failed)}")
+
+    stocktake.status = 'posted'
+    stocktake.posted_at = timezone.now()
+    stocktake.save(update_fields=['status', 'posted_at'])
+    return [txn for txns, _ in results for txn in txns]
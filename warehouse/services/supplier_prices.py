@@ -0,0 +1,37 @@
+from ..models import SupplierPrice
+
+
+class SupplierPriceIndex:
+    """
+    Індекс цін постачальників у пам'яті: {material_id: {supplier_id: price}}.
+    Завантажується одним запитом для набору матеріалів, далі всі пошуки - без звернень до БД.
+    """
+
+    def __init__(self, rows=()):
+        self._prices = {}
+        self._best = {}
+        for mat_id, sup_id, price in rows:
+            self._prices.setdefault(mat_id, {})[sup_id] = price
+            best = self._best.get(mat_id)
+            # При однаковій ціні перевага меншому supplier_id (стабільний вибір)
+            if best is None or (price, sup_id) < (best[1], best[0]):
+                self._best[mat_id] = (sup_id, price)
+
+    @classmethod
+    def for_materials(cls, material_ids):
+        """Будує індекс для вказаних матеріалів (один запит)."""
+        rows = SupplierPrice.objects.filter(material_id__in=material_ids).values_list(
+            'material_id', 'supplier_id', 'price'
+        )
+        return cls(rows)
+
+    def price(self, material_id, supplier_id):
+        """Ціна конкретного постачальника або None, якщо прайсу немає."""
+        return self._prices.get(material_id, {}).get(supplier_id)
+
+    def best(self, material_id):
+        """(supplier_id, price) найдешевшого постачальника або None."""
+        return self._best.get(material_id)
+
+    def __contains__(self, material_id):
+        return material_id in self._prices
@@ -0,0 +1,494 @@
+import csv
+import datetime
+import io
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import (
+    Warehouse, Category, Material, Supplier, SupplierPrice, ConstructionStage,
+    Order, OrderItem, Transaction
+)
+from .material_search import build_search_name, invalidate_local_index
+
+# Усі синтетичні записи позначені префіксом - їх легко знайти й видалити (purge_synthetic_data)
+SYNTHETIC_PREFIX = 'SYN'
+
+# Базові матеріали: (назва, одиниця, категорія, ціна грн, типова кількість операції)
+MATERIAL_BASES = [
+    ('Цемент М500', 'мішок', "В'яжучі", 180, 20),
+    ('Пісок річковий', 'т', 'Сипучі', 450, 5),
+    ('Щебінь 5-20', 'т', 'Сипучі', 650, 5),
+    ('Арматура A500C', 'т', 'Метал', 32000, 0.8),
+    ('Цегла рядова', 'шт', 'Стінові', 9, 500),
+    ('Газоблок D500', 'м3', 'Стінові', 2900, 3),
+    ('Бетон В25', 'м3', 'Бетон', 3200, 6),
+    ('Дошка обрізна', 'м3', 'Лісоматеріали', 9000, 1),
+    ('Фарба фасадна', 'л', 'Оздоблення', 180, 20),
+    ('Клей для плитки', 'мішок', 'Суміші', 250, 15),
+    ('Профіль CD-60', 'шт', 'Гіпсокартонні системи', 95, 40),
+    ('Гіпсокартон', 'лист', 'Гіпсокартонні системи', 260, 30),
+    ('Утеплювач мінвата', 'м2', 'Утеплення', 140, 50),
+    ('Труба ПП 25', 'м', 'Сантехніка', 45, 60),
+    ('Кабель ВВГ 3x2.5', 'м', 'Електрика', 38, 100),
+    ('Саморізи 3.5x35', 'уп', 'Кріплення', 160, 5),
+]
+STAGE_NAMES = ['Фундамент', 'Каркас', 'Покрівля', 'Оздоблення']
+
+# Частки подій: переміщення - одна подія, але два рядки (OUT + IN з одним transfer_group_id)
+KIND_IN, KIND_OUT, KIND_LOSS, KIND_TRANSFER = range(4)
+DEFAULT_MIX = {'IN': 0.30, 'OUT': 0.55, 'LOSS': 0.03, 'TRANSFER': 0.06}
+DESCRIPTIONS = {
+    KIND_IN: 'Поставка',
+    KIND_OUT: 'Списання на роботи',
+    KIND_LOSS: 'Бій / втрати',
+}
+# Прихід рідший за витрату, тому партії більші: (OUT + LOSS) / IN з запасом
+IN_BATCH_FACTOR = 2.1
+
+# Активність за днем тижня (пн..нд): у вихідні операцій мало
+WEEKDAY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 0.9, 0.35, 0.08])
+# Показник Zipf для популярності матеріалів: кілька позицій дають більшість операцій
+ZIPF_EXPONENT = 1.1
+
+ORDER_STATUSES = ['draft', 'new', 'rfq', 'approved', 'purchasing', 'transit', 'completed', 'rejected']
+ORDER_STATUS_WEIGHTS = [0.02, 0.10, 0.04, 0.08, 0.06, 0.05, 0.60, 0.05]
+ORDER_PRIORITIES = ['low', 'medium', 'high', 'critical']
+ORDER_PRIORITY_WEIGHTS = [0.2, 0.5, 0.25, 0.05]
+
+TRANSACTION_COLUMNS = (
+    'transaction_type', 'warehouse_id', 'material_id', 'quantity', 'price', 'date', 'created_at',
+    'created_by_id', 'description', 'order_id', 'stage_id', 'transfer_group_id',
+)
+
+
+@contextmanager
+def _explicit_created_at(*models):
+    """Вимикає auto_now_add на created_at, щоб bulk_create зберіг згенеровані дати."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    try:
+        for field in fields:
+            field.auto_now_add = False
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _milli_to_decimal(value):
+    return Decimal(value).scaleb(-3)
+
+
+def _cents_to_decimal(value):
+    return Decimal(value).scaleb(-2)
+
+
+class _TransactionWriter:
+    """
+    Пакетний запис транзакцій: на PostgreSQL - COPY (у рази швидше за INSERT),
+    на інших БД - bulk_create. Рядки - кортежі у порядку TRANSACTION_COLUMNS,
+    кількість у тисячних, ціна в копійках (цілі числа).
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+        self.written = 0
+        if self.use_copy:
+            opts = Transaction._meta
+            columns = ', '.join(opts.get_field(name).column for name in TRANSACTION_COLUMNS)
+            self.copy_sql = f'COPY {opts.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)'
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.use_copy:
+            self._copy(rows)
+        else:
+            self._bulk_create(rows)
+        self.written += len(rows)
+
+    def _copy(self, rows):
+        # Порожнє поле без лапок у CSV-режимі COPY - це NULL (description завжди непорожній)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for txn_type, wh_id, mat_id, qty, price, day, created_at, user_id, description, order_id, stage_id, group in rows:
+            writer.writerow((
+                txn_type, wh_id, mat_id, f'{qty // 1000}.{qty % 1000:03d}', f'{price // 100}.{price % 100:02d}',
+                day.isoformat(), created_at.isoformat(), user_id, description, order_id, stage_id, group
+            ))
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(self.copy_sql, buffer)
+
+    def _bulk_create(self, rows):
+        objects = []
+        for txn_type, wh_id, mat_id, qty, price, day, created_at, user_id, description, order_id, stage_id, group in rows:
+            objects.append(Transaction(
+                transaction_type=txn_type, warehouse_id=wh_id, material_id=mat_id,
+                quantity=_milli_to_decimal(qty), price=_cents_to_decimal(price),
+                date=day, created_at=created_at, created_by_id=user_id, description=description,
+                order_id=order_id, stage_id=stage_id, transfer_group_id=group
+            ))
+        with _explicit_created_at(Transaction):
+            Transaction.objects.bulk_create(objects, batch_size=self.batch_size)
+
+
+class SyntheticDataGenerator:
+    """
+    Генератор синтетичних даних для навантажувальних тестів і бенчмарків звітів.
+
+    Однаковий seed (і end_date) - однакові дані. Розподіли наближені до реальних:
+    популярність матеріалів за Zipf, активність складів - логнормальна (кілька великих об'єктів),
+    сезонність за днем тижня і зростання обсягів у часі, переміщення - парні OUT + IN.
+
+    Транзакції генеруються пакетами в хронологічному порядку (numpy), пишуться COPY/bulk_create.
+    Залишок кожної пари (склад, матеріал) відстежується на межах пакетів: де він іде в мінус,
+    в день перед початком періоду додається вхідний залишок (IN "Введення залишків").
+    Пам'ять: два масиви int64 розміром warehouses x materials (200 x 50 000 - ~160 МБ).
+    """
+
+    def __init__(self, *, seed=42, warehouses=20, materials=2000, transactions=200_000, orders=2000,
+                 items_per_order=4, days=365, batch_size=20_000, mix=None, end_date=None, progress=None):
+        if warehouses < 1 or materials < 1:
+            raise ValueError('Потрібен хоча б один склад і один матеріал')
+        self.seed = seed
+        self.warehouses = warehouses
+        self.materials = materials
+        self.transactions = transactions
+        self.orders = orders
+        self.items_per_order = max(1, items_per_order)
+        self.days = max(1, days)
+        self.batch_size = max(1, batch_size)
+        self.end_date = end_date or timezone.localdate()
+        self.start_date = self.end_date - datetime.timedelta(days=self.days - 1)
+        self.progress = progress or (lambda message: None)
+
+        mix = dict(mix or DEFAULT_MIX)
+        if warehouses < 2:
+            mix['TRANSFER'] = 0  # переміщувати нікуди
+        weights = np.array([mix['IN'], mix['OUT'], mix['LOSS'], mix['TRANSFER']], dtype=np.float64)
+        self.kind_p = weights / weights.sum()
+
+        self.rng = np.random.default_rng(seed)
+        self.tz = timezone.get_current_timezone()
+
+    # ------------------------------------------------------------------
+    # Довідники
+    # ------------------------------------------------------------------
+
+    def _create_users(self):
+        # Через create (не bulk_create), щоб сигнал створив UserProfile
+        count = min(50, max(1, self.warehouses // 5))
+        users = []
+        for i in range(count):
+            user, _ = User.objects.get_or_create(username=f'{SYNTHETIC_PREFIX.lower()}_user_{i + 1:03d}')
+            users.append(user.id)
+        return np.array(users, dtype=np.int64)
+
+    def _create_warehouses(self):
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(
+                name=f"{SYNTHETIC_PREFIX} Об'єкт {i + 1:04d}",
+                address=f'вул. Синтетична, {i + 1}',
+                budget_limit=_cents_to_decimal(int(self.rng.integers(500_000, 50_000_000)) * 100)
+            )
+            for i in range(self.warehouses)
+        ], batch_size=self.batch_size)
+        wh_ids = np.array([wh.id for wh in warehouses], dtype=np.int64)
+
+        stages = ConstructionStage.objects.bulk_create([
+            ConstructionStage(warehouse_id=wh_id, name=name)
+            for wh_id in wh_ids.tolist() for name in STAGE_NAMES
+        ], batch_size=self.batch_size)
+        stage_ids = np.array([stage.id for stage in stages], dtype=np.int64).reshape(self.warehouses, len(STAGE_NAMES))
+
+        # Активність складу: логнормальна - кілька великих об'єктів і "довгий хвіст"
+        activity = self.rng.lognormal(0.0, 1.0, self.warehouses)
+        return wh_ids, stage_ids, activity / activity.sum()
+
+    def _create_materials(self):
+        categories = {}
+        for _, _, category_name, _, _ in MATERIAL_BASES:
+            if category_name not in categories:
+                categories[category_name] = Category.objects.create(name=f'{SYNTHETIC_PREFIX} {category_name}').id
+
+        base_idx = self.rng.integers(0, len(MATERIAL_BASES), self.materials)
+        price_factor = self.rng.lognormal(0.0, 0.25, self.materials)
+        qty_factor = self.rng.lognormal(0.0, 0.3, self.materials)
+
+        objects, price_cents, typical_milli = [], [], []
+        for i, (b, pf, qf) in enumerate(zip(base_idx.tolist(), price_factor.tolist(), qty_factor.tolist())):
+            name, unit, category_name, base_price, base_qty = MATERIAL_BASES[b]
+            name = f'{name} №{i + 1}'
+            article = f'{SYNTHETIC_PREFIX}-{i + 1:06d}'
+            cents = max(1, round(base_price * pf * 100))
+            price_cents.append(cents)
+            typical_milli.append(max(1, round(base_qty * qf * 1000)))
+            objects.append(Material(
+                name=name, article=article, unit=unit, category_id=categories[category_name],
+                current_avg_price=_cents_to_decimal(cents),
+                min_limit=_milli_to_decimal(typical_milli[-1] * 2),
+                search_name=build_search_name(name, article)
+            ))
+
+        materials = Material.objects.bulk_create(objects, batch_size=self.batch_size)
+        mat_ids = np.array([m.id for m in materials], dtype=np.int64)
+
+        # Популярність за Zipf у випадковому порядку (щоб популярні не були першими за id)
+        popularity = 1.0 / np.arange(1, self.materials + 1) ** ZIPF_EXPONENT
+        popularity = self.rng.permutation(popularity)
+        return mat_ids, np.array(price_cents, dtype=np.int64), np.array(typical_milli, dtype=np.int64), popularity / popularity.sum()
+
+    def _create_suppliers(self, mat_ids, price_cents):
+        count = min(200, max(3, self.materials // 500))
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'{SYNTHETIC_PREFIX} Постачальник {i + 1:03d}', rating=int(self.rng.integers(60, 101)))
+            for i in range(count)
+        ])
+        supplier_ids = np.array([s.id for s in suppliers], dtype=np.int64)
+
+        # 1-3 пропозиції на матеріал, ціна постачальника +-10% від середньої
+        offers = []
+        per_material = self.rng.integers(1, min(3, count) + 1, self.materials)
+        for i, k in enumerate(per_material.tolist()):
+            factors = self.rng.normal(1.0, 0.1, k)
+            for supplier_idx, factor in zip(self.rng.choice(count, k, replace=False).tolist(), factors.tolist()):
+                offers.append(SupplierPrice(
+                    supplier_id=int(supplier_ids[supplier_idx]), material_id=int(mat_ids[i]),
+                    price=_cents_to_decimal(max(1, round(int(price_cents[i]) * factor)))
+                ))
+        SupplierPrice.objects.bulk_create(offers, batch_size=self.batch_size)
+        return supplier_ids
+
+    # ------------------------------------------------------------------
+    # Дати
+    # ------------------------------------------------------------------
+
+    def _day_weights(self):
+        """Ймовірність дня періоду: день тижня x плавне зростання обсягів (+50% до кінця періоду)."""
+        offsets = np.arange(self.days)
+        weekdays = (self.start_date.weekday() + offsets) % 7
+        weights = WEEKDAY_WEIGHTS[weekdays] * (1.0 + 0.5 * offsets / max(self.days - 1, 1))
+        return weights / weights.sum()
+
+    def _day_datetimes(self):
+        """Початок кожного дня періоду (aware, локальний час) - база для created_at."""
+        return [
+            timezone.make_aware(datetime.datetime.combine(self.start_date + datetime.timedelta(days=d), datetime.time()), self.tz)
+            for d in range(-1, self.days)
+        ]
+
+    def _created_at(self, day_starts, days, seconds):
+        # day_starts[0] - день перед періодом (вхідні залишки), тому зсув +1
+        return [day_starts[d + 1] + datetime.timedelta(seconds=s) for d, s in zip(days, seconds)]
+
+    # ------------------------------------------------------------------
+    # Заявки
+    # ------------------------------------------------------------------
+
+    def _create_orders(self, wh_ids, wh_p, mat_ids, mat_p, price_cents, typical_milli, supplier_ids, user_ids, day_starts, writer):
+        if not self.orders:
+            return 0, 0
+        n = self.orders
+        days = self.rng.choice(self.days, n, p=self._day_weights())
+        seconds = self.rng.integers(8 * 3600, 19 * 3600, n)
+        statuses = self.rng.choice(len(ORDER_STATUSES), n, p=ORDER_STATUS_WEIGHTS)
+        priorities = self.rng.choice(len(ORDER_PRIORITIES), n, p=ORDER_PRIORITY_WEIGHTS)
+        wh_idx = self.rng.choice(len(wh_ids), n, p=wh_p)
+        users = self.rng.choice(user_ids, n)
+        lead_days = self.rng.integers(2, 15, n)
+        created = self._created_at(day_starts, days.tolist(), seconds.tolist())
+
+        orders = []
+        for i in range(n):
+            day = self.start_date + datetime.timedelta(days=int(days[i]))
+            orders.append(Order(
+                warehouse_id=int(wh_ids[wh_idx[i]]), status=ORDER_STATUSES[statuses[i]],
+                priority=ORDER_PRIORITIES[priorities[i]], created_by_id=int(users[i]),
+                created_at=created[i], expected_date=day + datetime.timedelta(days=int(lead_days[i])),
+                note='Синтетична заявка'
+            ))
+        with _explicit_created_at(Order):
+            orders = Order.objects.bulk_create(orders, batch_size=self.batch_size)
+
+        item_counts = 1 + self.rng.poisson(self.items_per_order - 1, n)
+        total_items = int(item_counts.sum())
+        order_idx = np.repeat(np.arange(n), item_counts)
+        mat_idx = self.rng.choice(len(mat_ids), total_items, p=mat_p)
+        qty = np.maximum(1, np.round(typical_milli[mat_idx] * self.rng.lognormal(0.7, 0.5, total_items))).astype(np.int64)
+        fact = np.maximum(1, np.round(qty * self.rng.uniform(0.9, 1.0, total_items))).astype(np.int64)
+        price = np.maximum(1, np.round(price_cents[mat_idx] * self.rng.normal(1.0, 0.1, total_items))).astype(np.int64)
+        suppliers = self.rng.choice(supplier_ids, total_items)
+
+        items, receipts = [], []
+        for j in range(total_items):
+            order = orders[order_idx[j]]
+            completed = order.status == 'completed'
+            items.append(OrderItem(
+                order_id=order.id, material_id=int(mat_ids[mat_idx[j]]),
+                quantity=_milli_to_decimal(int(qty[j])),
+                quantity_fact=_milli_to_decimal(int(fact[j]) if completed else 0),
+                supplier_id=int(suppliers[j]), supplier_price=_cents_to_decimal(int(price[j]))
+            ))
+            if completed:
+                # Прийом по виконаній заявці - прихід на склад у очікувану дату (не пізніше кінця періоду)
+                day = min(order.expected_date, self.end_date)
+                receipts.append((
+                    'IN', order.warehouse_id, int(mat_ids[mat_idx[j]]), int(fact[j]), int(price[j]), day,
+                    day_starts[(day - self.start_date).days + 1] + datetime.timedelta(hours=12),
+                    order.created_by_id, f'Прийом по заявці #{order.id}', order.id, None, None
+                ))
+        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        for start in range(0, len(receipts), self.batch_size):
+            writer.write(receipts[start:start + self.batch_size])
+        return total_items, len(receipts)
+
+    # ------------------------------------------------------------------
+    # Транзакції
+    # ------------------------------------------------------------------
+
+    def _create_transactions(self, wh_ids, wh_p, stage_ids, mat_ids, mat_p, price_cents, typical_milli, user_ids, day_starts, writer):
+        n_wh, n_mat = len(wh_ids), len(mat_ids)
+        # Подій менше за рядки: кожне переміщення дає два рядки
+        events = int(round(self.transactions / (1.0 + self.kind_p[KIND_TRANSFER])))
+        event_days = np.repeat(np.arange(self.days), self.rng.multinomial(events, self._day_weights()))
+
+        balance = np.zeros(n_wh * n_mat, dtype=np.int64)
+        lowest = np.zeros(n_wh * n_mat, dtype=np.int64)
+        qty_factor = np.array([IN_BATCH_FACTOR, 1.0, 0.3, 1.0])
+
+        for start in range(0, events, self.batch_size):
+            days = event_days[start:start + self.batch_size]
+            n = len(days)
+            kinds = self.rng.choice(4, n, p=self.kind_p)
+            src = self.rng.choice(n_wh, n, p=wh_p)
+            dst = (src + self.rng.integers(1, max(n_wh, 2), n)) % n_wh
+            mat = self.rng.choice(n_mat, n, p=mat_p)
+            qty = np.maximum(1, np.round(typical_milli[mat] * qty_factor[kinds] * self.rng.lognormal(0.0, 0.6, n))).astype(np.int64)
+            price = np.where(
+                kinds == KIND_IN,
+                np.maximum(1, np.round(price_cents[mat] * self.rng.normal(1.0, 0.08, n))).astype(np.int64),
+                price_cents[mat]
+            )
+            stage = np.where(kinds == KIND_OUT, stage_ids[src, self.rng.integers(0, stage_ids.shape[1], n)], 0)
+            users = self.rng.choice(user_ids, n)
+            seconds = self.rng.integers(8 * 3600, 19 * 3600, n)
+            group_bytes = self.rng.bytes(16 * n)
+
+            # Баланс: IN +, OUT/LOSS -, переміщення: - на джерелі, + на отримувачі
+            is_transfer = kinds == KIND_TRANSFER
+            keys = np.concatenate([src * n_mat + mat, dst[is_transfer] * n_mat + mat[is_transfer]])
+            deltas = np.concatenate([np.where(kinds == KIND_IN, qty, -qty), qty[is_transfer]])
+            np.add.at(balance, keys, deltas)
+            touched = np.unique(keys)
+            lowest[touched] = np.minimum(lowest[touched], balance[touched])
+
+            rows = []
+            created = self._created_at(day_starts, days.tolist(), seconds.tolist())
+            for i, (kind, s, d, m, q, p, st, u, day) in enumerate(zip(
+                kinds.tolist(), src.tolist(), dst.tolist(), mat.tolist(), qty.tolist(),
+                price.tolist(), stage.tolist(), users.tolist(), days.tolist()
+            )):
+                date = self.start_date + datetime.timedelta(days=day)
+                src_id, mat_id = int(wh_ids[s]), int(mat_ids[m])
+                if kind == KIND_TRANSFER:
+                    group = uuid.UUID(bytes=group_bytes[i * 16:(i + 1) * 16], version=4)
+                    dst_id = int(wh_ids[d])
+                    rows.append(('OUT', src_id, mat_id, q, p, date, created[i], u, f"Переміщення на {SYNTHETIC_PREFIX} Об'єкт {d + 1:04d}", None, None, group))
+                    rows.append(('IN', dst_id, mat_id, q, p, date, created[i], u, f"Отримано з {SYNTHETIC_PREFIX} Об'єкт {s + 1:04d}", None, None, group))
+                else:
+                    txn_type = ('IN', 'OUT', 'LOSS')[kind]
+                    rows.append((txn_type, src_id, mat_id, q, p, date, created[i], u, DESCRIPTIONS[kind], None, st or None, None))
+            writer.write(rows)
+            self.progress(f'   транзакції: {writer.written}')
+
+        return self._write_opening_balances(lowest, wh_ids, mat_ids, price_cents, typical_milli, user_ids, day_starts, writer)
+
+    def _write_opening_balances(self, lowest, wh_ids, mat_ids, price_cents, typical_milli, user_ids, day_starts, writer):
+        """IN за день до періоду для пар, що йшли в мінус: дефіцит + типова партія як страховий запас."""
+        n_mat = len(mat_ids)
+        deficit_keys = np.nonzero(lowest < 0)[0]
+        day = self.start_date - datetime.timedelta(days=1)
+        created_at = day_starts[0] + datetime.timedelta(hours=8)
+        user_id = int(user_ids[0])
+
+        written = 0
+        for start in range(0, len(deficit_keys), self.batch_size):
+            keys = deficit_keys[start:start + self.batch_size]
+            wh_idx, mat_idx = keys // n_mat, keys % n_mat
+            qty = -lowest[keys] + typical_milli[mat_idx]
+            rows = [
+                ('IN', int(wh_ids[w]), int(mat_ids[m]), q, int(price_cents[m]), day, created_at, user_id, 'Введення залишків', None, None, None)
+                for w, m, q in zip(wh_idx.tolist(), mat_idx.tolist(), qty.tolist())
+            ]
+            writer.write(rows)
+            written += len(rows)
+        return written
+
+    # ------------------------------------------------------------------
+
+    def run(self):
+        """Генерує дані в одній транзакції БД. Повертає статистику (кількості, час)."""
+        if Material.objects.filter(article__startswith=f'{SYNTHETIC_PREFIX}-').exists():
+            raise ValueError('Синтетичні дані вже є в базі. Спочатку видаліть їх (purge_synthetic_data / --purge).')
+
+        started = time.perf_counter()
+        writer = _TransactionWriter(self.batch_size)
+        with transaction.atomic():
+            user_ids = self._create_users()
+            wh_ids, stage_ids, wh_p = self._create_warehouses()
+            self.progress(f'   склади: {len(wh_ids)}')
+            mat_ids, price_cents, typical_milli, mat_p = self._create_materials()
+            self.progress(f'   матеріали: {len(mat_ids)}')
+            supplier_ids = self._create_suppliers(mat_ids, price_cents)
+            day_starts = self._day_datetimes()
+
+            order_items, receipts = self._create_orders(
+                wh_ids, wh_p, mat_ids, mat_p, price_cents, typical_milli, supplier_ids, user_ids, day_starts, writer
+            )
+            self.progress(f'   заявки: {self.orders}, позицій: {order_items}')
+            opening = self._create_transactions(
+                wh_ids, wh_p, stage_ids, mat_ids, mat_p, price_cents, typical_milli, user_ids, day_starts, writer
+            )
+        invalidate_local_index()
+
+        return {
+            'seed': self.seed,
+            'warehouses': len(wh_ids),
+            'materials': len(mat_ids),
+            'suppliers': len(supplier_ids),
+            'orders': self.orders,
+            'order_items': order_items,
+            'transactions': writer.written,
+            'order_receipts': receipts,
+            'opening_balances': opening,
+            'date_from': self.start_date - datetime.timedelta(days=1),
+            'date_to': self.end_date,
+            'seconds': round(time.perf_counter() - started, 1),
+        }
+
+
+def purge_synthetic_data():
+    """Видаляє все, що створив SyntheticDataGenerator (за префіксом). Повертає {модель: кількість}."""
+    warehouses = Warehouse.objects.filter(name__startswith=f'{SYNTHETIC_PREFIX} ')
+    materials = Material.objects.filter(article__startswith=f'{SYNTHETIC_PREFIX}-')
+    deleted = {}
+    with transaction.atomic():
+        # Транзакції - першими й окремо: без залежних об'єктів це один DELETE, без вибірки в пам'ять
+        for key, queryset in [
+            ('transactions', Transaction.objects.filter(warehouse__in=warehouses)),
+            ('orders', Order.objects.filter(warehouse__in=warehouses)),
+            ('warehouses', warehouses),
+            ('materials', materials),
+            ('suppliers', Supplier.objects.filter(name__startswith=f'{SYNTHETIC_PREFIX} ')),
+            ('categories', Category.objects.filter(name__startswith=f'{SYNTHETIC_PREFIX} ')),
+            ('users', User.objects.filter(username__startswith=f'{SYNTHETIC_PREFIX.lower()}_user_')),
+        ]:
+            deleted[key] = queryset.delete()[1].get(queryset.model._meta.label, 0)
+    invalidate_local_index()
+    return deleted
@@ -0,0 +1,169 @@
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum, Q
+from ..models import Transaction, OrderItem, Material, Warehouse
+from .low_stock import BALANCE_EXPR
+from . import inventory
+
+# Заявки, які ще не закуплені - це потреба об'єкта, яку можна закрити переміщенням
+DEMAND_ORDER_STATUSES = ['new', 'rfq', 'approved']
+# Заявки, які вже закуплені/в дорозі - товар скоро прийде, дефіциту не створюють
+INBOUND_ORDER_STATUSES = ['purchasing', 'transit']
+
+# Кількості в матриці зберігаються в тисячних (int64), щоб уникнути похибок float
+QTY_SCALE = 1000
+
+
+def build_balance_matrix(warehouses):
+    """
+    Будує матриці склад x матеріал:
+    - stock: фактичний залишок;
+    - net: позиція (залишок + товар в дорозі) мінус потреба (min_limit + незакриті заявки).
+
+    net > 0 - надлишок, net < 0 - дефіцит.
+    Два агрегованих запити (залишки та заявки) незалежно від кількості складів.
+
+    Повертає (warehouse_ids, material_ids, stock, net) - матриці int64 у тисячних.
+    """
+    balances = list(
+        Transaction.objects.filter(warehouse__in=warehouses).values_list(
+            'warehouse_id', 'material_id', 'material__min_limit'
+        ).annotate(balance=BALANCE_EXPR).order_by()
+    )
+
+    order_rows = list(
+        OrderItem.objects.filter(
+            order__warehouse__in=warehouses,
+            order__status__in=DEMAND_ORDER_STATUSES + INBOUND_ORDER_STATUSES
+        ).values_list('order__warehouse_id', 'material_id', 'material__min_limit').annotate(
+            demand=Sum('quantity', filter=Q(order__status__in=DEMAND_ORDER_STATUSES)),
+            inbound=Sum('quantity', filter=Q(order__status__in=INBOUND_ORDER_STATUSES)),
+        ).order_by()
+    )
+
+    wh_ids = sorted({row[0] for row in balances} | {row[0] for row in order_rows})
+    mat_ids = sorted({row[1] for row in balances} | {row[1] for row in order_rows})
+    wh_index = {wh_id: i for i, wh_id in enumerate(wh_ids)}
+    mat_index = {mat_id: j for j, mat_id in enumerate(mat_ids)}
+
+    shape = (len(wh_ids), len(mat_ids))
+    stock = np.zeros(shape, dtype=np.int64)
+    demand = np.zeros(shape, dtype=np.int64)
+    inbound = np.zeros(shape, dtype=np.int64)
+    min_limit = np.zeros(len(mat_ids), dtype=np.int64)
+    # Пари, для яких застосовуємо min_limit: є рух по складу або заявка
+    tracked = np.zeros(shape, dtype=bool)
+
+    def scaled(value):
+        return int(round((value or 0) * QTY_SCALE))
+
+    for wh_id, mat_id, limit, balance in balances:
+        i, j = wh_index[wh_id], mat_index[mat_id]
+        stock[i, j] = scaled(balance)
+        min_limit[j] = scaled(limit)
+        tracked[i, j] = True
+
+    for wh_id, mat_id, limit, dem, inb in order_rows:
+        i, j = wh_index[wh_id], mat_index[mat_id]
+        demand[i, j] = scaled(dem)
+        inbound[i, j] = scaled(inb)
+        min_limit[j] = scaled(limit)
+        tracked[i, j] = True
+
+    requirement = np.where(tracked, min_limit[np.newaxis, :], 0) + demand
+    net = stock + inbound - requirement
+    return wh_ids, mat_ids, stock, net
+
+
+def _greedy_match(surplus, deficit):
+    """
+    Жадібне розподілення для одного матеріалу (north-west corner):
+    найбільший дефіцит закривається з найбільшого надлишку.
+
+    Повністю векторизовано: точки розриву - об'єднання кумулятивних сум
+    надлишків і дефіцитів; кожен відрізок між ними - одне переміщення.
+    Повертає масиви (src_rows, dst_rows, qty).
+    """
+    src_rows = np.flatnonzero(surplus > 0)
+    dst_rows = np.flatnonzero(deficit > 0)
+    src_rows = src_rows[np.argsort(-surplus[src_rows], kind='stable')]
+    dst_rows = dst_rows[np.argsort(-deficit[dst_rows], kind='stable')]
+
+    cs = np.cumsum(surplus[src_rows])
+    cd = np.cumsum(deficit[dst_rows])
+    total = min(cs[-1], cd[-1])
+
+    breakpoints = np.unique(np.concatenate([cs, cd]))
+    breakpoints = breakpoints[breakpoints <= total]
+    starts = np.concatenate([[0], breakpoints[:-1]])
+    qty = breakpoints - starts
+
+    src = src_rows[np.searchsorted(cs, starts, side='right')]
+    dst = dst_rows[np.searchsorted(cd, starts, side='right')]
+    return src, dst, qty
+
+
+def suggest_transfers(warehouses):
+    """
+    Пропозиції переміщень між складами: надлишок одного об'єкта закриває дефіцит іншого.
+
+    Надлишок джерела обмежений фактичним залишком (товар в дорозі перемістити не можна).
+    Повертає список словників, відсортований за матеріалом і кількістю:
+    {key, material, source, target, quantity}.
+    """
+    wh_ids, mat_ids, stock, net = build_balance_matrix(warehouses)
+    if not wh_ids:
+        return []
+
+    surplus = np.clip(np.minimum(net, stock), 0, None)
+    deficit = np.clip(-net, 0, None)
+
+    # Розглядаємо лише матеріали, де одночасно є і надлишок, і дефіцит
+    candidates = np.flatnonzero((surplus > 0).any(axis=0) & (deficit > 0).any(axis=0))
+
+    raw = []
+    for j in candidates:
+        src, dst, qty = _greedy_match(surplus[:, j], deficit[:, j])
+        raw.extend(zip(src.tolist(), dst.tolist(), [int(j)] * len(qty), qty.tolist()))
+
+    if not raw:
+        return []
+
+    materials = Material.objects.in_bulk({mat_ids[j] for _, _, j, _ in raw})
+    warehouse_map = Warehouse.objects.in_bulk({wh_ids[i] for i, _, _, _ in raw} | {wh_ids[i] for _, i, _, _ in raw})
+
+    suggestions = []
+    for src, dst, j, qty in raw:
+        source, target, material = warehouse_map[wh_ids[src]], warehouse_map[wh_ids[dst]], materials[mat_ids[j]]
+        suggestions.append({
+            'key': f"{material.id}-{source.id}-{target.id}",
+            'material': material,
+            'source': source,
+            'target': target,
+            'quantity': (Decimal(qty) / QTY_SCALE).quantize(Decimal("0.001")),
+        })
+
+    suggestions.sort(key=lambda s: (s['material'].name, -s['quantity']))
+    return suggestions
+
+
+@transaction.atomic
+def apply_transfer_suggestions(user, suggestions, date=None):
+    """
+    Проводить вибрані пропозиції через inventory.create_transfer однією транзакцією.
+    Якщо хоча б одне переміщення не проходить перевірку залишків - відкочується весь пакет.
+    Повертає список transfer_group_id.
+    """
+    group_ids = []
+    for s in suggestions:
+        group_ids.append(inventory.create_transfer(
+            user=user,
+            material=s['material'],
+            source_warehouse=s['source'],
+            target_warehouse=s['target'],
+            quantity=s['quantity'],
+            description="Автопропозиція балансування залишків",
+            date=date
+        ))
+    return group_ids
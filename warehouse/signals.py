@@ -1,4 +1,5 @@
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 # 🔥 ВИПРАВЛЕНО: Імпорт з warehouse.views.utils (де файл лежить фізично)
 # Завдяки пустому views/__init__.py це тепер безпечно і не викличе помилку.
@@ -14,4 +15,29 @@ def log_user_logout(sender, request, user, **kwargs):
 
 @receiver(user_login_failed)
 def log_user_login_failed(sender, credentials, request, **kwargs):
-    pass
\ No newline at end of file
+    pass
+
+
+# Локальний пошуковий індекс матеріалів (SQLite fallback) застаріває при зміні довідника
+@receiver([post_save, post_delete], sender='warehouse.Material')
+def invalidate_material_search(sender, **kwargs):
+    from warehouse.services.material_search import invalidate_local_index
+    invalidate_local_index()
+
+
+# Фото з телефонів: поворот за EXIF, WebP з обмеженою роздільністю (див. services.images)
+@receiver(pre_save, sender='warehouse.Transaction')
+@receiver(pre_save, sender='warehouse.Order')
+@receiver(pre_save, sender='warehouse.UserProfile')
+def normalize_uploaded_images(sender, instance, **kwargs):
+    from warehouse.services.images import normalize_instance_images
+    normalize_instance_images(instance)
+
+
+# Фото з адресацією за вмістом (warehouse.storage): файл видаляється, коли на нього не лишилось посилань
+@receiver(post_delete, sender='warehouse.Transaction')
+@receiver(post_delete, sender='warehouse.Order')
+@receiver(post_delete, sender='warehouse.UserProfile')
+def release_deleted_images(sender, instance, **kwargs):
+    from warehouse.services.media_store import release_instance_files
+    release_instance_files(instance)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import time
+import uuid
+from pathlib import PurePosixPath
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from .services.images import THUMBNAIL_ROOT
+
+# Усі завантаження зберігаються як blobs/ab/cd/<sha256><ext>: однаковий вміст - один файл
+BLOB_ROOT = 'blobs'
+# Похідні файли з детермінованими іменами (мініатюри) зберігаються за іменем, без хешування
+KEYED_PREFIXES = (f'{THUMBNAIL_ROOT}/',)
+MAX_EXTENSION_LENGTH = 10
+
+
+def content_hash(content):
+    # Пораховано під час прийому (uploads.StreamingUploadHandler) - файл не перечитується
+    precomputed = getattr(content, 'content_sha256', None)
+    if precomputed:
+        return precomputed
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_ROOT}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Медіа-сховище з адресацією за вмістом (STORAGES['default']).
+
+    Ім'я файлу - sha256 вмісту, тому одне фото ТТН, збережене в N транзакцій і в заявку,
+    записується на диск один раз, а всі записи посилаються на той самий blob.
+    upload_to поля ігнорується (береться тільки розширення). Видалення - тільки коли
+    на blob не лишилось посилань: див. services.media_store.release.
+    """
+
+    def claim(self, name):
+        """
+        Повторне використання наявного blob: оновлює mtime, тож delete_unclaimed його не видалить,
+        поки посилання ще не закомічене. False - blob щойно видалено, вміст треба записати заново.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete_unclaimed(self, name, grace):
+        """
+        Видаляє blob, якщо його не записували і не брали (claim) останні grace секунд. True - видалено.
+        Blob спершу атомарно перейменовується: save після цього його не знайде і запише заново,
+        а claim до перейменування видно за mtime - тоді blob повертається на місце.
+        """
+        path = self.path(name)
+        retired = f'{path}.{uuid.uuid4().hex}.deleting'
+        try:
+            os.rename(path, retired)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(retired).st_mtime < grace:
+            # Якщо save вже записав blob заново - вміст ідентичний
+            os.replace(retired, path)
+            return False
+        os.remove(retired)
+        return True
+
+    def blob_name(self, name, content):
+        extension = PurePosixPath(name or '').suffix.lower()
+        if len(extension) > MAX_EXTENSION_LENGTH:
+            extension = ''
+        digest = content_hash(content)
+        return f'{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name.startswith(KEYED_PREFIXES):
+            return super().save(name, content, max_length=max_length)
+
+        blob = self.blob_name(name, content)
+        validate_file_name(blob, allow_relative_path=True)
+        if self.claim(blob):
+            return blob
+
+        saved = self._save(blob, content)
+        if saved != blob:
+            # Той самий вміст паралельно записав інший процес - _save дав суфікс; вміст ідентичний
+            os.replace(self.path(saved), self.path(blob))
+        return blob
@@ -0,0 +1,14 @@
+from django import template
+from ..services.images import thumbnail_url
+
+register = template.Library()
+
+
+@register.filter(name='thumbnail')
+def thumbnail(field_file, size='sm'):
+    """
+    URL мініатюри фото (WebP): {{ item.photo|thumbnail }} або {{ order.proof_photo|thumbnail:'md' }}.
+    Створюється при першому зверненні (або заздалегідь: manage.py generate_thumbnails).
+    Порожнє поле - порожній рядок; не зображення (PDF) - URL оригіналу.
+    """
+    return thumbnail_url(field_file, size)
@@ -2,13 +2,22 @@ from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
-from django.db.models import Sum
+from django.db.models import Sum, Min, Max
 from django.urls import reverse
+from urllib.parse import urlencode
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+import datetime
 import json
+import logging
+import re
 import uuid
 
-from .models import Warehouse, Material, Transaction, Order, OrderItem, UserProfile, AuditLog
-from warehouse.services import inventory
+from .models import Warehouse, Material, Transaction, Order, OrderItem, UserProfile, AuditLog, ConstructionStage, StageLimit
+from warehouse.services import inventory, stock_events, benchmark
+from warehouse.services.low_stock import BALANCE_EXPR
+from warehouse.services.synthetic_data import SyntheticDataGenerator, purge_synthetic_data
 from warehouse.views.reports import period_report
 from warehouse.views.utils import enrich_transfers, get_warehouse_balance, work_writeoffs_qs
 
@@ -613,4 +622,2389 @@ class RegressionCriticalFlowsTests(TestCase):
         # Перевіряємо, що запис в AuditLog створено (якщо модель доступна)
         if AuditLog._meta.db_table:
             log_exists = AuditLog.objects.filter(action_type='CREATE', user=self.user).exists()
-            self.assertTrue(log_exists, "Audit log entry not found")
\ No newline at end of file
+            self.assertTrue(log_exists, "Audit log entry not found")
+
+class LowStockServiceTests(TestCase):
+    """
+    Тести для сервісу критичних залишків (low_stock_qs).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='lowstock', password='password', is_staff=True)
+        self.wh_1 = Warehouse.objects.create(name='Site A')
+        self.wh_2 = Warehouse.objects.create(name='Site B')
+        self.mat_cement = Material.objects.create(name='Cement', unit='kg', min_limit=Decimal('100.000'))
+        self.mat_sand = Material.objects.create(name='Sand', unit='t', min_limit=Decimal('10.000'))
+        self.mat_free = Material.objects.create(name='Nails', unit='pcs')  # без ліміту
+
+    def test_only_balances_below_limit_are_returned(self):
+        """1) У список потрапляють лише пари (склад, матеріал) із залишком <= min_limit."""
+        from warehouse.services.low_stock import low_stock_qs
+
+        inventory.create_incoming(self.mat_cement, self.wh_1, 50, self.user)   # 50 <= 100 -> критично
+        inventory.create_incoming(self.mat_cement, self.wh_2, 500, self.user)  # 500 > 100 -> ок
+        inventory.create_incoming(self.mat_sand, self.wh_1, 12, self.user)
+        inventory.create_writeoff(self.mat_sand, self.wh_1, 11, self.user)     # 1 <= 10 -> критично
+        inventory.create_incoming(self.mat_free, self.wh_1, 1, self.user)      # без ліміту -> ігнор
+
+        rows = list(low_stock_qs(Warehouse.objects.all()))
+        pairs = [(r['warehouse_id'], r['material_id']) for r in rows]
+
+        self.assertEqual(len(rows), 2)
+        # Ранжування: Sand (1/10 = 0.1) раніше за Cement (50/100 = 0.5)
+        self.assertEqual(pairs, [(self.wh_1.id, self.mat_sand.id), (self.wh_1.id, self.mat_cement.id)])
+        self.assertEqual(rows[0]['balance'], Decimal('1.000'))
+        self.assertEqual(rows[1]['shortage'], Decimal('50.000'))
+
+    def test_respects_warehouse_filter(self):
+        """2) Враховуються тільки передані склади."""
+        from warehouse.services.low_stock import low_stock_qs
+
+        inventory.create_incoming(self.mat_cement, self.wh_2, 5, self.user)
+        self.assertEqual(low_stock_qs(Warehouse.objects.filter(pk=self.wh_1.pk)).count(), 0)
+        self.assertEqual(low_stock_qs(Warehouse.objects.filter(pk=self.wh_2.pk)).count(), 1)
+
+    def test_manager_dashboard_shows_real_shortages(self):
+        """3) Дашборд менеджера показує реальні дефіцити, а не топ min_limit."""
+        inventory.create_incoming(self.mat_cement, self.wh_1, 20, self.user)
+        inventory.create_incoming(self.mat_sand, self.wh_1, 50, self.user)
+
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('manager_dashboard'))
+        self.assertEqual(resp.status_code, 200)
+
+        page = resp.context['critical_stock']
+        self.assertEqual(page.paginator.count, 1)
+        self.assertEqual(page.object_list[0]['material_id'], self.mat_cement.id)
+
+    def test_low_stock_pagination_keeps_status_filter(self):
+        """4) Посилання сторінок дефіцитів зберігають активний фільтр заявок ?status=."""
+        for i in range(11):
+            material = Material.objects.create(name=f'Low {i}', unit='pcs', min_limit=Decimal('10.000'))
+            inventory.create_incoming(material, self.wh_1, 1, self.user)
+
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('manager_dashboard'), {'status': 'new'})
+        self.assertContains(resp, 'href="?low_page=2&status=new"')
+
+
+class ReorderForecastTests(TestCase):
+    """
+    Тести для прогнозу дозамовлення (services.forecasting).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='forecaster', password='password', is_staff=True)
+        self.wh = Warehouse.objects.create(name='Forecast Site')
+        self.mat = Material.objects.create(name='Cement', unit='kg', min_limit=Decimal('20.000'))
+        self.today = timezone.localdate()
+
+        # 240 приходу 20 днів тому, потім по 10/день протягом останніх 14 днів -> залишок 100
+        inventory.create_incoming(self.mat, self.wh, 240, self.user, date=self.today - timezone.timedelta(days=20))
+        for days_ago in range(14):
+            inventory.create_writeoff(self.mat, self.wh, 10, self.user, date=self.today - timezone.timedelta(days=days_ago))
+
+    def test_usage_matrix_single_query(self):
+        """1) Денна витрата завантажується одним запитом у матрицю (пара x день)."""
+        from warehouse.services.forecasting import load_usage_matrix
+
+        with self.assertNumQueries(1):
+            pairs, matrix = load_usage_matrix(Warehouse.objects.all(), history_days=30, end_date=self.today)
+
+        self.assertEqual(pairs, [(self.wh.id, self.mat.id)])
+        self.assertEqual(matrix.shape, (1, 30))
+        self.assertEqual(matrix.sum(), 140.0)
+
+    def test_reorder_plan_quantities(self):
+        """2) Темп 10/день, залишок 100, ліміт 20, поставка 3 дні -> замовити через 5 днів 70 од."""
+        from warehouse.services.forecasting import compute_reorder_plan
+
+        plan = compute_reorder_plan(
+            Warehouse.objects.all(), history_days=30, window=14, lead_time=3, review_days=7, end_date=self.today
+        )
+        self.assertEqual(len(plan), 1)
+        row = plan[0]
+        self.assertEqual(row['current_stock'], Decimal('100.0'))
+        self.assertEqual(row['avg_daily_usage'], Decimal('10.0'))
+        self.assertEqual(row['days_of_cover'], Decimal('10.0'))
+        # Точка замовлення: 20 + 10*3 = 50 -> через (100-50)/10 = 5 днів
+        self.assertEqual(row['reorder_date'], self.today + timezone.timedelta(days=5))
+        # Кількість: 20 + 10*(3+7) - 50 = 70
+        self.assertEqual(row['reorder_quantity'], Decimal('70.0'))
+
+    def test_command_caches_and_view_reads(self):
+        """3) Команда зберігає прогноз, а звіт читає збережені рядки."""
+        from django.core.management import call_command
+        from io import StringIO
+        from warehouse.models import ReorderSuggestion
+
+        call_command('forecast_reorders', stdout=StringIO())
+        self.assertEqual(ReorderSuggestion.objects.count(), 1)
+
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('reorder_forecast'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['suggestions'].paginator.count, 1)
+
+    def test_negligible_rate_is_not_usage(self):
+        """4) Мізерний темп (давня витрата в EWMA) не дає покриття поза межами поля days_of_cover."""
+        from warehouse.services.forecasting import compute_reorder_plan, MAX_DAYS_OF_COVER
+
+        rare = Material.objects.create(name='Rare', unit='kg', min_limit=Decimal('20.000'))
+        inventory.create_incoming(rare, self.wh, 5, self.user, date=self.today - timezone.timedelta(days=89))
+        inventory.create_writeoff(rare, self.wh, Decimal('0.001'), self.user, date=self.today - timezone.timedelta(days=89))
+
+        plan = compute_reorder_plan(Warehouse.objects.all(), history_days=90, end_date=self.today)
+        self.assertEqual([row['material_id'] for row in plan], [self.mat.id])
+        self.assertEqual(MAX_DAYS_OF_COVER, 999999999.9)
+
+    def test_view_rejects_non_numeric_warehouse(self):
+        """5) Нечисловий ?warehouse= у звіті - 404, а не 500."""
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('reorder_forecast'), {'warehouse': 'abc'})
+        self.assertEqual(resp.status_code, 404)
+
+
+class DraftOrderGenerationTests(TestCase):
+    """
+    Тести для автоматичної генерації чернеток заявок (services.auto_orders).
+    """
+    def setUp(self):
+        from warehouse.models import Supplier, SupplierPrice
+
+        self.user = User.objects.create_user(username='autoorders', password='password', is_staff=True)
+        self.wh_1 = Warehouse.objects.create(name='Site 1')
+        self.wh_2 = Warehouse.objects.create(name='Site 2')
+        self.cement = Material.objects.create(name='Cement', unit='kg', min_limit=Decimal('100.000'))
+        self.sand = Material.objects.create(name='Sand', unit='t', min_limit=Decimal('10.000'))
+
+        self.sup_cheap = Supplier.objects.create(name='Cheap')
+        self.sup_pricey = Supplier.objects.create(name='Pricey')
+        SupplierPrice.objects.create(supplier=self.sup_cheap, material=self.cement, price=Decimal('90.00'))
+        SupplierPrice.objects.create(supplier=self.sup_pricey, material=self.cement, price=Decimal('120.00'))
+        SupplierPrice.objects.create(supplier=self.sup_pricey, material=self.sand, price=Decimal('300.00'))
+
+        inventory.create_incoming(self.cement, self.wh_1, 40, self.user)  # дефіцит 60
+        inventory.create_incoming(self.sand, self.wh_1, 4, self.user)     # дефіцит 6
+        inventory.create_incoming(self.cement, self.wh_2, 70, self.user)  # дефіцит 30
+
+    def test_drafts_grouped_by_warehouse_and_cheapest_supplier(self):
+        """1) Одна чернетка на (склад, найдешевший постачальник), з ціною постачальника."""
+        from warehouse.services.auto_orders import generate_draft_orders
+
+        result = generate_draft_orders(Warehouse.objects.all(), source='low_stock')
+        self.assertEqual(result, {'orders': 3, 'items': 3})
+
+        drafts = Order.objects.filter(status='draft')
+        self.assertEqual(drafts.count(), 3)
+
+        item = OrderItem.objects.get(order__warehouse=self.wh_1, material=self.cement)
+        self.assertEqual(item.supplier, self.sup_cheap)
+        self.assertEqual(item.supplier_price, Decimal('90.00'))
+        self.assertEqual(item.quantity, Decimal('60.000'))
+
+        # Запис аудиту посилається на свою чернетку
+        self.assertEqual(
+            set(AuditLog.objects.filter(action_type='CREATE', content_type__model='order').values_list('object_id', flat=True)),
+            set(drafts.values_list('id', flat=True))
+        )
+
+    def test_open_orders_reduce_need(self):
+        """2) Вже замовлене у відкритих заявках віднімається, повторний запуск не дублює."""
+        from warehouse.services.auto_orders import generate_draft_orders
+
+        order = Order.objects.create(warehouse=self.wh_2, status='approved', created_by=self.user)
+        OrderItem.objects.create(order=order, material=self.cement, quantity=Decimal('30.000'))
+
+        generate_draft_orders(Warehouse.objects.all(), source='low_stock')
+        self.assertFalse(OrderItem.objects.filter(order__status='draft', order__warehouse=self.wh_2).exists())
+
+        # Повторний запуск: все вже покрито чернетками
+        result = generate_draft_orders(Warehouse.objects.all(), source='low_stock')
+        self.assertEqual(result['orders'], 0)
+
+    def test_query_count_does_not_grow_with_warehouses(self):
+        """3) Кількість запитів не залежить від кількості складів."""
+        from warehouse.services.auto_orders import generate_draft_orders
+
+        for i in range(5):
+            wh = Warehouse.objects.create(name=f'Extra {i}')
+            inventory.create_incoming(self.cement, wh, 1, self.user)
+
+        # 7 запитів + SAVEPOINT/RELEASE атомарного блоку, незалежно від кількості складів
+        # (ContentType заявки - з кешу менеджера, як після першого запиту в процесі)
+        from django.contrib.contenttypes.models import ContentType
+        ContentType.objects.get_for_model(Order)
+        with self.assertNumQueries(9):
+            result = generate_draft_orders(Warehouse.objects.all(), source='both')
+        self.assertEqual(result['orders'], 8)
+
+
+class TransferOptimizerTests(TestCase):
+    """
+    Тести для пропозицій переміщень між складами (services.transfer_optimizer).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='balancer', password='password', is_staff=True)
+        self.wh_rich = Warehouse.objects.create(name='Rich Site')
+        self.wh_poor = Warehouse.objects.create(name='Poor Site')
+        self.cement = Material.objects.create(name='Cement', unit='kg', min_limit=Decimal('100.000'))
+
+        inventory.create_incoming(self.cement, self.wh_rich, 250, self.user)  # надлишок 150
+        inventory.create_incoming(self.cement, self.wh_poor, 30, self.user)   # дефіцит 70
+
+    def test_surplus_covers_deficit_with_open_demand(self):
+        """1) Надлишок закриває дефіцит з урахуванням min_limit і незакритих заявок."""
+        from warehouse.services.transfer_optimizer import suggest_transfers
+
+        order = Order.objects.create(warehouse=self.wh_poor, status='new', created_by=self.user)
+        OrderItem.objects.create(order=order, material=self.cement, quantity=Decimal('20.000'))
+
+        suggestions = suggest_transfers(Warehouse.objects.all())
+        self.assertEqual(len(suggestions), 1)
+        s = suggestions[0]
+        self.assertEqual((s['source'], s['target'], s['material']), (self.wh_rich, self.wh_poor, self.cement))
+        self.assertEqual(s['quantity'], Decimal('90.000'))
+
+    def test_inbound_orders_reduce_deficit_but_not_source_stock(self):
+        """2) Товар в дорозі зменшує дефіцит, але не може бути джерелом переміщення."""
+        from warehouse.services.transfer_optimizer import suggest_transfers
+
+        order = Order.objects.create(warehouse=self.wh_poor, status='transit', created_by=self.user)
+        OrderItem.objects.create(order=order, material=self.cement, quantity=Decimal('50.000'))
+        # Джерело має 100 в дорозі, але фізично лише 250
+        order_rich = Order.objects.create(warehouse=self.wh_rich, status='purchasing', created_by=self.user)
+        OrderItem.objects.create(order=order_rich, material=self.cement, quantity=Decimal('100.000'))
+
+        suggestions = suggest_transfers(Warehouse.objects.all())
+        self.assertEqual(len(suggestions), 1)
+        self.assertEqual(suggestions[0]['quantity'], Decimal('20.000'))
+
+    def test_bulk_approve_view_creates_transfers(self):
+        """3) Пакетне проведення вибраних пропозицій створює пари OUT/IN."""
+        self.client.force_login(self.user)
+        url = reverse('transfer_suggestions')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        key = response.context['suggestions'][0]['key']
+
+        response = self.client.post(url, {'selected': [key]})
+        self.assertRedirects(response, reverse('transfer_journal'), fetch_redirect_response=False)
+
+        self.assertEqual(get_warehouse_balance(self.wh_poor)[self.cement], Decimal('100.000'))
+        self.assertEqual(get_warehouse_balance(self.wh_rich)[self.cement], Decimal('180.000'))
+
+
+class SupplierPriceIndexTests(TestCase):
+    """
+    Тести для індексу цін постачальників і розділення заявок (services.supplier_prices / services.orders).
+    """
+    def setUp(self):
+        from warehouse.models import Supplier, SupplierPrice
+
+        self.user = User.objects.create_user(username='splitter', password='password', is_staff=True)
+        self.wh = Warehouse.objects.create(name='Split Site')
+        self.cement = Material.objects.create(name='Cement', unit='kg')
+        self.sand = Material.objects.create(name='Sand', unit='t')
+        self.sup_a = Supplier.objects.create(name='Supplier A')
+        self.sup_b = Supplier.objects.create(name='Supplier B')
+        SupplierPrice.objects.create(supplier=self.sup_a, material=self.cement, price=Decimal('95.00'))
+        SupplierPrice.objects.create(supplier=self.sup_b, material=self.cement, price=Decimal('90.00'))
+        SupplierPrice.objects.create(supplier=self.sup_a, material=self.sand, price=Decimal('300.00'))
+
+        self.order = Order.objects.create(warehouse=self.wh, created_by=self.user, note='Base')
+        self.item_cement = OrderItem.objects.create(order=self.order, material=self.cement, quantity=Decimal('10.000'))
+        self.item_sand = OrderItem.objects.create(order=self.order, material=self.sand, quantity=Decimal('2.000'))
+
+    def test_index_best_and_selected_price(self):
+        """1) Один запит на індекс; далі найкраща і конкретна ціна - з пам'яті."""
+        from warehouse.services.supplier_prices import SupplierPriceIndex
+
+        with self.assertNumQueries(1):
+            index = SupplierPriceIndex.for_materials([self.cement.id, self.sand.id])
+            self.assertEqual(index.best(self.cement.id), (self.sup_b.id, Decimal('90.00')))
+            self.assertEqual(index.price(self.cement.id, self.sup_a.id), Decimal('95.00'))
+            self.assertIsNone(index.price(self.sand.id, self.sup_b.id))
+
+    def test_split_assigns_supplier_prices(self):
+        """2) Перенесені позиції отримують постачальника і його ціну; повністю розділена заявка закривається."""
+        from warehouse.services.orders import split_order
+
+        new_orders, moved = split_order(self.order, {
+            self.item_cement.id: f'sup_{self.sup_a.id}',
+            self.item_sand.id: 'manual_1',
+        })
+        self.assertEqual((len(new_orders), moved), (2, 2))
+
+        self.item_cement.refresh_from_db()
+        self.assertEqual(self.item_cement.supplier, self.sup_a)
+        self.assertEqual(self.item_cement.supplier_price, Decimal('95.00'))
+        self.assertNotEqual(self.item_cement.order_id, self.order.id)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'rejected')
+        self.assertTrue(AuditLog.objects.filter(
+            action_type='ORDER_STATUS', object_id=self.order.id, old_value='new', new_value='rejected'
+        ).exists())
+
+    def test_split_view_query_count_is_constant(self):
+        """3) View розділення не робить запитів на кожну позицію."""
+        for i in range(10):
+            mat = Material.objects.create(name=f'Extra {i}', unit='шт')
+            OrderItem.objects.create(order=self.order, material=mat, quantity=Decimal('1.000'))
+
+        self.client.force_login(self.user)
+        url = reverse('split_order', args=[self.order.id])
+        payload = {f'item_{item_id}': f'sup_{self.sup_b.id}' for item_id in self.order.items.values_list('id', flat=True)}
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, payload)
+        self.assertEqual(response.status_code, 302)
+        self.assertLess(len(ctx.captured_queries), 25)  # з переходом статусу і записом в аудит
+        self.assertEqual(Order.objects.filter(note__startswith='Розділено').count(), 1)
+        self.assertEqual(self.order.items.count(), 0)
+
+    def test_full_split_refused_for_order_in_transit(self):
+        """4) Заявку в дорозі не можна закрити розділенням: нічого не переноситься."""
+        from warehouse.services.order_workflow import TransitionError
+        from warehouse.services.orders import split_order
+
+        Order.objects.filter(pk=self.order.pk).update(status='transit')
+        self.order.refresh_from_db()
+        with self.assertRaises(TransitionError):
+            split_order(self.order, {self.item_cement.id: 'manual_1', self.item_sand.id: 'manual_1'})
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'transit')
+        self.assertEqual(self.order.items.count(), 2)
+        self.assertFalse(Order.objects.filter(note__startswith='Розділено').exists())
+
+        # Часткове розділення статус не змінює і дозволене
+        new_orders, moved = split_order(self.order, {self.item_cement.id: 'manual_1'})
+        self.assertEqual(moved, 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'transit')
+
+
+class StockCheckContextTests(TestCase):
+    """
+    Тести для спільного контексту перевірки залишку (inventory.StockCheck) у формі та сервісі.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='stockcheck', password='password', is_staff=True)
+        self.wh = Warehouse.objects.create(name='Check Site')
+        self.material = Material.objects.create(name='Cement', unit='kg')
+        inventory.create_incoming(self.material, self.wh, 50, self.user)
+
+    def _form(self, quantity):
+        from warehouse.forms import TransactionForm
+        return TransactionForm({
+            'transaction_type': 'OUT',
+            'warehouse': self.wh.id,
+            'material': self.material.id,
+            'quantity': quantity,
+        })
+
+    def test_context_tracks_consumption(self):
+        """1) Після списання контекст знає новий залишок і відхиляє перевищення."""
+        from django.db import transaction
+
+        with transaction.atomic():
+            check = inventory.StockCheck(self.wh, self.material)
+            inventory.create_writeoff(self.material, self.wh, 30, self.user, stock_check=check)
+            self.assertEqual(check.available, Decimal('20.000'))
+            with self.assertRaises(inventory.InsufficientStockError):
+                inventory.create_writeoff(self.material, self.wh, 25, self.user, stock_check=check)
+
+    def test_form_and_service_share_single_balance_read(self):
+        """2) Форма і create_writeoff в одній транзакції читають залишок один раз."""
+        from django.db import transaction
+
+        form = self._form('10')
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                self.assertTrue(form.is_valid())
+                inventory.create_writeoff(
+                    self.material, self.wh, form.cleaned_data['quantity'], self.user,
+                    stock_check=form.stock_check
+                )
+        balance_reads = [q for q in ctx.captured_queries if 'SUM(' in q['sql'].upper()]
+        self.assertEqual(len(balance_reads), 1)
+
+    def test_form_rejects_overdraw(self):
+        """3) Перевищення залишку - помилка валідації форми з доступною кількістю."""
+        form = self._form('60')
+        self.assertFalse(form.is_valid())
+        self.assertIn('Доступно: 50.000', str(form.non_field_errors()))
+
+
+class MaterialAutocompleteTests(TestCase):
+    """
+    Тести для autocomplete-віджета матеріалу та in_bulk валідації formset (forms.MaterialItemFormSet).
+    """
+    def setUp(self):
+        self.materials = [Material.objects.create(name=f'Material {i:02d}', unit='шт') for i in range(30)]
+
+    def _formset_data(self, material_ids):
+        data = {
+            'items-TOTAL_FORMS': str(len(material_ids)),
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+        }
+        for i, mat_id in enumerate(material_ids):
+            data[f'items-{i}-material'] = str(mat_id)
+            data[f'items-{i}-quantity'] = '1'
+        return data
+
+    def test_widget_renders_only_selected_option(self):
+        """1) Рендериться лише порожня і вибрана опції, а не весь каталог."""
+        from warehouse.forms import TransactionForm
+
+        form = TransactionForm(initial={'material': self.materials[5].id})
+        html = str(form['material'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn('Material 05', html)
+        self.assertIn('data-ajax-url', html)
+
+    def test_formset_resolves_materials_in_one_query(self):
+        """2) Валідація formset резолвить усі матеріали одним in_bulk."""
+        from warehouse.forms import OrderItemFormSet
+
+        formset = OrderItemFormSet(self._formset_data([m.id for m in self.materials[:10]]), instance=Order())
+        with self.assertNumQueries(1):
+            self.assertTrue(formset.is_valid())
+        self.assertEqual(formset.forms[3].cleaned_data['material'], self.materials[3])
+
+    def test_formset_rejects_unknown_material(self):
+        """3) Неіснуючий id - помилка invalid_choice у відповідному рядку."""
+        from warehouse.forms import OrderItemFormSet
+
+        formset = OrderItemFormSet(self._formset_data([self.materials[0].id, 999999]), instance=Order())
+        self.assertFalse(formset.is_valid())
+        self.assertIn('material', formset.forms[1].errors)
+
+
+class MaterialSearchTests(TestCase):
+    """
+    Тести для пошуку матеріалів (services.material_search, ajax_materials).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='password')
+        self.cement = Material.objects.create(name='Цемент М500', article='CEM-500', unit='кг')
+        self.cement_bag = Material.objects.create(name='Мішок для цементу', article='BAG-1', unit='шт')
+        self.sand = Material.objects.create(name='Пісок річковий', article='SND', unit='т')
+        self.exact = Material.objects.create(name='Арматура', article='ЦЕМ', unit='т')
+
+    def test_search_name_is_normalized(self):
+        """1) search_name: нижній регістр, транслітерація, артикул; оновлюється при зміні назви."""
+        self.assertEqual(self.cement.search_name, 'tsement m500 cem 500')
+
+        self.sand.name = 'Пісок кар\'єрний'
+        self.sand.save(update_fields=['name'])
+        self.sand.refresh_from_db()
+        self.assertEqual(self.sand.search_name, 'pisok kariernyi snd')
+
+    def test_ranking_exact_article_then_prefix_then_word(self):
+        """2) Точний артикул першим, далі префікс назви, далі префікс слова; кирилиця = латиниця; 1 символ - префікс назви."""
+        from warehouse.services.material_search import search_materials
+
+        ids = [item['id'] for item in search_materials('цем')]
+        self.assertEqual(ids, [self.exact.id, self.cement.id, self.cement_bag.id])
+
+        latin_ids = [item['id'] for item in search_materials('tsem')]
+        self.assertEqual(latin_ids[0], self.cement.id)
+        self.assertIn(self.cement_bag.id, latin_ids)
+
+        # Один символ - лише префікс назви (індексований шлях); префікс слова - від двох
+        self.assertEqual([item['id'] for item in search_materials('м')], [self.cement_bag.id])
+        self.assertEqual([item['id'] for item in search_materials('м5')], [self.cement.id])
+
+    def test_ajax_endpoint_sees_new_materials(self):
+        """3) ajax_materials повертає ранжовані items; новий матеріал видно одразу (індекс скидається)."""
+        self.client.force_login(self.user)
+        url = reverse('ajax_materials')
+
+        response = self.client.get(url, {'q': 'пісок'})
+        self.assertEqual([item['id'] for item in response.json()['items']], [self.sand.id])
+
+        fresh = Material.objects.create(name='Пісок кварцовий', unit='т')
+        response = self.client.get(url, {'q': 'pisok k'})
+        self.assertEqual([item['id'] for item in response.json()['items']], [fresh.id])
+
+
+class AsyncAjaxTests(TestCase):
+    """
+    Тести для async AJAX endpoints (views.ajax_async): ті самі відповіді, що й sync-версії.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='async_user', password='password')
+        self.wh = Warehouse.objects.create(name='Async Склад')
+        self.other_wh = Warehouse.objects.create(name='Чужий склад')
+        self.user.profile.warehouses.add(self.wh)
+        self.cement = Material.objects.create(name='Цемент', unit='кг')
+        self.sand = Material.objects.create(name='Пісок', unit='т')
+        Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=self.cement, quantity=Decimal('10.000'))
+        Transaction.objects.create(transaction_type='OUT', warehouse=self.wh, material=self.cement, quantity=Decimal('4.000'))
+        Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=self.sand, quantity=Decimal('2.000'))
+        ConstructionStage.objects.create(warehouse=self.wh, name='Фундамент')
+        self.client.force_login(self.user)
+
+    def test_stock_matches_sync_endpoint(self):
+        """1) Залишки async == sync; чужий склад - 404."""
+        sync_data = self.client.get(reverse('ajax_warehouse_stock', args=[self.wh.id])).json()
+        async_data = self.client.get(reverse('ajax_warehouse_stock_async', args=[self.wh.id])).json()
+        # qty порівнюємо як Decimal: sync-версія на SQLite віддає '6' замість '6.000'
+        as_decimal = lambda data: [(i['material_id'], i['name'], i['unit'], Decimal(i['qty'])) for i in data['items']]
+        self.assertEqual(as_decimal(async_data), as_decimal(sync_data))
+        self.assertEqual([item['qty'] for item in async_data['items']], ['2.000', '6.000'])
+
+        response = self.client.get(reverse('ajax_warehouse_stock_async', args=[self.other_wh.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_materials_and_stages_match_sync(self):
+        """2) Пошук матеріалів і етапи: async == sync; без доступу до складу - порожній список."""
+        for query in ('цем', 'pis', ''):
+            self.assertEqual(
+                self.client.get(reverse('ajax_materials_async'), {'q': query}).json(),
+                self.client.get(reverse('ajax_materials'), {'q': query}).json()
+            )
+
+        stages = self.client.get(reverse('ajax_load_stages_async'), {'warehouse_id': self.wh.id}).json()
+        self.assertEqual(stages, self.client.get(reverse('ajax_load_stages'), {'warehouse_id': self.wh.id}).json())
+        self.assertEqual([s['name'] for s in stages], ['Фундамент'])
+        self.assertEqual(self.client.get(reverse('ajax_load_stages_async'), {'warehouse_id': self.other_wh.id}).json(), [])
+
+    def test_duplicates_and_rate_limit(self):
+        """3) Перевірка дублікатів async == sync; async rate limit повертає 429."""
+        order = Order.objects.create(warehouse=self.wh, created_by=self.user, status='new')
+        OrderItem.objects.create(order=order, material=self.cement, quantity=Decimal('1.000'))
+        OrderItem.objects.create(order=order, material=self.sand, quantity=Decimal('1.000'))
+
+        params = {'warehouse': self.wh.id}
+        async_data = self.client.get(reverse('check_order_duplicates_async'), params).json()
+        self.assertEqual(async_data, self.client.get(reverse('check_order_duplicates'), params).json())
+        self.assertEqual(async_data['orders'][0]['items'], 'Цемент, Пісок')
+
+        cache.clear()
+        statuses = [self.client.get(reverse('check_order_duplicates_async'), params).status_code for _ in range(31)]
+        self.assertEqual(statuses.count(429), 1)
+
+
+class StockEventsTests(TestCase):
+    """
+    Тести для каналу змін залишків (services.stock_events, SSE stock_events_stream).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='sse_user', password='password')
+        self.wh = Warehouse.objects.create(name='SSE Склад')
+        self.other_wh = Warehouse.objects.create(name='SSE Інший')
+        self.user.profile.warehouses.add(self.wh)
+        self.mat = Material.objects.create(name='Цемент SSE', unit='кг')
+
+    def tearDown(self):
+        stock_events.reset_broker()
+
+    def _reload_urls(self):
+        # Маршрут SSE реєструється при імпорті urls.py залежно від ASYNC_AJAX
+        import importlib
+        import sys
+        from django.conf import settings
+        from django.urls import clear_url_caches
+        from warehouse import urls as warehouse_urls
+
+        importlib.reload(warehouse_urls)
+        # include() кешує розібрані маршрути в кореневому URLconf - перечитуємо і його
+        importlib.reload(sys.modules[settings.ROOT_URLCONF])
+        clear_url_caches()
+
+    def test_inventory_publishes_signed_deltas_on_commit(self):
+        """1) Сервіси inventory публікують дельти тільки після коміту; OUT - зі знаком мінус."""
+        published = []
+
+        class RecordingBroker(stock_events.LocalBroker):
+            def publish(self, events):
+                published.extend(events)
+                super().publish(events)
+
+        stock_events._broker = RecordingBroker()
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.create_incoming(self.mat, self.wh, '10', self.user)
+            inventory.create_transfer(self.user, self.mat, self.wh, self.other_wh, '4')
+            self.assertEqual(published, [])
+
+        self.assertEqual(
+            [(e['warehouse_id'], e['delta']) for e in published],
+            [(self.wh.id, Decimal('10.000')), (self.wh.id, Decimal('-4.000')), (self.other_wh.id, Decimal('4.000'))]
+        )
+
+    async def test_local_broker_delivers_to_warehouse_subscribers(self):
+        """2) LocalBroker: подія з іншого потоку доходить до підписника свого складу; чужий склад - ні."""
+        import asyncio
+
+        broker = stock_events.LocalBroker()
+        listener = broker.listen(self.wh.id, idle_timeout=0.05)
+        self.assertEqual(await anext(listener), [])  # підписка активна, keep-alive
+
+        event = stock_events.make_event(1, self.wh.id, self.mat.id, 'LOSS', Decimal('2.000'))
+        other = stock_events.make_event(2, self.other_wh.id, self.mat.id, 'IN', Decimal('5.000'))
+        await asyncio.to_thread(broker.publish, [event, other])
+
+        self.assertEqual(await anext(listener), [event])
+        self.assertEqual(event['delta'], Decimal('-2.000'))
+        await listener.aclose()
+        self.assertEqual(broker._subscriptions[self.wh.id], set())
+
+    async def test_sse_replays_from_last_event_id(self):
+        """3) SSE (db-брокер): після Last-Event-ID приходять сумарні дельти; чужий склад - 404."""
+        first = await Transaction.objects.acreate(
+            transaction_type='IN', warehouse=self.wh, material=self.mat, quantity=Decimal('10.000')
+        )
+        await Transaction.objects.acreate(transaction_type='OUT', warehouse=self.wh, material=self.mat, quantity=Decimal('3.000'))
+        last = await Transaction.objects.acreate(
+            transaction_type='LOSS', warehouse=self.wh, material=self.mat, quantity=Decimal('1.500')
+        )
+        await self.async_client.aforce_login(self.user)
+
+        with self.settings(STOCK_EVENTS_BACKEND='db', ASYNC_AJAX=True):
+            self._reload_urls()
+            self.addCleanup(self._reload_urls)
+            stock_events.reset_broker()
+            url = reverse('ajax_warehouse_stock_events', args=[self.wh.id])
+            response = await self.async_client.get(url, headers={'Last-Event-ID': str(first.id)})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+            stream = aiter(response.streaming_content)
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+            message = (await anext(stream)).decode()
+            await stream.aclose()
+
+            response = await self.async_client.get(reverse('ajax_warehouse_stock_events', args=[self.other_wh.id]))
+            self.assertEqual(response.status_code, 404)
+
+        self.assertIn(f'id: {last.id}\nevent: stock\n', message)
+        payload = json.loads(message.split('data: ', 1)[1])
+        self.assertEqual(payload['deltas'], [{'material_id': self.mat.id, 'delta': '-4.500'}])
+
+    async def test_db_broker_delivers_lower_id_committed_later(self):
+        """5) db-брокер: менший id, закомічений після більшого, доставляється; пропуск без коміту - resync."""
+        broker = stock_events.DatabaseBroker()
+        broker.POLL_INTERVAL = 0.01
+        base = await Transaction.objects.acreate(
+            transaction_type='IN', warehouse=self.wh, material=self.mat, quantity=Decimal('10.000')
+        )
+        late = await Transaction.objects.acreate(
+            transaction_type='OUT', warehouse=self.wh, material=self.mat, quantity=Decimal('1.000')
+        )
+        after = await Transaction.objects.acreate(
+            transaction_type='OUT', warehouse=self.wh, material=self.mat, quantity=Decimal('2.000')
+        )
+        late_id = late.id
+        await late.adelete()  # ще не закомічена транзакція
+
+        listener = broker.listen(self.wh.id, last_event_id=(base.id, []), idle_timeout=1)
+        batch = await anext(listener)
+        self.assertEqual([event['id'] for event in batch], [after.id])
+        self.assertEqual(batch.position, f'{after.id}:{late_id}')
+
+        await Transaction.objects.acreate(
+            id=late_id, transaction_type='OUT', warehouse=self.wh, material=self.mat, quantity=Decimal('1.000')
+        )
+        batch = await anext(listener)
+        self.assertEqual([(event['id'], event['delta']) for event in batch], [(late_id, Decimal('-1.000'))])
+        self.assertEqual(batch.position, str(after.id))
+        await listener.aclose()
+
+        # Відновлення з Last-Event-ID з пропуском, який так і не з'явився (відкат)
+        self.assertEqual(stock_events.parse_position(f'{after.id}:0'), (after.id, [0]))
+        broker.GAP_TIMEOUT = 0
+        listener = broker.listen(self.wh.id, last_event_id=(after.id, [0]), idle_timeout=1)
+        self.assertIs(await anext(listener), stock_events.RESYNC)
+        await listener.aclose()
+
+    def test_no_stream_under_wsgi(self):
+        """4) ASYNC_AJAX=False (WSGI): SSE-маршруту немає, форми не підписуються (опитування)."""
+        from django.urls import NoReverseMatch
+
+        with self.settings(ASYNC_AJAX=False):
+            self._reload_urls()
+            self.addCleanup(self._reload_urls)
+            with self.assertRaises(NoReverseMatch):
+                reverse('ajax_warehouse_stock_events', args=[self.wh.id])
+            self.assertEqual(self.client.get(f'/ajax/warehouse/{self.wh.id}/stock/events/').status_code, 404)
+
+            self.client.force_login(self.user)
+            for name in ('add_transaction', 'create_transfer'):
+                response = self.client.get(reverse(name))
+                self.assertContains(response, 'data-stock-validate')
+                self.assertNotContains(response, 'data-stock-validate data-stock-events')
+
+        with self.settings(ASYNC_AJAX=True):
+            self.assertContains(self.client.get(reverse('add_transaction')), 'data-stock-validate data-stock-events')
+
+
+class QueryInstrumentationTests(TestCase):
+    """
+    Тести для QueryInstrumentationMiddleware (Server-Timing, дублікати SQL, бюджети).
+    """
+    def setUp(self):
+        from django.conf import settings
+
+        self.middleware = list(settings.MIDDLEWARE)
+        if 'warehouse.middleware.QueryInstrumentationMiddleware' not in self.middleware:
+            self.middleware.insert(2, 'warehouse.middleware.QueryInstrumentationMiddleware')
+        cache.clear()  # лічильники rate_limit з попередніх тестів
+
+        self.user = User.objects.create_superuser(username='metrics_admin', password='password')
+        self.wh = Warehouse.objects.create(name='Metrics Склад')
+        stage = ConstructionStage.objects.create(warehouse=self.wh, name='Metrics етап')
+        for i in range(3):
+            material = Material.objects.create(name=f'Мат {i}', unit='шт')
+            order = Order.objects.create(warehouse=self.wh, created_by=self.user, status='new')
+            OrderItem.objects.create(order=order, material=material, quantity=Decimal('1.000'))
+            StageLimit.objects.create(stage=stage, material=material, planned_quantity=Decimal('10.000'))
+        self.client.force_login(self.user)
+
+    def _server_timing(self, response):
+        return dict(
+            (part.split(';', 1)[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_reports_sql_and_templates(self):
+        """1) Server-Timing містить кількість SQL (як CaptureQueriesContext) і час рендеру шаблону."""
+        with self.settings(MIDDLEWARE=self.middleware):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('order_list'))
+
+        self.assertEqual(response.status_code, 200)
+        timing = self._server_timing(response)
+        self.assertIn(f'desc="SQL {len(ctx.captured_queries)}"', timing['sql'])
+        self.assertRegex(timing['tpl'], r'dur=\d+\.\d')
+        self.assertIn('total', timing)
+
+    def test_duplicate_fingerprints_are_logged(self):
+        """2) N+1 (однаковий SQL з різними id) рахується як дублікати; рядок метрик у логері warehouse."""
+        with self.settings(MIDDLEWARE=self.middleware):
+            with self.assertLogs('warehouse', level='INFO') as logs:
+                response = self.client.get(reverse('project_dashboard'))
+
+        self.assertIn('duplicate SQL', response['Server-Timing'])
+        line = next(message for message in logs.output if 'request_metrics' in message)
+        self.assertIn('view=project_dashboard', line)
+        duplicates = int(re.search(r'sql_duplicates=(\d+)', line).group(1))
+        self.assertGreaterEqual(duplicates, 2)  # SUM факту на кожен з 3 лімітів етапу
+
+    def test_budget_exceeded_warns_with_top_duplicates(self):
+        """3) Перевищення бюджету view - WARNING з відбитками найчастіших запитів."""
+        from warehouse.middleware import sql_fingerprint
+
+        with self.settings(MIDDLEWARE=self.middleware, QUERY_BUDGETS={'check_order_duplicates': 2}):
+            with self.assertLogs('warehouse', level='WARNING') as logs:
+                self.client.get(reverse('check_order_duplicates'), {'warehouse': self.wh.id})
+
+        self.assertIn('query_budget_exceeded view=check_order_duplicates', logs.output[0])
+        self.assertIn('budget=2', logs.output[0])
+        self.assertEqual(
+            sql_fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'a\'')[0],
+            sql_fingerprint('SELECT * FROM t WHERE id IN (%s) AND name = \'b\'')[0]
+        )
+
+
+def seed_query_budget_dataset(warehouses=4, materials=40, orders=12, items_per_order=4, prefix='budget'):
+    """
+    Середній набір даних для бюджетів запитів (bulk_create, без сигналів і сервісів).
+    Розмір підібрано так, щоб цикл "по матеріалу" або "по складу" давав десятки зайвих запитів.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from warehouse.models import Category, Supplier, SupplierPrice, StageLimit, Stocktake, StocktakeLine
+    from warehouse.services.material_search import build_search_name
+
+    admin = User.objects.create_superuser(username=f'{prefix}_admin', password='password')
+    foreman = User.objects.create_user(username=f'{prefix}_foreman', password='password')
+
+    whs = Warehouse.objects.bulk_create([Warehouse(name=f'Об\'єкт {i}', budget_limit=Decimal('100000')) for i in range(warehouses)])
+    foreman.profile.warehouses.add(*whs[:2])
+    categories = Category.objects.bulk_create([Category(name=f'Категорія {i}') for i in range(4)])
+    mats = Material.objects.bulk_create([
+        Material(
+            name=f'Матеріал {i}', article=f'{prefix}-{i:03d}', unit='шт', category=categories[i % 4],
+            current_avg_price=Decimal('10.00') + i, min_limit=Decimal('5.000'),
+            search_name=build_search_name(f'Матеріал {i}', f'{prefix}-{i:03d}')
+        )
+        for i in range(materials)
+    ])
+    suppliers = Supplier.objects.bulk_create([Supplier(name=f'Постачальник {i}') for i in range(3)])
+    SupplierPrice.objects.bulk_create([
+        SupplierPrice(supplier=sup, material=mat, price=Decimal('9.00') + n)
+        for n, sup in enumerate(suppliers) for mat in mats
+    ])
+    stages = ConstructionStage.objects.bulk_create([
+        ConstructionStage(warehouse=wh, name=f'Етап {n}') for wh in whs for n in range(3)
+    ])
+    StageLimit.objects.bulk_create([
+        StageLimit(stage=stage, material=mat, planned_quantity=Decimal('50.000'))
+        for stage in stages for mat in mats[:5]
+    ])
+
+    today = timezone.now().date()
+    txns = []
+    for w, wh in enumerate(whs):
+        for m, mat in enumerate(mats):
+            day = today - timezone.timedelta(days=(w + m) % 20)
+            txns.append(Transaction(transaction_type='IN', warehouse=wh, material=mat, quantity=Decimal('100.000'),
+                                    price=mat.current_avg_price, date=day, created_by=admin))
+            txns.append(Transaction(transaction_type='OUT', warehouse=wh, material=mat, quantity=Decimal('30.000'),
+                                    price=mat.current_avg_price, date=day, created_by=foreman, stage=stages[w * 3]))
+            if m % 5 == 0:
+                txns.append(Transaction(transaction_type='LOSS', warehouse=wh, material=mat, quantity=Decimal('2.000'),
+                                        price=mat.current_avg_price, date=day, created_by=foreman))
+    for mat in mats[:10]:
+        group = uuid.uuid4()
+        txns.append(Transaction(transaction_type='OUT', warehouse=whs[0], material=mat, quantity=Decimal('5.000'),
+                                date=today, created_by=admin, transfer_group_id=group))
+        txns.append(Transaction(transaction_type='IN', warehouse=whs[1], material=mat, quantity=Decimal('5.000'),
+                                date=today, created_by=admin, transfer_group_id=group))
+    Transaction.objects.bulk_create(txns)
+
+    statuses = ['new', 'rfq', 'approved', 'purchasing', 'transit', 'completed']
+    order_objs = Order.objects.bulk_create([
+        Order(warehouse=whs[i % warehouses], created_by=foreman if i % 2 else admin, status=statuses[i % len(statuses)],
+              source_warehouse=whs[(i + 1) % warehouses] if i % 4 == 0 else None, expected_date=today)
+        for i in range(orders)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, material=mats[(o * items_per_order + n) % materials], quantity=Decimal('10.000'),
+                  supplier=suppliers[n % 3], supplier_price=Decimal('9.50'),
+                  quantity_fact=Decimal('10.000') if order.status == 'completed' else Decimal('0.000'))
+        for o, order in enumerate(order_objs) for n in range(items_per_order)
+    ])
+    order_type = ContentType.objects.get_for_model(Order)
+    AuditLog.objects.bulk_create([
+        AuditLog(user=admin, action_type='ORDER_STATUS', content_type=order_type, object_id=order.id, new_value=order.status)
+        for order in order_objs
+    ])
+    stocktake = Stocktake.objects.create(warehouse=whs[0], created_by=admin)
+    StocktakeLine.objects.bulk_create([
+        StocktakeLine(stocktake=stocktake, material=mat, system_quantity=Decimal('70.000'),
+                      counted_quantity=Decimal('69.000') if m % 2 else None)
+        for m, mat in enumerate(mats)
+    ])
+
+    return {
+        'admin': admin, 'foreman': foreman, 'warehouses': whs, 'materials': mats,
+        'orders': order_objs, 'transactions': Transaction.objects.order_by('id'), 'stocktake': stocktake,
+    }
+
+
+class QueryBudgetMixin:
+    """
+    assertQueryBudget: викликає func і падає, якщо SQL-запитів більше за бюджет.
+    У повідомленні - найчастіші запити за відбитком (як у QueryInstrumentationMiddleware), тобто джерело N+1.
+    """
+    def assertQueryBudget(self, budget, func, *args, label='', **kwargs):
+        from collections import Counter
+        from warehouse.middleware import sql_fingerprint
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args, **kwargs)
+
+        count = len(ctx.captured_queries)
+        if count > budget:
+            counter = Counter(sql_fingerprint(query['sql'])[1] for query in ctx.captured_queries)
+            top = '\n'.join(f'  {n}x {sql[:300]}' for sql, n in counter.most_common(5))
+            self.fail(f"{label}: {count} SQL-запитів > бюджет {budget}. Найчастіші:\n{top}")
+        return result
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Бюджети SQL-запитів для кожного URL warehouse/urls.py на середньому наборі даних.
+    Бюджет - стеля, що не залежить від кількості матеріалів/складів/заявок:
+    цикл із запитом на кожен об'єкт його гарантовано перевищить.
+    """
+    # url name -> (бюджет, роль, kwargs). kwargs - ключі в self.objects: 'order', 'warehouse', ...
+    BUDGETS = {
+        'home': (4, 'admin', {}),
+        'index': (12, 'foreman', {}),
+        'check_order_duplicates': (6, 'admin', {}),
+        'ajax_load_stages': (5, 'admin', {}),
+        'ajax_warehouse_stock_legacy': (8, 'admin', {}),
+        'ajax_warehouse_stock': (8, 'admin', {'warehouse_id': 'warehouse'}),
+        'ajax_materials': (6, 'admin', {}),
+        'check_order_duplicates_async': (6, 'admin', {}),
+        'ajax_load_stages_async': (5, 'admin', {}),
+        'ajax_warehouse_stock_async': (6, 'admin', {'warehouse_id': 'warehouse'}),
+        'ajax_materials_async': (5, 'admin', {}),
+        'manager_dashboard': (14, 'admin', {}),
+        'order_list': (9, 'admin', {}),
+        'manager_order_detail': (11, 'admin', {'pk': 'order'}),
+        'create_order': (6, 'admin', {}),
+        'edit_order': (9, 'admin', {'pk': 'order'}),
+        'delete_order': (5, 'admin', {'pk': 'order'}),
+        'manager_process_order': (8, 'admin', {'pk': 'order'}),
+        'order_approve': (8, 'admin', {'pk': 'order'}),
+        'order_reject': (8, 'admin', {'pk': 'order'}),
+        'split_order': (11, 'admin', {'pk': 'order'}),
+        'transfer_suggestions': (7, 'admin', {}),
+        'import_data': (7, 'admin', {}),
+        'stocktake_list': (8, 'admin', {}),
+        'stocktake_detail': (8, 'admin', {'pk': 'stocktake'}),
+        'logistics_monitor': (11, 'admin', {}),
+        'logistics_dashboard': (11, 'admin', {}),
+        'mark_order_shipped': (5, 'admin', {'pk': 'order'}),
+        'bulk_order_transition': (4, 'admin', {}),
+        'ingest_transactions_api': (4, 'admin', {}),
+        'confirm_receipt': (6, 'admin', {'pk': 'order'}),
+        'warehouse_detail': (10, 'admin', {'pk': 'warehouse'}),
+        'transaction_detail': (10, 'admin', {'pk': 'transaction'}),
+        'add_transaction': (6, 'admin', {}),
+        'create_transfer': (10, 'admin', {}),
+        'add_transfer': (10, 'admin', {}),
+        'foreman_storage': (12, 'foreman', {}),
+        'foreman_order_detail': (11, 'foreman', {'pk': 'order'}),
+        'writeoff_history': (6, 'foreman', {}),
+        'delivery_history': (6, 'foreman', {}),
+        'material_list': (7, 'admin', {}),
+        'material_detail': (9, 'admin', {'pk': 'material'}),
+        'reports_dashboard': (9, 'admin', {}),
+        'stock_balance_report': (8, 'admin', {}),
+        'export_stock_report': (8, 'admin', {}),
+        'period_report': (9, 'admin', {}),
+        'writeoff_report': (7, 'admin', {}),
+        'planning_report': (6, 'admin', {}),
+        'reorder_forecast': (8, 'admin', {}),
+        'suppliers_rating': (6, 'admin', {}),
+        'financial_report': (6, 'admin', {}),
+        'problem_areas': (13, 'admin', {}),
+        'objects_comparison': (7, 'admin', {}),
+        'transfer_journal': (6, 'admin', {}),
+        'transfer_analytics': (8, 'admin', {}),
+        'movement_history': (6, 'admin', {}),
+        'procurement_journal': (5, 'admin', {}),
+        'global_audit_log': (6, 'admin', {}),
+        'rebar_analytics': (6, 'admin', {}),
+        'concrete_analytics': (6, 'admin', {}),
+        'mechanisms_analytics': (6, 'admin', {}),
+        'project_dashboard': (17, 'admin', {}),
+        'profile': (5, 'admin', {}),
+        'switch_active_warehouse': (8, 'admin', {'pk': 'warehouse'}),
+        'change_password': (4, 'admin', {}),
+        'print_order_pdf': (11, 'admin', {'pk': 'order'}),
+        'profiling_list': (5, 'admin', {}),
+        'profiling_detail': (4, 'admin', {'capture_id': '20000101T000000-00000000'}),
+        'profiling_download': (4, 'admin', {'capture_id': '20000101T000000-00000000', 'kind': 'sql'}),
+    }
+    # GET-параметри (значення - ключ у self.objects або літерал)
+    PARAMS = {
+        'check_order_duplicates': {'warehouse': 'warehouse'},
+        'check_order_duplicates_async': {'warehouse': 'warehouse'},
+        'ajax_load_stages': {'warehouse_id': 'warehouse'},
+        'ajax_load_stages_async': {'warehouse_id': 'warehouse'},
+        'ajax_warehouse_stock_legacy': {'warehouse_id': 'warehouse'},
+        'ajax_materials': {'q': 'мат'},
+        'ajax_materials_async': {'q': 'мат'},
+        'export_stock_report': {'export': 'excel'},
+        'period_report': {'start_date': '2000-01-01', 'end_date': '2100-12-31'},
+    }
+    # Не перевіряються: безкінечний SSE-потік
+    EXCLUDED = {'ajax_warehouse_stock_events'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_query_budget_dataset()
+
+    def setUp(self):
+        cache.clear()  # rate_limit
+        # Бюджет не залежить від DJANGO_LOG_LEVEL: на DEBUG django.template логує repr контексту
+        # (VariableDoesNotExist), а repr QuerySet / Transaction - це зайві запити, яких сторінка не робить
+        template_logger = logging.getLogger('django.template')
+        self.addCleanup(template_logger.setLevel, template_logger.level)
+        template_logger.setLevel(logging.INFO)
+        self.objects = {
+            'order': self.data['orders'][1],
+            'warehouse': self.data['warehouses'][0],
+            'material': self.data['materials'][0],
+            'transaction': self.data['transactions'].first(),
+            'stocktake': self.data['stocktake'],
+        }
+
+    def _resolve(self, values):
+        return {key: self.objects[value].pk if value in self.objects else value for key, value in values.items()}
+
+    def _url(self, name, kwargs):
+        url = reverse(name, kwargs=self._resolve(kwargs))
+        params = self._resolve(self.PARAMS.get(name, {}))
+        return f"{url}?{urlencode(params)}" if params else url
+
+    def test_every_url_has_budget(self):
+        """1) Кожен іменований маршрут warehouse/urls.py має бюджет (або явно виключений)."""
+        from warehouse import urls as warehouse_urls
+
+        names = {pattern.name for pattern in warehouse_urls.urlpatterns if pattern.name}
+        self.assertEqual(names - set(self.BUDGETS) - self.EXCLUDED, set())
+
+    def _query_counts(self):
+        counts = {}
+        for name, (budget, role, kwargs) in self.BUDGETS.items():
+            self.client.force_login(self.data[role])
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(self._url(name, kwargs))
+            counts[name] = len(ctx.captured_queries)
+        return counts
+
+    def test_pages_stay_within_query_budget(self):
+        """2) Кожна сторінка/AJAX/експорт вкладається у свій бюджет запитів."""
+        for name, (budget, role, kwargs) in self.BUDGETS.items():
+            with self.subTest(url=name):
+                self.client.force_login(self.data[role])
+                response = self.assertQueryBudget(budget, self.client.get, self._url(name, kwargs), label=name)
+                self.assertLess(response.status_code, 500)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        """3) Подвоєння складів/матеріалів/заявок не змінює кількість запитів (немає циклів із запитом)."""
+        before = self._query_counts()
+        seed_query_budget_dataset(prefix='budget2')
+        cache.clear()
+        after = self._query_counts()
+
+        grown = {name: (before[name], after[name]) for name in before if after[name] != before[name]}
+        self.assertEqual(grown, {})
+
+
+class SyntheticDataGeneratorTests(TestCase):
+    """Генератор синтетичних даних: детермінованість, парні переміщення, невід'ємні залишки."""
+
+    PARAMS = dict(warehouses=4, materials=60, transactions=1500, orders=30, days=60, batch_size=400, end_date=datetime.date(2026, 3, 31))
+
+    def _snapshot(self):
+        # id заявок у різних прогонах різні - прибираємо їх з опису приходу
+        return sorted(
+            (*row[:-1], re.sub(r'#\d+', '#', row[-1]))
+            for row in Transaction.objects.values_list(
+                'transaction_type', 'warehouse__name', 'material__article', 'quantity', 'price', 'date', 'description'
+            )
+        )
+
+    def test_same_seed_gives_same_data(self):
+        """1) Той самий seed - ті самі транзакції; інший seed - інші."""
+        stats = SyntheticDataGenerator(seed=7, **self.PARAMS).run()
+        first = self._snapshot()
+        self.assertEqual(stats['transactions'], len(first))
+        self.assertGreaterEqual(stats['transactions'], 1500)
+
+        purge_synthetic_data()
+        self.assertFalse(Transaction.objects.exists())
+        SyntheticDataGenerator(seed=7, **self.PARAMS).run()
+        self.assertEqual(self._snapshot(), first)
+
+        purge_synthetic_data()
+        SyntheticDataGenerator(seed=8, **self.PARAMS).run()
+        self.assertNotEqual(self._snapshot(), first)
+
+    def test_transfers_are_paired_legs(self):
+        """2) Кожне переміщення - OUT і IN з одним transfer_group_id, однією кількістю, на різних складах."""
+        SyntheticDataGenerator(seed=1, **self.PARAMS).run()
+        legs = {}
+        for group, txn_type, wh_id, mat_id, qty in Transaction.objects.filter(
+            transfer_group_id__isnull=False
+        ).values_list('transfer_group_id', 'transaction_type', 'warehouse_id', 'material_id', 'quantity'):
+            legs.setdefault(group, []).append((txn_type, wh_id, mat_id, qty))
+
+        self.assertTrue(legs)
+        for group, pair in legs.items():
+            self.assertEqual(sorted(leg[0] for leg in pair), ['IN', 'OUT'], group)
+            (_, wh_a, mat_a, qty_a), (_, wh_b, mat_b, qty_b) = pair
+            self.assertNotEqual(wh_a, wh_b)
+            self.assertEqual((mat_a, qty_a), (mat_b, qty_b))
+
+    def test_balances_are_not_negative_and_dates_in_period(self):
+        """3) Залишки всіх пар (склад, матеріал) >= 0, дати - в межах періоду (+ день вхідних залишків)."""
+        stats = SyntheticDataGenerator(seed=3, **self.PARAMS).run()
+        negative = [
+            row for row in Transaction.objects.values('warehouse_id', 'material_id').annotate(qty=BALANCE_EXPR).order_by()
+            if row['qty'] < 0
+        ]
+        self.assertEqual(negative, [])
+
+        dates = Transaction.objects.aggregate(first=Min('date'), last=Max('date'))
+        self.assertGreaterEqual(dates['first'], stats['date_from'])
+        self.assertLessEqual(dates['last'], stats['date_to'])
+        self.assertTrue(Transaction.objects.filter(transaction_type='OUT', stage__isnull=False).exists())
+        self.assertEqual(Order.objects.count(), 30)
+
+
+class BenchmarkTests(TestCase):
+    """Бенчмарк сервісів і звітів: усі сценарії, JSON-результат, відкат змін у БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(
+            seed=5, warehouses=3, materials=40, transactions=600, orders=10, days=30,
+            end_date=datetime.date(2026, 3, 31)
+        ).run()
+
+    def _counts(self):
+        return (Transaction.objects.count(), Order.objects.count(), OrderItem.objects.count(), User.objects.count())
+
+    def test_all_scenarios_measured_and_rolled_back(self):
+        """1) Кожен сценарій має ops/sec, перцентилі та SQL/оп; усе, що записано, відкочено."""
+        before = self._counts()
+        report = benchmark.run_benchmark(iterations=3, warmup=1, order_lines=3)
+
+        self.assertEqual(set(report['scenarios']), set(benchmark.SCENARIOS))
+        for name, result in report['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['iterations'], 3)
+                self.assertGreater(result['ops_per_sec'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries_per_op'], 0)
+        self.assertEqual(report['meta']['dataset']['transactions'], before[0])
+        self.assertEqual(self._counts(), before)
+
+    def test_invalid_input(self):
+        """2) Невідомий сценарій або порожня БД - ValueError (команда перетворює в CommandError)."""
+        with self.assertRaises(ValueError):
+            benchmark.run_benchmark(['no_such_scenario'])
+        Transaction.objects.all().delete()
+        with self.assertRaises(ValueError):
+            benchmark.run_benchmark(['get_warehouse_balance'], iterations=1, warmup=0)
+
+    def test_command_writes_json_and_compares(self):
+        """3) Команда пише JSON у файл і порівнює з попереднім прогоном (--compare)."""
+        import os
+        import tempfile
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = os.path.join(tmp, 'first.json'), os.path.join(tmp, 'second.json')
+            args = ['--scenario', 'get_warehouse_balance', '--scenario', 'create_writeoff', '--iterations', '2', '--warmup', '0']
+            call_command('benchmark', *args, '--output', first, stderr=open(os.devnull, 'w'))
+            call_command('benchmark', *args, '--read-only', '--output', second, '--compare', first, stderr=open(os.devnull, 'w'))
+            with open(second, encoding='utf-8') as f:
+                report = json.load(f)
+
+        self.assertEqual(list(report['scenarios']), ['get_warehouse_balance'])
+        self.assertIn('ops_per_sec', report['compare']['changes_pct']['get_warehouse_balance'])
+
+
+class ProfilingTests(TestCase):
+    """Профілювання запиту для staff: ?_profile=1 / X-Profile, артефакти, список, вимкнено за замовчуванням."""
+
+    def setUp(self):
+        import tempfile
+        from django.conf import settings
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.middleware = list(settings.MIDDLEWARE) + ['warehouse.middleware.ProfilingMiddleware']
+        self.profiling_settings = {'MIDDLEWARE': self.middleware, 'PROFILING_ENABLED': True, 'PROFILING_DIR': tmp.name}
+
+        self.admin = User.objects.create_user(username='profile_admin', password='password', is_staff=True)
+        self.foreman = User.objects.create_user(username='profile_foreman', password='password')
+        self.wh = Warehouse.objects.create(name='Profile Склад')
+        self.foreman.profile.warehouses.add(self.wh)
+        for i in range(3):
+            Transaction.objects.create(
+                transaction_type='IN', warehouse=self.wh, quantity=Decimal('5.000'),
+                material=Material.objects.create(name=f'Профіль мат {i}', unit='шт')
+            )
+
+    def test_disabled_by_default(self):
+        """1) Без DJANGO_PROFILING middleware не підключено: ?_profile=1 нічого не знімає."""
+        from django.conf import settings
+
+        self.assertNotIn('warehouse.middleware.ProfilingMiddleware', settings.MIDDLEWARE)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('stock_balance_report'), {'_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_staff_capture_is_listed_and_downloadable(self):
+        """2) Staff: профіль і журнал SQL збережено, є у списку, завантажуються; не-staff - ігнорується."""
+        with self.settings(**self.profiling_settings):
+            self.client.force_login(self.foreman)
+            response = self.client.get(reverse('writeoff_history'), {'_profile': '1'})
+            self.assertNotIn('X-Profile-Id', response)
+
+            self.client.force_login(self.admin)
+            response = self.client.get(reverse('stock_balance_report'), HTTP_X_PROFILE='1')
+            capture_id = response['X-Profile-Id']
+            self.assertEqual(response['X-Profile-URL'], reverse('profiling_detail', args=[capture_id]))
+
+            listing = self.client.get(reverse('profiling_list'))
+            self.assertEqual([c['id'] for c in listing.context['captures']], [capture_id])
+            self.assertEqual(listing.context['captures'][0]['view'], 'stock_balance_report')
+
+            detail = self.client.get(reverse('profiling_detail', args=[capture_id]))
+            self.assertContains(detail, 'stock_balance_report')
+            self.assertGreater(detail.context['capture']['sql_count'], 0)
+            self.assertIn('get_warehouses_balances', detail.context['capture']['top_cumulative'])
+
+            sql = self.client.get(reverse('profiling_download', args=[capture_id, 'sql']))
+            self.assertIn('warehouse_transaction', sql.content.decode())
+            prof = self.client.get(reverse('profiling_download', args=[capture_id, 'prof']))
+            self.assertGreater(len(b''.join(prof.streaming_content)), 0)
+
+    def test_old_captures_pruned_and_bad_ids_404(self):
+        """3) Зберігається не більше PROFILING_KEEP профілів; некоректний id або формат - 404."""
+        self.client.force_login(self.admin)
+        with self.settings(PROFILING_KEEP=2, **self.profiling_settings):
+            ids = [self.client.get(reverse('profiling_list'), {'_profile': '1'})['X-Profile-Id'] for _ in range(3)]
+            kept = [c['id'] for c in self.client.get(reverse('profiling_list')).context['captures']]
+
+            self.assertEqual(len(kept), 2)
+            self.assertEqual(set(kept) | set(ids), set(ids))
+            self.assertEqual(self.client.get(reverse('profiling_detail', args=['..%2Fsecret'])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('profiling_download', args=[kept[0], 'exe'])).status_code, 404)
+
+
+class ImagePipelineTests(TestCase):
+    """Фото: поворот за EXIF і WebP з обмеженою роздільністю при збереженні, кешовані мініатюри, фонова обробка."""
+
+    def setUp(self):
+        import tempfile
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username='photo_user', password='password')
+        self.client.force_login(self.user)
+        self.wh = Warehouse.objects.create(name='Фото Склад')
+        self.user.profile.warehouses.add(self.wh)
+        self.material = Material.objects.create(name='Фото мат', unit='шт')
+
+    def _jpeg(self, name='IMG_0001.jpg', size=(3000, 1000), orientation=6):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        image = Image.new('RGB', size, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def _image_size(self, field_file):
+        from PIL import Image
+
+        with field_file.storage.open(field_file.name, 'rb') as f, Image.open(f) as image:
+            return image.format, image.size
+
+    def test_upload_is_rotated_and_reencoded_to_webp(self):
+        """1) JPEG 3000x1000 з EXIF-поворотом -> WebP 683x2048 без EXIF; PDF заявки лишається як є, без мініатюри."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        txn = Transaction.objects.create(
+            transaction_type='IN', warehouse=self.wh, material=self.material,
+            quantity=Decimal('1.000'), photo=self._jpeg()
+        )
+        txn.refresh_from_db()
+        self.assertTrue(txn.photo.name.endswith('.webp'))
+        self.assertEqual(self._image_size(txn.photo), ('WEBP', (683, 2048)))
+
+        order = Order.objects.create(
+            warehouse=self.wh, created_by=self.user,
+            request_photo=SimpleUploadedFile('zayavka.pdf', b'%PDF-1.4 test', content_type='application/pdf')
+        )
+        order.refresh_from_db()
+        self.assertTrue(order.request_photo.name.endswith('.pdf'))
+
+        # Мініатюри для PDF немає - посилання на оригінал; результат кешується, PDF більше не декодується
+        from unittest import mock
+        from warehouse.services import images
+
+        cache.clear()
+        self.assertEqual(images.thumbnail_url(order.request_photo), order.request_photo.url)
+        with mock.patch.object(images, 'encode_webp') as encode:
+            self.assertEqual(images.thumbnail_url(order.request_photo, 'md'), order.request_photo.url)
+        encode.assert_not_called()
+
+    def test_receipt_photo_encoded_once_and_thumbnail_cached(self):
+        """2) Фото ТТН на кілька позицій кодується один раз; мініатюра створюється при першому показі і перевикористовується."""
+        from unittest import mock
+        from warehouse.services import images
+
+        order = Order.objects.create(warehouse=self.wh, created_by=self.user, status='transit')
+        items = [
+            OrderItem.objects.create(order=order, material=Material.objects.create(name=f'ТТН мат {i}', unit='шт'), quantity=Decimal('2.000'))
+            for i in range(3)
+        ]
+        with mock.patch.object(images, 'encode_webp', wraps=images.encode_webp) as encode:
+            inventory.process_order_receipt(order, {item.id: '2' for item in items}, self.user, proof_photo=self._jpeg('ttn.jpg'))
+        self.assertEqual(encode.call_count, 1)
+
+        txn = Transaction.objects.filter(order=order).first()
+        self.assertTrue(txn.photo.name.endswith('.webp'))
+        response = self.client.get(reverse('delivery_history'))
+        thumb = images.thumbnail_name(txn.photo.name, 'sm')
+        self.assertContains(response, txn.photo.storage.url(thumb))
+        self.assertEqual(self._image_size(Transaction(photo=thumb).photo), ('WEBP', (53, 160)))
+
+        with mock.patch.object(images, 'encode_webp') as encode:
+            self.client.get(reverse('delivery_history'))
+        encode.assert_not_called()
+        self.assertEqual(images.thumbnail_url(Transaction().photo), '')
+
+    def test_generate_thumbnails_converts_legacy_originals(self):
+        """3) generate_thumbnails --convert-originals: старий JPEG -> WebP (шлях оновлено, оригінал видалено) + мініатюри."""
+        import io
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from django.core.management import call_command
+        from warehouse.services import images
+
+        txn = Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=self.material, quantity=Decimal('1.000'))
+        storage = txn.photo.storage
+        legacy = FileSystemStorage().save('transactions/legacy.jpg', ContentFile(self._jpeg(size=(4000, 3000), orientation=1).read()))
+        Transaction.objects.filter(pk=txn.pk).update(photo=legacy)
+
+        call_command('generate_thumbnails', '--convert-originals', stdout=io.StringIO())
+
+        txn.refresh_from_db()
+        self.assertRegex(txn.photo.name, r'^blobs/.+\.webp$')
+        self.assertFalse(storage.exists(legacy))
+        self.assertEqual(self._image_size(txn.photo), ('WEBP', (2048, 1536)))
+        for size in images.THUMBNAIL_SIZES:
+            self.assertTrue(storage.exists(images.thumbnail_name(txn.photo.name, size)))
+
+
+class MediaStoreTests(TestCase):
+    """Медіа з адресацією за вмістом: один файл на однаковий вміст, видалення за лічильником посилань, перенос старих файлів."""
+
+    def setUp(self):
+        import tempfile
+        from unittest import mock
+        from warehouse.services import media_store
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = tmp.name
+        # Без вікна захисту щойно записаних blobs (перевіряється окремо в тесті 4)
+        grace = mock.patch.object(media_store, 'RELEASE_GRACE_SECONDS', 0)
+        grace.start()
+        self.addCleanup(grace.stop)
+
+        self.user = User.objects.create_user(username='media_user', password='password')
+        self.wh = Warehouse.objects.create(name='Медіа Склад')
+
+    def _files(self):
+        import os
+
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root).replace(os.sep, '/')
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def _upload(self, name='ttn.png', color=(10, 120, 200)):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_receipt_photo_stored_once(self):
+        """1) Фото ТТН на 4 позиції + заявку: усі записи посилаються на один blob, на диску - один файл."""
+        order = Order.objects.create(warehouse=self.wh, created_by=self.user, status='transit')
+        items = [
+            OrderItem.objects.create(order=order, material=Material.objects.create(name=f'Медіа мат {i}', unit='шт'), quantity=Decimal('1.000'))
+            for i in range(4)
+        ]
+        inventory.process_order_receipt(order, {item.id: '1' for item in items}, self.user, proof_photo=self._upload())
+
+        names = set(Transaction.objects.filter(order=order).values_list('photo', flat=True))
+        order.refresh_from_db()
+        names.add(order.proof_photo.name)
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self._files(), sorted(names))
+        self.assertRegex(names.pop(), r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.webp$')
+
+    def test_file_deleted_with_last_reference(self):
+        """2) Файл і мініатюра видаляються після коміту, коли видалено останній запис, що на нього посилається."""
+        from warehouse.services import images, media_store
+
+        material = Material.objects.create(name='Медіа мат', unit='шт')
+        txns = [
+            Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=material, quantity=Decimal('1.000'), photo=self._upload())
+            for _ in range(2)
+        ]
+        name = txns[0].photo.name
+        self.assertEqual(txns[1].photo.name, name)
+        images.thumbnail_url(txns[0].photo)
+        self.assertEqual(media_store.reference_count(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            txns[0].delete()
+        self.assertTrue(txns[1].photo.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            txns[1].delete()
+        self.assertEqual(self._files(), [])
+
+    def test_dedupe_media_moves_legacy_files(self):
+        """3) dedupe_media: два старі файли з однаковим вмістом -> один blob, посилання оновлено; blob без посилань видалено."""
+        import io
+        from django.core.files.storage import FileSystemStorage, default_storage
+        from django.core.management import call_command
+
+        material = Material.objects.create(name='Старе фото', unit='шт')
+        legacy = FileSystemStorage()
+        content = self._upload().read()
+        for name in ('transactions/a.png', 'orders/proofs/b.png'):
+            legacy.save(name, io.BytesIO(content))
+        txn = Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=material, quantity=Decimal('1.000'))
+        order = Order.objects.create(warehouse=self.wh, created_by=self.user)
+        Transaction.objects.filter(pk=txn.pk).update(photo='transactions/a.png')
+        Order.objects.filter(pk=order.pk).update(proof_photo='orders/proofs/b.png')
+        orphan = default_storage.save('orphan.png', self._upload(color=(0, 0, 0)))
+
+        call_command('dedupe_media', stdout=io.StringIO())
+
+        txn.refresh_from_db()
+        order.refresh_from_db()
+        self.assertTrue(txn.photo.name.startswith('blobs/'))
+        self.assertEqual(order.proof_photo.name, txn.photo.name)
+        self.assertEqual(self._files(), [txn.photo.name])
+        self.assertNotEqual(orphan, txn.photo.name)
+
+    def test_release_spares_blob_taken_by_concurrent_save(self):
+        """4) Blob, щойно взятий save того самого вмісту, release не видаляє; видалений blob save записує заново."""
+        import os
+        import time
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from warehouse.services import media_store
+
+        material = Material.objects.create(name='Медіа гонка', unit='шт')
+        txn = Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=material, quantity=Decimal('1.000'), photo=self._upload())
+        name = txn.photo.name
+        path = default_storage.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+
+        # Паралельний запит зберігає той самий вміст (посилання ще не закомічене), потім видаляється останній запис
+        self.assertEqual(default_storage.save('ttn.webp', ContentFile(content)), name)
+        with mock.patch.object(media_store, 'RELEASE_GRACE_SECONDS', 600):
+            with self.captureOnCommitCallbacks(execute=True):
+                txn.delete()
+            self.assertTrue(default_storage.exists(name))
+            self.assertEqual(media_store.collect_garbage(), 0)
+
+        os.utime(path, (old, old))
+        self.assertEqual(media_store.collect_garbage(), 1)
+        self.assertEqual(self._files(), [])
+        self.assertEqual(default_storage.save('ttn.webp', ContentFile(content)), name)
+        self.assertTrue(default_storage.exists(name))
+
+
+class StreamingUploadTests(TestCase):
+    """Потокове завантаження: ліміти під час прийому, запис без зайвої копії, пам'ять при паралельних завантаженнях."""
+
+    def setUp(self):
+        import tempfile
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username='upload_user', password='password')
+        self.client.force_login(self.user)
+        self.wh = Warehouse.objects.create(name='Upload Склад')
+        self.user.profile.warehouses.add(self.wh)
+
+    def _spooled(self):
+        import os
+        from warehouse.uploads import spool_dir
+
+        return os.listdir(spool_dir()) if os.path.isdir(spool_dir()) else []
+
+    def test_oversized_and_disallowed_files_rejected_while_streaming(self):
+        """1) Файл > 10 MB і .exe відхиляються під час прийому: помилка поля форми, на диску нічого не лишається."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from warehouse.forms import MAX_UPLOAD_SIZE
+
+        big = SimpleUploadedFile('huge.jpg', b'\0' * (MAX_UPLOAD_SIZE + 1), content_type='image/jpeg')
+        response = self.client.post(reverse('profile'), {'email': 'u@test.com', 'photo': big})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Файл занадто великий', str(response.context['p_form'].errors['photo']))
+
+        exe = SimpleUploadedFile('setup.exe', b'MZ', content_type='application/octet-stream')
+        response = self.client.post(reverse('profile'), {'email': 'u@test.com', 'photo': exe})
+        self.assertIn('Недозволений тип файлу', str(response.context['p_form'].errors['photo']))
+
+        self.user.profile.refresh_from_db()
+        self.assertFalse(self.user.profile.photo)
+        self.assertEqual(self._spooled(), [])
+
+    def test_import_files_have_own_size_limit(self):
+        """4) CSV/XLSX імпорту більші за 10 MB приймаються (власний ліміт), фото такого розміру - ні."""
+        from unittest import mock
+        from warehouse import uploads
+        from warehouse.uploads import StreamingUploadHandler
+
+        def accepted(file_name, size):
+            handler = StreamingUploadHandler()
+            handler.new_file('file', file_name, 'application/octet-stream', None)
+            for start in range(0, size, handler.chunk_size):
+                handler.receive_data_chunk(b'\0' * min(handler.chunk_size, size - start), start)
+            upload = handler.file_complete(size)
+            upload.close()
+            return not getattr(upload, 'upload_error', None)
+
+        with mock.patch.object(uploads, 'MAX_UPLOAD_SIZE', 1024), mock.patch.object(uploads, 'MAX_IMPORT_UPLOAD_SIZE', 4096):
+            self.assertFalse(accepted('big.jpg', 2048))
+            self.assertTrue(accepted('stock.csv', 2048))
+            self.assertTrue(accepted('stock.xlsx', 2048))
+            self.assertFalse(accepted('stock.csv', 8192))
+        self.assertEqual(self._spooled(), [])
+
+    def test_accepted_file_moved_into_storage(self):
+        """2) PDF до заявки: файл переноситься з тимчасового у blob (ім'я = sha256 з прийому), тимчасових файлів немає."""
+        import hashlib
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        order = Order.objects.create(warehouse=self.wh, created_by=self.user, status='transit')
+        item = OrderItem.objects.create(order=order, material=Material.objects.create(name='Upload мат', unit='шт'), quantity=Decimal('1.000'))
+        content = b'%PDF-1.4 ' + b'x' * 200_000
+        pdf = SimpleUploadedFile('ttn.pdf', content, content_type='application/pdf')
+
+        self.client.post(reverse('confirm_receipt', args=[order.pk]), {f'item_qty_{item.id}': '1', 'proof_photo': pdf})
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+        self.assertIn(hashlib.sha256(content).hexdigest(), order.proof_photo.name)
+        with order.proof_photo.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(self._spooled(), [])
+
+    def test_concurrent_uploads_memory_bounded(self):
+        """3) 8 паралельних завантажень по 2 MB: пік пам'яті обробника - до 2 MB (стандартні обробники - > 16 MB)."""
+        import io
+        import threading
+        import tracemalloc
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+        from django.http.multipartparser import MultiPartParser
+        from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+        from warehouse.uploads import StreamingUploadHandler
+
+        bodies = [
+            encode_multipart(BOUNDARY, {'photo': SimpleUploadedFile(f'p{i}.jpg', bytes([i]) * (2 * 1024 * 1024))})
+            for i in range(8)
+        ]
+
+        def peak_memory(handler_classes):
+            barrier = threading.Barrier(len(bodies))
+            files = []
+
+            def upload(body):
+                meta = {'CONTENT_TYPE': MULTIPART_CONTENT, 'CONTENT_LENGTH': str(len(body))}
+                handlers = [cls() for cls in handler_classes]
+                barrier.wait()
+                files.append(MultiPartParser(meta, io.BytesIO(body), handlers).parse()[1]['photo'])
+
+            tracemalloc.start()
+            threads = [threading.Thread(target=upload, args=(body,)) for body in bodies]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.assertEqual(sorted(f.size for f in files), [2 * 1024 * 1024] * len(bodies))
+            for f in files:
+                f.close()
+            return peak
+
+        streaming = peak_memory([StreamingUploadHandler])
+        default = peak_memory([MemoryFileUploadHandler, TemporaryFileUploadHandler])
+        self.assertLess(streaming, 2 * 1024 * 1024)
+        self.assertGreater(default, 16 * 1024 * 1024)
+        self.assertEqual(self._spooled(), [])
+
+
+class OrderWorkflowTests(QueryBudgetMixin, TestCase):
+    """Статуси заявок: дозволені переходи, масовий перехід одним UPDATE з пакетним аудитом."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='workflow_admin', password='password', is_staff=True)
+        self.client.force_login(self.admin)
+        self.wh = Warehouse.objects.create(name='Workflow Склад')
+
+    def _orders(self, status, count):
+        return Order.objects.bulk_create([Order(warehouse=self.wh, created_by=self.admin, status=status) for _ in range(count)])
+
+    def test_transitions_enforced_for_single_orders(self):
+        """1) Усі статуси описані; погодити можна нову, але не виконану; прийом нової заявки - TransitionError."""
+        from warehouse.services import order_workflow
+
+        self.assertEqual(set(order_workflow.TRANSITIONS), {code for code, _ in Order.STATUS_CHOICES})
+        new, completed = self._orders('new', 1)[0], self._orders('completed', 1)[0]
+
+        self.client.post(reverse('order_approve', args=[new.pk]))
+        self.client.post(reverse('order_approve', args=[completed.pk]))
+        new.refresh_from_db()
+        completed.refresh_from_db()
+        self.assertEqual((new.status, completed.status), ('approved', 'completed'))
+        self.assertEqual(AuditLog.objects.filter(action_type='ORDER_STATUS', object_id=new.pk, old_value='new', new_value='approved').count(), 1)
+
+        draft = self._orders('new', 1)[0]
+        with self.assertRaises(order_workflow.TransitionError):
+            inventory.process_order_receipt(draft, {}, self.admin)
+
+    def test_bulk_transition_single_update_and_audit_insert(self):
+        """2) 40 заявок 'purchasing' + 2 нові -> 'transit': фіксована кількість запитів, нові пропущені, 40 записів аудиту."""
+        purchasing = self._orders('purchasing', 40)
+        new = self._orders('new', 2)
+        ids = [order.pk for order in purchasing + new]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('bulk_order_transition'), {'status': 'transit', 'order_ids': ids},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "warehouse_order"')]
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "warehouse_auditlog"')]
+        self.assertEqual((len(updates), len(inserts)), (1, 1))
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+
+        data = response.json()
+        self.assertEqual(sorted(data['moved']), sorted(o.pk for o in purchasing))
+        self.assertEqual(data['skipped'], {str(o.pk): 'new' for o in new})
+        self.assertEqual(Order.objects.filter(status='transit').count(), 40)
+        self.assertEqual(AuditLog.objects.filter(action_type='ORDER_STATUS', old_value='purchasing', new_value='transit').count(), 40)
+
+    def test_mark_shipped_goes_through_workflow(self):
+        """3) Відправка з монітора: примітка + аудит; заявку, що ще не погоджена, відправити не можна."""
+        order = self._orders('purchasing', 1)[0]
+        new = self._orders('new', 1)[0]
+
+        self.client.post(reverse('mark_order_shipped', args=[order.pk]), {'driver_phone': '+380501112233', 'vehicle_number': 'AA1234BB'})
+        self.client.post(reverse('mark_order_shipped', args=[new.pk]), {'driver_phone': '', 'vehicle_number': ''})
+
+        order.refresh_from_db()
+        new.refresh_from_db()
+        self.assertEqual(order.status, 'transit')
+        self.assertIn('AA1234BB', order.note)
+        self.assertEqual((new.status, new.note), ('new', ''))
+        self.assertTrue(AuditLog.objects.filter(object_id=order.pk, new_value='transit', user=self.admin).exists())
+
+    def test_second_receipt_of_stale_order_is_rejected(self):
+        """4) Прийом перевіряє статус заблокованої заявки: повтор зі застарілим об'єктом - TransitionError; аудит ORDER_STATUS."""
+        from warehouse.services import order_workflow
+
+        order = self._orders('transit', 1)[0]
+        item = OrderItem.objects.create(order=order, material=Material.objects.create(name='Прийом мат', unit='шт'), quantity=Decimal('3.000'))
+        stale = Order.objects.get(pk=order.pk)
+
+        inventory.process_order_receipt(order, {item.id: '3'}, self.admin)
+        with self.assertRaises(order_workflow.TransitionError):
+            inventory.process_order_receipt(stale, {item.id: '3'}, self.admin)
+
+        self.assertEqual(Transaction.objects.filter(order=order).count(), 1)
+        self.assertEqual(stale.status, 'completed')
+        self.assertTrue(AuditLog.objects.filter(
+            action_type='ORDER_STATUS', object_id=order.pk, old_value='transit', new_value='completed', user=self.admin
+        ).exists())
+
+
+class OrderLookupTests(TestCase):
+    """Індекси заявок під логістику, прострочені й дублікати; перевірка дублікатів без N+1."""
+
+    def setUp(self):
+        cache.clear()  # лічильники rate_limit з попередніх тестів
+        self.admin = User.objects.create_user(username='lookup_admin', password='password', is_staff=True)
+        self.client.force_login(self.admin)
+        self.wh = Warehouse.objects.create(name='Lookup Склад')
+        self.materials = [Material.objects.create(name=f'Lookup мат {i}', unit='шт') for i in range(6)]
+
+    def _order(self, status, material_indexes, expected_days=3):
+        order = Order.objects.create(
+            warehouse=self.wh, created_by=self.admin, status=status,
+            expected_date=timezone.now().date() + timezone.timedelta(days=expected_days)
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, material=self.materials[i], quantity=Decimal('1.000')) for i in material_indexes
+        ])
+        return order
+
+    def test_access_paths_use_composite_indexes(self):
+        """1) Складені індекси Order є в схемі БД; на SQLite план логістики/прострочених/дублікатів їх використовує."""
+        indexes = {tuple(index.fields): index.name for index in Order._meta.indexes}
+        status_idx = indexes[('status', 'expected_date')]
+        created_idx = indexes[('warehouse', 'created_at')]
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        self.assertEqual(constraints[status_idx]['columns'], ['status', 'expected_date'])
+        self.assertEqual(constraints[created_idx]['columns'], ['warehouse_id', 'created_at'])
+
+        # Вибір плану на PostgreSQL залежить від статистики таблиці - на майже порожній там можливий Seq Scan
+        if connection.vendor != 'sqlite':
+            return
+        logistics = Order.objects.filter(status='purchasing').order_by('expected_date').explain()
+        overdue = Order.objects.filter(status__in=['purchasing', 'transit'], expected_date__lt=timezone.now().date()).explain()
+        duplicates = Order.objects.filter(warehouse=self.wh, created_at__gte=timezone.now()).explain()
+        self.assertIn(status_idx, logistics)
+        self.assertIn(status_idx, overdue)
+        self.assertIn(created_idx, duplicates)
+
+    def test_duplicate_check_compares_materials_in_fixed_queries(self):
+        """2) Дублікати: 2 запити на будь-яку кількість заявок; з materials - тільки заявки зі спільними матеріалами."""
+        from warehouse.services.orders import find_duplicate_orders
+
+        overlapping = self._order('new', [0, 1, 2])
+        other = self._order('approved', [3, 4])
+        self._order('completed', [0])
+        for _ in range(5):
+            self._order('new', [5])
+
+        with self.assertNumQueries(2):
+            everything = find_duplicate_orders(self.wh.id)
+        self.assertEqual(len(everything), 7)
+
+        with self.assertNumQueries(2):
+            matched = find_duplicate_orders(self.wh.id, [self.materials[1].id, self.materials[2].id, self.materials[3].id])
+        self.assertEqual({row['id']: row['shared_materials'] for row in matched}, {overlapping.id: 2, other.id: 1})
+        self.assertEqual(next(r for r in matched if r['id'] == overlapping.id)['items'], 'Lookup мат 0, Lookup мат 1, Lookup мат 2')
+
+        params = {'warehouse': self.wh.id, 'materials': f'{self.materials[3].id},x'}
+        sync_data = self.client.get(reverse('check_order_duplicates'), params).json()
+        self.assertEqual(sync_data, self.client.get(reverse('check_order_duplicates_async'), params).json())
+        self.assertEqual([row['id'] for row in sync_data['orders']], [other.id])
+
+    def test_logistics_and_problem_areas_queries_do_not_grow(self):
+        """3) Монітор логіста і проблемні зони: кількість запитів не залежить від кількості заявок."""
+        def count_queries(url_name):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
+            return len(ctx.captured_queries)
+
+        self._order('purchasing', [0, 1], expected_days=-2)
+        self._order('transit', [2], expected_days=-1)
+        before = {name: count_queries(name) for name in ('logistics_monitor', 'problem_areas')}
+        for i in range(8):
+            self._order(['purchasing', 'transit'][i % 2], [i % 6, (i + 1) % 6, (i + 2) % 6], expected_days=-3)
+        after = {name: count_queries(name) for name in ('logistics_monitor', 'problem_areas')}
+        self.assertEqual(before, after)
+
+
+class OrderListTests(TestCase):
+    """Журнал заявок: сторінки, кількість позицій і сума в SQL, потоковий експорт."""
+
+    def setUp(self):
+        cache.clear()  # лічильники rate_limit з попередніх тестів
+        self.admin = User.objects.create_user(username='orderlist_admin', password='password', is_staff=True)
+        self.client.force_login(self.admin)
+        self.wh = Warehouse.objects.create(name='Журнал Склад')
+        self.cement = Material.objects.create(name='Журнал Цемент', unit='т', current_avg_price=Decimal('4200.00'))
+        self.sand = Material.objects.create(name='Журнал Пісок', unit='т', current_avg_price=Decimal('350.50'))
+
+    def _orders(self, count, status='new'):
+        orders = Order.objects.bulk_create([
+            Order(warehouse=self.wh, created_by=self.admin, status=status) for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, material=material, quantity=quantity)
+            for order in orders
+            for material, quantity in ((self.cement, Decimal('1.500')), (self.sand, Decimal('4.000')))
+        ])
+        return orders
+
+    def _get(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('order_list'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_totals_are_annotated_in_sql(self):
+        """1) items_total і estimated_total з одного запиту збігаються з підрахунком у Python."""
+        from warehouse.services.orders import with_totals
+
+        order = self._orders(1)[0]
+        Order.objects.create(warehouse=self.wh, created_by=self.admin, status='new')  # без позицій
+        with self.assertNumQueries(1):
+            rows = {o.id: o for o in with_totals(Order.objects.all())}
+
+        expected = sum(item.quantity * item.material.current_avg_price for item in order.items.all())
+        self.assertEqual(rows[order.id].items_total, 2)
+        self.assertEqual(rows[order.id].estimated_total, expected)
+        empty = next(o for pk, o in rows.items() if pk != order.id)
+        self.assertEqual((empty.items_total, empty.estimated_total), (0, 0))
+
+    def test_list_is_paginated_with_constant_queries(self):
+        """2) Сторінка - ORDER_LIST_PAGE_SIZE заявок; кількість запитів не залежить від кількості заявок."""
+        from warehouse.services.orders import ORDER_LIST_PAGE_SIZE
+
+        self._orders(3)
+        _, few_queries = self._get()
+        self._orders(ORDER_LIST_PAGE_SIZE + 7, status='approved')
+        response, many_queries = self._get()
+
+        self.assertEqual(few_queries, many_queries)
+        page = response.context['orders']
+        self.assertEqual(page.paginator.count, ORDER_LIST_PAGE_SIZE + 10)
+        self.assertEqual(len(page.object_list), ORDER_LIST_PAGE_SIZE)
+        self.assertContains(response, '≈ 7702 грн')
+
+        today = timezone.localdate().isoformat()
+        response, _ = self._get({'status': 'approved', 'date_to': today, 'page': 2})
+        self.assertEqual(len(response.context['orders'].object_list), 7)
+        self.assertContains(response, f'&status=approved&date_to={today}')
+
+    def test_export_streams_workbook_with_annotated_totals(self):
+        """3) Експорт - потокова відповідь xlsx з позиціями і сумою; запитів стільки ж при більшій кількості заявок."""
+        import io
+        import openpyxl
+
+        orders = self._orders(2)
+        response, few_queries = self._get({'export': 'excel'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="Orders_', response['Content-Disposition'])
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+
+        rows = {row[0]: row for row in sheet.iter_rows(min_row=2, values_only=True)}
+        self.assertEqual(set(rows), {order.id for order in orders})
+        self.assertEqual(rows[orders[0].id][7:], (2, 7702.0))
+        self.assertEqual(sheet['A1'].value, 'ID')
+
+        self._orders(30)
+        response, many_queries = self._get({'export': 'excel'})
+        b''.join(response.streaming_content)
+        self.assertEqual(few_queries, many_queries)
+
+
+class InventoryEventOutboxTests(TestCase):
+    """Outbox подій складу: запис у транзакції сервісів, споживачі з чекпоінтами, перебудова зведення."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='outbox_user', password='password')
+        self.wh = Warehouse.objects.create(name='Outbox Склад')
+        self.wh2 = Warehouse.objects.create(name='Outbox Склад 2')
+        self.cement = Material.objects.create(name='Outbox Цемент', unit='т')
+        self.sand = Material.objects.create(name='Outbox Пісок', unit='т')
+
+    def _levels(self):
+        from warehouse.models import StockLevel
+        return {(l.warehouse_id, l.material_id): l.quantity for l in StockLevel.objects.all()}
+
+    def test_services_write_events_in_same_transaction(self):
+        """1) Кожна транзакція сервісу - подія з дельтою; відкат або помилка залишку - без подій."""
+        from django.db import transaction as db_transaction
+        from warehouse.models import InventoryEvent
+
+        inventory.create_incoming(self.cement, self.wh, '10', self.user)
+        inventory.create_transfer(self.user, self.cement, self.wh, self.wh2, '4')
+        inventory.create_writeoff(self.cement, self.wh2, '1.5', self.user, transaction_type='LOSS')
+        with self.assertRaises(inventory.InsufficientStockError):
+            inventory.create_writeoff(self.sand, self.wh, '1', self.user)
+        with self.assertRaises(RuntimeError):
+            with db_transaction.atomic():
+                inventory.create_incoming(self.sand, self.wh, '5', self.user)
+                raise RuntimeError('відкат')
+
+        events = list(InventoryEvent.objects.order_by('id'))
+        self.assertEqual(
+            [(e.warehouse_id, e.delta) for e in events],
+            [(self.wh.id, Decimal('10.000')), (self.wh.id, Decimal('-4.000')),
+             (self.wh2.id, Decimal('4.000')), (self.wh2.id, Decimal('-1.500'))]
+        )
+        self.assertEqual([e.id for e in events], sorted(e.id for e in events))
+        self.assertEqual({e.transaction_id for e in events}, set(Transaction.objects.values_list('id', flat=True)))
+
+    def test_consumer_applies_batches_with_checkpoint(self):
+        """2) stock_levels дорівнює get_warehouse_balance; повторний запуск нічого не обробляє; свіжий пропуск id - стоп."""
+        from warehouse.models import EventCheckpoint, InventoryEvent
+        from warehouse.services import inventory_events
+
+        inventory.create_incoming(self.cement, self.wh, '10', self.user)
+        inventory.create_incoming(self.sand, self.wh, '3', self.user)
+        inventory.create_transfer(self.user, self.cement, self.wh, self.wh2, '4')
+        inventory.create_writeoff(self.sand, self.wh, '1', self.user)
+
+        self.assertEqual(inventory_events.pending('stock_levels'), 5)
+        self.assertEqual(inventory_events.consume('stock_levels', batch_size=2), 5)
+        self.assertEqual(inventory_events.consume('stock_levels'), 0)
+        expected = {
+            (wh.id, material.id): qty
+            for wh in (self.wh, self.wh2) for material, qty in get_warehouse_balance(wh).items()
+        }
+        self.assertEqual(self._levels(), expected)
+        checkpoint = EventCheckpoint.objects.get(consumer='stock_levels')
+        self.assertEqual(checkpoint.position, InventoryEvent.objects.aggregate(last=Max('id'))['last'])
+
+        # Пропуск у послідовності (транзакція ще не закомічена) - споживач чекає
+        inventory.create_incoming(self.cement, self.wh, '1', self.user)
+        gap = inventory.create_incoming(self.cement, self.wh, '2', self.user)
+        inventory.create_incoming(self.cement, self.wh, '3', self.user)
+        gap.events.all().delete()
+        self.assertEqual(inventory_events.consume('stock_levels'), 1)
+        self.assertEqual(self._levels()[(self.wh.id, self.cement.id)], Decimal('7.000'))
+
+        # Пропуск, який споживач бачить довше GAP_GRACE_SECONDS, - відкочена транзакція, пропускаємо
+        checkpoint = EventCheckpoint.objects.get(consumer='stock_levels')
+        self.assertIsNotNone(checkpoint.gap_seen_at)
+        EventCheckpoint.objects.update(gap_seen_at=timezone.now() - timezone.timedelta(minutes=5))
+        self.assertEqual(inventory_events.consume('stock_levels'), 1)
+        self.assertEqual(self._levels()[(self.wh.id, self.cement.id)], Decimal('10.000'))
+        self.assertIsNone(EventCheckpoint.objects.get(consumer='stock_levels').gap_seen_at)
+
+    def test_lower_id_committed_after_higher_is_not_skipped(self):
+        """4) Менший id, закомічений пізніше за більший (стара created_at), обробляється, а не пропускається."""
+        from warehouse.models import EventCheckpoint, InventoryEvent
+        from warehouse.services import inventory_events
+
+        inventory.create_incoming(self.cement, self.wh, '10', self.user)
+        self.assertEqual(inventory_events.consume('stock_levels'), 1)
+
+        # Довгий імпорт отримав менший id, швидке списання з більшим id закомітилось першим
+        slow = inventory.create_incoming(self.cement, self.wh, '5', self.user)
+        inventory.create_writeoff(self.cement, self.wh, '1', self.user)
+        slow_event = slow.events.get()
+        slow_id = slow_event.id
+        slow_event.delete()
+        InventoryEvent.objects.update(created_at=timezone.now() - timezone.timedelta(minutes=5))
+        self.assertEqual(inventory_events.consume('stock_levels'), 0)
+
+        slow_event.id = slow_id
+        slow_event.save(force_insert=True)  # коміт через > GAP_GRACE_SECONDS після запису
+        self.assertEqual(inventory_events.consume('stock_levels'), 2)
+        self.assertEqual(self._levels()[(self.wh.id, self.cement.id)], Decimal('14.000'))
+        self.assertIsNone(EventCheckpoint.objects.get(consumer='stock_levels').gap_seen_at)
+
+    def test_rebuild_includes_transactions_without_events(self):
+        """3) --rebuild рахує і транзакції без подій (адмінка, імпорт), далі команда доробляє нові події."""
+        import io
+        from django.core.management import CommandError, call_command
+
+        inventory.create_incoming(self.cement, self.wh, '10', self.user)
+        Transaction.objects.create(transaction_type='IN', warehouse=self.wh, material=self.sand, quantity=Decimal('7.000'))
+
+        out = io.StringIO()
+        call_command('consume_inventory_events', '--rebuild', stdout=out)
+        self.assertIn('stock_levels', out.getvalue())
+        self.assertEqual(self._levels(), {(self.wh.id, self.cement.id): Decimal('10.000'), (self.wh.id, self.sand.id): Decimal('7.000')})
+
+        inventory.create_writeoff(self.sand, self.wh, '2', self.user)
+        call_command('consume_inventory_events', 'stock_levels', stdout=out)
+        self.assertEqual(self._levels()[(self.wh.id, self.sand.id)], Decimal('5.000'))
+        with self.assertRaises(CommandError):
+            call_command('consume_inventory_events', 'unknown', stdout=out)
+
+
+class BatchIngestionApiTests(TestCase):
+    """Пакетне API операцій: одна транзакція з bulk insert, ключі ідемпотентності, результати по операціях."""
+
+    def setUp(self):
+        cache.clear()  # rate_limit
+        self.foreman = User.objects.create_user(username='ingest_foreman', password='password')
+        self.wh = Warehouse.objects.create(name='Ingest Склад')
+        self.wh2 = Warehouse.objects.create(name='Ingest Склад 2')
+        self.foreign = Warehouse.objects.create(name='Ingest Чужий')
+        self.foreman.profile.warehouses.add(self.wh, self.wh2)
+        self.materials = [Material.objects.create(name=f'Ingest мат {i}', unit='шт') for i in range(12)]
+        for material in self.materials:
+            inventory.create_incoming(material, self.wh, '100', self.foreman)
+        self.client.force_login(self.foreman)
+
+    def _post(self, operations):
+        return self.client.post(
+            reverse('ingest_transactions_api'), json.dumps({'operations': operations}), content_type='application/json'
+        )
+
+    def _op(self, key, op_type='OUT', material=0, quantity='5', **extra):
+        return {'key': key, 'type': op_type, 'material_id': self.materials[material].id,
+                'warehouse_id': self.wh.id, 'quantity': quantity, **extra}
+
+    def test_batch_is_posted_with_fixed_query_count(self):
+        """1) IN/OUT/LOSS/TRANSFER одним запитом; кількість SQL не залежить від розміру пакета."""
+        from warehouse.models import InventoryEvent
+
+        events_before = InventoryEvent.objects.count()
+        response = self._post([
+            self._op('k-in', 'IN', quantity='10', date='2026-01-05'),
+            self._op('k-out', 'OUT', quantity='30'),
+            self._op('k-loss', 'LOSS', quantity='1.5'),
+            self._op('k-tr', 'TRANSFER', quantity='20', target_warehouse_id=self.wh2.id),
+        ])
+        data = response.json()
+        self.assertEqual((data['created'], data['duplicates'], data['errors']), (4, 0, 0))
+        self.assertEqual([r['key'] for r in data['results']], ['k-in', 'k-out', 'k-loss', 'k-tr'])
+        self.assertEqual(len(data['results'][3]['transactions']), 2)
+        self.assertIsNotNone(data['results'][3]['transfer_group_id'])
+        self.assertEqual(get_warehouse_balance(self.wh)[self.materials[0]], Decimal('58.500'))
+        self.assertEqual(get_warehouse_balance(self.wh2)[self.materials[0]], Decimal('20.000'))
+        self.assertEqual(InventoryEvent.objects.count() - events_before, 5)
+        self.assertEqual(Transaction.objects.get(pk=data['results'][0]['transactions'][0]).date, datetime.date(2026, 1, 5))
+        self.assertEqual(
+            sorted(AuditLog.objects.filter(content_type__model='transaction').values_list('object_id', flat=True)),
+            sorted(r['transactions'][0] for r in data['results'])
+        )
+
+        def count_queries(prefix, size):
+            with CaptureQueriesContext(connection) as ctx:
+                data = self._post([self._op(f'{prefix}-{i}', material=i, quantity='1') for i in range(size)]).json()
+            self.assertEqual(data['created'], size)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries('small', 2), count_queries('large', 12))
+
+    def test_replays_are_ignored_and_errors_can_be_retried(self):
+        """2) Повтор ключа - 'duplicate' з тим самим результатом; помилки не зберігають ключ і їх можна переслати."""
+        from warehouse.models import IdempotencyKey
+
+        batch = [
+            self._op('a'),
+            self._op('a'),  # повтор у тому ж пакеті
+            self._op('b', material=1, quantity='150'),  # нестача
+            self._op('c', warehouse_id=self.foreign.id),  # немає доступу
+            self._op('d', 'MOVE'),
+            {'type': 'OUT'},  # без ключа
+        ]
+        first = self._post(batch).json()
+        self.assertEqual([r['status'] for r in first['results']], ['created', 'duplicate', 'error', 'error', 'error', 'error'])
+        self.assertEqual(first['results'][1]['transactions'], first['results'][0]['transactions'])
+        self.assertIn('Insufficient stock', first['results'][2]['error'])
+        self.assertIn('Немає доступу', first['results'][3]['error'])
+
+        transactions_before = Transaction.objects.count()
+        replay = self._post(batch[:1]).json()
+        self.assertEqual(replay['results'][0], {**first['results'][0], 'status': 'duplicate'})
+        self.assertEqual(Transaction.objects.count(), transactions_before)
+        self.assertEqual(set(IdempotencyKey.objects.values_list('key', flat=True)), {'a'})
+
+        retried = self._post([self._op('b', material=1, quantity='50')]).json()
+        self.assertEqual(retried['results'][0]['status'], 'created')
+
+    def test_concurrent_key_and_malformed_requests(self):
+        """3) Ключ, закомічений паралельно (IntegrityError), - повтор як duplicate; некоректний запит - 400/405."""
+        from unittest import mock
+        from django.db import IntegrityError
+        from warehouse.models import IdempotencyKey
+        from warehouse.services import ingestion
+
+        original = ingestion._ingest
+        calls = []
+
+        def racing(items, user, *args):
+            calls.append(1)
+            if len(calls) == 1:
+                original(items, user, *args)
+                raise IntegrityError('duplicate key value violates unique constraint')
+            IdempotencyKey.objects.create(user=user, key='race', result={'transactions': [999], 'transfer_group_id': None})
+            return original(items, user, *args)
+
+        transactions_before = Transaction.objects.count()
+        with mock.patch.object(ingestion, '_ingest', side_effect=racing):
+            data = self._post([self._op('race')]).json()
+        self.assertEqual(data['results'][0], {'key': 'race', 'status': 'duplicate', 'transactions': [999], 'transfer_group_id': None})
+        self.assertEqual(Transaction.objects.count(), transactions_before)
+
+        url = reverse('ingest_transactions_api')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+        too_many = [self._op(f'x{i}') for i in range(ingestion.MAX_BATCH_ITEMS + 1)]
+        self.assertEqual(self._post(too_many).status_code, 400)
+
+    def test_non_finite_and_oversized_numbers_are_item_errors(self):
+        """4) NaN / Infinity / число поза полем (14, 3) або (14, 2) - помилка операції, а не 500."""
+        response = self._post([
+            self._op('nan', quantity='NaN'),
+            self._op('nan-literal', quantity=float('nan')),  # json.dumps пише літерал NaN, json.loads його приймає
+            self._op('inf', 'IN', quantity='Infinity'),
+            self._op('huge', 'IN', quantity='1e12'),
+            self._op('huge-price', 'IN', quantity='1', price='1e12'),
+            self._op('ok', 'IN', quantity='99999999999.999', price='999999999999.99'),
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['error'] * 5 + ['created'])
+        expected = ['некоректне число'] * 3 + ['завелике число'] * 2
+        for result, fragment in zip(results, expected):
+            self.assertIn(fragment, result['error'])
+
+
+class DataImportTests(TestCase):
+    """Імпорт CSV/XLSX: порядкове читання, пакети, карта артикулів, bulk upsert."""
+
+    def setUp(self):
+        cache.clear()  # rate_limit
+        self.admin = User.objects.create_user(username='import_admin', password='password', is_staff=True)
+        self.wh = Warehouse.objects.create(name='Імпорт Склад')
+        self.materials = [
+            Material.objects.create(name=f'Імпорт мат {i}', unit='шт', article=f'IMP-{i}') for i in range(40)
+        ]
+
+    def _csv(self, lines):
+        import io
+        return io.BytesIO('\n'.join(lines).encode('utf-8-sig'))
+
+    def _xlsx(self, rows, name='plan.xlsx'):
+        import io
+        import openpyxl
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        wb = openpyxl.Workbook()
+        for row in rows:
+            wb.active.append(row)
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_opening_stock_posts_only_difference_in_fixed_queries(self):
+        """1) Залишки - цільові (повтор нічого не змінює); кількість запитів не залежить від кількості рядків."""
+        from warehouse.services import data_import
+
+        lines = ['Артикул;Кількість', 'IMP-0;12,5', 'IMP-1;3', 'IMP-0;10', 'NOPE;1', 'IMP-2;abc', '', 'IMP-3;0']
+        stats = data_import.run_import('stock', self._csv(lines), 'stock.csv', warehouse=self.wh, user=self.admin)
+        self.assertEqual((stats['rows'], stats['imported'], stats['unchanged'], stats['error_count']), (6, 2, 1, 2))
+        self.assertEqual([line for line, _ in stats['errors']], [5, 6])
+        balance = get_warehouse_balance(self.wh)
+        self.assertEqual((balance[self.materials[0]], balance[self.materials[1]]), (Decimal('10.000'), Decimal('3.000')))
+
+        again = data_import.run_import('stock', self._csv(['article;quantity', 'IMP-0;8', 'IMP-1;3']), 'stock.csv', warehouse=self.wh)
+        self.assertEqual((again['imported'], again['unchanged'], again['error_count']), (0, 1, 1))
+        self.assertIn('більше ніж у файлі', again['errors'][0][1])
+
+        def count_queries(count, start):
+            rows = ['article,quantity'] + [f'IMP-{i},5' for i in range(start, start + count)]
+            with CaptureQueriesContext(connection) as ctx:
+                stats = data_import.run_import('stock', self._csv(rows), 'stock.csv', warehouse=self.wh)
+            self.assertEqual(stats['imported'], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(3, 10), count_queries(25, 15))
+
+    def test_stage_limits_and_supplier_prices_upsert(self):
+        """2) Ліміти (XLSX через форму) і прайс (CSV через команду) - upsert: повторний імпорт оновлює, не дублює."""
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from warehouse.models import Supplier, SupplierPrice
+
+        stage = ConstructionStage.objects.create(name='Фундамент', warehouse=self.wh)
+        StageLimit.objects.create(stage=stage, material=self.materials[0], planned_quantity=Decimal('1.000'))
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('import_data'), {
+            'kind': 'stage_limits', 'warehouse': self.wh.id,
+            'file': self._xlsx([('Етап', 'Артикул', 'План'), ('Фундамент', 'IMP-0', 150.5),
+                                ('Стіни', 'IMP-0', 45), ('Стіни', 'IMP-1', 2), ('Дах', 'NOPE', 1)]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats']['imported'], 3)
+        limits = {(l.stage.name, l.material_id): l.planned_quantity for l in StageLimit.objects.select_related('stage')}
+        self.assertEqual(limits, {
+            ('Фундамент', self.materials[0].id): Decimal('150.500'),
+            ('Стіни', self.materials[0].id): Decimal('45.000'),
+            ('Стіни', self.materials[1].id): Decimal('2.000'),
+        })
+        self.assertEqual(ConstructionStage.objects.filter(warehouse=self.wh).count(), 2)
+
+        supplier = Supplier.objects.create(name='Імпорт Постачальник')
+        SupplierPrice.objects.create(supplier=supplier, material=self.materials[0], price=Decimal('100.00'))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as f:
+            f.write('article,price\nIMP-0,120.50\nIMP-1,99\nIMP-1,98\n')
+        self.addCleanup(os.unlink, f.name)
+        out = io.StringIO()
+        call_command('import_data', 'supplier_prices', f.name, '--supplier', supplier.name, '--batch-size', '2', stdout=out)
+        self.assertIn('імпортовано: 3', out.getvalue())
+        self.assertEqual(
+            dict(SupplierPrice.objects.filter(supplier=supplier).values_list('material_id', 'price')),
+            {self.materials[0].id: Decimal('120.50'), self.materials[1].id: Decimal('98.00')}
+        )
+
+    def test_invalid_files_are_rejected(self):
+        """3) Без потрібних колонок / без складу / не той формат - помилка форми; import_concrete_plan читає файл."""
+        import io
+        import os
+        import tempfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+
+        self.client.force_login(self.admin)
+        url = reverse('import_data')
+        response = self.client.post(url, {'kind': 'stage_limits', 'warehouse': self.wh.id,
+                                          'file': self._xlsx([('article', 'qty'), ('IMP-0', 1)])})
+        self.assertIn('Відсутні колонки: stage, planned_quantity', response.context['form'].errors['file'][0])
+        response = self.client.post(url, {'kind': 'stock', 'file': SimpleUploadedFile('s.csv', b'article,quantity\n')})
+        self.assertIn('warehouse', response.context['form'].errors)
+        response = self.client.post(url, {'kind': 'stock', 'warehouse': self.wh.id,
+                                          'file': SimpleUploadedFile('s.exe', b'MZ')})
+        self.assertIn('file', response.context['form'].errors)
+        self.assertFalse(Transaction.objects.exists())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as f:
+            f.write('stage;article;planned_quantity\n0. Фундамент (Плита);IMP-5;150.5\n')
+        self.addCleanup(os.unlink, f.name)
+        call_command('import_concrete_plan', f.name, '--warehouse', self.wh.name, stdout=io.StringIO())
+        self.assertEqual(StageLimit.objects.get(material=self.materials[5]).planned_quantity, Decimal('150.500'))
+
+    def test_malformed_content_is_reported_not_raised(self):
+        """4) CSV у Windows-1251 читається; не-XLSX - помилка файлу; NaN/Infinity і числа поза полем - помилки рядків."""
+        import io
+        from warehouse.services import data_import
+
+        cp1251 = io.BytesIO('Артикул;Кількість\nIMP-0;5\n'.encode('cp1251'))
+        stats = data_import.run_import('stock', cp1251, 'stock.csv', warehouse=self.wh)
+        self.assertEqual((stats['imported'], stats['error_count']), (1, 0))
+
+        with self.assertRaisesMessage(data_import.DataImportError, 'Excel'):
+            data_import.run_import('stock', io.BytesIO(b'article;quantity\nIMP-0;5\n'), 'stock.xlsx', warehouse=self.wh)
+
+        lines = ['article;quantity;price', 'IMP-1;NaN;', 'IMP-2;Infinity;', 'IMP-3;1e30;', 'IMP-4;-1e30;',
+                 'IMP-5;100000000000;', 'IMP-6;1;1e12', 'IMP-7;99999999999.999;']
+        stats = data_import.run_import('stock', self._csv(lines), 'stock.csv', warehouse=self.wh)
+        self.assertEqual((stats['imported'], stats['error_count']), (1, 6))
+        expected = ['некоректне число', 'некоректне число', 'завелике число', "від'ємною", 'завелике число', 'завелике число']
+        for (_, message), fragment in zip(stats['errors'], expected):
+            self.assertIn(fragment, message)
+
+
+class StocktakeTests(TestCase):
+    """Інвентаризація: знімок залишків, підрахунок (форма / файл), проведення розбіжностей одним пакетом."""
+
+    def setUp(self):
+        cache.clear()  # rate_limit
+        self.admin = User.objects.create_user(username='stocktake_admin', password='password', is_staff=True)
+        self.wh = Warehouse.objects.create(name='Інвент Склад')
+        self.materials = [
+            Material.objects.create(name=f'Інвент мат {i}', unit='шт', article=f'INV-{i}', current_avg_price=Decimal('10.00'))
+            for i in range(4)
+        ]
+        for material in self.materials[:3]:
+            inventory.create_incoming(material, self.wh, Decimal('10'), self.admin)
+
+    def test_start_snapshots_balances_and_collects_counts(self):
+        """1) Старт - знімок ненульових залишків; одна незавершена на склад; підрахунок з форми й файлу."""
+        import io
+        from warehouse.services import data_import, stocktake as stocktake_services
+
+        inventory.create_writeoff(self.materials[2], self.wh, Decimal('10'), self.admin)
+        stocktake = stocktake_services.start(self.wh, self.admin)
+        self.assertEqual(
+            dict(stocktake.lines.values_list('material_id', 'system_quantity')),
+            {self.materials[0].id: Decimal('10.000'), self.materials[1].id: Decimal('10.000')}
+        )
+        with self.assertRaises(stocktake_services.StocktakeError):
+            stocktake_services.start(self.wh, self.admin)
+
+        lines = stocktake.lines.select_related('material')
+        counts, errors = stocktake_services.counts_from_form(
+            {f'count_{self.materials[0].id}': '9,5', f'count_{self.materials[1].id}': '-1'}, lines
+        )
+        self.assertEqual(counts, {self.materials[0].id: Decimal('9.500')})
+        self.assertEqual(len(errors), 1)
+        stocktake_services.save_counts(stocktake, counts)
+
+        counts, errors = data_import.read_quantities(
+            io.BytesIO('article;quantity\nINV-1;12\nINV-3;4\nNOPE;1\n'.encode('utf-8')), 'count.csv'
+        )
+        self.assertEqual(len(errors), 1)
+        stocktake_services.save_counts(stocktake, counts)
+
+        lines, totals = stocktake_services.variance_report(stocktake)
+        self.assertEqual(
+            {line.material_id: line.variance for line in lines},
+            {self.materials[0].id: Decimal('-0.500'), self.materials[1].id: Decimal('2.000'), self.materials[3].id: Decimal('4.000')}
+        )
+        self.assertEqual((totals['counted'], totals['surplus_value'], totals['shortage_value']),
+                         (3, Decimal('60.00'), Decimal('5.00')))
+
+    def test_post_creates_adjustments_in_one_document(self):
+        """2) Проведення: IN/LOSS одним пакетом з посиланням на документ; залишок = факт; повтор - помилка."""
+        from warehouse.services import stocktake as stocktake_services
+
+        stocktake = stocktake_services.start(self.wh, self.admin)
+        stocktake_services.save_counts(stocktake, {
+            self.materials[0].id: Decimal('7'), self.materials[1].id: Decimal('10'), self.materials[3].id: Decimal('2'),
+        })
+        # Операція під час підрахунку зберігається: коригується поточний залишок на розбіжність
+        inventory.create_incoming(self.materials[0], self.wh, Decimal('5'), self.admin)
+
+        with CaptureQueriesContext(connection) as ctx:
+            txns = stocktake_services.post(stocktake, self.admin)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "warehouse_transaction"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(
+            sorted((t.transaction_type, t.material_id, t.quantity) for t in stocktake.transactions.all()),
+            sorted([('LOSS', self.materials[0].id, Decimal('3.000')), ('IN', self.materials[3].id, Decimal('2.000'))])
+        )
+        self.assertEqual(len(txns), 2)
+        balance = get_warehouse_balance(self.wh)
+        self.assertEqual((balance[self.materials[0]], balance[self.materials[3]]), (Decimal('12.000'), Decimal('2.000')))
+        self.materials[3].refresh_from_db()
+        self.assertEqual(self.materials[3].current_avg_price, Decimal('10.00'))
+
+        stocktake.refresh_from_db()
+        self.assertEqual(stocktake.status, 'posted')
+        with self.assertRaises(stocktake_services.StocktakeError):
+            stocktake_services.post(stocktake, self.admin)
+        with self.assertRaises(stocktake_services.StocktakeError):
+            stocktake_services.save_counts(stocktake, {self.materials[0].id: Decimal('1')})
+
+    def test_views_and_rollback_when_shortage_cannot_be_written_off(self):
+        """3) Сторінки: старт, збереження, проведення; нестача більша за поточний залишок - нічого не проводиться."""
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('stocktake_list'), {'warehouse': self.wh.id, 'note': 'Річна'})
+        stocktake = self.wh.stocktakes.get()
+        self.assertRedirects(response, reverse('stocktake_detail', args=[stocktake.pk]))
+
+        url = reverse('stocktake_detail', args=[stocktake.pk])
+        self.client.post(url, {'action': 'save', f'count_{self.materials[0].id}': '1', f'count_{self.materials[1].id}': ''})
+        self.assertEqual(
+            dict(stocktake.lines.values_list('material_id', 'counted_quantity')),
+            {self.materials[0].id: Decimal('1.000'), self.materials[1].id: None, self.materials[2].id: None}
+        )
+        # Після знімка списано майже все: нестачу 9 списати не можна
+        inventory.create_writeoff(self.materials[0], self.wh, Decimal('8'), self.admin)
+        response = self.client.post(url, {'action': 'post'}, follow=True)
+        self.assertContains(response, 'нестачу не списати')
+        stocktake.refresh_from_db()
+        self.assertEqual(stocktake.status, 'draft')
+        self.assertFalse(stocktake.transactions.exists())
+
+        self.client.post(url, {'action': 'save', f'count_{self.materials[0].id}': '10'})
+        self.client.post(url, {'action': 'post'})
+        stocktake.refresh_from_db()
+        self.assertEqual(stocktake.status, 'posted')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="count_')
+
+    def test_malformed_counts_are_reported(self):
+        """4) Пошкоджений файл підрахунку і NaN / завеликі числа - повідомлення, а не 500; рядки не змінюються."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from warehouse.services import stocktake as stocktake_services
+
+        stocktake = stocktake_services.start(self.wh, self.admin)
+        url = reverse('stocktake_detail', args=[stocktake.pk])
+        self.client.force_login(self.admin)
+
+        response = self.client.post(url, {'action': 'upload', 'file': SimpleUploadedFile('count.xlsx', b'not a zip')}, follow=True)
+        self.assertContains(response, 'Excel')
+        response = self.client.post(url, {
+            'action': 'upload', 'file': SimpleUploadedFile('count.csv', b'article;quantity\nINV-0;NaN\nINV-1;1e30\n'),
+        }, follow=True)
+        self.assertContains(response, 'Рядків з помилками: 2')
+
+        response = self.client.post(url, {
+            'action': 'save', f'count_{self.materials[0].id}': 'NaN', f'count_{self.materials[1].id}': '1e12',
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(stocktake.lines.filter(counted_quantity__isnull=False).exists())
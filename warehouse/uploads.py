@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+import tempfile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from .forms import (
+    ALLOWED_DOC_EXTENSIONS, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_IMPORT_EXTENSIONS,
+    MAX_IMPORT_UPLOAD_SIZE, MAX_IMPORT_UPLOAD_SIZE_MB, MAX_UPLOAD_SIZE, MAX_UPLOAD_SIZE_MB
+)
+
+# Тимчасові файли завантажень - у MEDIA_ROOT (та сама ФС, що й сховище): збереження - rename, без копії
+SPOOL_DIR = '.uploads'
+ALLOWED_EXTENSIONS = sorted(set(ALLOWED_IMAGE_EXTENSIONS) | set(ALLOWED_DOC_EXTENSIONS) | set(ALLOWED_IMPORT_EXTENSIONS))
+
+
+def spool_dir():
+    return os.path.join(settings.MEDIA_ROOT, SPOOL_DIR)
+
+
+def _extension(file_name):
+    return os.path.splitext(file_name)[1].lower().lstrip('.')
+
+
+def _size_limit(file_name):
+    """(байт, MB): CSV/XLSX імпорту - MAX_IMPORT_UPLOAD_SIZE, решта (фото, документи) - MAX_UPLOAD_SIZE."""
+    if _extension(file_name) in ALLOWED_IMPORT_EXTENSIONS:
+        return MAX_IMPORT_UPLOAD_SIZE, MAX_IMPORT_UPLOAD_SIZE_MB
+    return MAX_UPLOAD_SIZE, MAX_UPLOAD_SIZE_MB
+
+
+def _too_large_message(limit_mb):
+    return f"Файл занадто великий. Максимальний розмір: {limit_mb} MB."
+
+
+class StreamedUpload(UploadedFile):
+    """Завантаження, записане потоково у spool_dir(). temporary_file_path() -> FileSystemStorage переносить файл."""
+
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        directory = spool_dir()
+        os.makedirs(directory, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + os.path.splitext(name)[1][:10], dir=directory)
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+        # sha256 рахується під час прийому - ContentAddressedStorage не перечитує файл
+        self.content_sha256 = None
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # Файл уже перенесено у сховище
+            pass
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, відхилений під час прийому (розмір/тип). Форми показують upload_error як помилку поля."""
+
+    def __init__(self, name, content_type, size, upload_error):
+        super().__init__(io.BytesIO(), name, content_type, size)
+        self.upload_error = upload_error
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Єдиний обробник завантажень (settings.FILE_UPLOAD_HANDLERS).
+
+    Тип файлу перевіряється до прийому даних, розмір - під час прийому: як тільки файл
+    перевищив ліміт (MAX_UPLOAD_SIZE; для CSV/XLSX імпорту - MAX_IMPORT_UPLOAD_SIZE), запис
+    зупиняється і тимчасовий файл видаляється (решта тіла запиту вичитується без збереження). У пам'яті - тільки поточний chunk, незалежно від розміру
+    файлу (стандартний MemoryFileUploadHandler тримає до 2.5 MB на файл).
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.received = 0
+        self.upload = None
+        self.digest = hashlib.sha256()
+        self.upload_error = None
+        self.max_size, self.max_size_mb = _size_limit(file_name)
+
+        if _extension(file_name) not in ALLOWED_EXTENSIONS:
+            self.upload_error = f"Недозволений тип файлу. Дозволені: {', '.join(ALLOWED_EXTENSIONS)}"
+        elif content_length and content_length > self.max_size:
+            self.upload_error = _too_large_message(self.max_size_mb)
+        else:
+            self.upload = StreamedUpload(file_name, content_type, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.upload is None:
+            return None
+        if self.received > self.max_size:
+            self.upload_error = _too_large_message(self.max_size_mb)
+            self.upload.close()
+            self.upload = None
+            return None
+        self.digest.update(raw_data)
+        self.upload.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.upload is None:
+            return RejectedUpload(self.file_name, self.content_type, self.received, self.upload_error)
+        self.upload.seek(0)
+        self.upload.size = file_size
+        self.upload.content_sha256 = self.digest.hexdigest()
+        return self.upload
+
+    def upload_interrupted(self):
+        if self.upload is not None:
+            self.upload.close()
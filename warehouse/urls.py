@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 # 🔥 Модульні імпорти views
@@ -7,9 +8,18 @@ from .views.concrete_analytics import concrete_analytics
 from .views.rebar_analytics import rebar_analytics
 from .views.mechanisms_analytics import mechanisms_analytics
 from .views.utils import ajax_warehouse_stock, ajax_materials
+from .views import ajax_async
+from .views import profiling
 # Імпортуємо нову view home (диспетчер)
 from .views.home import home as home_view
 
+# ASYNC_AJAX=True: основні /ajax/ маршрути обслуговують async views (деплой під ASGI, див. asgi.py)
+if settings.ASYNC_AJAX:
+    check_duplicates_view, load_stages_view = ajax_async.check_order_duplicates, ajax_async.load_stages
+    ajax_warehouse_stock, ajax_materials = ajax_async.ajax_warehouse_stock, ajax_async.ajax_materials
+else:
+    check_duplicates_view, load_stages_view = orders.check_order_duplicates, general.load_stages
+
 urlpatterns = [
     # ==============================================================================
     # ГОЛОВНА СТОРІНКА (HOME / DISPATCHER)
@@ -23,8 +33,8 @@ urlpatterns = [
     # ==============================================================================
     # AJAX API (ДЛЯ JS)
     # ==============================================================================
-    path('ajax/check_duplicates/', orders.check_order_duplicates, name='check_order_duplicates'),
-    path('ajax/load-stages/', general.load_stages, name='ajax_load_stages'),
+    path('ajax/check_duplicates/', check_duplicates_view, name='check_order_duplicates'),
+    path('ajax/load-stages/', load_stages_view, name='ajax_load_stages'),
     
     # (A) Ajax Warehouse Stock: Legacy path з новим іменем
     path('ajax/warehouse-stock/', ajax_warehouse_stock, name='ajax_warehouse_stock_legacy'),
@@ -36,6 +46,12 @@ urlpatterns = [
     # AJAX API для матеріалів
     path('ajax/materials/', ajax_materials, name='ajax_materials'),
 
+    # Async-версії (async ORM) - завжди доступні окремо, для ASGI-воркерів і порівняння навантаження
+    path('ajax/async/check_duplicates/', ajax_async.check_order_duplicates, name='check_order_duplicates_async'),
+    path('ajax/async/load-stages/', ajax_async.load_stages, name='ajax_load_stages_async'),
+    path('ajax/async/warehouse/<int:warehouse_id>/stock/', ajax_async.ajax_warehouse_stock, name='ajax_warehouse_stock_async'),
+    path('ajax/async/materials/', ajax_async.ajax_materials, name='ajax_materials_async'),
+
     # ==============================================================================
     # РОБОЧИЙ СТІЛ МЕНЕДЖЕРА (MANAGER)
     # ==============================================================================
@@ -52,10 +68,22 @@ urlpatterns = [
     
     # Обробка заявки (погодження/відхилення)
     path('manager/order/<int:pk>/process/', manager.manager_process_order, name='manager_process_order'),
+    path('manager/order/<int:pk>/approve/', manager.order_approve, name='order_approve'),
+    path('manager/order/<int:pk>/reject/', manager.order_reject, name='order_reject'),
     
     # Split Order (Розділення заявки)
     path('manager/order/<int:pk>/split/', manager.split_order, name='split_order'),
 
+    # Імпорт CSV/XLSX: залишки, ліміти етапів, прайси постачальників
+    path('manager/import/', manager.import_data, name='import_data'),
+
+    # Інвентаризація: знімок залишків, підрахунок (форма / файл), проведення розбіжностей пакетом
+    path('manager/stocktakes/', manager.stocktake_list, name='stocktake_list'),
+    path('manager/stocktake/<int:pk>/', manager.stocktake_detail, name='stocktake_detail'),
+
+    # Пропозиції переміщень між об'єктами (балансування залишків)
+    path('manager/transfers/suggestions/', manager.transfer_suggestions, name='transfer_suggestions'),
+
     # ==============================================================================
     # ЛОГІСТИКА
     # ==============================================================================
@@ -65,6 +93,7 @@ urlpatterns = [
     path('logistics/dashboard/', orders.logistics_monitor, name='logistics_dashboard'),
     
     path('order/<int:pk>/mark_shipped/', orders.mark_order_shipped, name='mark_order_shipped'),
+    path('orders/bulk-transition/', orders.bulk_order_transition, name='bulk_order_transition'),
     path('order/<int:pk>/confirm_receipt/', orders.confirm_receipt, name='confirm_receipt'),
 
     # ==============================================================================
@@ -74,6 +103,9 @@ urlpatterns = [
     path('transaction/<int:pk>/', transactions.transaction_detail, name='transaction_detail'),
     path('transaction/add/', transactions.add_transaction, name='add_transaction'),
     
+    # Пакетне API операцій з ключами ідемпотентності (офлайн-клієнти)
+    path('api/transactions/batch/', transactions.ingest_transactions_api, name='ingest_transactions_api'),
+
     # Переміщення (Transfers)
     path('transfer/create/', transactions.create_transfer_view, name='create_transfer'), # Використовує alias у transactions.py
     # Alias для сумісності з шаблонами/тестами (add_transfer)
@@ -105,6 +137,7 @@ urlpatterns = [
     
     # Фінанси та Планування
     path('reports/planning/', reports.planning_report, name='planning_report'),
+    path('reports/forecast/', reports.reorder_forecast, name='reorder_forecast'),
     path('reports/suppliers/', reports.suppliers_rating, name='suppliers_rating'),
     path('reports/financial/', reports.savings_report, name='financial_report'), # Alias
     path('reports/problems/', reports.problem_areas, name='problem_areas'),
@@ -116,6 +149,11 @@ urlpatterns = [
     path('reports/movement/', reports.movement_history, name='movement_history'),
     path('reports/procurement/', reports.procurement_journal, name='procurement_journal'),
     path('reports/audit/', reports.global_audit_log, name='global_audit_log'),
+
+    # Профілі запитів (staff, DJANGO_PROFILING=True)
+    path('profiling/', profiling.profiling_list, name='profiling_list'),
+    path('profiling/<str:capture_id>/', profiling.profiling_detail, name='profiling_detail'),
+    path('profiling/<str:capture_id>/download/<str:kind>/', profiling.profiling_download, name='profiling_download'),
     
     # SAP Analytics
     path('reports/rebar/', rebar_analytics, name='rebar_analytics'),
@@ -132,4 +170,11 @@ urlpatterns = [
     
     # Друк
     path('order/<int:pk>/print/', orders.print_order_pdf, name='print_order_pdf'),
-]
\ No newline at end of file
+]
+
+# SSE: зміни залишків складу - тільки під ASGI (ASYNC_AJAX=True). Під WSGI потік займав би
+# sync-воркер на весь STREAM_MAX_SECONDS; форми тоді перечитують залишки опитуванням (stock_ajax.js)
+if settings.ASYNC_AJAX:
+    urlpatterns.append(
+        path('ajax/warehouse/<int:warehouse_id>/stock/events/', ajax_async.stock_events_stream, name='ajax_warehouse_stock_events')
+    )
\ No newline at end of file
@@ -0,0 +1,210 @@
+import json
+import time
+from decimal import Decimal
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from ..models import Transaction, Warehouse, ConstructionStage, OrderItem
+from ..decorators import rate_limit
+from ..services.low_stock import BALANCE_EXPR
+from ..services.material_search import asearch_materials
+from ..services import stock_events
+from ..services.orders import DUPLICATE_ITEMS_PREVIEW, duplicate_candidates
+from .utils import parse_id_list
+
+# ==============================================================================
+# ASYNC AJAX (ASGI)
+# Ті самі JSON-відповіді, що й sync-версії у views/utils.py, general.py, orders.py,
+# але без блокування воркера на час запиту до БД (async ORM).
+# ==============================================================================
+
+# Залишок у JSON - завжди з 3 знаками, як DecimalField(decimal_places=3) у sync-версії
+QTY_PLACES = Decimal('0.001')
+# SSE: через скільки секунд сервер закриває потік (EventSource перепідключиться з Last-Event-ID)
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _ahas_access(user, warehouse_id):
+    """Async-аналог utils.check_access: staff/superuser - завжди, інші - через profile.warehouses."""
+    if user.is_superuser or user.is_staff:
+        return True
+    return await Warehouse.objects.filter(pk=warehouse_id, userprofile__user=user).aexists()
+
+
+@login_required
+@rate_limit(requests_per_minute=60, key_prefix='ajax_stock')
+async def ajax_warehouse_stock(request, warehouse_id=None):
+    """
+    AJAX API (async): залишки по складу. Формат як у utils.ajax_warehouse_stock.
+    Баланс рахується одним GROUP BY разом з назвою та одиницею матеріалу.
+    """
+    if warehouse_id is None:
+        warehouse_id = request.GET.get('warehouse_id')
+
+    if not warehouse_id:
+        return JsonResponse({'error': 'Missing warehouse_id'}, status=400)
+
+    wh_id_int = _parse_id(warehouse_id)
+    if wh_id_int is None:
+        return JsonResponse({'error': 'Invalid ID'}, status=404)
+
+    user = await request.auser()
+    if not await Warehouse.objects.filter(pk=wh_id_int).aexists() or not await _ahas_access(user, wh_id_int):
+        # Якщо склад не знайдено або немає доступу - 404 (щоб не світити наявність)
+        return JsonResponse({}, status=404)
+
+    rows = (
+        Transaction.objects.filter(warehouse_id=wh_id_int)
+        .values('material_id', 'material__name', 'material__unit')
+        .annotate(qty=BALANCE_EXPR)
+        .order_by('material__name')
+    )
+    items = [
+        {
+            "material_id": row['material_id'],
+            "name": row['material__name'],
+            "unit": row['material__unit'],
+            "qty": str(row['qty'].quantize(QTY_PLACES))
+        }
+        async for row in rows
+        if row['qty']
+    ]
+
+    return JsonResponse({
+        "warehouse_id": wh_id_int,
+        "items": items
+    })
+
+
+@login_required
+@require_GET
+@rate_limit(requests_per_minute=120, key_prefix='ajax_materials')
+async def ajax_materials(request):
+    """AJAX API (async): пошук матеріалів. Формат як у utils.ajax_materials: {"items": [...]}."""
+    query = request.GET.get('q') or request.GET.get('term')
+    items = await asearch_materials(query, limit=50)
+    return JsonResponse({'items': items})
+
+
+@login_required
+@require_GET
+@rate_limit(requests_per_minute=60, key_prefix='ajax_stages')
+async def load_stages(request):
+    """API (async): етапи будівництва складу. Формат як у general.load_stages."""
+    wh_id_int = _parse_id(request.GET.get('warehouse_id'))
+    stages = []
+
+    if wh_id_int is not None and await _ahas_access(await request.auser(), wh_id_int):
+        qs = ConstructionStage.objects.filter(warehouse_id=wh_id_int).order_by('name').values('id', 'name')
+        stages = [stage async for stage in qs]
+
+    return JsonResponse(stages, safe=False)
+
+
+@login_required
+@rate_limit(requests_per_minute=30, key_prefix='ajax_order_dup')
+async def check_order_duplicates(request):
+    """
+    AJAX (async): чи не створювали схожу заявку на цей склад недавно.
+    Два запити (заявки + позиції з назвами) замість запиту на кожну заявку й позицію.
+    """
+    wh_id = _parse_id(request.GET.get('warehouse'))
+    if wh_id is None:
+        return JsonResponse({'exists': False})
+
+    material_ids = parse_id_list(request.GET.get('materials'))
+    orders = [order async for order in duplicate_candidates(wh_id, material_ids).only('id', 'created_at')]
+    if not orders:
+        return JsonResponse({'exists': False})
+
+    names = {}
+    items = OrderItem.objects.filter(order_id__in=[o.id for o in orders]).order_by('order_id', 'id')
+    async for order_id, name in items.values_list('order_id', 'material__name'):
+        preview = names.setdefault(order_id, [])
+        if len(preview) < DUPLICATE_ITEMS_PREVIEW:
+            preview.append(name)
+
+    data = []
+    for o in orders:
+        row = {
+            'id': o.id,
+            'date': o.created_at.strftime("%d.%m %H:%M"),
+            'items': ", ".join(names.get(o.id, []))
+        }
+        if material_ids:
+            row['shared_materials'] = o.shared_materials
+        data.append(row)
+    return JsonResponse({'exists': True, 'orders': data})
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stock_event_stream(warehouse_id, last_event_id):
+    """Пакети подій брокера -> SSE: одна подія 'stock' з сумарними дельтами по матеріалах."""
+    yield f"retry: {STREAM_RETRY_MS}\n\n"
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    listener = stock_events.get_broker().listen(warehouse_id, last_event_id)
+    try:
+        async for batch in listener:
+            if batch is stock_events.RESYNC:
+                yield _sse('resync', {'warehouse_id': warehouse_id})
+            elif batch:
+                deltas = {}
+                for event in batch:
+                    deltas[event['material_id']] = deltas.get(event['material_id'], Decimal('0')) + event['delta']
+                yield _sse('stock', {
+                    'warehouse_id': warehouse_id,
+                    'deltas': [
+                        {'material_id': mat_id, 'delta': str(delta.quantize(QTY_PLACES))}
+                        for mat_id, delta in deltas.items() if delta
+                    ]
+                }, event_id=batch.position)
+            else:
+                yield ": keep-alive\n\n"
+
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        await listener.aclose()
+
+
+@login_required
+@rate_limit(requests_per_minute=30, key_prefix='ajax_stock_events')
+async def stock_events_stream(request, warehouse_id):
+    """
+    SSE: зміни залишків складу в реальному часі (дельти від сервісів inventory).
+    URL: /ajax/warehouse/<int:warehouse_id>/stock/events/
+
+    event: stock  - {"warehouse_id", "deltas": [{"material_id", "delta": "-4.000"}]}, id = позиція потоку брокера
+    event: resync - події пропущено, клієнт має перечитати /ajax/warehouse/<id>/stock/
+    Розрахований на ASGI: під WSGI кожен відкритий потік займає воркер.
+    """
+    user = await request.auser()
+    if not await Warehouse.objects.filter(pk=warehouse_id).aexists() or not await _ahas_access(user, warehouse_id):
+        return JsonResponse({}, status=404)
+
+    last_event_id = stock_events.parse_position(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(
+        _stock_event_stream(warehouse_id, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx: не буферизувати потік
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -7,13 +7,16 @@ from django.contrib.auth.forms import PasswordChangeForm
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Q, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce
 from decimal import Decimal, ROUND_HALF_UP
 
 from ..models import Order, UserProfile, Warehouse, ConstructionStage, Material, Transaction
 from ..forms import UserUpdateForm, ProfileUpdateForm
 from .utils import get_user_warehouses, get_warehouse_balance, check_access
 from ..decorators import rate_limit
+from ..services.material_search import search_materials
+from ..services.low_stock import BALANCE_EXPR
 
 # ==============================================================================
 # ГОЛОВНА СТОРІНКА
@@ -134,13 +137,13 @@ def change_password_view(request):
             user = form.save()
             update_session_auth_hash(request, user)  # Щоб не розлогінило
             messages.success(request, 'Пароль успішно змінено!')
-            return render(request, 'warehouse/password_change_done.html')
+            return render(request, 'registration/password_change_done.html')
         else:
             messages.error(request, 'Виправте помилки нижче.')
     else:
         form = PasswordChangeForm(request.user)
         
-    return render(request, 'warehouse/password_change_form.html', {'form': form})
+    return render(request, 'registration/password_change_form.html', {'form': form})
 
 
 # ==============================================================================
@@ -172,7 +175,13 @@ def material_list(request):
     Список матеріалів з пошуком та пагінацією.
     """
     query = request.GET.get('q', '')
-    materials_list = Material.objects.all().select_related('category').order_by('name')
+    # Залишок рахується підзапитом тільки для матеріалів поточної сторінки
+    stock_sq = Transaction.objects.filter(
+        material=OuterRef('pk')
+    ).order_by().values('material').annotate(b=BALANCE_EXPR).values('b')
+    materials_list = Material.objects.all().select_related('category').annotate(
+        stock_balance=Coalesce(Subquery(stock_sq), Value(Decimal("0.000")), output_field=DecimalField(max_digits=14, decimal_places=3))
+    ).order_by('name')
     
     if query:
         materials_list = materials_list.filter(
@@ -199,40 +208,28 @@ def material_detail(request, pk):
     """
     material = get_object_or_404(Material, pk=pk)
     
-    # 1. Рахуємо залишки по складах (тільки доступні користувачу, або всі для менеджера)
+    # 1. Залишки по складах (тільки доступні користувачу, або всі для менеджера)
+    # Один GROUP BY по складу (IN - OUT - LOSS) замість двох агрегатів на кожен склад
     warehouses = get_user_warehouses(request.user)
+    balances = Transaction.objects.filter(
+        material=material,
+        warehouse__in=warehouses
+    ).values('warehouse_id', 'warehouse__name').annotate(qty=BALANCE_EXPR).order_by('warehouse_id')
+
     stock_distribution = []
-    total_quantity = 0
-    
-    for wh in warehouses:
-        # Рахуємо залишок конкретного матеріалу на складі
-        # Формула: IN - OUT - LOSS (враховуючи переміщення, які є OUT/IN з group_id)
-        
-        # IN (Прихід + Вхідні переміщення)
-        in_qty = Transaction.objects.filter(
-            material=material, 
-            warehouse=wh, 
-            transaction_type='IN'
-        ).aggregate(s=Sum('quantity'))['s'] or 0
-        
-        # OUT (Витрата + Вихідні переміщення) + LOSS
-        out_loss_qty = Transaction.objects.filter(
-            material=material, 
-            warehouse=wh, 
-            transaction_type__in=['OUT', 'LOSS']
-        ).aggregate(s=Sum('quantity'))['s'] or 0
-        
-        qty = in_qty - out_loss_qty
-        
+    total_quantity = Decimal("0.000")
+
+    for row in balances:
+        qty = row['qty'] or Decimal("0.000")
         if qty != 0: # Показуємо тільки якщо є рух або залишок
             stock_distribution.append({
-                'warehouse': wh.name,
+                'warehouse': row['warehouse__name'],
                 'quantity': round(qty, 2)
             })
             total_quantity += qty
             
     # 2. Оціночна вартість
-    total_value = total_quantity * float(material.current_avg_price)
+    total_value = total_quantity * material.current_avg_price
     
     # 3. Історія операцій (останні 50)
     # Фільтруємо транзакції тільки по доступних складах
@@ -285,11 +282,7 @@ def ajax_materials(request):
     URL: /ajax/materials/?q=query
     """
     query = request.GET.get('q', '')
-    materials = Material.objects.all().order_by('name')
-    
-    if query:
-        materials = materials.filter(name__icontains=query)
     
-    # Повертаємо топ-50 результатів
-    results = list(materials.values('id', 'name')[:50])
+    # Повертаємо топ-50 результатів (той самий індексований пошук, що й views.utils.ajax_materials)
+    results = [{'id': item['id'], 'name': item['name']} for item in search_materials(query, limit=50)]
     return JsonResponse(results, safe=False)
\ No newline at end of file
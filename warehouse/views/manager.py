@@ -1,6 +1,6 @@
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Q, Sum, F, Case, When, DecimalField
+from django.db.models import Q, Sum, F, Case, When, DecimalField, Count
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -10,13 +10,21 @@ from django.utils import timezone
 # --- Models Import ---
 from ..models import (
     Order, OrderItem, OrderComment, Material,
-    Warehouse, Transaction, Supplier, Category, ConstructionStage, SupplierPrice
+    Warehouse, Transaction, Supplier, Category, ConstructionStage, Stocktake
 )
 from .utils import (
-    get_warehouse_balance, log_audit,
+    get_warehouse_balance, log_audit, get_client_ip,
     get_allowed_warehouses, restrict_warehouses_qs, enforce_warehouse_access_or_404
 )
 from ..decorators import staff_required
+from ..services.low_stock import low_stock_qs
+from ..services import transfer_optimizer
+from ..services import orders as order_services
+from ..services import order_workflow
+from ..services import data_import
+from ..services import stocktake as stocktake_services
+from ..services.supplier_prices import SupplierPriceIndex
+from ..services.inventory import InsufficientStockError
 
 # --- Forms Import ---
 try:
@@ -42,6 +50,8 @@ except ImportError:
     
     OrderFnItemFormSet = inlineformset_factory(Order, OrderItem, form=OrderItemForm, extra=1)
 
+from ..forms import DataImportForm, StocktakeStartForm, StocktakeUploadForm
+
 
 @staff_required
 def dashboard(request):
@@ -74,13 +84,14 @@ def dashboard(request):
     # Ліміт 10 для дашборду
     recent_orders = recent_orders[:10]
 
-    # Матеріали з низьким запасом (для дозволених складів)
-    low_stock_materials = Material.objects.filter(min_limit__gt=0).order_by('-min_limit')[:5]
+    # Критичні залишки: реальне порівняння залишку з min_limit (один SQL-запит + COUNT)
+    low_stock_paginator = Paginator(low_stock_qs(allowed_warehouses), 10)
+    critical_stock = low_stock_paginator.get_page(request.GET.get('low_page'))
 
     context = {
         'stats': orders_stat,
         'recent_orders': recent_orders,
-        'low_stock_materials': low_stock_materials,
+        'critical_stock': critical_stock,
         'page_title': 'Панель керування',
         'current_status': status
     }
@@ -261,14 +272,17 @@ def order_approve(request, pk):
     enforce_warehouse_access_or_404(request.user, order.warehouse)
 
     if request.method == 'POST':
-        order.status = 'approved'
-        order.save()
-        
-        OrderComment.objects.create(
-            order=order,
-            author=request.user,
-            text="✅ Заявку погоджено. Передано в закупівлю."
-        )
+        try:
+            with transaction.atomic():
+                order_workflow.transition(order, 'approved', request.user, get_client_ip(request))
+                OrderComment.objects.create(
+                    order=order,
+                    author=request.user,
+                    text="✅ Заявку погоджено. Передано в закупівлю."
+                )
+        except order_workflow.TransitionError as e:
+            messages.error(request, str(e))
+            return redirect('manager_order_detail', pk=pk)
         
         messages.success(request, f"Заявку #{order.id} погоджено!")
         return redirect('manager_order_detail', pk=pk)
@@ -290,14 +304,17 @@ def order_reject(request, pk):
 
     if request.method == 'POST':
         reason = request.POST.get('reason', 'Без пояснення')
-        order.status = 'rejected'
-        order.save()
-        
-        OrderComment.objects.create(
-            order=order,
-            author=request.user,
-            text=f"🚫 Заявку відхилено. Причина: {reason}"
-        )
+        try:
+            with transaction.atomic():
+                order_workflow.transition(order, 'rejected', request.user, get_client_ip(request))
+                OrderComment.objects.create(
+                    order=order,
+                    author=request.user,
+                    text=f"🚫 Заявку відхилено. Причина: {reason}"
+                )
+        except order_workflow.TransitionError as e:
+            messages.error(request, str(e))
+            return redirect('manager_order_detail', pk=pk)
         
         messages.warning(request, f"Заявку #{order.id} відхилено.")
         return redirect('manager_order_detail', pk=pk)
@@ -386,75 +403,42 @@ def split_order(request, pk):
     """
     Розділення заявки на декілька частин (наприклад, різні постачальники).
     Працює з items, а не з legacy material field.
+    Ціни постачальників беруться з SupplierPriceIndex (один запит на всю заявку).
     """
     original_order = get_object_or_404(Order, pk=pk)
     enforce_warehouse_access_or_404(request.user, original_order.warehouse)
-    items = original_order.items.select_related('material').all()
-    
+
+    if request.method == 'POST':
+        assignments = {
+            item_id: request.POST.get(f'item_{item_id}', 'original')
+            for item_id in original_order.items.values_list('id', flat=True)
+        }
+        try:
+            new_orders, moved_count = order_services.split_order(
+                original_order, assignments, user=request.user, ip=get_client_ip(request)
+            )
+        except order_workflow.TransitionError as e:
+            messages.error(request, str(e))
+            return redirect('manager_order_detail', pk=pk)
+
+        if new_orders:
+            log_audit(request, 'UPDATE', original_order, new_val=f"Split into {len(new_orders)} new orders")
+            messages.success(request, f"Успішно розділено на {len(new_orders)} нових заявок! Перенесено {moved_count} товарів.")
+
+        return redirect('manager_dashboard')
+
+    items = list(original_order.items.select_related('material'))
+
     # Групуємо постачальників для форми
     suppliers = Supplier.objects.all()
     suppliers_map = {s.id: s for s in suppliers}
-    
-    if request.method == 'POST':
-        with transaction.atomic():
-            new_orders_map = {}
-            moved_count = 0
-            
-            for item in items:
-                group_key = request.POST.get(f'item_{item.id}')
-                
-                # Якщо група не 'default'/'original' (залишити в старій), переносимо
-                if group_key and group_key != 'original':
-                    if group_key not in new_orders_map:
-                        supplier_id = None
-                        supplier = None
-                        
-                        if group_key.startswith('sup_'):
-                            try:
-                                supplier_id = int(group_key.split('_')[1])
-                                supplier = Supplier.objects.get(pk=supplier_id)
-                            except (ValueError, Supplier.DoesNotExist):
-                                pass
-                        
-                        new_order = Order.objects.create(
-                            warehouse=original_order.warehouse,
-                            created_by=original_order.created_by,
-                            status='new',
-                            priority=original_order.priority,
-                            expected_date=original_order.expected_date,
-                            supplier=supplier,
-                            note=f"Розділено із заявки #{original_order.id}"
-                        )
-                        new_orders_map[group_key] = new_order
-                    
-                    target_order = new_orders_map[group_key]
-                    item.order = target_order
-                    
-                    # Підтягуємо ціну постачальника
-                    if target_order.supplier:
-                        price_obj = SupplierPrice.objects.filter(
-                            supplier=target_order.supplier, 
-                            material=item.material
-                        ).first()
-                        if price_obj:
-                            item.supplier_price = price_obj.price
-                            
-                    item.save()
-                    moved_count += 1
-
-            if new_orders_map:
-                original_order.note = f"{original_order.note} | Частково розділена."
-                original_order.save()
-                
-                if original_order.items.count() == 0:
-                    original_order.status = 'rejected'
-                    original_order.note += " (Всі товари перенесено)"
-                    original_order.save()
-
-                log_audit(request, 'UPDATE', original_order, new_val=f"Split into {len(new_orders_map)} new orders")
-                messages.success(request, f"Успішно розділено на {len(new_orders_map)} нових заявок! Перенесено {moved_count} товарів.")
-                
-            return redirect('manager_dashboard')
+
+    # Авто-підказка найдешевшого постачальника без запиту на кожну позицію
+    price_index = SupplierPriceIndex.for_materials({item.material_id for item in items})
+    for item in items:
+        best = price_index.best(item.material_id)
+        item.best_supplier = suppliers_map.get(best[0]) if best else None
+        item.best_price = best[1] if best else None
 
     return render(request, 'warehouse/split_order.html', {
         'order': original_order, 
@@ -464,6 +448,179 @@ def split_order(request, pk):
     })
 
 
+@staff_required
+def transfer_suggestions(request):
+    """
+    Пропозиції переміщень між об'єктами (надлишок -> дефіцит).
+    GET - перелік пропозицій; POST - пакетне проведення вибраних.
+    Пропозиції перераховуються при POST, тож кількості завжди актуальні.
+    """
+    allowed_warehouses = get_allowed_warehouses(request.user)
+    suggestions = transfer_optimizer.suggest_transfers(allowed_warehouses)
+
+    if request.method == 'POST':
+        selected_keys = set(request.POST.getlist('selected'))
+        selected = [s for s in suggestions if s['key'] in selected_keys]
+
+        if not selected:
+            messages.warning(request, "Не вибрано жодного переміщення.")
+            return redirect('transfer_suggestions')
+
+        try:
+            group_ids = transfer_optimizer.apply_transfer_suggestions(request.user, selected)
+        except InsufficientStockError as e:
+            messages.error(request, f"Пакет не проведено: {e}")
+            return redirect('transfer_suggestions')
+
+        log_audit(request, 'CREATE', new_val=f"Bulk transfers from suggestions: {len(group_ids)}")
+        messages.success(request, f"✅ Проведено {len(group_ids)} переміщень.")
+        return redirect('transfer_journal')
+
+    return render(request, 'warehouse/transfer_suggestions.html', {
+        'suggestions': suggestions,
+        'page_title': 'Пропозиції переміщень'
+    })
+
+
+@staff_required
+def import_data(request):
+    """
+    Імпорт CSV/XLSX: початкові залишки, ліміти етапів (кошторис), прайси постачальників.
+    Файл приймається потоково (uploads.StreamingUploadHandler) і читається порядково
+    (services.data_import) - розмір файлу не впливає на пам'ять.
+    """
+    allowed_warehouses = get_allowed_warehouses(request.user)
+    stats = None
+
+    if request.method == 'POST':
+        form = DataImportForm(request.POST, request.FILES, warehouses=allowed_warehouses)
+        if form.is_valid():
+            data = form.cleaned_data
+            upload = data['file']
+            try:
+                stats = data_import.run_import(
+                    data['kind'], upload.file, upload.name,
+                    warehouse=data['warehouse'], supplier=data['supplier'], user=request.user
+                )
+            except data_import.DataImportError as e:
+                form.add_error('file', str(e))
+            else:
+                log_audit(
+                    request, 'CREATE',
+                    new_val=f"Import {data['kind']} from {upload.name}: {stats['imported']} rows, {stats['error_count']} errors"
+                )
+                if stats['error_count']:
+                    messages.warning(request, f"Імпортовано {stats['imported']}, рядків з помилками: {stats['error_count']}.")
+                else:
+                    messages.success(request, f"✅ Імпортовано {stats['imported']} рядків.")
+    else:
+        form = DataImportForm(warehouses=allowed_warehouses)
+
+    return render(request, 'warehouse/data_import.html', {
+        'form': form,
+        'stats': stats,
+        'formats': [
+            (label, data_import.COLUMNS[kind], data_import.OPTIONAL_COLUMNS.get(kind, ()))
+            for kind, label in data_import.KIND_LABELS.items()
+        ],
+        'page_title': 'Імпорт даних'
+    })
+
+
+STOCKTAKE_LIST_PAGE_SIZE = 30
+STOCKTAKE_REPORTED_ERRORS = 5
+
+
+@staff_required
+def stocktake_list(request):
+    """
+    Інвентаризації складів: перелік документів і старт нової (POST) - знімок облікових залишків.
+    """
+    allowed_warehouses = get_allowed_warehouses(request.user)
+
+    if request.method == 'POST':
+        form = StocktakeStartForm(request.POST, warehouses=allowed_warehouses)
+        if form.is_valid():
+            try:
+                stocktake = stocktake_services.start(
+                    form.cleaned_data['warehouse'], request.user, note=form.cleaned_data['note']
+                )
+            except stocktake_services.StocktakeError as e:
+                messages.error(request, str(e))
+            else:
+                log_audit(request, 'CREATE', stocktake, new_val=f"Stocktake started: {stocktake.warehouse.name}")
+                messages.success(request, f"✅ Інвентаризацію №{stocktake.id} розпочато: облікові залишки зафіксовано.")
+                return redirect('stocktake_detail', pk=stocktake.pk)
+    else:
+        form = StocktakeStartForm(warehouses=allowed_warehouses)
+
+    stocktakes = (
+        Stocktake.objects.filter(warehouse__in=allowed_warehouses)
+        .select_related('warehouse', 'created_by')
+        .annotate(lines_total=Count('lines'), counted_total=Count('lines__counted_quantity'))
+        .order_by('-created_at', '-pk')  # Meta.ordering не діє на запити з GROUP BY
+    )
+    return render(request, 'warehouse/stocktake_list.html', {
+        'form': form,
+        'stocktakes': Paginator(stocktakes, STOCKTAKE_LIST_PAGE_SIZE).get_page(request.GET.get('page')),
+        'page_title': 'Інвентаризація'
+    })
+
+
+@staff_required
+def stocktake_detail(request, pk):
+    """
+    Документ інвентаризації. POST action:
+    'save' - фактичні кількості з таблиці, 'upload' - з файлу (article, quantity),
+    'post' - проведення всіх розбіжностей одним пакетом.
+    """
+    stocktake = get_object_or_404(Stocktake.objects.select_related('warehouse', 'created_by'), pk=pk)
+    enforce_warehouse_access_or_404(request.user, stocktake.warehouse)
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        try:
+            if action == 'save':
+                counts, errors = stocktake_services.counts_from_form(
+                    request.POST, stocktake.lines.select_related('material')
+                )
+                saved = stocktake_services.save_counts(stocktake, counts)
+                if errors:
+                    messages.warning(request, f"Не збережено {len(errors)}: {'; '.join(errors[:STOCKTAKE_REPORTED_ERRORS])}")
+                messages.success(request, f"Збережено рядків: {saved}.")
+
+            elif action == 'upload':
+                form = StocktakeUploadForm(request.POST, request.FILES)
+                if not form.is_valid():
+                    messages.error(request, ' '.join(error for errors in form.errors.values() for error in errors))
+                    return redirect('stocktake_detail', pk=pk)
+                upload = form.cleaned_data['file']
+                counts, errors = data_import.read_quantities(upload.file, upload.name)
+                saved = stocktake_services.save_counts(stocktake, counts)
+                if errors:
+                    messages.warning(request, f"Рядків з помилками: {len(errors)}: " + '; '.join(
+                        f"{line}: {message}" for line, message in errors[:STOCKTAKE_REPORTED_ERRORS]
+                    ))
+                messages.success(request, f"Завантажено з файлу рядків: {saved}.")
+
+            elif action == 'post':
+                txns = stocktake_services.post(stocktake, request.user)
+                log_audit(request, 'UPDATE', stocktake, new_val=f"Stocktake posted: {len(txns)} adjustments")
+                messages.success(request, f"✅ Інвентаризацію проведено: коригувань {len(txns)}.")
+        except (stocktake_services.StocktakeError, data_import.DataImportError) as e:
+            messages.error(request, str(e))
+        return redirect('stocktake_detail', pk=pk)
+
+    lines, totals = stocktake_services.variance_report(stocktake)
+    return render(request, 'warehouse/stocktake_detail.html', {
+        'stocktake': stocktake,
+        'lines': lines,
+        'totals': totals,
+        'upload_form': StocktakeUploadForm(),
+        'page_title': f'Інвентаризація №{stocktake.id}'
+    })
+
+
 # ==============================================================================
 # COMPATIBILITY LAYER (ALIASES & STUBS)
 # ==============================================================================
@@ -475,9 +632,11 @@ manager_order_detail = order_detail
 @staff_required
 def manager_process_order(request, pk):
     """
-    Редирект на деталі заявки, оскільки процес погодження змінено.
-    Відображає шаблон-повідомлення.
+    Кнопка «Погодити» на сторінці заявки (POST) - погодження через order_approve.
+    GET - редирект на деталі заявки (шаблон-повідомлення).
     """
+    if request.method == 'POST':
+        return order_approve(request, pk)
     order = get_object_or_404(Order, pk=pk)
     enforce_warehouse_access_or_404(request.user, order.warehouse)
     return render(request, 'warehouse/manager_process_order.html', {'order': order})
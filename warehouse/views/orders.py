@@ -4,22 +4,27 @@ from django.contrib import messages
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
+from django.http import HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, HttpResponse, FileResponse
+from django.core.paginator import Paginator
 from django.db.models import Q
 import json
 import logging
+import tempfile
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
 from decimal import Decimal
 
 logger = logging.getLogger('warehouse')
 
 from ..models import Order, OrderItem, Warehouse, Material, Supplier, AuditLog
 from ..forms import OrderForm, OrderItemFormSet
-from ..services import inventory
+from ..services import inventory, order_workflow
+from ..services import orders as order_services
 from ..services.inventory import InsufficientStockError
-from .utils import log_audit, check_access
-from ..decorators import rate_limit
+from .utils import log_audit, check_access, get_client_ip, get_allowed_warehouses, parse_id_list
+from ..decorators import rate_limit, staff_required
 
 # ==============================================================================
 # СПИСОК ЗАЯВОК (ORDER LIST)
@@ -28,13 +33,12 @@ from ..decorators import rate_limit
 @login_required
 def order_list(request):
     """
-    Загальний список заявок з фільтрацією.
-    Відображає всі заявки, відсортовані від найновіших.
+    Загальний список заявок з фільтрацією, посторінково (від найновіших).
+    Кількість позицій і орієнтовна сума рахуються в SQL (services.orders.with_totals).
     """
-    # Оптимізація: завантажуємо пов'язані об'єкти (склад, автор) та товари (items + матеріали)
-    orders = Order.objects.select_related('warehouse', 'created_by', 'source_warehouse') \
-                          .prefetch_related('items__material') \
-                          .order_by('-created_at')
+    orders = order_services.with_totals(
+        Order.objects.select_related('warehouse', 'created_by', 'source_warehouse')
+    ).order_by('-created_at', '-id')
 
     # Фільтрація по статусу
     status = request.GET.get('status')
@@ -51,72 +55,77 @@ def order_list(request):
 
     # EXPORT TO EXCEL
     if request.GET.get('export') == 'excel':
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Журнал заявок"
-
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-
-        # Headers
-        headers = ['ID', 'Дата', 'Тип', 'Об\'єкт', 'Статус', 'Пріоритет', 'Автор', 'Позицій', 'Сума (грн)']
-        ws.append(headers)
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # Data
-        for order in orders:
-            order_type = "Переміщення" if order.source_warehouse else "Закупівля"
-            total_sum = sum(item.quantity * (item.material.current_avg_price or 0) for item in order.items.all())
-            ws.append([
-                order.id,
-                order.created_at.strftime('%d.%m.%Y'),
-                order_type,
-                order.warehouse.name,
-                order.get_status_display(),
-                order.get_priority_display(),
-                order.created_by.get_full_name() if order.created_by else "—",
-                order.items.count(),
-                float(total_sum)
-            ])
-
-        # Autosize columns
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    cell_len = len(str(cell.value)) if cell.value else 0
-                    if cell_len > max_length:
-                        max_length = cell_len
-                except:
-                    pass
-            ws.column_dimensions[column].width = min(max_length + 2, 50)
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        filename = f"Orders_{timezone.now().strftime('%Y-%m-%d')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        wb.save(response)
-        return response
+        return _export_orders_excel(orders)
+
+    # Позиції (для прев'ю товарів) - тільки для заявок поточної сторінки
+    paginator = Paginator(orders.prefetch_related('items__material'), order_services.ORDER_LIST_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     return render(request, 'warehouse/order_list.html', {
-        'orders': orders,
+        'orders': page_obj,
         'f_status': status,
         'f_date_from': date_from,
         'f_date_to': date_to
     })
 
 
+# Ширини колонок експорту (write-only аркуш не дозволяє автопідбір після запису)
+ORDER_EXPORT_COLUMNS = [
+    ('ID', 8), ('Дата', 12), ('Тип', 14), ('Об\'єкт', 30), ('Статус', 16),
+    ('Пріоритет', 12), ('Автор', 24), ('Позицій', 10), ('Сума (грн)', 14),
+]
+
+
+def _export_orders_excel(orders):
+    """
+    Журнал заявок в Excel: write-only аркуш, заявки читаються пачками (iterator),
+    файл віддається потоком - пам'ять не залежить від кількості заявок.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Журнал заявок")
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+    border = Border(
+        left=Side(style='thin'), right=Side(style='thin'),
+        top=Side(style='thin'), bottom=Side(style='thin')
+    )
+
+    header = []
+    for index, (title, width) in enumerate(ORDER_EXPORT_COLUMNS, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.border = border
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        header.append(cell)
+    ws.append(header)
+
+    for order in orders.iterator(chunk_size=order_services.EXPORT_CHUNK_SIZE):
+        ws.append([
+            order.id,
+            order.created_at.strftime('%d.%m.%Y'),
+            "Переміщення" if order.source_warehouse_id else "Закупівля",
+            order.warehouse.name,
+            order.get_status_display(),
+            order.get_priority_display(),
+            order.created_by.get_full_name() if order.created_by else "—",
+            order.items_total,
+            float(order.estimated_total)
+        ])
+
+    # Тимчасовий файл видаляється після закриття відповіді
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    filename = f"Orders_{timezone.now().strftime('%Y-%m-%d')}.xlsx"
+    return FileResponse(
+        output, as_attachment=True, filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
 # ==============================================================================
 # СТВОРЕННЯ ТА РЕДАГУВАННЯ (CREATE / EDIT)
 # ==============================================================================
@@ -249,8 +258,12 @@ def logistics_monitor(request):
     if not request.user.is_staff:
         return redirect('index')
         
-    purchasing_orders = Order.objects.filter(status='purchasing').order_by('expected_date')
-    transit_orders = Order.objects.filter(status='transit').order_by('expected_date')
+    # Позиції з матеріалами - одним prefetch на список, а не запит на кожну картку
+    orders_qs = Order.objects.select_related(
+        'warehouse', 'source_warehouse', 'created_by'
+    ).prefetch_related('items__material')
+    purchasing_orders = orders_qs.filter(status='purchasing').order_by('expected_date')
+    transit_orders = orders_qs.filter(status='transit').order_by('expected_date')
     
     return render(request, 'warehouse/logistics.html', {
         'purchasing_orders': purchasing_orders,
@@ -274,16 +287,47 @@ def mark_order_shipped(request, pk):
         
         # Можна зберегти це в примітку
         note_add = f"\n[Логістика] Водій: {driver_phone}, Авто: {vehicle_number}"
-        order.note += note_add
-        
-        order.status = 'transit'
-        order.save()
         
-        log_audit(request, 'ORDER_STATUS', order, new_val="TRANSIT")
-        messages.success(request, f"Заявку #{order.id} відправлено (Transit).")
+        try:
+            with transaction.atomic():
+                order_workflow.transition(order, 'transit', request.user, get_client_ip(request))
+                order.note += note_add
+                order.save(update_fields=['note', 'updated_at'])
+        except order_workflow.TransitionError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f"Заявку #{order.id} відправлено (Transit).")
         
     return redirect('logistics_monitor')
 
+
+@staff_required
+def bulk_order_transition(request):
+    """
+    Масова зміна статусу заявок (логістика: вибрані 'purchasing' -> 'transit').
+    Один UPDATE + один пакетний запис в аудит (order_workflow.bulk_transition).
+    POST: order_ids (кілька), status. JSON-відповідь для AJAX, інакше - редірект на монітор.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    to_status = request.POST.get('status', '')
+    order_ids = [int(pk) for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+    if to_status not in order_workflow.TRANSITIONS or not order_ids:
+        return JsonResponse({'error': 'Вкажіть заявки і статус'}, status=400)
+
+    orders = Order.objects.filter(pk__in=order_ids, warehouse__in=get_allowed_warehouses(request.user))
+    moved_ids, skipped = order_workflow.bulk_transition(orders, to_status, request.user, get_client_ip(request))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'moved': moved_ids, 'skipped': {str(pk): status for pk, status in skipped.items()}})
+
+    if moved_ids:
+        messages.success(request, f"Статус «{order_workflow.STATUS_LABELS[to_status]}»: {len(moved_ids)} заявок.")
+    if skipped:
+        messages.warning(request, f"Пропущено (перехід не дозволений): {', '.join(f'#{pk}' for pk in skipped)}")
+    return redirect('logistics_monitor')
+
 @login_required
 def confirm_receipt(request, pk):
     """
@@ -308,6 +352,9 @@ def confirm_receipt(request, pk):
         comment = request.POST.get('comment', '')
         
         try:
+            # Фото відхилено ще під час завантаження (розмір/тип) - заявку не приймаємо
+            if getattr(proof_photo, 'upload_error', None):
+                raise ValueError(proof_photo.upload_error)
             inventory.process_order_receipt(order, items_data, request.user, proof_photo, comment)
 
             log_audit(request, 'ORDER_RECEIVED', order, new_val="Items added to stock")
@@ -337,26 +384,14 @@ def confirm_receipt(request, pk):
 def check_order_duplicates(request):
     """
     AJAX: Перевіряє, чи не створювали схожу заявку на цей склад недавно.
+    materials=1,2,3 (необов'язково) - тільки заявки з хоча б одним із цих матеріалів.
     """
     wh_id = request.GET.get('warehouse')
-    if not wh_id: return JsonResponse({'exists': False})
-
-    # Шукаємо заявки за останні 3 дні
-    three_days_ago = timezone.now() - timezone.timedelta(days=3)
-    recent_orders = Order.objects.filter(
-        warehouse_id=wh_id,
-        created_at__gte=three_days_ago
-    ).exclude(status__in=['completed', 'rejected', 'draft']).order_by('-created_at')
-    
-    if recent_orders.exists():
-        data = []
-        for o in recent_orders:
-            items_str = ", ".join([i.material.name for i in o.items.all()[:3]])
-            data.append({
-                'id': o.id,
-                'date': o.created_at.strftime("%d.%m %H:%M"),
-                'items': items_str
-            })
+    if not wh_id or not wh_id.isdigit(): return JsonResponse({'exists': False})
+
+    material_ids = parse_id_list(request.GET.get('materials'))
+    data = order_services.find_duplicate_orders(int(wh_id), material_ids)
+    if data:
         return JsonResponse({'exists': True, 'orders': data})
         
     return JsonResponse({'exists': False})
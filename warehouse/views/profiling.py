@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, FileResponse
+from django.shortcuts import render
+
+from ..decorators import staff_required
+from ..services import profiling
+
+# ==============================================================================
+# ПРОФІЛІ ЗАПИТІВ (staff)
+# Зняття: ?_profile=1 або заголовок X-Profile: 1 при DJANGO_PROFILING=True (див. ProfilingMiddleware)
+# ==============================================================================
+
+
+def _load_or_404(capture_id):
+    try:
+        return profiling.load_capture(capture_id)
+    except (OSError, ValueError):
+        raise Http404("Профіль не знайдено.")
+
+
+@staff_required
+def profiling_list(request):
+    """Останні зняті профілі: шлях, час, кількість SQL, хто знімав."""
+    return render(request, 'warehouse/profiling_list.html', {
+        'captures': profiling.list_captures(),
+        'enabled': settings.PROFILING_ENABLED,
+        'param': profiling.PROFILE_PARAM,
+        'header': profiling.PROFILE_HEADER,
+    })
+
+
+@staff_required
+def profiling_detail(request, capture_id):
+    """Профіль: найважчі функції (cumulative / tottime) і журнал SQL."""
+    capture = _load_or_404(capture_id)
+    return render(request, 'warehouse/profiling_detail.html', {'capture': capture})
+
+
+@staff_required
+def profiling_download(request, capture_id, kind):
+    """Завантаження: prof (pstats для snakeviz), sql (журнал запитів), json (усе разом)."""
+    if kind not in profiling.DOWNLOAD_KINDS:
+        raise Http404("Невідомий формат.")
+    content_type, extension = profiling.DOWNLOAD_KINDS[kind]
+    filename = f"profile_{capture_id}.{extension}"
+
+    if kind == 'sql':
+        response = HttpResponse(profiling.render_sql_log(_load_or_404(capture_id)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
+    try:
+        path = profiling.capture_path(capture_id, extension)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    except OSError:
+        raise Http404("Профіль не знайдено.")
@@ -5,7 +5,8 @@ from django.utils import timezone
 from datetime import timedelta
 from ..models import Transaction, Order, StageLimit, Material
 # Імпортуємо правильні функції з utils
-from .utils import get_user_warehouses, get_warehouse_balance
+from .utils import get_user_warehouses
+from ..services.low_stock import low_stock_qs
 
 @login_required
 def project_dashboard(request):
@@ -33,27 +34,20 @@ def project_dashboard(request):
         date__gte=start_month
     ).aggregate(s=Sum(spent_expr))['s'] or 0
     
-    # 3. Критичні залишки
+    # 3. Критичні залишки (розрахунок у SQL, а не обхід балансів кожного складу)
     critical_items = []
     warehouses = get_user_warehouses(request.user)
-    
-    for wh in warehouses:
-        # get_warehouse_balance тепер повертає словник {MaterialObj: quantity}
-        balance = get_warehouse_balance(wh)
-        
-        for material, qty in balance.items():
-            # 🔥 ВИПРАВЛЕНО: material - це об'єкт моделі, використовуємо getattr замість .get()
-            # Також підтримуємо обидва варіанти назви поля (min_limit або min_stock)
-            min_limit = getattr(material, 'min_limit', 0) or getattr(material, 'min_stock', 0)
-            
-            if min_limit > 0 and qty <= min_limit:
-                critical_items.append({
-                    'warehouse': wh.name,
-                    'material': material.name,
-                    'quantity': qty,
-                    'unit': material.unit,
-                    'min_limit': min_limit
-                })
+    critical_qs = low_stock_qs(warehouses)
+    critical_count = critical_qs.count()
+
+    for row in critical_qs[:50]:
+        critical_items.append({
+            'warehouse': row['warehouse__name'],
+            'material': row['material__name'],
+            'quantity': row['balance'],
+            'unit': row['material__unit'],
+            'min_limit': row['min_limit']
+        })
 
     # 4. Бетонування (KPI) - Приклад
     concrete_stages = []
@@ -92,6 +86,7 @@ def project_dashboard(request):
         'total_spent': total_spent,
         'spent_this_month': spent_this_month,
         'critical_items': critical_items,
+        'critical_count': critical_count,
         'concrete_stages': concrete_stages,
         'recent_logs': recent_logs
     })
\ No newline at end of file
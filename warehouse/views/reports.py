@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, F, DecimalField, Count, Q, Case, When, Value, Avg, ExpressionWrapper
 from django.db.models.functions import TruncMonth, TruncDay
 from django.http import HttpResponse, Http404
+from django.core.paginator import Paginator
 from datetime import timedelta
 import datetime
 from django.utils import timezone
@@ -11,7 +12,7 @@ import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from decimal import Decimal, ROUND_HALF_UP
 
-from ..models import Transaction, Order, OrderItem, Warehouse, Material, Supplier, AuditLog
+from ..models import Transaction, Order, OrderItem, Warehouse, Material, Supplier, AuditLog, ReorderSuggestion
 
 
 # ==============================================================================
@@ -85,7 +86,7 @@ def create_excel_response(headers, data_rows, filename, sheet_title="Report"):
 from ..forms import PeriodReportForm
 from .utils import (
     get_user_warehouses, 
-    get_warehouse_balance, 
+    get_warehouses_balances,
     enrich_transfers, 
     work_writeoffs_qs, 
     get_allowed_warehouses, 
@@ -286,27 +287,37 @@ def period_report(request):
         # 2. Транзакції (фільтр)
         # Спочатку фільтруємо по доступу до складів (якщо склад не вибрано, беремо всі дозволені)
         base_qs = restrict_warehouses_qs(Transaction.objects.all(), request.user)
-        
-        txs = base_qs.filter(date__gte=start_date, date__lte=end_date)
-        if warehouse:
-            txs = txs.filter(warehouse=warehouse)
-            
-        # Для розрахунку початкового залишку беремо все ДО start_date
-        pre_txs = base_qs.filter(date__lt=start_date)
         if warehouse:
-            pre_txs = pre_txs.filter(warehouse=warehouse)
-            
+            base_qs = base_qs.filter(warehouse=warehouse)
+
+        # Початковий залишок (все ДО start_date) і обороти за період - одним GROUP BY по матеріалах
+        is_in = Q(transaction_type='IN')
+        is_out = Q(transaction_type__in=['OUT', 'LOSS'])
+        before = Q(date__lt=start_date)
+        in_period = Q(date__gte=start_date)
+        totals = {
+            row['material_id']: row
+            for row in base_qs.filter(date__lte=end_date).order_by().values('material_id').annotate(
+                start_in=Sum('quantity', filter=before & is_in),
+                start_out=Sum('quantity', filter=before & is_out),
+                period_in=Sum('quantity', filter=in_period & is_in),
+                period_out=Sum('quantity', filter=in_period & is_out),
+            )
+        }
+
         # Групуємо по матеріалах
         for mat in materials:
+            row = totals.get(mat.id)
+            if row is None:
+                continue
+
             # Початковий залишок
-            start_in = pre_txs.filter(material=mat, transaction_type='IN').aggregate(s=Sum('quantity'))['s'] or Decimal("0.000")
-            start_out = pre_txs.filter(material=mat, transaction_type__in=['OUT', 'LOSS']).aggregate(s=Sum('quantity'))['s'] or Decimal("0.000")
-            start_balance = start_in - start_out
-            
+            start_balance = (row['start_in'] or Decimal("0.000")) - (row['start_out'] or Decimal("0.000"))
+
             # Обороти за період
-            period_in = txs.filter(material=mat, transaction_type='IN').aggregate(s=Sum('quantity'))['s'] or Decimal("0.000")
-            period_out = txs.filter(material=mat, transaction_type__in=['OUT', 'LOSS']).aggregate(s=Sum('quantity'))['s'] or Decimal("0.000")
-            
+            period_in = row['period_in'] or Decimal("0.000")
+            period_out = row['period_out'] or Decimal("0.000")
+
             # Кінцевий
             end_balance = start_balance + period_in - period_out
             
@@ -372,8 +383,11 @@ def stock_balance_report(request):
              raise Http404("Склад не знайдено або доступ заборонено.")
         target_warehouses = warehouses.filter(id=selected_wh_id)
     
+    target_warehouses = list(target_warehouses)
+    balances = get_warehouses_balances(target_warehouses)
+
     for wh in target_warehouses:
-        balance_map = get_warehouse_balance(wh)
+        balance_map = balances.get(wh.id, {})
         
         for mat, qty in balance_map.items():
             if qty <= 0: continue
@@ -584,10 +598,11 @@ def problem_areas(request):
     # Фільтруємо Order по warehouse__in=allowed
     base_order_qs = restrict_warehouses_qs(Order.objects.all(), request.user, warehouse_field='warehouse')
     
+    # Індекс (status, expected_date); склад і позиції - без запиту на кожен рядок
     overdue = base_order_qs.filter(
         status__in=['purchasing', 'transit'],
         expected_date__lt=timezone.now().date()
-    )
+    ).select_related('warehouse').prefetch_related('items__material').order_by('expected_date')
     
     # Втрати
     # Фільтруємо Transaction по warehouse__in=allowed
@@ -596,7 +611,8 @@ def problem_areas(request):
     
     return render(request, 'warehouse/problem_areas.html', {
         'overdue': overdue,
-        'recent_losses': losses
+        'recent_losses': losses,
+        'today': timezone.now().date(),
     })
 
 @login_required
@@ -646,10 +662,18 @@ def objects_comparison(request):
         output_field=DecimalField(max_digits=14, decimal_places=2)
     )
 
+    # Використовуємо work_writeoffs_qs, щоб рахувати тільки РЕАЛЬНІ витрати, а не переміщення
+    # Один GROUP BY по складу замість агрегату на кожен склад
+    spent_by_wh = dict(
+        work_writeoffs_qs(Transaction.objects.filter(warehouse__in=warehouses))
+        .order_by()
+        .values('warehouse')
+        .annotate(s=Sum(spent_expr))
+        .values_list('warehouse', 's')
+    )
+
     for wh in warehouses:
-        # Використовуємо work_writeoffs_qs, щоб рахувати тільки РЕАЛЬНІ витрати, а не переміщення
-        # Тут не треба restrict_warehouses_qs, бо ми вже ітеруємось по дозволених складах
-        spent = work_writeoffs_qs(Transaction.objects.filter(warehouse=wh)).aggregate(s=Sum(spent_expr))['s'] or Decimal("0.00")
+        spent = spent_by_wh.get(wh.id) or Decimal("0.00")
         
         data.append({
             'name': wh.name,
@@ -753,6 +777,58 @@ def planning_report(request):
         'f_priority': f_priority
     })
 
+# ==============================================================================
+# ПРОГНОЗ ДОЗАМОВЛЕННЯ (REORDER FORECAST)
+# ==============================================================================
+
+@login_required
+def reorder_forecast(request):
+    """
+    Звіт: Прогноз дозамовлення на основі темпу витрати.
+    Читає готові результати ReorderSuggestion (розраховуються командою forecast_reorders).
+    """
+    warehouses = get_allowed_warehouses(request.user)
+    wh_id = request.GET.get('warehouse')
+
+    qs = restrict_warehouses_qs(ReorderSuggestion.objects.all(), request.user)
+    qs = qs.select_related('warehouse', 'material').order_by('reorder_date', 'days_of_cover')
+
+    if wh_id:
+        if not wh_id.isdigit() or not warehouses.filter(pk=wh_id).exists():
+            raise Http404("Склад не знайдено або доступ заборонено.")
+        qs = qs.filter(warehouse_id=wh_id)
+
+    # EXPORT TO EXCEL
+    if request.GET.get('export') == 'excel':
+        headers = ['Замовити до', 'Об\'єкт', 'Матеріал', 'Од.', 'Залишок', 'Витрата/день', 'Вистачить (дн.)', 'Замовити']
+        rows = []
+        for sug in qs:
+            rows.append([
+                sug.reorder_date.strftime('%d.%m.%Y') if sug.reorder_date else '',
+                sug.warehouse.name,
+                sug.material.name,
+                sug.material.unit,
+                float(sug.current_stock),
+                float(max(sug.avg_daily_usage, sug.smoothed_daily_usage)),
+                float(sug.days_of_cover) if sug.days_of_cover is not None else '',
+                float(sug.reorder_quantity)
+            ])
+        filename = f"Reorder_Forecast_{timezone.now().strftime('%Y-%m-%d')}.xlsx"
+        return create_excel_response(headers, rows, filename, "Прогноз")
+
+    paginator = Paginator(qs, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    last_run = qs.order_by('-computed_at').values_list('computed_at', flat=True).first()
+
+    return render(request, 'warehouse/reorder_forecast.html', {
+        'suggestions': page_obj,
+        'warehouses': warehouses,
+        'selected_wh': int(wh_id) if wh_id else None,
+        'last_run': last_run,
+        'today': timezone.localdate(),
+    })
+
 # ==============================================================================
 # РЕЙТИНГ ПОСТАЧАЛЬНИКІВ (SUPPLIERS RATING)
 # ==============================================================================
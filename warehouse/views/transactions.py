@@ -1,18 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.db.models import Sum, Case, When, F, DecimalField, Q
 from django.utils import timezone
+from django.db import transaction
 from django import forms
 from decimal import Decimal, ROUND_HALF_UP
+import json
 import logging
 
 logger = logging.getLogger('warehouse')
 
 from ..models import Transaction, Order, Warehouse, Material, ConstructionStage 
-from ..forms import TransactionForm
+from ..forms import TransactionForm, MaterialChoiceField
 from .utils import (
     get_user_warehouses, 
     check_access, 
@@ -21,9 +23,11 @@ from .utils import (
     get_stock_json,
     enforce_warehouse_access_or_404,
     get_allowed_warehouses,
-    restrict_warehouses_qs
+    restrict_warehouses_qs,
+    get_client_ip
 )
-from ..services import inventory
+from ..decorators import rate_limit
+from ..services import inventory, ingestion
 # Імпортуємо виняток для обробки помилок залишків
 from ..services.inventory import InsufficientStockError
 
@@ -158,6 +162,77 @@ def transaction_detail(request, pk):
 # ДОДАВАННЯ ТРАНЗАКЦІЇ (РУЧНЕ)
 # ==============================================================================
 
+def _save_transaction_form(request, form, post_data):
+    """
+    Валідує TransactionForm і проводить операцію через inventory services.
+    Повертає HttpResponse або None (показати форму знову).
+    Викликається всередині transaction.atomic() - див. add_transaction.
+    """
+    if form.is_valid():
+        data = form.cleaned_data
+        wh = data['warehouse']
+        
+        # Перевірка доступу до складу
+        # Це викликає 404, якщо користувач не має прав на цей склад
+        enforce_warehouse_access_or_404(request.user, wh)
+
+        try:
+            # Використовуємо inventory services замість ручного створення
+            t_type = data['transaction_type']
+            
+            # Отримуємо дату та ціну з post_data (бо їх може не бути в form.cleaned_data, якщо полів немає у формі)
+            tx_date = post_data.get('date')
+            tx_price = post_data.get('price')
+            
+            if t_type == 'IN':
+                inventory.create_incoming(
+                    material=data['material'],
+                    warehouse=wh,
+                    quantity=data['quantity'],
+                    user=request.user,
+                    price=tx_price,
+                    description=data['description'],
+                    date=tx_date,
+                    photo=data.get('photo')
+                )
+                action_msg = "✅ Прихід успішно створено!"
+                
+            elif t_type in ['OUT', 'LOSS']:
+                # Спроба створити списання з перевіркою залишків
+                inventory.create_writeoff(
+                    transaction_type=t_type,
+                    material=data['material'],
+                    warehouse=wh,
+                    quantity=data['quantity'],
+                    user=request.user,
+                    description=data['description'],
+                    date=tx_date,
+                    stage=data.get('stage'), # Тільки для OUT
+                    photo=data.get('photo'),
+                    stock_check=form.stock_check
+                )
+                action_msg = f"✅ {'Списання' if t_type == 'OUT' else 'Втрати'} успішно проведено!"
+            else:
+                # Якщо раптом прилетів TRANSFER або щось інше
+                raise ValidationError("Невірний тип транзакції для цієї форми.")
+            
+            log_audit(request, 'CREATE', new_val=f"{t_type}: {data['material'].name} x {data['quantity']} on {wh.name}")
+            messages.success(request, action_msg)
+            return redirect('warehouse_detail', pk=wh.id)
+            
+        except InsufficientStockError as e:
+            # Обробка помилки нестачі товару
+            messages.error(request, str(e))
+            # Повертаємо користувача на форму з даними
+            return render(request, 'warehouse/transaction_form.html', {'form': form})
+        except ValidationError as e:
+            messages.error(request, str(e))
+        except Exception as e:
+            logger.exception(f"Transaction creation failed for user {request.user.id}")
+            messages.error(request, "Помилка при створенні транзакції. Спробуйте ще раз.")
+    return None
+
+
 @login_required
 def add_transaction(request):
     """
@@ -182,67 +257,12 @@ def add_transaction(request):
         # навіть якщо користувач маніпулював ID або форма рендериться заново.
         # Перевірка доступу буде виконана нижче через enforce_warehouse_access_or_404.
         
-        if form.is_valid():
-            data = form.cleaned_data
-            wh = data['warehouse']
-            
-            # Перевірка доступу до складу
-            # Це викликає 404, якщо користувач не має прав на цей склад
-            enforce_warehouse_access_or_404(request.user, wh)
-
-            try:
-                # Використовуємо inventory services замість ручного створення
-                t_type = data['transaction_type']
-                
-                # Отримуємо дату та ціну з post_data (бо їх може не бути в form.cleaned_data, якщо полів немає у формі)
-                tx_date = post_data.get('date')
-                tx_price = post_data.get('price')
-                
-                if t_type == 'IN':
-                    inventory.create_incoming(
-                        material=data['material'],
-                        warehouse=wh,
-                        quantity=data['quantity'],
-                        user=request.user,
-                        price=tx_price,
-                        description=data['description'],
-                        date=tx_date,
-                        photo=data.get('photo')
-                    )
-                    action_msg = "✅ Прихід успішно створено!"
-                    
-                elif t_type in ['OUT', 'LOSS']:
-                    # Спроба створити списання з перевіркою залишків
-                    inventory.create_writeoff(
-                        transaction_type=t_type,
-                        material=data['material'],
-                        warehouse=wh,
-                        quantity=data['quantity'],
-                        user=request.user,
-                        description=data['description'],
-                        date=tx_date,
-                        stage=data.get('stage'), # Тільки для OUT
-                        photo=data.get('photo')
-                    )
-                    action_msg = f"✅ {'Списання' if t_type == 'OUT' else 'Втрати'} успішно проведено!"
-                else:
-                    # Якщо раптом прилетів TRANSFER або щось інше
-                    raise ValidationError("Невірний тип транзакції для цієї форми.")
-                
-                log_audit(request, 'CREATE', new_val=f"{t_type}: {data['material'].name} x {data['quantity']} on {wh.name}")
-                messages.success(request, action_msg)
-                return redirect('warehouse_detail', pk=wh.id)
-                
-            except InsufficientStockError as e:
-                # Обробка помилки нестачі товару
-                messages.error(request, str(e))
-                # Повертаємо користувача на форму з даними
-                return render(request, 'warehouse/transaction_form.html', {'form': form})
-            except ValidationError as e:
-                messages.error(request, str(e))
-            except Exception as e:
-                logger.exception(f"Transaction creation failed for user {request.user.id}")
-                messages.error(request, "Помилка при створенні транзакції. Спробуйте ще раз.")
+        # Валідація і списання в одній транзакції: залишок, прочитаний формою під блокуванням,
+        # перевикористовується в create_writeoff (form.stock_check)
+        with transaction.atomic():
+            response = _save_transaction_form(request, form, post_data)
+        if response is not None:
+            return response
     else:
         # GET request
         form = TransactionForm()
@@ -273,7 +293,7 @@ class TransferForm(forms.Form):
     source_warehouse = forms.ModelChoiceField(queryset=Warehouse.objects.none(), label="Зі складу")
     # ТІЛЬКИ ДОЗВОЛЕНІ СКЛАДИ ДЛЯ ПРИЗНАЧЕННЯ (по замовчуванню none, заповниться у view)
     target_warehouse = forms.ModelChoiceField(queryset=Warehouse.objects.none(), label="На склад")
-    material = forms.ModelChoiceField(queryset=Material.objects.all(), label="Матеріал")
+    material = MaterialChoiceField(label="Матеріал")
     
     # DECIMAL UPDATE
     quantity = forms.DecimalField(
@@ -369,4 +389,42 @@ def add_transfer(request):
     })
 
 # Alias for compatibility with warehouse/urls.py
-create_transfer_view = add_transfer
\ No newline at end of file
+create_transfer_view = add_transfer
+
+# ==============================================================================
+# ПАКЕТНЕ API (OFFLINE-КЛІЄНТИ)
+# ==============================================================================
+
+@login_required
+@rate_limit(requests_per_minute=30, key_prefix='api_ingest')
+def ingest_transactions_api(request):
+    """
+    Пакет операцій від офлайн-клієнта (прораб без зв'язку відправляє накопичене).
+    POST JSON: {"operations": [{"key": "<uuid>", "type": "OUT", "material_id": 1, "warehouse_id": 2,
+    "quantity": "5", ...}, ...]} - формат операцій див. services.ingestion.ingest.
+
+    Відповідь: {"results": [...], "created": N, "duplicates": N, "errors": N}. Повторна відправка
+    того самого key безпечна: операція не дублюється, повертається статус "duplicate".
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Некоректний JSON'}, status=400)
+
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    try:
+        results = ingestion.ingest(
+            operations, request.user, get_allowed_warehouses(request.user), ip=get_client_ip(request)
+        )
+    except ingestion.BatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    statuses = [result['status'] for result in results]
+    return JsonResponse({
+        'results': results,
+        'created': statuses.count('created'),
+        'duplicates': statuses.count('duplicate'),
+        'errors': statuses.count('error'),
+    })
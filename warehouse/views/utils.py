@@ -2,6 +2,7 @@ from django.db.models import Sum, Case, When, F, DecimalField, Value, Q
 from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
 from ..models import Transaction, Warehouse, Material, AuditLog, UserProfile
+from ..services.low_stock import BALANCE_EXPR
 import json
 from decimal import Decimal
 
@@ -160,6 +161,26 @@ def get_warehouse_balance(warehouse):
         
     return balance
 
+def get_warehouses_balances(warehouses):
+    """
+    Залишки кількох складів двома запитами: GROUP BY (склад, матеріал) + in_bulk матеріалів.
+    Повертає {warehouse_id: {Material_Object: Decimal_quantity}} - для кожного складу той самий
+    формат, що й get_warehouse_balance, але без запитів на кожен склад.
+    """
+    rows = list(
+        Transaction.objects.filter(warehouse__in=warehouses)
+        .order_by()
+        .values('warehouse_id', 'material_id')
+        .annotate(qty=BALANCE_EXPR)
+    )
+    materials_map = Material.objects.in_bulk({row['material_id'] for row in rows})
+
+    balances = {}
+    for row in rows:
+        qty = (row['qty'] or Decimal("0.000")).quantize(Decimal("0.001"))
+        balances.setdefault(row['warehouse_id'], {})[materials_map[row['material_id']]] = qty
+    return balances
+
 def get_stock_json(user=None):
     """
     Повертає JSON з залишками по всіх складах.
@@ -175,8 +196,11 @@ def get_stock_json(user=None):
     else:
         warehouses = get_allowed_warehouses(user)
     
+    warehouses = list(warehouses)
+    balances = get_warehouses_balances(warehouses)
+
     for wh in warehouses:
-        balance_map = get_warehouse_balance(wh)
+        balance_map = balances.get(wh.id, {})
         
         # Оскільки get_warehouse_balance повертає об'єкти Material як ключі,
         # нам треба перетворити їх назад в ID для JSON серіалізації.
@@ -194,6 +218,21 @@ def get_stock_json(user=None):
 # 4. АУДИТ ТА ЖУРНАЛИ
 # ==============================================================================
 
+def parse_id_list(value):
+    """'1,2,x,3' -> [1, 2, 3] (GET-параметр зі списком id; некоректні значення пропускаються)."""
+    return [int(part) for part in (value or '').split(',') if part.strip().isdigit()]
+
+
+def get_client_ip(request):
+    """IP клієнта для журналу аудиту (перший з X-Forwarded-For за проксі)."""
+    meta = getattr(request, 'META', {}) or {}
+    x_forwarded_for = meta.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        # Беремо перший IP зі списку проксі
+        return x_forwarded_for.split(',')[0].strip()
+    return meta.get('REMOTE_ADDR')
+
+
 def log_audit(request, action_type, affected_object=None, old_val=None, new_val=None):
     """
     Записує дію в журнал аудиту (AuditLog).
@@ -209,14 +248,7 @@ def log_audit(request, action_type, affected_object=None, old_val=None, new_val=
             user = req_user
         
         # 2. IP extraction (fail-safe)
-        meta = getattr(request, 'META', {}) or {}
-        
-        x_forwarded_for = meta.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            # Беремо перший IP зі списку проксі
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = meta.get('REMOTE_ADDR')
+        ip = get_client_ip(request)
     
     # 3. Smart creation: pass only allowed fields
     import logging
@@ -284,6 +316,7 @@ def enrich_transfers(queryset):
     return list(grouped_transfers.values())
 
 from ..decorators import rate_limit
+from ..services.material_search import search_materials
 
 
 @login_required
@@ -363,16 +396,7 @@ def ajax_materials(request):
     """
     query = request.GET.get('q') or request.GET.get('term')
     
-    materials = Material.objects.all().order_by('name')
-    
-    if query:
-        # Фільтрація по назві або артикулу
-        materials = materials.filter(
-            Q(name__icontains=query) | Q(article__icontains=query)
-        )
-    
-    # Оптимізація: беремо тільки потрібні поля і лімітуємо кількість
-    # Використовуємо values() для отримання словників
-    items = list(materials.values('id', 'name', 'unit', 'article')[:50])
+    # Індексований пошук з ранжуванням (точний артикул -> префікс -> підрядок)
+    items = search_materials(query, limit=50)
     
     return JsonResponse({'items': items})
\ No newline at end of file